@@ -0,0 +1,193 @@
+# core/autotuner.py - AIMD concurrency autotuning for the download pool
+import threading
+import time
+import logging
+
+from core.error_classifier import PERMANENT, RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class ThroughputMeter:
+    """线程安全的字节计数器，下载线程在进度钩子中调用 add()，调节器定期 take()。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._total = 0
+
+    def add(self, nbytes):
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self._bytes += nbytes
+            self._total += nbytes
+
+    def take(self):
+        """返回自上次 take() 以来的字节数并清零。"""
+        with self._lock:
+            nbytes, self._bytes = self._bytes, 0
+        return nbytes
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return self._total
+
+
+class ConcurrencyAutotuner:
+    """
+    AIMD (加性增、乘性减) 并发自动调节器。
+
+    每个采样周期统计聚合吞吐量 (来自进度钩子的字节数) 和下载尝试的错误率：
+      - 被限流或临时错误率超过阈值时，并发数乘以 decrease_factor (乘性减)；
+      - 有任务在排队且吞吐量没有比上个周期明显下降时，并发数加 1 (加性增)；
+      - 上一次增加并发后吞吐量反而下降时，撤回这次增加。
+    永久性错误 (私密、已删除等) 与负载无关，不计入错误率。
+    """
+
+    def __init__(self, set_concurrency, get_counts, meter, min_workers=1, max_workers=10, interval=10.0,
+                 error_threshold=0.2, decrease_factor=0.5, drop_tolerance=0.1):
+        """
+        参数:
+            set_concurrency (callable): 设置并发数的函数，返回实际生效的值 (例如 DownloadScheduler.set_concurrency)。
+            get_counts (callable): 返回 {'queued', 'running', 'limit', ...} 的函数 (例如 DownloadScheduler.get_counts)。
+            meter (ThroughputMeter): 吞吐量计数器。
+            min_workers / max_workers (int): 并发数的调节范围。
+            interval (float): 采样周期 (秒)。
+            error_threshold (float): 触发乘性减的错误率。
+            decrease_factor (float): 乘性减系数 (0~1)。
+            drop_tolerance (float): 吞吐量下降多少比例视为"增加并发没有收益"。
+        """
+        self._set_concurrency = set_concurrency
+        self._get_counts = get_counts
+        self.meter = meter
+        self.min_workers = max(1, int(min_workers))
+        self.max_workers = max(self.min_workers, int(max_workers))
+        self.interval = max(1.0, float(interval))
+        self.error_threshold = min(1.0, max(0.0, float(error_threshold)))
+        self.decrease_factor = min(0.95, max(0.1, float(decrease_factor)))
+        self.drop_tolerance = min(0.9, max(0.0, float(drop_tolerance)))
+
+        self._lock = threading.Lock()
+        self._attempts = 0
+        self._errors = 0
+        self._rate_limited = 0
+        self._last_tick = time.monotonic()
+        self._last_throughput = None
+        self._last_action = None
+        self.enabled = False
+        self._timer_queue = None
+        self.history = [] # 最近的调节记录 (time, limit, throughput, error_rate, action)
+
+    @classmethod
+    def from_config(cls, get_config, set_concurrency, get_counts, meter, default_max=10):
+        """根据配置创建调节器，无效值回退到默认值。"""
+        values = {}
+        for key, attr, cast, default in (('autotune_min_workers', 'min_workers', int, 1),
+                                         ('autotune_max_workers', 'max_workers', int, default_max),
+                                         ('autotune_interval', 'interval', float, 10.0),
+                                         ('autotune_error_threshold', 'error_threshold', float, 0.2)):
+            try:
+                values[attr] = cast(get_config(key, default))
+            except (ValueError, TypeError):
+                print(f"警告: 配置中的 '{key}' 值无效，将使用默认值 {default}。")
+                values[attr] = default
+        return cls(set_concurrency, get_counts, meter, **values)
+
+    def record_attempt(self, result):
+        """记录一次下载尝试的结果 (DownloadScheduler 的 on_attempt_done 回调，工作线程调用)。"""
+        if not isinstance(result, dict):
+            return
+        status = result.get('status')
+        category = result.get('error_category')
+        with self._lock:
+            self._attempts += 1
+            if status in ('retry', 'error') and category != PERMANENT:
+                self._errors += 1
+                if category == RATE_LIMITED:
+                    self._rate_limited += 1
+
+    def start(self, timer_queue):
+        """
+        启用自动调节，使用 timer_queue (DelayedTaskQueue) 定期采样。
+        """
+        self._timer_queue = timer_queue
+        self.enabled = True
+        self.meter.take()
+        with self._lock:
+            self._attempts = self._errors = self._rate_limited = 0
+            self._last_tick = time.monotonic()
+            self._last_throughput = None
+            self._last_action = None
+        self._schedule_next()
+
+    def stop(self):
+        self.enabled = False
+        if self._timer_queue:
+            self._timer_queue.cancel(('autotune',))
+
+    def tick(self):
+        """执行一次采样和调节，返回调节后的并发数。"""
+        now = time.monotonic()
+        nbytes = self.meter.take()
+        with self._lock:
+            elapsed = max(1e-6, now - self._last_tick)
+            self._last_tick = now
+            attempts, errors, rate_limited = self._attempts, self._errors, self._rate_limited
+            self._attempts = self._errors = self._rate_limited = 0
+        throughput = nbytes / elapsed
+        error_rate = errors / attempts if attempts else 0.0
+        counts = self._get_counts()
+        current = counts.get('limit', self.min_workers)
+        target, action = current, 'hold'
+
+        if rate_limited or (errors >= 2 and error_rate > self.error_threshold):
+            target, action = int(current * self.decrease_factor), 'decrease'
+        elif counts.get('running', 0) == 0:
+            action = 'idle' # 没有正在下载的任务，吞吐量没有参考意义
+        elif (self._last_action == 'increase' and self._last_throughput
+              and throughput < self._last_throughput * (1.0 - self.drop_tolerance)):
+            target, action = current - 1, 'revert' # 上次增加并发没有带来收益
+        elif counts.get('queued', 0) > 0:
+            target, action = current + 1, 'increase'
+
+        target = max(self.min_workers, min(self.max_workers, target))
+        if target != current:
+            target = self._set_concurrency(target)
+            logger.info("并发自动调节: %d -> %d (%s, 吞吐量 %.1f KB/s, 错误率 %.0f%%)",
+                        current, target, action, throughput / 1024, error_rate * 100)
+        elif action in ('increase', 'decrease', 'revert'):
+            action = 'hold' # 已到达边界
+        if action != 'idle':
+            self._last_throughput = throughput
+        self._last_action = action
+        self.history.append((time.time(), target, throughput, error_rate, action))
+        del self.history[:-50]
+        return target
+
+    def get_stats(self):
+        last = self.history[-1] if self.history else None
+        return {
+            'enabled': self.enabled,
+            'min_workers': self.min_workers,
+            'max_workers': self.max_workers,
+            'last_limit': last[1] if last else None,
+            'last_throughput_kbps': (last[2] / 1024) if last else None,
+            'last_error_rate': last[3] if last else None,
+            'total_bytes': self.meter.total_bytes,
+        }
+
+    # --- Internal Helpers ---
+
+    def _run_tick(self):
+        if not self.enabled:
+            return
+        try:
+            self.tick()
+        finally:
+            self._schedule_next()
+
+    def _schedule_next(self):
+        if self.enabled and self._timer_queue:
+            self._timer_queue.schedule(self.interval, self._run_tick, key=('autotune',))
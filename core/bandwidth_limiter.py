@@ -0,0 +1,234 @@
+# core/bandwidth_limiter.py - Shared token-bucket bandwidth limiting for all download workers
+import datetime
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_WAIT_SLICE = 0.5 # 单次等待的最长秒数，便于在运行时调整限速后尽快生效
+SCHEDULE_CHECK_INTERVAL = 30.0 # 重新计算时间段限速的间隔 (秒)
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶。
+
+    consume() 先扣除令牌 (允许透支)，再等待到透支被补足，因此多个线程共享同一个桶时
+    总速率不会超过 rate。rate 为 0 或 None 表示不限速。
+    """
+
+    def __init__(self, rate=None, burst=None):
+        """
+        参数:
+            rate (float | None): 每秒补充的字节数，0 或 None 表示不限速。
+            burst (float | None): 桶容量 (字节)，默认等于 1 秒的速率。
+        """
+        self._condition = threading.Condition()
+        self.rate = None
+        self.burst = 0.0
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """运行时修改速率，正在等待的线程会立即按新速率重新计算。"""
+        with self._condition:
+            self._refill()
+            rate = float(rate) if rate else None
+            if rate is not None and rate <= 0:
+                rate = None
+            self.rate = rate
+            self.burst = float(burst) if burst else (rate or 0.0)
+            if rate is None:
+                self._tokens = 0.0
+            else:
+                self._tokens = min(self._tokens, self.burst)
+            self._condition.notify_all()
+
+    def consume(self, amount, should_stop=None):
+        """
+        扣除 amount 字节的令牌，必要时阻塞当前线程。返回实际等待的秒数。
+
+        should_stop (callable | None) 返回 True 时 (例如任务已取消) 在下一个等待片段结束等待。
+        """
+        if amount <= 0:
+            return 0.0
+        waited = 0.0
+        with self._condition:
+            if self.rate is None:
+                return 0.0
+            self._refill()
+            self._tokens -= amount
+            while self.rate is not None and self._tokens < 0:
+                if should_stop is not None and should_stop():
+                    break
+                timeout = min(MAX_WAIT_SLICE, -self._tokens / self.rate)
+                started = time.monotonic()
+                self._condition.wait(timeout)
+                waited += time.monotonic() - started
+                self._refill()
+        return waited
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+def _parse_clock(value):
+    hour, minute = str(value).strip().split(':', 1)
+    return datetime.time(int(hour), int(minute))
+
+
+class BandwidthSchedule:
+    """
+    按一天中的时间段设置全局限速。
+
+    规则格式: [{"start": "09:00", "end": "18:00", "limit_kbps": 512}, ...]，
+    end 早于 start 表示跨越午夜；不在任何时间段内时使用基础限速。
+    """
+
+    def __init__(self, rules=None):
+        self.rules = []
+        for rule in rules or []:
+            try:
+                start, end = _parse_clock(rule['start']), _parse_clock(rule['end'])
+                limit_kbps = max(0, int(rule.get('limit_kbps', 0)))
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                print(f"警告: 忽略无效的限速时间段 {rule}: {e}")
+                continue
+            self.rules.append((start, end, limit_kbps))
+
+    def limit_for(self, now, default_kbps):
+        """返回 now (datetime) 时刻适用的限速 (KB/s)，0 表示不限速。"""
+        current = now.time()
+        for start, end, limit_kbps in self.rules:
+            if start <= end:
+                active = start <= current < end
+            else:
+                active = current >= start or current < end
+            if active:
+                return limit_kbps
+        return default_kbps
+
+
+class BandwidthLimiter:
+    """
+    所有下载线程共享的带宽限制器: 一个全局令牌桶，加上可选的按平台子令牌桶。
+
+    下载线程在进度回调中调用 consume(platform, nbytes)，超过限速时在回调内等待，
+    从而降低 yt-dlp 的读取速度。限速可在运行时修改，正在进行的下载无需重启。
+    """
+
+    def __init__(self, limit_kbps=0, platform_limits_kbps=None, schedule=None):
+        """
+        参数:
+            limit_kbps (int): 全局基础限速 (KB/s)，0 表示不限速。
+            platform_limits_kbps (dict | None): 平台名到子限速 (KB/s) 的映射。
+            schedule (list | None): 时间段限速规则，见 BandwidthSchedule。
+        """
+        self._lock = threading.Lock()
+        self.limit_kbps = 0
+        self.schedule = BandwidthSchedule(schedule)
+        self._global_bucket = TokenBucket()
+        self._platform_buckets = {}
+        self._effective_kbps = None
+        self._next_schedule_check = 0.0
+        self._throttled_seconds = 0.0
+        self._bytes = 0
+        self.set_limit(limit_kbps)
+        self.set_platform_limits(platform_limits_kbps or {})
+
+    @classmethod
+    def from_config(cls, get_config):
+        """
+        根据配置创建限制器，无效值回退到不限速。
+
+        参数:
+            get_config (callable): 形如 ConfigManager.get_config(key, default) 的函数。
+        """
+        try:
+            limit_kbps = max(0, int(get_config('bandwidth_limit_kbps', 0)))
+        except (ValueError, TypeError):
+            print("警告: 配置中的 'bandwidth_limit_kbps' 值无效，将不限速。")
+            limit_kbps = 0
+        platform_limits = get_config('bandwidth_platform_limits_kbps', {}) or {}
+        if not isinstance(platform_limits, dict):
+            print("警告: 配置中的 'bandwidth_platform_limits_kbps' 不是字典，将忽略。")
+            platform_limits = {}
+        schedule = get_config('bandwidth_schedule', []) or []
+        if not isinstance(schedule, list):
+            print("警告: 配置中的 'bandwidth_schedule' 不是列表，将忽略。")
+            schedule = []
+        return cls(limit_kbps, platform_limits, schedule)
+
+    def set_limit(self, limit_kbps):
+        """修改全局基础限速 (KB/s)，立即对正在进行的下载生效。"""
+        with self._lock:
+            self.limit_kbps = max(0, int(limit_kbps or 0))
+            self._next_schedule_check = 0.0
+        self._apply_schedule(force=True)
+
+    def set_platform_limits(self, platform_limits_kbps):
+        """修改按平台的子限速 (KB/s)，0 表示该平台只受全局限速约束。"""
+        with self._lock:
+            for platform, limit_kbps in platform_limits_kbps.items():
+                try:
+                    rate = max(0, int(limit_kbps)) * 1024
+                except (ValueError, TypeError):
+                    print(f"警告: 平台 '{platform}' 的限速值无效，将忽略。")
+                    continue
+                bucket = self._platform_buckets.get(str(platform).lower())
+                if bucket is None:
+                    self._platform_buckets[str(platform).lower()] = TokenBucket(rate)
+                else:
+                    bucket.set_rate(rate)
+
+    def effective_limit_kbps(self):
+        """当前生效的全局限速 (KB/s)，0 表示不限速。"""
+        self._apply_schedule()
+        return self._effective_kbps or 0
+
+    def consume(self, platform, nbytes, should_stop=None):
+        """
+        记录 nbytes 字节的下载量，超过平台或全局限速时阻塞调用线程。
+        should_stop 返回 True 时提前结束等待 (见 TokenBucket.consume)。
+        """
+        if nbytes <= 0:
+            return
+        self._apply_schedule()
+        waited = 0.0
+        bucket = self._platform_buckets.get(platform)
+        if bucket is not None:
+            waited += bucket.consume(nbytes, should_stop)
+        waited += self._global_bucket.consume(nbytes, should_stop)
+        with self._lock:
+            self._bytes += nbytes
+            self._throttled_seconds += waited
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'limit_kbps': self.limit_kbps,
+                'effective_kbps': self._effective_kbps or 0,
+                'platform_limits_kbps': {p: int((b.rate or 0) / 1024) for p, b in self._platform_buckets.items()},
+                'bytes': self._bytes,
+                'throttled_seconds': self._throttled_seconds,
+            }
+
+    # --- Internal Helpers ---
+
+    def _apply_schedule(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now < self._next_schedule_check:
+                return
+            self._next_schedule_check = now + SCHEDULE_CHECK_INTERVAL
+            limit_kbps = self.schedule.limit_for(datetime.datetime.now(), self.limit_kbps)
+            if limit_kbps == self._effective_kbps:
+                return
+            self._effective_kbps = limit_kbps
+        logger.info("全局下载限速调整为 %s", f"{limit_kbps} KB/s" if limit_kbps else "不限速")
+        self._global_bucket.set_rate(limit_kbps * 1024)
@@ -0,0 +1,117 @@
+# core/batch_tracker.py - Event-driven completion tracking for download batches
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSummary:
+    """一个批次在某一时刻的计数快照。"""
+
+    __slots__ = ('batch_id', 'total', 'succeeded', 'failed', 'cancelled')
+
+    def __init__(self, batch_id, total, succeeded, failed, cancelled=0):
+        self.batch_id = batch_id
+        self.total = total
+        self.succeeded = succeeded
+        self.failed = failed
+        self.cancelled = cancelled
+
+    @property
+    def done(self):
+        return self.succeeded + self.failed + self.cancelled
+
+    @property
+    def is_complete(self):
+        return self.done >= self.total
+
+    def __repr__(self):
+        return (f"BatchSummary(batch_id={self.batch_id!r}, total={self.total}, "
+                f"succeeded={self.succeeded}, failed={self.failed}, cancelled={self.cancelled})")
+
+
+class DownloadBatch:
+    """
+    一个下载批次的完成计数。
+
+    每个任务 Future 完成时通过 done-callback 更新计数 (在完成 Future 的线程中执行，
+    计数在锁内修改)，无需轮询线程或从界面读取状态；汇总是 O(1) 的计数快照。
+    多个批次各自计数，互相重叠时汇总仍然正确。
+    """
+
+    def __init__(self, batch_id, on_item_done=None, on_complete=None):
+        """
+        参数:
+            batch_id: 批次标识。
+            on_item_done (callable | None): 每个任务完成时调用 on_item_done(summary)。
+            on_complete (callable | None): 批次已封口且全部任务完成时调用一次 on_complete(summary)。
+        注意: 回调在完成 Future 的线程中执行，需要更新界面时应转交给主线程。
+        """
+        self.batch_id = batch_id
+        self._on_item_done = on_item_done
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+        self._total = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._sealed = False
+        self._completed = False
+
+    def add(self, item_id, future):
+        """登记一个任务 Future。必须在 seal() 之前调用。"""
+        with self._lock:
+            if self._sealed:
+                raise RuntimeError(f"批次 {self.batch_id} 已封口，无法继续添加任务")
+            self._total += 1
+        future.add_done_callback(lambda f, captured_id=item_id: self._on_future_done(captured_id, f))
+
+    def seal(self):
+        """停止接受新任务；如果所有任务都已完成 (或批次为空)，立即触发 on_complete。"""
+        with self._lock:
+            self._sealed = True
+            summary = self._take_completion()
+        if summary:
+            self._notify(self._on_complete, summary)
+
+    def summary(self):
+        with self._lock:
+            return self._snapshot()
+
+    # --- Internal Helpers ---
+
+    def _on_future_done(self, item_id, future):
+        status = None
+        if not future.cancelled() and future.exception() is None:
+            result = future.result()
+            status = result.get('status') if isinstance(result, dict) else None
+        with self._lock:
+            if status == 'finished':
+                self._succeeded += 1
+            elif status == 'cancelled':
+                self._cancelled += 1
+            else:
+                self._failed += 1
+            snapshot = self._snapshot()
+            completion = self._take_completion()
+        self._notify(self._on_item_done, snapshot)
+        if completion:
+            self._notify(self._on_complete, completion)
+
+    def _snapshot(self):
+        return BatchSummary(self.batch_id, self._total, self._succeeded, self._failed, self._cancelled)
+
+    def _take_completion(self):
+        """调用方需持有锁。返回需要报告的完成汇总 (每个批次只返回一次)，否则返回 None。"""
+        if self._completed or not self._sealed or self._succeeded + self._failed + self._cancelled < self._total:
+            return None
+        self._completed = True
+        return self._snapshot()
+
+    def _notify(self, callback, summary):
+        if not callback:
+            return
+        try:
+            callback(summary)
+        except Exception as e:
+            logger.error("批次 %s 回调出错: %s", self.batch_id, e, exc_info=True)
@@ -0,0 +1,158 @@
+# core/bulk_import.py - Streaming bulk URL import on a background thread
+import os
+import threading
+import logging
+
+from core.url_canonicalizer import canonicalize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000 # 每批写入任务存储的 URL 数量
+PROGRESS_EVERY_LINES = 1000 # 没有写入时也每读取这么多行更新一次进度
+
+
+class BulkUrlImporter:
+    """
+    在后台线程中流式导入大量 URL (来自文件或一段文本)。
+
+    逐行读取，按 url_canonicalizer 的规范键去重，每 chunk_size 个 URL 通过 TaskStore.add_many() 写入任务存储一次，
+    界面由进度定时器增量刷新；可随时取消，取消前已读取的行仍会写入，之后的行不再读取。
+    """
+
+    def __init__(self, store, platform, make_title=None, chunk_size=DEFAULT_CHUNK_SIZE, is_archived=None):
+        """
+        参数:
+            store (TaskStore): 任务存储 (线程安全)。
+            platform (str): 导入任务所属的平台名 (域名属于其他已知平台时以域名为准)。
+            make_title (callable | None): make_title(url) 返回初始显示名称。
+            chunk_size (int): 每批写入的 URL 数量。
+            is_archived (callable | None): is_archived(canonical) 为 True 的视频已下载过，跳过。
+        """
+        self.store = store
+        self.platform = platform
+        self._make_title = make_title or (lambda url: url[:50])
+        self.chunk_size = max(1, int(chunk_size))
+        self._is_archived = is_archived
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._progress = {'lines': 0, 'added': 0, 'duplicates': 0, 'archived': 0, 'invalid': 0,
+                          'position': 0, 'total': 0, 'done': False, 'cancelled': False, 'error': None}
+
+    def start_file(self, path):
+        """开始从文本文件 (每行一个或多个 URL) 导入。"""
+        self._start(self._run_file, path)
+
+    def start_text(self, text):
+        """开始从一段文本 (例如剪贴板内容) 导入。"""
+        self._start(self._run_text, text)
+
+    def cancel(self):
+        """请求取消，导入线程在处理完当前行后停止。"""
+        self._cancel_event.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        """等待导入线程结束 (最多 timeout 秒)。"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def progress(self):
+        """
+        返回进度快照 (任意线程调用)。
+
+        返回:
+            dict: lines / added / duplicates / archived / invalid 计数，fraction (0~1)，
+                  以及 done、cancelled、error。
+        """
+        with self._lock:
+            progress = dict(self._progress)
+        total = progress['total']
+        progress['fraction'] = min(1.0, progress['position'] / total) if total else (1.0 if progress['done'] else 0.0)
+        return progress
+
+    # --- Internal Helpers (导入线程) ---
+
+    def _start(self, target, source):
+        if self.is_running():
+            raise RuntimeError("导入已在进行中")
+        self._thread = threading.Thread(target=target, args=(source,), name='BulkUrlImporter', daemon=True)
+        self._thread.start()
+
+    def _run_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                self._set_progress(total=f.tell())
+                f.seek(0)
+                self._consume((raw.decode('utf-8', 'replace'), len(raw)) for raw in f)
+        except OSError as e:
+            logger.error("读取导入文件 %s 失败: %s", path, e)
+            self._finish(error=str(e))
+
+    def _run_text(self, text):
+        self._set_progress(total=len(text))
+        self._consume((line, len(line)) for line in text.splitlines(keepends=True))
+
+    def _consume(self, lines):
+        seen = set()
+        chunk = []
+        counts = {'lines': 0, 'added': 0, 'duplicates': 0, 'archived': 0, 'invalid': 0, 'position': 0}
+        try:
+            for line, size in lines:
+                if self._cancel_event.is_set():
+                    break
+                counts['lines'] += 1
+                counts['position'] += size
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                found = False
+                for token in line.split():
+                    canonical = canonicalize(token, self.platform)
+                    if canonical is None:
+                        continue
+                    found = True
+                    task_id = canonical.task_id
+                    if task_id in seen:
+                        counts['duplicates'] += 1
+                        continue
+                    seen.add(task_id)
+                    if self._is_archived is not None and self._is_archived(canonical):
+                        counts['archived'] += 1
+                        continue
+                    chunk.append({'id': task_id, 'url': canonical.url, 'platform': canonical.platform,
+                                  'filename': self._make_title(canonical.url)})
+                if not found:
+                    counts['invalid'] += 1
+                if len(chunk) >= self.chunk_size:
+                    self._flush_chunk(chunk, counts)
+                    chunk = []
+                elif counts['lines'] % PROGRESS_EVERY_LINES == 0:
+                    self._set_progress(**counts)
+            if chunk: # 取消时同样写入已读取的行，计数与任务存储保持一致
+                self._flush_chunk(chunk, counts)
+        except Exception as e:
+            logger.error("批量导入 URL 时出错: %s", e, exc_info=True)
+            self._finish(error=str(e), **counts)
+            return
+        self._finish(**counts)
+
+    def _flush_chunk(self, chunk, counts):
+        added = len(self.store.add_many(chunk))
+        counts['added'] += added
+        counts['duplicates'] += len(chunk) - added # 已在任务存储中的 URL
+        self._set_progress(**counts)
+
+    def _set_progress(self, **values):
+        with self._lock:
+            self._progress.update(values)
+
+    def _finish(self, error=None, **counts):
+        with self._lock:
+            self._progress.update(counts)
+            self._progress['done'] = True
+            self._progress['cancelled'] = self._cancel_event.is_set()
+            self._progress['error'] = error
@@ -0,0 +1,76 @@
+# core/cancel_token.py - Per-task cooperative cancellation tokens
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 取消原因
+REASON_USER = '已取消'      # 用户取消任务: 中止传输并删除 .part 文件
+REASON_SHUTDOWN = 'shutdown' # 程序退出: 中止传输但保留 .part 文件和检查点，下次启动续传
+
+
+def keeps_partials(cancel_token):
+    """取消后是否应保留 .part 文件 (程序退出时的取消)。"""
+    return cancel_token is not None and getattr(cancel_token, 'reason', None) == REASON_SHUTDOWN
+
+
+class CancelToken:
+    """
+    一个任务的一次下载尝试的取消令牌 (线程安全)。
+
+    取消是协作式的: cancel() 只设置标志，执行下载的一方在进度回调、带宽等待和
+    重试等待等检查点查看 cancelled 并自行中止。与 concurrent.futures.Future 一样，
+    add_callback() 注册的回调在取消时调用 (例如把取消转发到工作进程)。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason=REASON_USER):
+        """
+        请求取消 (可在任意线程调用)。
+
+        返回:
+            bool: 是否为第一次取消 (重复取消不再调用回调)。
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._invoke(callback)
+        return True
+
+    def wait(self, timeout=None):
+        """等待最多 timeout 秒，期间被取消则立即返回。返回是否已取消 (用于可中断的重试等待)。"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        """注册取消回调 callback(token)；已取消时立即在当前线程调用。"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        self._invoke(callback)
+
+    def remove_callback(self, callback):
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def _invoke(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            logger.error("取消回调出错: %s", e, exc_info=True)
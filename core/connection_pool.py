@@ -0,0 +1,369 @@
+# core/connection_pool.py - Shared yt-dlp HTTP transport, DNS cache and connection reuse metrics
+import time
+import socket
+import functools
+import ipaddress
+import threading
+import collections
+import logging
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DNS_TTL = 300     # DNS 缓存条目的有效期 (秒)
+DNS_MAX_ENTRIES = 1024    # DNS 缓存的最大条目数 (超过时淘汰最久未用的)
+
+# 共享传输层的 yt-dlp 请求处理器 (按 RH_KEY)。urllib 处理器每个请求都新建连接，没有可以共享的传输层
+SHARED_HANDLER_KEYS = ('Requests',)
+
+_COUNTER_KEYS = ('requests', 'connections', 'tls_connections', 'handshake_seconds',
+                 'dns_hits', 'dns_misses', 'dns_seconds')
+
+_pooled_handler_classes = {} # yt-dlp 请求处理器类 -> 使用共享传输层的子类
+
+
+class DnsCache:
+    """
+    DNS 缓存: 在 ttl 秒内复用同一主机的解析结果。
+
+    只用于 ConnectionPool 为共享传输层新建的连接，不替换 socket.getaddrinfo，进程中的其他代码
+    不受影响。解析失败不缓存；IP 地址字面量直接放行。
+    """
+
+    def __init__(self, ttl=DEFAULT_DNS_TTL, max_entries=DNS_MAX_ENTRIES, on_lookup=None):
+        """
+        参数:
+            ttl (float): 条目有效期 (秒)。
+            max_entries (int): 最大条目数。
+            on_lookup (callable | None): 每次查询后调用 on_lookup(hit, seconds) (用于统计)。
+        """
+        self.ttl = max(1.0, float(ttl))
+        self.max_entries = max(1, int(max_entries))
+        self._on_lookup = on_lookup
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict() # (host, port, family, type, proto, flags) -> (过期时刻, 结果)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        """与 socket.getaddrinfo 参数和返回值相同。"""
+        if not isinstance(host, str) or _is_ip_literal(host):
+            return socket.getaddrinfo(host, port, family, type, proto, flags)
+        key = (host.lower(), port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                result = list(entry[1])
+            else:
+                result = None
+        if result is not None:
+            self._report(True, 0.0)
+            return result
+
+        started = time.perf_counter()
+        result = socket.getaddrinfo(host, port, family, type, proto, flags)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tuple(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._report(False, elapsed)
+        return result
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _report(self, hit, seconds):
+        if self._on_lookup is not None:
+            self._on_lookup(hit, seconds)
+
+
+class ConnectionPool:
+    """
+    跨下载任务共享的 yt-dlp HTTP 传输层。
+
+    每次下载尝试都会新建 YoutubeDL 实例，默认情况下每个实例都有自己的请求处理器和连接，结束时关闭，
+    下一个任务到同一 CDN 主机要重新做 DNS 解析、TCP 和 TLS 握手。new_ydl() 创建的实例仍有自己的
+    请求处理器、会话和 cookie (从各自的 cookie 来源加载，任务之间互不可见)，只有传输层 (requests
+    处理器的 HTTPAdapter，即 urllib3 按主机维护的 keep-alive 连接池) 在 TLS 设置相同的实例之间共享，
+    连接在任务之间复用。共享传输层新建连接时经 DNS 缓存解析主机名并记录握手耗时。
+
+    没有安装 requests 时 yt-dlp 使用 urllib 处理器，每个请求都新建连接，不共享也不统计。
+
+    统计 (get_stats):
+        requests / connections: 经共享传输层发送的请求数与为此新建的连接数，
+        reuse_ratio = 1 - connections / requests (重定向到其他主机也算新连接，是近似值)；
+        handshake_ms_avg: 新建连接的平均耗时 (DNS + TCP + TLS 握手)；
+        dns_*: DNS 缓存的命中、未命中和实际解析耗时；sessions: 共享传输层的个数。
+    """
+
+    def __init__(self, reuse=True, dns_ttl=DEFAULT_DNS_TTL):
+        """
+        参数:
+            reuse (bool): 是否在任务之间共享传输层。为 False 时 new_ydl() 返回普通 YoutubeDL 实例 (原有行为)。
+            dns_ttl (float): DNS 缓存有效期 (秒)，0 表示不缓存。
+        """
+        self.reuse = bool(reuse)
+        self.dns_ttl = max(0, float(dns_ttl or 0))
+        self._lock = threading.Lock() # 保护计数
+        self._transports_lock = threading.Lock()
+        self._transports = {} # TLS 设置键 -> 共享的 HTTPAdapter
+        self._pool_classes = None # 共享传输层使用的 urllib3 连接池类 (首次共享时创建)
+        self._counters = dict.fromkeys(_COUNTER_KEYS, 0)
+        self._reported = dict(self._counters) # take_delta() 上次取走时的计数
+        self._reported_unavailable = False
+        self.dns_cache = DnsCache(self.dns_ttl, on_lookup=self._record_dns) if self.dns_ttl else None
+
+    @classmethod
+    def from_config(cls, get_config):
+        """根据配置 (connection_reuse, dns_cache_ttl) 创建连接池。"""
+        try:
+            dns_ttl = max(0, float(get_config('dns_cache_ttl', DEFAULT_DNS_TTL) or 0))
+        except (ValueError, TypeError):
+            print(f"警告: 配置中的 'dns_cache_ttl' 值无效，将使用默认值 {DEFAULT_DNS_TTL}。")
+            dns_ttl = DEFAULT_DNS_TTL
+        return cls(reuse=get_config('connection_reuse', True), dns_ttl=dns_ttl)
+
+    def worker_config(self):
+        """在工作进程中创建等价连接池所需的参数 (可序列化)。"""
+        return {'reuse': self.reuse, 'dns_ttl': self.dns_ttl}
+
+    def new_ydl(self, params):
+        """
+        创建一个 YoutubeDL 实例，其 HTTP 请求经共享的传输层发送 (reuse 为 False 时返回普通实例)。
+
+        参数:
+            params (dict): yt-dlp 选项，与 yt_dlp.YoutubeDL(params) 相同。
+        """
+        if not self.reuse:
+            return yt_dlp.YoutubeDL(params)
+        return _PooledYoutubeDL(params, self)
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None,
+                          socket_options=None):
+        """
+        为共享传输层新建 TCP 连接 (经 DNS 缓存解析)，参数与 urllib3.util.connection.create_connection 相同。
+        指定 source_address 时只尝试同一地址族的地址 (与 yt-dlp 一致)。
+        """
+        host, port = address
+        if host.startswith('['):
+            host = host.strip('[]')
+        resolve = self.dns_cache.getaddrinfo if self.dns_cache is not None else socket.getaddrinfo
+        addresses = resolve(host, port, 0, socket.SOCK_STREAM)
+        if source_address is not None:
+            family = socket.AF_INET6 if ':' in source_address[0] else socket.AF_INET
+            addresses = [info for info in addresses if info[0] == family]
+        if not addresses:
+            raise OSError(f"没有可用于连接 {host} 的地址")
+        error = None
+        for family, socktype, proto, _, sockaddr in addresses:
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                for option in socket_options or ():
+                    sock.setsockopt(*option)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+        try:
+            raise error
+        finally:
+            error = None # 打断 traceback 引用环
+
+    def take_delta(self):
+        """返回自上次调用以来的计数增量 (工作进程把它发回主进程合并)，没有变化时返回 None。"""
+        with self._lock:
+            delta = {key: self._counters[key] - self._reported[key] for key in _COUNTER_KEYS}
+            self._reported = dict(self._counters)
+        return delta if any(delta.values()) else None
+
+    def merge(self, delta):
+        """合并工作进程发回的计数增量。"""
+        with self._lock:
+            for key in _COUNTER_KEYS:
+                self._counters[key] += delta.get(key, 0)
+            self._reported = {key: self._reported[key] + delta.get(key, 0) for key in _COUNTER_KEYS}
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        with self._transports_lock:
+            stats['sessions'] = len(self._transports)
+        requests, connections = stats['requests'], stats['connections']
+        stats['reuse_ratio'] = round(max(0.0, 1 - connections / requests), 3) if requests else None
+        stats['handshake_ms_avg'] = round(stats['handshake_seconds'] * 1000 / connections, 1) if connections else None
+        lookups = stats['dns_hits'] + stats['dns_misses']
+        stats['dns_hit_ratio'] = round(stats['dns_hits'] / lookups, 3) if lookups else None
+        stats['handshake_seconds'] = round(stats['handshake_seconds'], 3)
+        stats['dns_seconds'] = round(stats['dns_seconds'], 3)
+        stats.update(reuse=self.reuse, dns_ttl=self.dns_ttl, dns_entries=len(self.dns_cache) if self.dns_cache else 0)
+        return stats
+
+    def close(self):
+        """关闭所有共享传输层 (断开保持的连接) 并清空 DNS 缓存。"""
+        with self._transports_lock:
+            transports, self._transports = list(self._transports.values()), {}
+        for adapter in transports:
+            try:
+                adapter.close()
+            except Exception as e:
+                logger.warning("关闭共享传输层时出错: %s", e)
+        if self.dns_cache is not None:
+            self.dns_cache.clear()
+
+    # --- Internal Helpers (任意线程调用) ---
+
+    def _wrap_handlers(self, handlers):
+        """把 yt-dlp 的请求处理器类换成使用共享传输层的子类 (绑定本连接池)，其余处理器不变。"""
+        wrapped = [functools.partial(_pooled_handler_class(handler), connection_pool=self)
+                   if getattr(handler, 'RH_KEY', None) in SHARED_HANDLER_KEYS else handler
+                   for handler in handlers]
+        if wrapped == handlers and not self._reported_unavailable:
+            self._reported_unavailable = True
+            logger.info("yt-dlp 没有可用的 requests 处理器 (未安装 requests)，任务之间不复用连接")
+        return wrapped
+
+    def _shared_adapter(self, key, candidate):
+        """
+        返回 TLS 设置为 key 的共享 HTTPAdapter。还没有时由 candidate (新会话自带的、尚未使用的
+        adapter) 担任，否则关闭 candidate。
+        """
+        with self._transports_lock:
+            adapter = self._transports.get(key)
+            if adapter is None:
+                if self._pool_classes is None:
+                    self._pool_classes = _timed_pool_classes(self)
+                candidate.poolmanager.pool_classes_by_scheme = self._pool_classes
+                adapter = self._transports[key] = candidate
+                logger.info("新建共享传输层 (第 %d 个)", len(self._transports))
+        if adapter is not candidate:
+            candidate.close()
+        return adapter
+
+    def _record_request(self):
+        with self._lock:
+            self._counters['requests'] += 1
+
+    def _record_connection(self, seconds, tls):
+        with self._lock:
+            self._counters['connections'] += 1
+            self._counters['handshake_seconds'] += seconds
+            if tls:
+                self._counters['tls_connections'] += 1
+
+    def _record_dns(self, hit, seconds):
+        with self._lock:
+            self._counters['dns_hits' if hit else 'dns_misses'] += 1
+            self._counters['dns_seconds'] += seconds
+
+
+class _PooledYoutubeDL(yt_dlp.YoutubeDL):
+    """请求处理器使用 ConnectionPool 共享传输层的 YoutubeDL (由 ConnectionPool.new_ydl 创建)。"""
+
+    def __init__(self, params, connection_pool):
+        self._connection_pool = connection_pool
+        super().__init__(params)
+
+    def build_request_director(self, handlers, preferences=None):
+        return super().build_request_director(self._connection_pool._wrap_handlers(list(handlers)), preferences)
+
+
+class _SharedTransportMixin:
+    """
+    requests 请求处理器的共享传输层扩展。
+
+    处理器和会话仍归单个 YoutubeDL 实例所有 (会话使用该实例自己的 cookiejar)；会话挂载的
+    HTTPAdapter 换成连接池中 TLS 设置相同的共享 adapter，处理器关闭时不关闭它。
+    """
+
+    def __init__(self, *, connection_pool, **kwargs):
+        self._connection_pool = connection_pool
+        super().__init__(**kwargs)
+
+    def _create_instance(self, cookiejar, legacy_ssl_support=None, **kwargs):
+        session = super()._create_instance(cookiejar=cookiejar, legacy_ssl_support=legacy_ssl_support, **kwargs)
+        legacy = legacy_ssl_support if legacy_ssl_support is not None else self.legacy_ssl_support
+        key = (self.verify, self.prefer_system_certs, bool(legacy), self.source_address,
+               tuple(sorted(self._client_cert.items())))
+        adapter = self._connection_pool._shared_adapter(key, session.get_adapter('https://'))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _close_instance(self, instance):
+        instance.adapters.clear() # 共享的 adapter 由 ConnectionPool.close() 关闭
+        super()._close_instance(instance)
+
+    def _send(self, request):
+        self._connection_pool._record_request()
+        return super()._send(request)
+
+
+def _pooled_handler_class(base):
+    cls = _pooled_handler_classes.get(base)
+    if cls is None: # 类名须以 RH 结尾 (yt-dlp 由类名得出 RH_KEY)
+        cls = _pooled_handler_classes.setdefault(
+            base, type(f'Pooled{base.__name__}', (_SharedTransportMixin, base), {}))
+    return cls
+
+
+class _TimedConnectionMixin:
+    """共享传输层的 urllib3 连接: 经 ConnectionPool 的 DNS 缓存建立 TCP 连接，并记录握手耗时。"""
+
+    _owner = None # ConnectionPool
+    _tls = False
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        self._owner._record_connection(time.perf_counter() - started, self._tls)
+
+    def _new_conn(self):
+        # 异常转换与 urllib3.connection.HTTPConnection._new_conn 相同
+        from urllib3 import exceptions
+        try:
+            return self._owner.create_connection((self.host, self.port), self.timeout,
+                                                 source_address=self.source_address,
+                                                 socket_options=self.socket_options)
+        except socket.gaierror as e:
+            if hasattr(exceptions, 'NameResolutionError'): # urllib3 2.x
+                raise exceptions.NameResolutionError(self.host, self, e) from e
+            raise exceptions.NewConnectionError(self, f"Failed to resolve {self.host}: {e}") from e
+        except socket.timeout as e:
+            raise exceptions.ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})") from e
+        except OSError as e:
+            raise exceptions.NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+def _timed_pool_classes(pool):
+    """为一个 ConnectionPool 创建 urllib3 连接池类 (用作 PoolManager.pool_classes_by_scheme)。"""
+    import urllib3
+    http_connection = type('HTTPConnection', (_TimedConnectionMixin, urllib3.connection.HTTPConnection),
+                           {'_owner': pool, '_tls': False})
+    https_connection = type('HTTPSConnection', (_TimedConnectionMixin, urllib3.connection.HTTPSConnection),
+                            {'_owner': pool, '_tls': True})
+    return {'http': type('HTTPConnectionPool', (urllib3.HTTPConnectionPool,), {'ConnectionCls': http_connection}),
+            'https': type('HTTPSConnectionPool', (urllib3.HTTPSConnectionPool,), {'ConnectionCls': https_connection})}
+
+
+def _is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host.split('%', 1)[0])
+    except ValueError:
+        return False
+    return True
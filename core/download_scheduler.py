@@ -0,0 +1,396 @@
+# core/download_scheduler.py - Thread pool dispatch with non-blocking retries and per-host limits
+import collections
+import concurrent.futures
+import itertools
+import threading
+import logging
+
+from core.cancel_token import CancelToken, REASON_USER
+from core.retry_scheduler import DelayedTaskQueue
+from core.host_limiter import HostLimiter, host_key_for_url
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadScheduler:
+    """
+    下载任务调度器。
+
+    每个任务对应一个任务 Future，只在任务得到最终结果 (成功或最终失败) 时完成。
+    单次下载尝试在线程池中执行；尝试返回 status='retry' 时，任务被放入延迟队列，
+    到期后重新提交，等待期间不占用线程池的工作线程。
+
+    提交到线程池之前还要经过 HostLimiter：单个平台的并发已满或熔断器打开时，任务暂存在
+    该平台的等待队列中，其他平台的任务不受影响。
+
+    调度器在应用运行期间一直存在，可以随时提交新任务；同一 id 的任务在完成之前重复提交
+    会直接返回已有的任务 Future。get_counts() 返回实时的等待/运行/完成计数。
+
+    线程池按上限 (max_pool_size) 创建一次，实际并发数由 set_concurrency() 控制的许可数决定，
+    调整并发数不会重建线程池，也不会取消或丢失正在执行的任务。
+
+    每次下载尝试都有自己的 CancelToken；cancel() 取消令牌后，尝试在下一个检查点 (进度回调、
+    带宽等待) 中止并返回 {'status': 'cancelled'}，工作线程和主机名额随即释放。
+    """
+
+    def __init__(self, run_attempt, max_workers, host_limiter=None, on_waiting=None, on_attempt_done=None,
+                 max_pool_size=None, on_attempt_start=None, postprocessor=None):
+        """
+        参数:
+            run_attempt (callable): 执行单次下载尝试的函数，接收 (item_info, cancel_token)，返回结果字典。
+                                    需要重试时返回 {'status': 'retry', 'retry_delay': 秒数, ...}；
+                                    cancel_token 被取消后应尽快返回 {'status': 'cancelled', ...}。
+            max_workers (int): 线程池最大工作线程数。
+            host_limiter (HostLimiter | None): 按主机的并发限制与熔断器，None 时只受线程池大小限制。
+            on_waiting (callable | None): 任务进入主机等待队列时调用 on_waiting(item_info, host, wake_delay)，
+                                          wake_delay 不为 None 表示熔断器打开。可在任意线程调用。
+            on_attempt_done (callable | None): 每次下载尝试结束时在工作线程中调用 on_attempt_done(result)，
+                                               用于统计错误率 (例如并发自动调节)。
+            max_pool_size (int | None): 线程池大小，即 set_concurrency() 允许的最大并发数，默认等于 max_workers。
+            on_attempt_start (callable | None): 每次下载尝试开始前在工作线程中调用 on_attempt_start(item_info)
+                                                (例如等待该任务正在进行的预取)。
+            postprocessor (PostProcessPool | None): 尝试返回 status='postprocessing' 时接收后处理作业，
+                                                    作业结束后任务才完成；下载名额在作业排队前即释放。
+        """
+        self._run_attempt = run_attempt
+        self.max_workers = max(1, int(max_workers)) # 当前并发许可数
+        self.pool_size = max(self.max_workers, int(max_pool_size or 0))
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+        self.retry_queue = DelayedTaskQueue(name='DownloadRetryQueue')
+        self.host_limiter = host_limiter or HostLimiter()
+        self._on_waiting = on_waiting
+        self._on_attempt_done = on_attempt_done
+        self._on_attempt_start = on_attempt_start
+        self._postprocessor = postprocessor
+        self._lock = threading.Lock()
+        self._executing = 0 # 已占用并发许可的尝试数 (由 _lock 保护)
+        self._ready = collections.deque() # 已取得主机名额、等待并发许可的尝试 (host, item_info, task_future)
+        # 任务状态计数 (由 _counts_lock 保护)。queued 包括等待线程池、主机名额和重试延迟的任务
+        self._counts_lock = threading.Lock()
+        self._inflight = {} # item_id -> 任务 Future
+        self._executing_ids = set() # 正在执行下载尝试的任务 id
+        self._tokens = {} # item_id -> 正在执行的尝试的 CancelToken
+        self._cancelled_ids = set() # 已请求取消、尚未得到最终结果的任务 id
+        self._queued = 0
+        self._running = 0
+        self._postprocessing = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._cancelled = 0
+
+    def submit(self, item_info):
+        """
+        提交一个下载任务 (可在任意时刻、任意线程调用)。
+
+        返回:
+            concurrent.futures.Future: 任务 Future，结果为最终的结果字典。同一 id 的任务
+                                       尚未完成时返回已有的 Future，不会重复下载。
+        """
+        item_id = item_info.get('id')
+        with self._counts_lock:
+            existing = self._inflight.get(item_id)
+            if existing is not None:
+                logger.info("任务 [%s] 已在队列中，忽略重复提交", item_id)
+                return existing
+            task_future = concurrent.futures.Future()
+            task_future.set_running_or_notify_cancel()
+            if item_id is not None:
+                self._inflight[item_id] = task_future
+            self._queued += 1
+        task_future.add_done_callback(lambda f, captured_id=item_id: self._on_task_done(captured_id, f))
+        self._dispatch(dict(item_info), task_future)
+        return task_future
+
+    def is_inflight(self, item_id):
+        """任务是否已提交且尚未得到最终结果。"""
+        with self._counts_lock:
+            return item_id in self._inflight
+
+    def is_running(self, item_id):
+        """任务是否正在执行下载尝试。"""
+        with self._counts_lock:
+            return item_id in self._executing_ids
+
+    def cancel(self, item_id, reason=REASON_USER):
+        """
+        取消一个尚未得到最终结果的任务 (可在任意线程调用)。
+
+        还没有开始执行的任务 (等待主机名额、并发许可或重试延迟) 立即从队列中移除，任务 Future
+        以 {'status': 'cancelled'} 完成；已提交到线程池的尝试开始前检查取消标记，同样以 cancelled
+        完成；正在执行的下载尝试通过其 CancelToken 中止 (在下一次
+        进度回调时)，结束后同样以 cancelled 完成，不再重试。reason 为 REASON_SHUTDOWN (程序退出) 时
+        中止的尝试保留 .part 文件，下次启动续传。
+
+        返回:
+            bool: 任务是否在调度器中 (未完成)。
+        """
+        with self._counts_lock:
+            task_future = self._inflight.get(item_id)
+            if task_future is None:
+                return False
+            self._cancelled_ids.add(item_id)
+            token = self._tokens.get(item_id)
+        if token is not None: # 正在执行，在锁外取消 (令牌回调可能阻塞)
+            token.cancel(reason)
+        elif self._remove_parked(task_future) or self.retry_queue.cancel(item_id): # 还在排队，直接完成
+            self._resolve_queued(task_future, self._cancelled_result(item_id))
+        elif self._postprocessor is not None:
+            self._postprocessor.cancel(item_id) # 后处理作业尚未开始时不再执行
+        return True
+
+    def upcoming(self, limit):
+        """
+        按预计的开始顺序返回即将执行的任务 (等待并发许可的在前，其次是各主机等待队列)，
+        不包括重试延迟中和已取消的任务。
+
+        返回:
+            list: 最多 limit 个 item_info。
+        """
+        with self._lock:
+            entries = [item_info for _, item_info, _ in itertools.islice(self._ready, limit)]
+        if len(entries) < limit:
+            entries.extend(item_info for item_info, _ in self.host_limiter.peek_waiting(limit - len(entries)))
+        with self._counts_lock:
+            return [item_info for item_info in entries if item_info.get('id') not in self._cancelled_ids]
+
+    def get_counts(self):
+        """
+        返回实时计数:
+            queued: 等待执行的任务 (线程池队列、主机等待队列、重试延迟中)
+            running: 正在执行下载尝试的任务
+            postprocessing: 已下载完成、在后处理队列中的任务 (不占用下载名额)
+            succeeded / failed / cancelled: 调度器创建以来完成的任务数
+        """
+        with self._counts_lock:
+            return {'queued': self._queued, 'running': self._running, 'postprocessing': self._postprocessing,
+                    'succeeded': self._succeeded,
+                    'failed': self._failed, 'cancelled': self._cancelled, 'limit': self.max_workers}
+
+    def set_concurrency(self, max_workers):
+        """
+        调整并发许可数 (不超过线程池大小)，返回实际生效的值。
+
+        增大时立即启动等待许可的尝试；减小时正在执行的尝试继续完成，
+        之后只在执行数低于新值时才启动新的尝试。
+        """
+        with self._lock:
+            self.max_workers = max(1, min(self.pool_size, int(max_workers)))
+            startable = self._take_ready()
+            applied = self.max_workers
+        for entry in startable:
+            self._start_attempt(*entry)
+        return applied
+
+    def shutdown(self, wait=True):
+        """关闭延迟队列和线程池。未到期的重试和主机等待队列中的任务将被丢弃。"""
+        self.retry_queue.shutdown()
+        with self._lock:
+            ready = [(item_info, task_future) for _, item_info, task_future in self._ready]
+            self._ready.clear()
+        for item_info, task_future in ready + self.host_limiter.drain_waiting():
+            self._resolve_queued(task_future, {'id': item_info.get('id'), 'status': 'error',
+                                               'error_message': '调度器已关闭，任务未开始'})
+        self.executor.shutdown(wait=wait)
+
+    # --- Internal Helpers ---
+
+    def _dispatch(self, item_info, task_future):
+        if self._is_cancelled(item_info.get('id')):
+            self._resolve_queued(task_future, self._cancelled_result(item_info.get('id')))
+            return
+        host = host_key_for_url(item_info.get('url'))
+        acquired, wake_delay = self.host_limiter.acquire_or_park(host, (item_info, task_future))
+        if acquired:
+            self._submit_attempt(host, item_info, task_future)
+            return
+        logger.info("任务 [%s] 进入主机 %s 的等待队列", item_info.get('id'), host)
+        self._schedule_pump(host, wake_delay)
+        if self._on_waiting:
+            try:
+                self._on_waiting(item_info, host, wake_delay)
+            except Exception as e:
+                logger.error("on_waiting 回调出错 [%s]: %s", item_info.get('id'), e)
+
+    def _submit_attempt(self, host, item_info, task_future):
+        with self._lock:
+            if self._executing >= self.max_workers:
+                self._ready.append((host, item_info, task_future)) # 等待并发许可
+                return
+            self._executing += 1
+        self._start_attempt(host, item_info, task_future)
+
+    def _take_ready(self):
+        """调用方需持有 _lock。按许可余量取出等待中的尝试并占用许可。"""
+        startable = []
+        while self._ready and self._executing < self.max_workers:
+            startable.append(self._ready.popleft())
+            self._executing += 1
+        return startable
+
+    def _release_permit(self):
+        with self._lock:
+            self._executing -= 1
+            startable = self._take_ready()
+        for entry in startable:
+            self._start_attempt(*entry)
+
+    def _start_attempt(self, host, item_info, task_future):
+        try:
+            self.executor.submit(self._execute_attempt, host, item_info, task_future)
+        except RuntimeError as e: # 线程池已关闭
+            logger.warning("任务 [%s] 无法提交到线程池: %s", item_info.get('id'), e)
+            with self._lock:
+                self._executing -= 1
+            self.host_limiter.release(host)
+            self._resolve_queued(task_future, {'id': item_info.get('id'), 'status': 'error',
+                                               'error_message': f'提交错误: {e}'})
+
+    def _remove_parked(self, task_future):
+        """把任务从并发许可或主机名额的等待队列中移除，返回是否找到。"""
+        with self._lock:
+            parked = next((entry for entry in self._ready if entry[2] is task_future), None)
+            if parked is not None:
+                self._ready.remove(parked)
+        if parked is not None: # 已为它占用的主机名额还给下一个等待任务
+            host = parked[0]
+            runnable, wake_delay = self.host_limiter.release(host)
+            self._submit_runnable(host, runnable, wake_delay)
+            return True
+        return self.host_limiter.remove_waiting(lambda entry: entry[1] is task_future) is not None
+
+    def _pump(self, host):
+        """熔断冷却结束时由延迟队列调用，提交该主机可以执行的等待任务。"""
+        runnable, wake_delay = self.host_limiter.pump(host)
+        self._submit_runnable(host, runnable, wake_delay)
+
+    def _submit_runnable(self, host, runnable, wake_delay):
+        for item_info, task_future in runnable:
+            self._submit_attempt(host, item_info, task_future)
+        self._schedule_pump(host, wake_delay)
+
+    def _schedule_pump(self, host, wake_delay):
+        if wake_delay is not None:
+            self.retry_queue.schedule(wake_delay, self._pump, host, key=('host-pump', host))
+
+    def _on_task_done(self, item_id, task_future):
+        result = task_future.result() if not task_future.cancelled() and task_future.exception() is None else None
+        status = result.get('status') if isinstance(result, dict) else None
+        with self._counts_lock:
+            if self._inflight.get(item_id) is task_future:
+                del self._inflight[item_id]
+                self._cancelled_ids.discard(item_id)
+            if status == 'finished':
+                self._succeeded += 1
+            elif status == 'cancelled':
+                self._cancelled += 1
+            else:
+                self._failed += 1
+
+    def _resolve_queued(self, task_future, result):
+        """以最终结果完成一个仍处于 queued 状态 (未在执行) 的任务。"""
+        with self._counts_lock:
+            self._queued -= 1
+        task_future.set_result(result)
+
+    def _is_cancelled(self, item_id):
+        with self._counts_lock:
+            return item_id in self._cancelled_ids
+
+    @staticmethod
+    def _cancelled_result(item_id):
+        return {'id': item_id, 'status': 'cancelled', 'error_message': '已取消'}
+
+    def _move_count(self, from_queued):
+        """在 queued 与 running 之间移动一个任务的计数。"""
+        with self._counts_lock:
+            delta = 1 if from_queued else -1
+            self._queued -= delta
+            self._running += delta
+
+    def _start_postprocessing(self, item_info, result, task_future):
+        """把后处理作业交给后处理队列，作业结束时以其结果完成任务。"""
+        try:
+            if self._postprocessor is None:
+                raise RuntimeError("没有配置后处理队列")
+            pending = self._postprocessor.submit(item_info, result)
+        except Exception as e:
+            logger.error("任务 [%s] 无法提交后处理作业: %s", item_info.get('id'), e)
+            pending = concurrent.futures.Future()
+            pending.set_result({'id': item_info.get('id'), 'status': 'error', 'error_message': f'后处理提交失败: {e}'})
+        pending.add_done_callback(lambda f: self._finish_postprocessing(item_info, f, task_future))
+
+    def _finish_postprocessing(self, item_info, pending, task_future):
+        try:
+            result = pending.result()
+        except Exception as e:
+            logger.error("任务 [%s] 后处理作业异常: %s", item_info.get('id'), e)
+            result = {'id': item_info.get('id'), 'status': 'error', 'error_message': f'后处理异常: {e}'}
+        with self._counts_lock:
+            self._postprocessing -= 1
+        task_future.set_result(result)
+
+    def _execute_attempt(self, host, item_info, task_future):
+        item_id = item_info.get('id')
+        with self._counts_lock:
+            self._queued -= 1
+            self._running += 1
+            cancelled = item_id in self._cancelled_ids
+            if not cancelled:
+                self._executing_ids.add(item_id)
+                token = self._tokens[item_id] = CancelToken()
+        if cancelled: # 在等待许可或主机名额期间被取消
+            result = self._cancelled_result(item_id)
+        else:
+            try:
+                if self._on_attempt_start:
+                    try:
+                        self._on_attempt_start(item_info)
+                    except Exception as e:
+                        logger.error("on_attempt_start 回调出错 [%s]: %s", item_id, e)
+                result = self._run_attempt(item_info, token)
+            except Exception as e:
+                logger.error("下载尝试执行异常 [%s]: %s", item_id, e, exc_info=True)
+                result = {'id': item_id, 'status': 'error', 'error_message': f'任务执行异常: {e}'}
+            finally:
+                with self._counts_lock:
+                    self._executing_ids.discard(item_id)
+                    self._tokens.pop(item_id, None)
+
+        status = result.get('status') if isinstance(result, dict) else None
+        if self._on_attempt_done and status != 'cancelled' and not cancelled:
+            try:
+                self._on_attempt_done(result)
+            except Exception as e:
+                logger.error("on_attempt_done 回调出错 [%s]: %s", item_info.get('id'), e)
+
+        # 释放主机名额并把结果交给熔断器，然后提交因此可以执行的等待任务
+        category = result.get('error_category') if status in ('retry', 'error') else None
+        runnable, wake_delay = self.host_limiter.release(host, status, category)
+        self._submit_runnable(host, runnable, wake_delay)
+        self._release_permit()
+
+        if status == 'retry':
+            self._move_count(from_queued=False) # 等待重试期间计为 queued
+        else:
+            with self._counts_lock:
+                self._running -= 1
+                if status == 'postprocessing':
+                    self._postprocessing += 1
+
+        if status == 'postprocessing':
+            self._start_postprocessing(item_info, result, task_future)
+            return
+
+        if status == 'retry' and self._is_cancelled(item_id):
+            self._resolve_queued(task_future, self._cancelled_result(item_id))
+            return
+        if status == 'retry':
+            next_info = dict(item_info)
+            next_info['attempt'] = result.get('attempt', item_info.get('attempt', 0)) + 1
+            delay = result.get('retry_delay', 0)
+            logger.info("任务 [%s] 将在 %.1f 秒后进行第 %d 次尝试", item_info.get('id'), delay, next_info['attempt'] + 1)
+            if not self.retry_queue.schedule(delay, self._dispatch, next_info, task_future, key=item_info.get('id')):
+                self._resolve_queued(task_future, {'id': item_info.get('id'), 'status': 'error',
+                                                   'error_message': result.get('error_message') or '调度器已关闭，重试被放弃'})
+            return
+        task_future.set_result(result)
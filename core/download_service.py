@@ -5,18 +5,66 @@ import threading
 import time # 需要 time 模块来实现延时
 import logging
 
-class UserCancelledError(Exception):
+from core.info_cache import cache_key_for_url
+from core.retry_scheduler import RetryPolicy
+from core.error_classifier import classify_error, PERMANENT, TRANSIENT
+from core.host_limiter import host_key_for_url
+from core.partial_download import CheckpointTracker, verify_checkpoint, discard_partial
+from core.download_archive import archive_key
+from core.url_canonicalizer import canonicalize
+from core.format_policy import FormatPolicy, LEGACY_FORMAT, describe_conversion
+from core.cancel_token import keeps_partials
+
+class UserCancelledError(yt_dlp.utils.DownloadCancelled):
     """Exception raised when user requests download cancellation."""
-    pass
+    msg = '用户取消了下载'
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
+
+def archive_key_for_url(url):
+    """下载前 (不访问网络) 确定视频的存档键: 优先用规范化规则，否则用 yt-dlp 的提取器匹配。"""
+    canonical = canonicalize(url)
+    if canonical is not None and canonical.video_id:
+        return archive_key(canonical.platform, canonical.video_id)
+    return cache_key_for_url(url)
+
+
+def cancelled_result(item_id, progress_callback=None, keep_partials=False):
+    """
+    取消的下载尝试的结果字典，同时报告 cancelled 状态。
+
+    keep_partials 为 False 时 .part 文件已被删除，任务的检查点一并清除；程序退出时的取消
+    (keep_partials=True) 不报告状态，队列日志中的检查点保留，下次启动续传。
+    """
+    if progress_callback is not None and not keep_partials:
+        progress_callback({'id': item_id, 'status': 'cancelled', 'description': '已取消', 'partial': None})
+    return {'id': item_id, 'status': 'cancelled', 'error_message': '已取消'}
+
+
 class DownloadService:
     """提供通用的视频下载服务，封装 yt-dlp 调用，并包含重试机制。"""
 
-    def __init__(self, default_options=None):
-        """初始化下载服务。"""
+    def __init__(self, default_options=None, info_cache=None, retry_policy=None, bandwidth_limiter=None,
+                 throughput_meter=None, download_archive=None, defer_postprocessing=False, format_policy=None,
+                 connection_pool=None):
+        """
+        初始化下载服务。
+
+        参数:
+            default_options (dict | None): 覆盖默认 yt-dlp 选项。
+            info_cache (InfoCache | None): 信息字典缓存，提供时重试和重新下载可跳过提取阶段。
+            retry_policy (RetryPolicy | None): 重试策略，默认最多重试 2 次、指数退避。
+            bandwidth_limiter (BandwidthLimiter | None): 所有下载线程共享的带宽限制器，None 表示不限速。
+            throughput_meter (ThroughputMeter | None): 聚合吞吐量计数器 (供并发自动调节使用)。
+            download_archive (DownloadArchive | None): 下载存档，已下载过的视频不再提取和下载。
+            defer_postprocessing (bool): 为 True 时下载尝试不执行 post_process 阶段的后处理 (FFmpeg 转码等)，
+                                         而是返回 status='postprocessing' 和后处理作业，由后处理队列执行。
+            format_policy (FormatPolicy | None): 格式选择和容器转换策略，默认转封装优先 (见 core.format_policy)。
+            connection_pool (ConnectionPool | None): 共享传输层，提供时各任务的 YoutubeDL 实例复用
+                                                     同一组 HTTP 连接 (cookie 仍各自独立，见 core.connection_pool)。
+        """
         self.default_ydl_opts = {
             'quiet': True,
             'noprogress': True,
@@ -27,11 +75,19 @@ class DownloadService:
             'postprocessors': [
                  {'key': 'FFmpegVideoConvertor', 'preferedformat': 'mp4'},
             ],
-            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+            'format': LEGACY_FORMAT, # 由 format_policy 按目标容器调整
         }
         if default_options:
             self.default_ydl_opts.update(default_options)
 
+        self.info_cache = info_cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.bandwidth_limiter = bandwidth_limiter
+        self.throughput_meter = throughput_meter
+        self.download_archive = download_archive
+        self.defer_postprocessing = defer_postprocessing
+        self.format_policy = format_policy or FormatPolicy()
+        self.connection_pool = connection_pool
         self._callback_context = {}
         self._context_lock = threading.Lock()
 
@@ -48,25 +104,38 @@ class DownloadService:
 
         callback = context.get('callback')
         item_id = context.get('item_id')
-        # cancel_func = context.get('is_cancel_requested_func') # 取消功能已移除
+        cancel_token = context.get('cancel_token')
         error_reported_key = f"{context_key}_error_reported"
         error_reported = context.get(error_reported_key, False)
 
-        if not callback or not item_id: # 移除对 cancel_func 的检查
+        if not callback or not item_id:
             logger.warning("进度钩子上下文信息不完整 (item_id: %s, callback: %s)", item_id, callback)
             return
 
-        # 取消检查逻辑已移除
-
         status = d['status']
         progress_data = {'id': item_id, 'status': status}
 
+        if status == 'downloading':
+            tracker = context.get('checkpoints')
+            if tracker is not None:
+                tracker.update(d.get('tmpfilename'), d.get('downloaded_bytes') or 0)
+            if self.bandwidth_limiter or self.throughput_meter:
+                self._account_downloaded_bytes(context, d)
+        # 取消检查点: 抛出的异常中止 yt-dlp 的传输 (DownloadCancelled 不会被 yt-dlp 当作错误处理)
+        if cancel_token is not None and cancel_token.cancelled:
+            raise UserCancelledError()
+
         try:
             if status == 'downloading':
                 progress_data['percent'] = d.get('_percent_str', '0%').strip()
                 progress_data['size'] = d.get('_total_bytes_str') or d.get('_downloaded_bytes_str', '未知')
                 progress_data['speed'] = d.get('_speed_str', 'N/A')
                 progress_data['eta'] = d.get('_eta_str', 'N/A')
+                tracker = context.get('checkpoints')
+                if tracker is not None:
+                    # 定期记录 .part 文件的检查点 (见上方 tracker.update)，随进度一起持久化，重启后据此续传
+                    checkpoints = tracker.checkpoints()
+                    if checkpoints: progress_data['partial'] = checkpoints
             elif status == 'finished':
                 progress_data['filename'] = os.path.basename(d.get('filename', ''))
                 progress_data['size'] = d.get('_total_bytes_str', '未知')
@@ -88,11 +157,74 @@ class DownloadService:
                 if context_key in self._callback_context:
                      self._callback_context[context_key][error_reported_key] = True
 
+        if status == 'finished':
+            # 记录下载阶段得到的 info_dict，作为后处理钩子未触发时的路径来源
+            self._update_context(context_key, info_dict=d.get('info_dict'),
+                                 downloaded_filepath=d.get('filename'))
+
         try:
             callback(progress_data)
         except Exception as cb_e:
             logger.error("调用外部进度回调时出错 (item_id: %s): %s", item_id, cb_e, exc_info=True)
 
+    def _account_downloaded_bytes(self, context, d):
+        """
+        计算本次回调新增的字节数，计入吞吐量统计，并向共享带宽限制器申请令牌
+        (超过限速时在此等待，从而降低 yt-dlp 的读取速度)。只在下载线程中调用。
+        """
+        downloaded = d.get('downloaded_bytes') or 0
+        filename = d.get('tmpfilename') or d.get('filename')
+        last_filename, last_downloaded = context.get('bandwidth_position', (None, 0))
+        context['bandwidth_position'] = (filename, downloaded)
+        if filename != last_filename or downloaded < last_downloaded:
+            return # 新文件 (例如先视频后音频) 的第一次回调可能包含断点续传前已有的字节，不计入
+        nbytes = downloaded - last_downloaded
+        if self.throughput_meter:
+            self.throughput_meter.add(nbytes)
+        if not self.bandwidth_limiter:
+            return
+        try:
+            # 任务被取消时不再等待令牌，进度钩子随即中止传输
+            self.bandwidth_limiter.consume(context.get('host'), nbytes, should_stop=context.get('should_stop'))
+        except Exception as e:
+            logger.error("带宽限制器出错 (item_id: %s): %s", context.get('item_id'), e)
+
+    def _postprocessor_hook(self, d):
+        """yt-dlp 后处理钩子：记录后处理后的 info_dict (其中 filepath 已随格式转换更新)。"""
+        if d.get('status') != 'finished':
+            return
+        info_dict = d.get('info_dict')
+        if info_dict:
+            self._update_context(threading.get_ident(), info_dict=info_dict,
+                                 postprocessed_filepath=info_dict.get('filepath'))
+
+    def _post_hook(self, filepath):
+        """yt-dlp 最终钩子：所有后处理和文件移动完成后调用，参数为最终文件路径。"""
+        self._update_context(threading.get_ident(), final_filepath=filepath)
+
+    def _update_context(self, context_key, **values):
+        with self._context_lock:
+            context = self._callback_context.get(context_key)
+            if context is not None:
+                context.update(values)
+
+    def _resolve_final_filepath(self, context_key, ydl):
+        """根据单次下载过程中钩子捕获的信息确定最终文件路径，无需再次请求网站。"""
+        with self._context_lock:
+            context = dict(self._callback_context.get(context_key) or {})
+        for key in ('final_filepath', 'postprocessed_filepath'):
+            if context.get(key):
+                return context[key]
+        info_dict = context.get('info_dict')
+        if info_dict:
+            if info_dict.get('filepath'):
+                return info_dict['filepath']
+            try:
+                return ydl.prepare_filename(info_dict)
+            except Exception as path_e:
+                logger.warning("根据 info_dict 生成文件路径失败: %s", path_e)
+        return context.get('downloaded_filepath')
+
     def _was_error_reported_by_hook(self, context_key):
         with self._context_lock:
             context = self._callback_context.get(context_key)
@@ -106,30 +238,188 @@ class DownloadService:
             if context:
                 context[f"{context_key}_error_reported"] = reported
 
+    def _new_ydl(self, ydl_opts):
+        """创建 YoutubeDL 实例，配置了连接池时经其共享传输层发送请求。"""
+        if self.connection_pool is not None:
+            return self.connection_pool.new_ydl(ydl_opts)
+        return yt_dlp.YoutubeDL(ydl_opts)
+
+    def _download_once(self, ydl, url, item_id):
+        """
+        执行一次下载并返回 yt-dlp 状态码。
+
+        有缓存时直接用缓存的信息字典下载，跳过提取阶段；缓存中的媒体链接失效时
+        删除该条目并重新提取 (与 yt-dlp 的 --load-info-json 行为一致)。
+        """
+        cache_key = cache_key_for_url(url) if self.info_cache else None
+        if not cache_key:
+            return ydl.download([url])
+
+        cached_info = self.info_cache.get(cache_key)
+        if cached_info:
+            logger.info("使用缓存的信息字典 [%s]: %s", item_id, cache_key)
+            try:
+                ydl.process_ie_result(cached_info, download=True)
+                return getattr(ydl, '_download_retcode', 0)
+            except yt_dlp.utils.DownloadError as cached_e:
+                logger.warning("缓存的信息字典下载失败 [%s]，重新提取: %s", item_id, cached_e)
+                self.info_cache.invalidate(cache_key)
+
+        ie_result = ydl.extract_info(url, download=False, process=False)
+        if ie_result and ie_result.get('_type', 'video') == 'video':
+            self.info_cache.put(cache_key, ydl.sanitize_info(ie_result, remove_private_keys=True))
+        ydl.process_ie_result(ie_result, download=True)
+        return getattr(ydl, '_download_retcode', 0)
+
+    @staticmethod
+    def _discard_partials(context):
+        """取消后删除本次尝试留下的 .part 文件 (取消的任务不再续传)。"""
+        tracker = context.get('checkpoints')
+        for part_path in tracker.part_paths() if tracker is not None else ():
+            discard_partial(part_path)
+
+    def _verify_partials(self, item_id, checkpoints):
+        """
+        校验上次运行留下的 .part 文件检查点: 一致的保留并续传，不一致的删除后重新下载。
+
+        返回:
+            list: 可以续传的检查点。
+        """
+        valid = []
+        for checkpoint in checkpoints or ():
+            status, detail = verify_checkpoint(checkpoint)
+            if status == 'resume':
+                logger.info("任务 [%s] 从 %d 字节处继续下载 %s", item_id, detail, checkpoint['path'])
+                valid.append(checkpoint)
+            elif status == 'mismatch':
+                logger.warning("任务 [%s] 的未完成文件校验失败 (%s)，将重新下载: %s", item_id, detail, checkpoint['path'])
+                discard_partial(checkpoint['path'])
+        return valid
+
     def _extract_friendly_error(self, download_error):
-        # TODO: 未来根据 download_error 的类型和内容，解析更具体的错误原因，
-        # 例如区分视频不存在、权限问题、网络问题等。
-        # msg = str(download_error) # 保留原始消息用于日志记录可能更好
-        # logger.debug(f"原始下载错误: {msg}") # 可以添加调试日志记录原始错误
-        return "下载失败" # 暂时统一返回通用错误信息
+        """根据错误分类返回用户可读的错误描述 (例如私密视频、地区限制、被限流)。"""
+        return classify_error(download_error).message
+
+    def _failure_key(self, url):
+        return cache_key_for_url(url) or url
+
+    def _archive_key_for_url(self, url):
+        return archive_key_for_url(url)
 
-    def download_item(self, item_info, progress_callback): # 移除 is_cancel_requested_func 参数
+    def _record_downloaded(self, context_key, url, filepath):
+        """下载成功后写入下载存档 (存档键优先取自信息字典中的提取器和视频 id)。"""
+        if not self.download_archive:
+            return
+        with self._context_lock:
+            info_dict = (self._callback_context.get(context_key) or {}).get('info_dict') or {}
+        key = archive_key(info_dict.get('extractor_key'), info_dict.get('id')) or self._archive_key_for_url(url)
+        try:
+            self.download_archive.add(key, title=info_dict.get('title'), filepath=filepath)
+        except Exception as e:
+            logger.warning("写入下载存档失败 (%s): %s", key, e)
+
+    @staticmethod
+    def _postprocess_job(context, filepath, postprocessors, container=None):
+        """后处理作业描述 (可序列化，进程模式下从工作进程传回主进程)。container 为容器转换的目标格式。"""
+        info_dict = context.get('info_dict') or {}
+        info = {key: info_dict.get(key) for key in ('id', 'title', 'extractor_key', 'vcodec', 'acodec')
+                if info_dict.get(key) is not None}
+        info['ext'] = os.path.splitext(filepath)[1].lstrip('.')
+        return {'filepath': filepath, 'postprocessors': [dict(pp) for pp in postprocessors], 'info': info,
+                'container': container}
+
+    def _remember_permanent_failure(self, url, classification):
+        """记录永久性失败，同一链接再次入队时直接失败，不再提取或重试。"""
+        if self.info_cache and classification.is_permanent:
+            self.info_cache.put_failure(self._failure_key(url), classification.reason, classification.message)
+
+    def prefetch_info(self, item_info):
+        """
+        流水线的提取阶段: 只提取信息字典并写入缓存，不下载。之后的下载尝试通过 _download_once
+        直接使用缓存，网络传输不再等待提取。
+
+        返回:
+            str: 'extracted' (已提取并缓存)、'cached' (缓存中已有)、'skipped' (没有缓存、
+                 已下载过或已知永久性失败) 或 'failed' (提取失败，下载尝试时会重新提取并处理错误)。
+        """
+        url = item_info.get('url')
+        cache_key = cache_key_for_url(url) if self.info_cache and url else None
+        if not cache_key:
+            return 'skipped'
+        if self.info_cache.get_failure(self._failure_key(url)):
+            return 'skipped'
+        if self.download_archive and self.download_archive.contains(self._archive_key_for_url(url)):
+            return 'skipped'
+        if self.info_cache.contains(cache_key):
+            return 'cached'
+
+        task_opts = self.default_ydl_opts.copy()
+        if isinstance(item_info.get('ydl_opts'), dict):
+            task_opts.update(item_info['ydl_opts'])
+        try:
+            with self._new_ydl(task_opts) as ydl:
+                ie_result = ydl.extract_info(url, download=False, process=False)
+                if not ie_result or ie_result.get('_type', 'video') != 'video':
+                    return 'skipped' # 播放列表等不缓存，与 _download_once 一致
+                self.info_cache.put(cache_key, ydl.sanitize_info(ie_result, remove_private_keys=True))
+        except Exception as e:
+            classification = classify_error(e)
+            logger.info("预取信息字典失败 [%s] (%s): %s", item_info.get('id'), classification.reason, classification.message)
+            self._remember_permanent_failure(url, classification)
+            return 'failed'
+        logger.debug("已预取信息字典 [%s]: %s", item_info.get('id'), cache_key)
+        return 'extracted'
+
+    def download_item(self, item_info, progress_callback, cancel_token=None):
+        """
+        执行一次下载尝试。
+
+        尝试序号取自 item_info['attempt'] (默认 0)。本方法不会在工作线程中等待重试：
+        失败且重试策略允许时返回 {'status': 'retry', 'retry_delay': 秒数, 'attempt': 序号}，
+        由调用方 (DownloadScheduler) 在延迟到期后重新提交。
+
+        cancel_token (CancelToken | None) 被取消时，下一次进度回调即中止 yt-dlp 的传输 (提取阶段
+        没有进度回调，在传输开始时中止)，删除本次尝试的 .part 文件并返回 status='cancelled'。
+
+        返回:
+            dict: 包含 id 和 status ('finished' / 'error' / 'retry' / 'cancelled') 的结果字典。
+        """
         item_id = item_info.get('id')
         url = item_info.get('url')
         output_path = item_info.get('output_path')
+        attempt = int(item_info.get('attempt', 0) or 0)
+        max_retries = self.retry_policy.max_retries
 
-        # 移除对 is_cancel_requested_func 的检查
         if not all([item_id, url, output_path, callable(progress_callback)]):
             error_msg = "下载信息或进度回调函数不完整"
             logger.error("%s: id=%s, url=%s, output_path=%s, cb=%s",
                          error_msg, item_id, url, output_path, progress_callback)
             return {'id': item_id, 'status': 'error', 'error_message': error_msg}
 
+        # 已记录为永久性失败的链接直接失败 (除非调用方要求忽略记录)
+        if self.info_cache and not item_info.get('ignore_failure_memory'):
+            known_failure = self.info_cache.get_failure(self._failure_key(url))
+            if known_failure:
+                error_message = f"{known_failure['message']} (已记录的永久性错误)"
+                logger.info("任务 [%s] 命中永久性失败记录，跳过下载: %s", item_id, known_failure)
+                progress_callback({'id': item_id, 'status': 'error', 'description': error_message[:100]})
+                return {'id': item_id, 'status': 'error', 'error_message': error_message,
+                        'error_category': PERMANENT, 'error_reason': known_failure['reason']}
+
+        # 下载存档中已有记录的视频直接完成，不进行提取
+        if self.download_archive and not item_info.get('ignore_archive'):
+            if self.download_archive.contains(self._archive_key_for_url(url)):
+                logger.info("任务 [%s] 已在下载存档中，跳过下载: %s", item_id, url)
+                progress_callback({'id': item_id, 'status': 'finished', 'description': '已下载 (下载存档中有记录)'})
+                return {'id': item_id, 'status': 'finished', 'skipped': 'archived'}
+
+        if cancel_token is not None and cancel_token.cancelled:
+            return cancelled_result(item_id, progress_callback, keeps_partials(cancel_token))
+
         final_status = 'pending'
         final_filepath = None
         error_message = None
-        max_retries = 2
-        retry_delays = [3, 5]
+        classification = None
 
         task_opts = self.default_ydl_opts.copy()
         try:
@@ -141,94 +431,120 @@ class DownloadService:
 
         if 'ydl_opts' in item_info and isinstance(item_info['ydl_opts'], dict):
             task_opts.update(item_info['ydl_opts'])
+        # 转封装优先: 选择编码兼容的流，FFmpegVideoConvertor 换成按需转封装/转码的容器转换
+        task_opts, conversion_target = self.format_policy.prepare(task_opts)
 
-        # --- 限速逻辑已移除 ---
+        # 限速: 由共享的 BandwidthLimiter 在进度钩子中控制，见 _account_downloaded_bytes
         task_opts['progress_hooks'] = [self._progress_hook]
+        # 断点续传: yt-dlp 发现同名 .part 文件时用 HTTP Range 请求从文件末尾继续
+        task_opts['continuedl'] = True
+        checkpoints = item_info.get('partial')
+        if attempt == 0 and checkpoints:
+            checkpoints = self._verify_partials(item_id, checkpoints)
+        task_opts['postprocessor_hooks'] = [self._postprocessor_hook]
+        # 转码等后处理交给后处理队列，下载线程 (网络名额) 只负责传输和合并
+        postprocessors = task_opts.get('postprocessors') or []
+        deferred_postprocessors = [pp for pp in postprocessors if pp.get('when', 'post_process') == 'post_process'] \
+            if self.defer_postprocessing else []
+        if deferred_postprocessors:
+            task_opts['postprocessors'] = [pp for pp in postprocessors if pp not in deferred_postprocessors]
+        defer_conversion = bool(conversion_target and self.defer_postprocessing)
+        task_opts['post_hooks'] = [self._post_hook]
 
         thread_id = threading.get_ident()
         context_key = thread_id
         context = {
             'item_id': item_id,
             'callback': progress_callback,
-            # 'is_cancel_requested_func': is_cancel_requested_func, # 取消功能已移除
+            'host': host_key_for_url(url),
+            'checkpoints': CheckpointTracker(checkpoints),
+            'cancel_token': cancel_token,
+            'should_stop': (lambda: cancel_token.cancelled) if cancel_token is not None else None,
             f"{context_key}_error_reported": False
         }
         with self._context_lock:
             self._callback_context[context_key] = context
 
         try: # 外层 try，确保 finally 会执行
-            # --- 重试循环 ---
-            for attempt in range(max_retries + 1):
-                # 重置错误报告标志，以便重试时钩子可以再次报告错误
-                self._mark_error_reported(context_key, False)
-                attempt_error_message = None # 记录本次尝试的错误信息
-
-                try: # 内层 try，处理单次尝试的异常
-                    logger.info(f"开始下载尝试 {attempt + 1}/{max_retries + 1} [{item_id}]: {url}")
-                    if attempt == 0:
-                        progress_callback({'id': item_id, 'status': 'preparing'})
-
-                    with yt_dlp.YoutubeDL(task_opts) as ydl:
-                        result_code = ydl.download([url])
-
-                        if result_code == 0:
-                            final_status = 'finished'
-                            logger.info(f"下载完成 [{item_id}] (尝试 {attempt + 1})")
-                            try:
-                               info_dict = ydl.extract_info(url, download=False)
-                               if info_dict: final_filepath = ydl.prepare_filename(info_dict)
-                            except Exception as path_e: logger.warning("获取文件路径失败: %s", path_e)
-                            break # 成功，跳出 for 循环
-                        else:
-                            # result_code 非 0
-                            # 如果 ignoreerrors=False, 理论上错误会通过异常抛出，
-                            # result_code != 0 的情况会减少。但以防万一保留处理。
-                            attempt_error_message = f"yt-dlp 返回非零状态码: {result_code}"
-                            logger.error(f"下载失败 [{item_id}] (尝试 {attempt + 1}): {attempt_error_message}")
-                            # 标记错误，继续重试或结束循环
-                            self._mark_error_reported(context_key)
-                            # 不再需要检查 _was_error_reported_by_hook，因为异常处理会捕获更详细信息
-
-                # UserCancelledError 处理已移除 (取消功能移除)
-                except yt_dlp.utils.DownloadError as de:
-                    # 异常处理：捕获 DownloadError 并提取信息
-                    error_message_short = self._extract_friendly_error(de) # 提取友好错误信息
-                    attempt_error_message = f"{error_message_short}" # 直接使用提取后的信息
-                    logger.error(f"下载失败 [{item_id}] (尝试 {attempt + 1}): {attempt_error_message}\nOriginal Error: %s", de, exc_info=False)
-                    self._mark_error_reported(context_key) # 标记错误发生
-                except Exception as e:
-                    # 未知异常处理
-                    attempt_error_message = f"发生未知错误: {e}" # 包含异常类型
-                    logger.error(f"下载失败 [{item_id}] (尝试 {attempt + 1}): {attempt_error_message}", exc_info=True)
-                    self._mark_error_reported(context_key) # 标记错误发生
-
-                # --- 循环结束判断与重试延时 (移回 for 循环内部) ---
-                if final_status == 'finished': # 移除 cancelled 检查
-                    break # 如果已成功，直接跳出
-
-                if attempt < max_retries: # 如果还有重试机会
-                    delay = retry_delays[attempt]
-                    logger.info(f"任务 [{item_id}] 第 {attempt + 2} 次重试将在 {delay} 秒后开始...")
-                    progress_callback({'id': item_id, 'status': 'retrying', 'description': f'等待 {delay}s 后重试 ({attempt + 2}/{max_retries + 1})'})
-                    time.sleep(delay) # 简化延时，不再检查取消
-                # --- 此处缺少一个 else 块，用于处理达到最大重试次数的情况 ---
-                # --- 此处缺少一个 else 块，用于处理达到最大重试次数的情况 ---
-                else: # 已达到最大重试次数 (将此块移回 for 循环内部)
-                     logger.error(f"任务 [{item_id}] 所有 {max_retries + 1} 次尝试均失败。")
-                     final_status = 'error' # 最终状态设为错误
-                     error_message = attempt_error_message or "所有重试尝试均失败" # 使用最后一次捕获的错误或通用消息
-                     # 确保发送最终错误状态回调
-                     progress_callback({'id': item_id, 'status': 'error', 'description': error_message[:100]}) # 发送清理后的错误信息
-                     break # 跳出 for 循环
-
-            # --- for 循环结束 ---
-            # 修正：如果循环结束状态仍是 pending，说明是未处理的错误
-            if final_status == 'pending':
-                final_status = 'error'
-                if not error_message: error_message = "下载因未知原因失败"
+            attempt_error_message = None # 记录本次尝试的错误信息
+            try: # 内层 try，处理单次尝试的异常
+                logger.info(f"开始下载尝试 {attempt + 1}/{max_retries + 1} [{item_id}]: {url}")
+                if attempt == 0:
+                    progress_callback({'id': item_id, 'status': 'preparing'})
+
+                with self._new_ydl(task_opts) as ydl:
+                    if conversion_target and not defer_conversion:
+                        self.format_policy.install(
+                            ydl, conversion_target,
+                            on_result=lambda conversion: self._update_context(context_key, conversion=conversion))
+                    result_code = self._download_once(ydl, url, item_id)
+
+                    if result_code == 0:
+                        final_status = 'finished'
+                        logger.info(f"下载完成 [{item_id}] (尝试 {attempt + 1})")
+                        # 文件路径由本次下载的钩子捕获，不再额外调用 extract_info
+                        final_filepath = self._resolve_final_filepath(context_key, ydl)
+                        if not final_filepath: logger.warning("未能从下载钩子中获取文件路径 [%s]", item_id)
+                        self._record_downloaded(context_key, url, final_filepath)
+                        # 下载完成后仍存在的 .part 文件 (例如这次选择了不同的格式) 已无用，删除
+                        for checkpoint in context['checkpoints'].checkpoints():
+                            if os.path.exists(checkpoint['path']):
+                                discard_partial(checkpoint['path'])
+                    else:
+                        # result_code 非 0
+                        # 如果 ignoreerrors=False, 理论上错误会通过异常抛出，
+                        # result_code != 0 的情况会减少。但以防万一保留处理。
+                        attempt_error_message = f"yt-dlp 返回非零状态码: {result_code}"
+                        logger.error(f"下载失败 [{item_id}] (尝试 {attempt + 1}): {attempt_error_message}")
+                        self._mark_error_reported(context_key)
+
+            except UserCancelledError:
+                final_status = 'cancelled'
+                logger.info(f"下载已取消 [{item_id}] (尝试 {attempt + 1})")
+            except yt_dlp.utils.DownloadError as de:
+                # 异常处理：捕获 DownloadError 并分类 (永久 / 临时 / 限流)
+                classification = classify_error(de)
+                attempt_error_message = classification.message # 友好错误信息
+                logger.error(f"下载失败 [{item_id}] (尝试 {attempt + 1}): {attempt_error_message}\nOriginal Error: %s", de, exc_info=False)
+                self._mark_error_reported(context_key) # 标记错误发生
+            except Exception as e:
+                # 未知异常处理
+                attempt_error_message = f"发生未知错误: {e}" # 包含异常类型
+                classification = classify_error(e)
+                logger.error(f"下载失败 [{item_id}] (尝试 {attempt + 1}): {attempt_error_message}", exc_info=True)
+                self._mark_error_reported(context_key) # 标记错误发生
+
+            if final_status not in ('finished', 'cancelled') and cancel_token is not None and cancel_token.cancelled:
+                final_status = 'cancelled' # 取消导致的连接中断等错误不再重试
+
+            if final_status == 'cancelled':
+                # 用户取消的任务不再续传，删除未完成的文件；程序退出时保留，下次启动续传。
+                # 下载名额随本方法返回立即释放
+                keep_partials = keeps_partials(cancel_token)
+                if not keep_partials:
+                    self._discard_partials(context)
+                return cancelled_result(item_id, progress_callback, keep_partials)
+
+            # --- 失败后的重试判断：不在此处等待，交给调用方的延迟队列 ---
+            if final_status != 'finished':
+                category = classification.category if classification else TRANSIENT
+                if self.retry_policy.should_retry(attempt, category):
+                    delay = self.retry_policy.delay_for(attempt, category)
+                    logger.info(f"任务 [{item_id}] 第 {attempt + 2} 次尝试将在 {delay:.1f} 秒后开始...")
+                    progress_callback({'id': item_id, 'status': 'retrying',
+                                       'description': f'等待 {delay:.0f}s 后重试 ({attempt + 2}/{max_retries + 1})'})
+                    return {'id': item_id, 'status': 'retry', 'attempt': attempt, 'retry_delay': delay,
+                            'error_message': attempt_error_message, 'error_category': category}
+
+                if classification and classification.is_permanent:
+                    logger.error(f"任务 [{item_id}] 遇到永久性错误 ({classification.reason})，不再重试。")
+                    self._remember_permanent_failure(url, classification)
+                else:
+                    logger.error(f"任务 [{item_id}] 所有 {attempt + 1} 次尝试均失败。")
+                final_status = 'error' # 最终状态设为错误
+                error_message = attempt_error_message or "所有重试尝试均失败" # 使用最后一次捕获的错误或通用消息
                 # 确保发送最终错误状态回调
-                if not self._was_error_reported_by_hook(context_key):
-                     progress_callback({'id': item_id, 'status': 'error', 'description': error_message[:100]})
+                progress_callback({'id': item_id, 'status': 'error', 'description': error_message[:100]}) # 发送清理后的错误信息
 
         finally: # 外层 finally，确保上下文被清理
             with self._context_lock:
@@ -239,19 +555,48 @@ class DownloadService:
         result = {'id': item_id, 'status': final_status}
         if final_status == 'finished' and final_filepath and os.path.exists(final_filepath):
              result['filepath'] = final_filepath
+             if deferred_postprocessors or defer_conversion:
+                 result['status'] = 'postprocessing'
+                 result['postprocess'] = self._postprocess_job(context, final_filepath, deferred_postprocessors,
+                                                               conversion_target if defer_conversion else None)
+             elif context.get('conversion'):
+                 # 记录本任务采用的容器转换方式 (不需要 / 转封装 / 转码) 和消耗的 CPU 秒数
+                 result['conversion'] = context['conversion']
+                 progress_callback({'id': item_id, 'status': 'finished',
+                                    'description': describe_conversion(context['conversion'])})
         # 只记录最后一次尝试的或特定的错误信息
-        # 移除 cancelled 状态的判断
         if final_status == 'error' and error_message and "已由钩子报告" not in error_message:
              result['error_message'] = error_message
+        if final_status == 'error':
+             result['error_category'] = classification.category if classification else TRANSIENT
+             if classification: result['error_reason'] = classification.reason
+             if classification and classification.http_status: result['http_status'] = classification.http_status
         logger.debug("DownloadService: 即将返回最终结果 for %s: %s (类型: %s)", item_id, result, type(result))
         return result
 
+    def download_item_with_retries(self, item_info, progress_callback, cancel_token=None):
+        """
+        同步执行下载并在当前线程内完成全部重试 (供单任务脚本或测试使用)。重试等待期间取消立即返回。
+
+        线程池中的下载应通过 DownloadScheduler 调度，以免重试等待占用工作线程。
+        """
+        item_info = dict(item_info)
+        while True:
+            result = self.download_item(item_info, progress_callback, cancel_token)
+            if result.get('status') != 'retry':
+                return result
+            if cancel_token is not None:
+                if cancel_token.wait(result.get('retry_delay', 0)):
+                    return cancelled_result(item_info.get('id'), progress_callback, keeps_partials(cancel_token))
+            else:
+                time.sleep(result.get('retry_delay', 0))
+            item_info['attempt'] = result.get('attempt', 0) + 1
+
 # --- Test Code ---
 if __name__ == '__main__':
+    from core.cancel_token import CancelToken
     print("Testing DownloadService...")
     def my_progress_callback(data): print(f"  Callback: {data}")
-    cancel_flag = False
-    def mock_is_cancel_requested(): return cancel_flag
     service = DownloadService()
     output_dir = 'test_download_service_retry'
     os.makedirs(output_dir, exist_ok=True) # 确保测试目录存在
@@ -259,8 +604,7 @@ if __name__ == '__main__':
     # --- Test 1: 正常下载 ---
     print("\n[Test 1] 正常下载")
     item1 = {'id': 'Test_OK', 'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'output_path': output_dir}
-    cancel_flag = False
-    res1 = service.download_item(item1, my_progress_callback, mock_is_cancel_requested)
+    res1 = service.download_item_with_retries(item1, my_progress_callback)
     print(f"[Test 1] Result: {res1}")
 
     # --- Test 2: 模拟下载失败一次后成功 ---
@@ -288,15 +632,15 @@ if __name__ == '__main__':
                 # 调用真实的钩子处理函数
                 if 'progress_hooks' in self.opts:
                     for hook in self.opts['progress_hooks']: hook(hook_data)
+                # 模拟后处理完成后的最终路径回调
+                for hook in self.opts.get('post_hooks', []): hook(file_path)
                 return 0
-        def extract_info(self, url, download): return {'id': 'MockID', 'title': 'MockVideo'}
         def prepare_filename(self, info): return os.path.join(output_dir, 'MockVideo [MockID].mp4')
 
     original_ydl = yt_dlp.YoutubeDL
     yt_dlp.YoutubeDL = MockYoutubeDLFailOnce
     item2 = {'id': 'Test_Retry_OK', 'url': 'mock://fail_once', 'output_path': output_dir}
-    cancel_flag = False
-    res2 = service.download_item(item2, my_progress_callback, mock_is_cancel_requested)
+    res2 = service.download_item_with_retries(item2, my_progress_callback)
     print(f"[Test 2] Result: {res2}")
     yt_dlp.YoutubeDL = original_ydl
 
@@ -315,8 +659,7 @@ if __name__ == '__main__':
 
     yt_dlp.YoutubeDL = MockYoutubeDLFailAlways
     item3 = {'id': 'Test_Retry_Fail', 'url': 'mock://fail_always', 'output_path': output_dir}
-    cancel_flag = False
-    res3 = service.download_item(item3, my_progress_callback, mock_is_cancel_requested)
+    res3 = service.download_item_with_retries(item3, my_progress_callback)
     print(f"[Test 3] Result: {res3}")
     yt_dlp.YoutubeDL = original_ydl
 
@@ -324,15 +667,15 @@ if __name__ == '__main__':
     print("\n[Test 4] 测试重试期间取消")
     yt_dlp.YoutubeDL = MockYoutubeDLFailAlways # 使用持续失败的模拟类
     item4 = {'id': 'Test_Retry_Cancel', 'url': 'mock://fail_cancel', 'output_path': output_dir}
-    cancel_flag = False
-    download_thread = threading.Thread(target=service.download_item,
-                                       args=(item4, my_progress_callback, mock_is_cancel_requested),
+    cancel_token = CancelToken()
+    download_thread = threading.Thread(target=service.download_item_with_retries,
+                                       args=(item4, my_progress_callback, cancel_token),
                                        daemon=True)
     download_thread.start()
     print("  [Test 4] 等待 4 秒（第一次重试等待期间）后请求取消...")
     time.sleep(4)
-    print("  [Test 4] 设置取消标志")
-    cancel_flag = True
+    print("  [Test 4] 取消任务")
+    cancel_token.cancel()
     download_thread.join(10)
     if download_thread.is_alive(): print("  [Test 4] 线程未按预期结束!")
     else: print("  [Test 4] 线程已结束 (检查回调中的 cancelled 状态)")
@@ -0,0 +1,154 @@
+# core/error_classifier.py - Classify yt-dlp / HTTP failures to drive the retry policy
+import re
+
+try:
+    from yt_dlp.utils import ExtractorError, GeoRestrictedError, UnsupportedError, ContentTooShortError
+except ImportError: # yt-dlp 未安装时只按错误文本分类
+    ExtractorError = GeoRestrictedError = UnsupportedError = ContentTooShortError = ()
+
+# --- 错误类别 ---
+PERMANENT = 'permanent'       # 重试没有意义 (私密、已删除、地区限制、版权等)
+TRANSIENT = 'transient'       # 临时故障 (网络、服务器 5xx 等)，按常规退避重试
+RATE_LIMITED = 'rate_limited' # 被限流 (HTTP 429、提取阶段的 403 等)，使用更长的退避
+
+# (原因代码, 类别, 用户可读描述, 错误文本匹配规则)，按顺序匹配，先匹配者优先
+_MESSAGE_RULES = [
+    ('rate_limited', RATE_LIMITED, '请求过于频繁，已被限流',
+     re.compile(r'too many requests|rate[- ]?limit|http error 429|confirm you.?re not a bot', re.I)),
+    ('private', PERMANENT, '视频为私密视频',
+     re.compile(r'private video|video is private|this post is private|account is private', re.I)),
+    ('copyright', PERMANENT, '视频因版权原因不可用',
+     re.compile(r'copyright', re.I)),
+    ('geo_blocked', PERMANENT, '视频在当前地区不可用',
+     re.compile(r'not available (?:in|from) your (?:country|location)|geo[- ]?restrict|blocked it in your country', re.I)),
+    ('login_required', PERMANENT, '需要登录或年龄验证',
+     re.compile(r'sign in to confirm your age|age[- ]restricted|members[- ]only|requires? (?:payment|login|authentication)|login required', re.I)),
+    ('removed', PERMANENT, '视频已被删除或不可用',
+     re.compile(r'video unavailable|has been removed|no longer available|does not exist|account .*terminated', re.I)),
+    ('unsupported', PERMANENT, '不支持的链接',
+     re.compile(r'unsupported url', re.I)),
+    ('format_unavailable', PERMANENT, '请求的格式不可用',
+     re.compile(r'requested format is not available', re.I)),
+    ('network', TRANSIENT, '网络错误',
+     re.compile(r'timed? ?out|connection (?:reset|refused|aborted)|temporary failure|name resolution|'
+                r'network is unreachable|remote end closed|incomplete ?read|ssl', re.I)),
+    ('server_error', TRANSIENT, '服务器错误',
+     re.compile(r'http error 5\d\d', re.I)),
+]
+
+# HTTP 状态码到 (原因代码, 类别, 描述) 的映射。404/410/403 只在提取阶段 (网页、API) 按此处理
+_STATUS_RULES = {
+    429: ('rate_limited', RATE_LIMITED, '请求过于频繁，已被限流 (HTTP 429)'),
+    403: ('forbidden', RATE_LIMITED, '访问被拒绝 (HTTP 403)，可能已被限流'),
+    404: ('removed', PERMANENT, '视频已被删除或不可用 (HTTP 404)'),
+    410: ('removed', PERMANENT, '视频已被删除或不可用 (HTTP 410)'),
+    451: ('copyright', PERMANENT, '视频因法律原因不可用 (HTTP 451)'),
+}
+
+# 下载媒体或分片时的 404/410/403 通常是签名 URL 过期或 CDN 节点暂时缺失，重新提取后即可恢复，
+# 既不说明视频已删除，也不说明整个平台在限流
+_MEDIA_STATUS_RULES = {
+    403: ('media_forbidden', TRANSIENT, '媒体地址拒绝访问 (HTTP 403)，可能已过期'),
+    404: ('media_not_found', TRANSIENT, '媒体地址已失效 (HTTP 404)'),
+    410: ('media_not_found', TRANSIENT, '媒体地址已失效 (HTTP 410)'),
+}
+
+_HTTP_STATUS_TEXT = re.compile(r'http error (\d{3})', re.I)
+# 提取阶段 (下载网页、API 或元数据) 的错误文本
+_EXTRACTOR_STAGE_TEXT = re.compile(
+    r'unable to download (?:webpage|json|xml|api|[\w ]*?(?:page|metadata|info\b))|unable to extract', re.I)
+
+
+class ErrorClassification:
+    """一次失败的分类结果。"""
+
+    def __init__(self, category, reason, message, http_status=None):
+        self.category = category       # PERMANENT / TRANSIENT / RATE_LIMITED
+        self.reason = reason           # 具体原因代码，例如 'private'、'geo_blocked'
+        self.message = message         # 用户可读的中文描述
+        self.http_status = http_status # 相关 HTTP 状态码 (如有)
+
+    @property
+    def is_permanent(self):
+        return self.category == PERMANENT
+
+    def __repr__(self):
+        return (f"ErrorClassification(category={self.category!r}, reason={self.reason!r}, "
+                f"http_status={self.http_status!r})")
+
+
+def _iter_error_chain(error):
+    """遍历异常及其原始原因 (DownloadError.exc_info、ExtractorError.cause、__cause__ 等)。"""
+    seen = set()
+    stack = [error]
+    while stack:
+        current = stack.pop()
+        if current is None or id(current) in seen or not isinstance(current, BaseException):
+            continue
+        seen.add(id(current))
+        yield current
+        exc_info = getattr(current, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            stack.append(exc_info[1])
+        stack.extend((getattr(current, 'cause', None), current.__cause__, current.__context__))
+
+
+def _http_status(error):
+    for attr in ('status', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def _from_extractor(chain, text):
+    """错误是否发生在提取阶段 (而不是下载媒体或分片时)。"""
+    if ExtractorError and any(isinstance(e, ExtractorError) for e in chain):
+        return True
+    return bool(_EXTRACTOR_STAGE_TEXT.search(text))
+
+
+def classify_error(error):
+    """
+    对下载失败进行分类。
+
+    参数:
+        error (BaseException | str): yt-dlp 抛出的异常 (通常为 DownloadError) 或错误文本。
+    返回:
+        ErrorClassification: 分类结果；无法识别的错误视为临时错误。
+    """
+    if isinstance(error, str):
+        chain, messages = [], [error]
+    else:
+        chain = list(_iter_error_chain(error))
+        messages = [str(getattr(e, 'orig_msg', None) or e) for e in chain]
+
+    http_status = None
+    for e in chain:
+        http_status = http_status or _http_status(e)
+        if GeoRestrictedError and isinstance(e, GeoRestrictedError):
+            return ErrorClassification(PERMANENT, 'geo_blocked', '视频在当前地区不可用', http_status)
+        if UnsupportedError and isinstance(e, UnsupportedError):
+            return ErrorClassification(PERMANENT, 'unsupported', '不支持的链接', http_status)
+
+    text = '\n'.join(messages)
+    if http_status is None:
+        match = _HTTP_STATUS_TEXT.search(text)
+        http_status = int(match.group(1)) if match else None
+
+    rules = _STATUS_RULES
+    if http_status in _MEDIA_STATUS_RULES and not _from_extractor(chain, text):
+        rules = _MEDIA_STATUS_RULES
+    if http_status in rules:
+        reason, category, message = rules[http_status]
+        return ErrorClassification(category, reason, message, http_status)
+
+    for reason, category, message, pattern in _MESSAGE_RULES:
+        if pattern.search(text):
+            return ErrorClassification(category, reason, message, http_status)
+
+    if any(ContentTooShortError and isinstance(e, ContentTooShortError) for e in chain):
+        return ErrorClassification(TRANSIENT, 'incomplete', '下载内容不完整', http_status)
+    if http_status and http_status >= 500:
+        return ErrorClassification(TRANSIENT, 'server_error', f'服务器错误 (HTTP {http_status})', http_status)
+    return ErrorClassification(TRANSIENT, 'unknown', '下载失败', http_status)
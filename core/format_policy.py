@@ -0,0 +1,221 @@
+# core/format_policy.py - Remux-first format selection: prefer container-compatible streams, transcode only when needed
+import os
+import time
+import threading
+import logging
+
+from yt_dlp.postprocessor.common import PostProcessor
+from yt_dlp.postprocessor.ffmpeg import FFmpegVideoConvertorPP, FFmpegVideoRemuxerPP
+from yt_dlp.utils import PostProcessingError
+
+logger = logging.getLogger(__name__)
+
+# 原有的格式选择 (DownloadService 和 YouTube 模块的默认值)。回退到 best 时可能选中 webm/mkv，
+# 之后的 FFmpegVideoConvertor 会完整重新编码
+LEGACY_FORMAT = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+
+# 各容器可以直接复制 (不重新编码) 的 (视频编码前缀, 音频编码前缀)，按 yt-dlp 的 vcodec/acodec 字段匹配
+CONTAINER_CODECS = {
+    'mp4': (('avc', 'h264', 'hvc', 'hev', 'h265', 'av01', 'vp09', 'vp9', 'mp4v'),
+            ('mp4a', 'aac', 'mp3', 'opus', 'flac', 'alac', 'ac-3', 'ec-3')),
+    'mov': (('avc', 'h264', 'hvc', 'hev', 'h265', 'mp4v'), ('mp4a', 'aac', 'mp3', 'alac', 'ac-3')),
+    'webm': (('vp8', 'vp08', 'vp9', 'vp09', 'av01'), ('opus', 'vorbis')),
+}
+
+# 转换方式
+PATH_NONE = 'none'           # 文件已是目标容器 (兼容的流在合并时已直接复制)
+PATH_REMUX = 'remux'         # 流复制转封装 (-c copy)，几乎不占 CPU
+PATH_TRANSCODE = 'transcode' # 编码与目标容器不兼容，重新编码
+
+_PATH_LABELS = {PATH_REMUX: '转封装', PATH_TRANSCODE: '转码'}
+
+
+def codecs_fit(container, vcodec, acodec):
+    """
+    判断视频/音频编码能否不重新编码直接放入容器。
+
+    返回:
+        bool | None: True / False；编码未知或容器不在 CONTAINER_CODECS 中时返回 None。
+    """
+    if container == 'mkv':
+        return True
+    allowed = CONTAINER_CODECS.get(container)
+    if allowed is None:
+        return None
+    for codec, prefixes in ((vcodec, allowed[0]), (acodec, allowed[1])):
+        if codec == 'none':
+            continue # 纯音频或纯视频
+        if not codec:
+            return None
+        if not str(codec).lower().startswith(prefixes):
+            return False
+    return True
+
+
+def remux_first_format(container):
+    """
+    目标容器的格式选择: 先选原有的 mp4+m4a 组合，其次选编码可以直接放入目标容器的流组合
+    (只需转封装)，最后才回退到任意格式 (可能需要转码)。
+    """
+    allowed = CONTAINER_CODECS.get(container)
+    if allowed is None:
+        return LEGACY_FORMAT
+    video_re = '|'.join(allowed[0])
+    audio_re = '|'.join(allowed[1])
+    fits = f"[vcodec~='^({video_re})'][acodec~='^({audio_re})']"
+    return '/'.join((
+        f'bestvideo[ext={container}]+bestaudio[ext=m4a]' if container in ('mp4', 'mov') else
+        f'bestvideo[ext={container}]+bestaudio[ext={container}]',
+        f"bestvideo[vcodec~='^({video_re})']+bestaudio[acodec~='^({audio_re})']",
+        f'best[ext={container}]',
+        f'best{fits}',
+        'best',
+    ))
+
+
+def describe_conversion(conversion):
+    """完成状态的描述文字，例如 '完成 (转封装为 mp4, CPU 0.3s)'。"""
+    label = _PATH_LABELS.get((conversion or {}).get('path'))
+    if not label:
+        return '完成'
+    return f"完成 ({label}为 {conversion['target']}, CPU {conversion['cpu_seconds']:.1f}s)"
+
+
+def _cpu_seconds():
+    """本线程的 CPU 时间加上已结束子进程 (FFmpeg) 的 CPU 时间。"""
+    times = os.times()
+    return time.thread_time() + times.children_user + times.children_system
+
+
+class FormatPolicy:
+    """
+    转封装优先的格式策略。
+
+    格式选择优先选择编码与目标容器兼容的流组合；下载后用 ContainerConversionPP 代替
+    FFmpegVideoConvertor: 已是目标容器时不处理，编码兼容 (或未知) 时流复制转封装，
+    只有编码不兼容 (或转封装失败) 时才重新编码。每个任务记录采用的方式和消耗的 CPU 秒数。
+    """
+
+    def __init__(self, remux_first=True):
+        """
+        参数:
+            remux_first (bool): 为 False 时保持原有行为 (原格式选择，FFmpegVideoConvertor 直接转码)。
+        """
+        self.remux_first = bool(remux_first)
+        self._lock = threading.Lock()
+        self._stats = {path: {'count': 0, 'cpu_seconds': 0.0} for path in (PATH_NONE, PATH_REMUX, PATH_TRANSCODE)}
+        self._stats['remux_failed'] = 0
+
+    @classmethod
+    def from_config(cls, get_config):
+        """根据配置 (remux_first) 创建格式策略。"""
+        return cls(remux_first=get_config('remux_first', True))
+
+    def prepare(self, ydl_opts):
+        """
+        按策略调整一次下载的 yt-dlp 选项。
+
+        参数:
+            ydl_opts (dict): yt-dlp 选项 (不修改)。
+
+        返回:
+            tuple: (调整后的选项, 目标容器或 None)。目标容器不为 None 时，调用方需要用 install()
+                   安装 ContainerConversionPP (或把目标容器随后处理作业传给后处理队列)。
+        """
+        if not self.remux_first:
+            return ydl_opts, None
+        postprocessors = ydl_opts.get('postprocessors') or []
+        converters = [pp for pp in postprocessors if pp.get('key') == 'FFmpegVideoConvertor']
+        target = converters[-1].get('preferedformat') if converters else None
+        # 只处理单一目标容器；'webm>mp4/mkv' 这类映射交给 yt-dlp 原样处理
+        if not target or not isinstance(target, str) or not target.isalnum():
+            return ydl_opts, None
+        target = target.lower()
+        ydl_opts = dict(ydl_opts)
+        ydl_opts['postprocessors'] = [pp for pp in postprocessors if pp not in converters]
+        if ydl_opts.get('format') == LEGACY_FORMAT:
+            ydl_opts['format'] = remux_first_format(target)
+        return ydl_opts, target
+
+    def install(self, ydl, target, on_result=None):
+        """
+        在 YoutubeDL 实例上安装容器转换后处理器 (post_process 阶段)。
+
+        参数:
+            ydl (yt_dlp.YoutubeDL): 下载或后处理使用的实例。
+            target (str): 目标容器，例如 'mp4'。
+            on_result (callable | None): 转换完成后以转换记录字典调用 (在运行后处理的线程中)。
+        """
+        ydl.add_post_processor(ContainerConversionPP(ydl, target, policy=self, on_result=on_result),
+                               when='post_process')
+
+    def record(self, conversion):
+        with self._lock:
+            entry = self._stats[conversion['path']]
+            entry['count'] += 1
+            entry['cpu_seconds'] = round(entry['cpu_seconds'] + conversion['cpu_seconds'], 3)
+            if conversion.get('remux_failed'):
+                self._stats['remux_failed'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {key: dict(value) if isinstance(value, dict) else value for key, value in self._stats.items()}
+        stats['remux_first'] = self.remux_first
+        return stats
+
+
+class ContainerConversionPP(PostProcessor):
+    """
+    把下载的文件转换为目标容器: 不需要 / 流复制转封装 / 重新编码 三选一。
+
+    转换记录 {'path', 'target', 'source_ext', 'vcodec', 'acodec', 'cpu_seconds'} 写入
+    info['container_conversion']。cpu_seconds 为本线程与 FFmpeg 子进程的 CPU 时间，多个转换
+    同时进行时子进程时间按结束时刻归属，是近似值。
+    """
+
+    def __init__(self, downloader=None, target='mp4', policy=None, on_result=None):
+        super().__init__(downloader)
+        self.target = target
+        self.policy = policy
+        self.on_result = on_result
+
+    @classmethod
+    def pp_key(cls):
+        return 'ContainerConversion'
+
+    @PostProcessor._restrict_to(images=False)
+    def run(self, info):
+        source_ext = (info.get('ext') or os.path.splitext(info.get('filepath') or '')[1].lstrip('.')).lower()
+        vcodec, acodec = info.get('vcodec'), info.get('acodec')
+        conversion = {'target': self.target, 'source_ext': source_ext, 'vcodec': vcodec, 'acodec': acodec}
+        started = _cpu_seconds()
+        files_to_delete = []
+        if source_ext == self.target:
+            conversion['path'] = PATH_NONE
+        elif codecs_fit(self.target, vcodec, acodec) is False:
+            conversion['path'] = PATH_TRANSCODE
+            files_to_delete, info = self._delegate(FFmpegVideoConvertorPP, info)
+        else:
+            try:
+                conversion['path'] = PATH_REMUX
+                files_to_delete, info = self._delegate(FFmpegVideoRemuxerPP, info)
+            except PostProcessingError as e:
+                # 编码未知且容器不接受 (或 FFmpeg 拒绝流复制)，回退到转码
+                logger.info("转封装为 %s 失败，改为转码: %s", self.target, e)
+                conversion.update(path=PATH_TRANSCODE, remux_failed=True)
+                files_to_delete, info = self._delegate(FFmpegVideoConvertorPP, info)
+        if conversion['path'] != PATH_NONE and (info.get('ext') or '').lower() != self.target:
+            conversion['path'] = PATH_NONE # FFmpeg 后处理器跳过了该文件 (例如不支持的源格式)
+        conversion['cpu_seconds'] = round(max(0.0, _cpu_seconds() - started), 3)
+        info['container_conversion'] = conversion
+        logger.info("容器转换 [%s]: %s -> %s, 方式 %s, CPU %.2fs", info.get('id'), source_ext, self.target,
+                    conversion['path'], conversion['cpu_seconds'])
+        if self.policy is not None:
+            self.policy.record(conversion)
+        if self.on_result is not None:
+            self.on_result(conversion)
+        return files_to_delete, info
+
+    def _delegate(self, pp_class, info):
+        pp = pp_class(self._downloader, preferedformat=self.target)
+        return pp.run(info)
@@ -0,0 +1,669 @@
+# core/headless.py - Headless command-line entry point (no Tk)
+"""
+无界面的命令行入口，适合在服务器、计划任务或脚本中批量下载。
+
+用法 (在项目根目录下):
+    python -m core.headless [选项] [链接文件 ...]
+    cat links.txt | python -m core.headless -o D:\\videos
+
+链接文件每行一个或多个 URL，'#' 开头的行为注释；不给文件或给 '-' 时从标准输入读取。
+标准输出每行一个 JSON 事件 (queued / skipped / progress / result / summary / message / listening)，
+日志和警告写到标准错误。--serve 同时启动 HTTP 任务接口 (core.http_api)，其他服务可以随时提交链接。
+
+与图形界面共用 DownloadService、DownloadScheduler、平台 logic 模块、下载存档和队列日志
+(--queue)，但不导入 tkinter 和 googleapiclient，启动时间只取决于 yt-dlp 的导入。
+"""
+import os
+import re
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import logging
+import contextlib
+import importlib
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from config.config_manager import ConfigManager
+from core.download_service import DownloadService
+from core.process_pool import ProcessDownloadService
+from core.prefetch import ExtractionPrefetcher
+from core.postprocess_pool import PostProcessPool
+from core.format_policy import FormatPolicy
+from core.connection_pool import ConnectionPool
+from core.info_cache import InfoCache
+from core.progress_bus import ProgressBus
+from core.retry_scheduler import RetryPolicy
+from core.download_scheduler import DownloadScheduler
+from core.host_limiter import HostLimiter
+from core.bandwidth_limiter import BandwidthLimiter
+from core.queue_journal import QueueJournal
+from core.url_canonicalizer import canonicalize
+from core.download_archive import DownloadArchive, archive_key
+from core.task_store import (TaskStore, normalize_status, ALL_STATUSES, ACTIVE_STATUSES, QUEUED, FINISHED, ERROR,
+                             CANCELLED)
+
+logger = logging.getLogger(__name__)
+
+# 退出码
+EXIT_OK = 0           # 所有任务成功 (包括下载存档中已有、跳过的任务)
+EXIT_FAILED = 1       # 至少一个任务下载失败
+EXIT_USAGE = 2        # 参数错误或无法读取输入 (与 argparse 一致)
+EXIT_NO_TASKS = 3     # 输入中没有可下载的 URL
+EXIT_INTERRUPTED = 130 # 被 Ctrl+C 或 SIGTERM 中断 (未完成的任务在 --queue 模式下保留)
+
+DEFAULT_PROGRESS_INTERVAL = 1.0 # 每个任务最多每隔这么多秒输出一条 progress 事件
+MAX_CONCURRENT_DOWNLOADS = 10   # 与图形界面的并发上限一致
+
+# 可以在无界面模式下直接使用的平台 logic 模块 (平台名 -> (模块, 立即下载函数))。
+# YouTube 的 logic 模块在导入时加载 googleapiclient (搜索功能)，这里不导入，
+# 其链接与图形界面 "添加到下载列表" 一样直接按 URL 入队。
+PLATFORM_LOGIC = {
+    'TikTok': ('modules.tiktok.logic', 'download_tiktok_urls'),
+}
+
+_ANSI_ESCAPE_PATTERN = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+_PROGRESS_KEYS = ('status', 'percent', 'size', 'speed', 'eta', 'filename', 'description')
+
+
+class _Interrupted(Exception):
+    """收到 SIGTERM 时抛出，与 KeyboardInterrupt 一样处理。"""
+
+
+class HeadlessRunner:
+    """
+    无界面的下载控制器。
+
+    实现平台 logic 模块使用的 app 接口 (get_download_path、start_immediate_downloads、
+    add_urls_to_download_queue、update_status、show_message、update_download_progress)，
+    进度通过 ProgressBus 合并后按间隔输出为 JSON 行。
+    """
+
+    def __init__(self, config_manager, project_root, output_path, emit, concurrency=None, use_queue=False,
+                 use_archive=True, progress_interval=DEFAULT_PROGRESS_INTERVAL, processes=None):
+        """
+        参数:
+            config_manager (ConfigManager): 配置。
+            project_root (str): 项目根目录 (缓存、下载存档和队列日志所在位置)。
+            output_path (str): 下载目录。
+            emit (callable): emit(event_dict) 输出一个事件。
+            concurrency (int | None): 并发数，None 时使用配置 max_concurrent_downloads。
+            use_queue (bool): 是否加载并更新图形界面的持久化队列 (download_queue.journal)。
+            use_archive (bool): 是否使用下载存档跳过已下载的视频。
+            progress_interval (float): progress 事件的输出间隔 (秒)。
+            processes (int | None): 在工作进程中执行下载 (0 表示与 CPU 核数相同)；
+                                    None 时按配置 execution_mode 决定。
+        """
+        self.config_manager = config_manager
+        self.output_path = output_path
+        self.emit = emit
+        self.progress_interval = max(0.05, float(progress_interval))
+        get_config = config_manager.get_config
+
+        if concurrency is None:
+            try:
+                concurrency = int(get_config('max_concurrent_downloads', 3))
+            except (ValueError, TypeError):
+                logger.warning("配置中的 'max_concurrent_downloads' 值无效，将使用默认值 3。")
+                concurrency = 3
+
+        self.info_cache = self._create_info_cache(project_root)
+        self.download_archive = self._create_download_archive(project_root) if use_archive else None
+        self.queue_journal = self._create_queue_journal(project_root) if use_queue else None
+        self.retry_policy = RetryPolicy.from_config(get_config)
+        self.bandwidth_limiter = BandwidthLimiter.from_config(get_config)
+        self.host_limiter = HostLimiter.from_config(get_config)
+        self.format_policy = FormatPolicy.from_config(get_config)
+        self.connection_pool = ConnectionPool.from_config(get_config)
+        self.postprocess_pool = PostProcessPool.from_config(get_config, progress_callback=self.update_download_progress,
+                                                            format_policy=self.format_policy)
+        self.download_service = self._create_download_service(processes)
+        concurrency_limit = max(MAX_CONCURRENT_DOWNLOADS, getattr(self.download_service, 'processes', 0))
+        self.max_workers = max(1, min(concurrency_limit, int(concurrency)))
+        self.prefetcher = ExtractionPrefetcher.from_config(get_config, extract=self.download_service.prefetch_info,
+                                                           upcoming=lambda limit: self.download_scheduler.upcoming(limit))
+        self.download_scheduler = DownloadScheduler(self._run_attempt, self.max_workers,
+                                                    host_limiter=self.host_limiter,
+                                                    on_waiting=self._on_task_waiting,
+                                                    on_attempt_start=self.prefetcher.claim,
+                                                    postprocessor=self.postprocess_pool)
+        if self.info_cache is not None:
+            self.prefetcher.start()
+        self.task_store = TaskStore()
+        self.progress_bus = ProgressBus()
+        self._lock = threading.Lock() # 保护 _pending 和 _counts (HTTP 接口线程也会登记、取消任务)
+        self._wakeup = threading.Event()
+        self._pending = {} # 等待提交的任务: id -> item_info (按加入顺序)
+        self._futures = {}
+        self._counts = {'succeeded': 0, 'failed': 0, 'cancelled': 0, 'skipped': 0, 'invalid': 0}
+
+    # --- 平台 logic 模块使用的 app 接口 ---
+
+    def get_download_path(self):
+        return self.output_path
+
+    def update_status(self, message):
+        self.emit({'event': 'message', 'level': 'info', 'message': message})
+
+    def show_message(self, title, message, msg_type='info'):
+        self.emit({'event': 'message', 'level': msg_type, 'title': title, 'message': message})
+
+    def update_download_progress(self, progress_data):
+        """接收下载线程的进度 (任意线程调用)，只写入进度总线，由 run() 定时输出。"""
+        self.progress_bus.publish(progress_data)
+
+    def add_urls_to_download_queue(self, urls, platform):
+        """把 URL 加入待下载任务 (无界面模式下加入队列即开始下载)。返回新增任务的 id 列表。"""
+        items = []
+        for url in urls:
+            canonical = canonicalize(url, platform)
+            if canonical is None:
+                self._skip(None, url, 'invalid')
+                continue
+            items.append({'id': canonical.task_id, 'url': canonical.url})
+        return self.start_immediate_downloads(items, platform)
+
+    def start_immediate_downloads(self, items_info_list, platform):
+        """
+        登记要下载的任务 (由 run() 统一提交到调度器)。
+
+        返回:
+            list: 新登记任务的 id 列表。
+        """
+        added_ids = []
+        for item_info in items_info_list:
+            canonical = canonicalize(item_info.get('url'), platform)
+            if canonical is None:
+                self._skip(item_info.get('id'), item_info.get('url'), 'invalid')
+            elif self._register(canonical, item_info) == 'queued':
+                added_ids.append(canonical.task_id)
+        return added_ids
+
+    # --- HTTP 任务接口 (core.http_api) 使用的接口 ---
+
+    def api_submit(self, urls, platform=None):
+        """提交链接 (接口线程调用)，返回每个链接的结果字典。"""
+        results = []
+        for url in urls:
+            canonical = canonicalize(url, platform)
+            if canonical is None:
+                self._skip(None, url, 'invalid')
+                results.append({'url': url, 'result': 'invalid'})
+                continue
+            result = self._register(canonical, {})
+            results.append({'url': canonical.url, 'id': canonical.task_id, 'platform': canonical.platform,
+                            'result': result})
+        return results
+
+    def api_cancel(self, task_id):
+        """取消任务: 未开始的任务不再执行，正在进行的下载在下一次进度回调时中止。任务不存在时返回 None。"""
+        if task_id not in self.task_store:
+            return None
+        with self._lock:
+            pending = self._pending.pop(task_id, None)
+            if pending is not None:
+                self._counts['cancelled'] += 1
+        running = self.download_scheduler.is_running(task_id)
+        cancelled = pending is not None or self.download_scheduler.cancel(task_id)
+        if cancelled and not running:
+            self.update_download_progress({'id': task_id, 'status': CANCELLED, 'description': '已取消'})
+        return {'id': task_id, 'cancelled': cancelled, 'running': running}
+
+    def api_stats(self):
+        with self._lock:
+            totals = dict(self._counts)
+        return {'queue': self.download_scheduler.get_counts(), 'tasks': self.task_store.count_by_status(),
+                'totals': totals, 'prefetch': self.prefetcher.get_stats(),
+                'postprocess': self.postprocess_pool.get_stats() if self.postprocess_pool else None,
+                'format_policy': self.format_policy.get_stats(), 'connections': self.connection_pool.get_stats()}
+
+    # --- 输入 ---
+
+    def load_queue(self):
+        """
+        从队列日志恢复图形界面的下载队列，并把上次运行时未完成的任务加入本次下载。
+
+        返回:
+            int: 恢复并登记下载的任务数。
+        """
+        if self.queue_journal is None or not self.queue_journal.exists():
+            return 0
+        tasks = [task for task in self.queue_journal.replay() if normalize_status(task.get('status')) != FINISHED]
+        self.task_store.add_many(tasks)
+        resumed = 0
+        for item_id in self.task_store.ids_with_status(*ACTIVE_STATUSES):
+            record = self.task_store.get(item_id)
+            with self._lock:
+                self._pending[item_id] = {'id': item_id, 'url': record.url, 'output_path': self.output_path,
+                                          'partial': record.partial}
+            self.emit({'event': 'queued', 'id': item_id, 'url': record.url, 'platform': record.platform,
+                       'resumed': True})
+            resumed += 1
+        self.task_store.take_persist_changes() # 刚加载的任务已在日志中
+        return resumed
+
+    def add_urls(self, urls):
+        """按平台分组后交给对应的 logic 模块 (没有可用模块的平台直接按 URL 入队)。"""
+        by_platform = {}
+        for url in urls:
+            canonical = canonicalize(url)
+            if canonical is None:
+                self._skip(None, url, 'invalid')
+                continue
+            by_platform.setdefault(canonical.platform, []).append(url)
+        for platform, platform_urls in by_platform.items():
+            download_urls = self._load_platform_download(platform)
+            if download_urls is not None:
+                download_urls(platform_urls, self)
+            else:
+                self.add_urls_to_download_queue(platform_urls, platform)
+
+    # --- 执行 ---
+
+    def run(self, serve=False):
+        """
+        提交所有登记的任务并等待完成，期间按间隔输出进度。
+
+        参数:
+            serve (bool): 为 True 时所有任务完成后继续等待新任务 (HTTP 接口提交)，直到进程被中断。
+        返回:
+            dict: 汇总计数 (total / succeeded / failed / cancelled / skipped / invalid / elapsed)。
+        """
+        started = time.monotonic()
+        total = 0
+        while True:
+            total += self._submit_pending()
+            if self._futures:
+                done, _ = wait(list(self._futures), timeout=self.progress_interval, return_when=FIRST_COMPLETED)
+            elif serve:
+                done = ()
+                self._wakeup.wait(self.progress_interval)
+                self._wakeup.clear()
+            else:
+                break
+            self._flush_progress()
+            for future in done:
+                self._on_task_finished(self._futures.pop(future), future.result())
+            self._journal_store_changes()
+        self._flush_progress()
+        self._journal_store_changes()
+        with self._lock:
+            return dict(self._counts, total=total, elapsed=round(time.monotonic() - started, 3))
+
+    def close(self, interrupted=False):
+        """
+        保存队列日志和下载存档。
+
+        参数:
+            interrupted (bool): 为 True 时不等待正在进行的下载 (下次用 --queue 运行或打开图形界面时继续)。
+        """
+        self.prefetcher.stop()
+        self.download_scheduler.shutdown(wait=not interrupted)
+        if self.postprocess_pool is not None:
+            self.postprocess_pool.shutdown(wait=not interrupted)
+        if isinstance(self.download_service, ProcessDownloadService):
+            self.download_service.close(wait=not interrupted)
+        if not interrupted:
+            self.connection_pool.close() # 中断时下载线程可能仍在使用共享会话
+        if self.queue_journal is not None:
+            self._journal_store_changes()
+            self.queue_journal.compact(self.task_store.export(exclude_statuses=(FINISHED,), persist_only=True))
+            self.queue_journal.close()
+        if self.download_archive is not None:
+            if interrupted:
+                self.download_archive.save() # 下载线程可能仍在写入，不关闭
+            else:
+                self.download_archive.close()
+        if self.info_cache is not None and not interrupted:
+            self.info_cache.close()
+
+    # --- Internal Helpers ---
+
+    def _register(self, canonical, item_info):
+        """
+        登记一个规范化后的任务 (任意线程调用)。
+
+        返回:
+            str: 'queued'、'duplicate' 或 'archived'。
+        """
+        item_id = canonical.task_id
+        if self._is_archived(canonical):
+            self._skip(item_id, canonical.url, 'archived')
+            return 'archived'
+        with self._lock:
+            if item_id in self._pending or self.download_scheduler.is_inflight(item_id):
+                duplicate = True
+            else:
+                duplicate = False
+                record = self.task_store.get(item_id)
+                if record is None:
+                    title = canonical.url.split('/')[-1].split('?')[0] or canonical.url
+                    self.task_store.add(item_id, canonical.url, canonical.platform, filename=title[:50])
+                item_info = dict(item_info, id=item_id, url=canonical.url, output_path=self.output_path)
+                if record is not None and record.partial:
+                    item_info.setdefault('partial', record.partial) # 队列中记录的 .part 检查点
+                self._pending[item_id] = item_info
+        if duplicate:
+            self._skip(item_id, canonical.url, 'duplicate')
+            return 'duplicate'
+        self.emit({'event': 'queued', 'id': item_id, 'url': canonical.url, 'platform': canonical.platform})
+        self._wakeup.set()
+        return 'queued'
+
+    def _submit_pending(self):
+        """把登记的任务提交到调度器 (主线程调用)，返回提交数量。"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for item_id, item_info in pending.items():
+            self.task_store.update(item_id, status=QUEUED, description='')
+            self._futures[self.download_scheduler.submit(item_info)] = item_id
+        return len(pending)
+
+    def _run_attempt(self, item_info, cancel_token=None):
+        """在工作线程中执行一次下载尝试，异常转换为错误结果 (调度器要求总是返回字典)。"""
+        item_id = item_info.get('id')
+        try:
+            result = self.download_service.download_item(item_info, self.update_download_progress, cancel_token)
+        except Exception as e:
+            logger.error("任务 [%s] 执行异常: %s", item_id, e, exc_info=True)
+            result = None
+            error_message = f'任务执行异常: {e}'
+        else:
+            error_message = '下载服务未按预期返回结果'
+        if not isinstance(result, dict):
+            result = {'id': item_id, 'status': 'error', 'error_message': error_message}
+            self.update_download_progress({'id': item_id, 'status': 'error', 'description': error_message[:100]})
+        return result
+
+    def _on_task_waiting(self, item_info, host, wake_delay):
+        if wake_delay is None:
+            description = f"等待 {host} 并发名额"
+        else:
+            description = f"{host} 被限流，约 {wake_delay:.0f}s 后恢复"
+        self.update_download_progress({'id': item_info.get('id'), 'status': 'waiting', 'description': description})
+
+    def _flush_progress(self):
+        """取出合并后的进度写入任务存储，并输出 progress 事件。"""
+        for progress_data in self.progress_bus.drain():
+            item_id = progress_data['id']
+            status = progress_data.get('status')
+            fields = {}
+            if status in ALL_STATUSES:
+                fields['status'] = status
+            if 'partial' in progress_data:
+                fields['partial'] = progress_data['partial']
+            if progress_data.get('filename'):
+                fields['filename'] = progress_data['filename'][:50]
+            if fields and item_id in self.task_store:
+                self.task_store.update(item_id, **fields)
+            event = {'event': 'progress', 'id': item_id}
+            for key in _PROGRESS_KEYS:
+                value = progress_data.get(key)
+                if value is not None:
+                    event[key] = _ANSI_ESCAPE_PATTERN.sub('', value).strip() if isinstance(value, str) else value
+            self.emit(event)
+
+    def _on_task_finished(self, item_id, result):
+        status = result.get('status')
+        if status == 'finished':
+            counter = 'skipped' if result.get('skipped') else 'succeeded'
+        else:
+            counter = 'cancelled' if status == CANCELLED else 'failed'
+        with self._lock:
+            self._counts[counter] += 1
+        if status == 'finished':
+            self.task_store.update(item_id, status=FINISHED)
+        elif status == CANCELLED:
+            self.task_store.update(item_id, status=CANCELLED, description='已取消')
+        else:
+            self.task_store.update(item_id, status=ERROR, description=(result.get('error_message') or '')[:100])
+        event = {'event': 'result', 'id': item_id, 'status': status}
+        for key in ('filepath', 'skipped', 'conversion', 'error_message', 'error_category', 'error_reason',
+                    'http_status'):
+            if result.get(key) is not None:
+                event[key] = result[key]
+        self.emit(event)
+
+    def _journal_store_changes(self):
+        if self.queue_journal is None: return
+        tasks, removed_ids = self.task_store.take_persist_changes()
+        if tasks or removed_ids:
+            self.queue_journal.record(tasks, removed_ids)
+        if self.queue_journal.needs_compaction(len(self.task_store)):
+            self.queue_journal.compact(self.task_store.export(exclude_statuses=(FINISHED,), persist_only=True))
+
+    def _skip(self, item_id, url, reason):
+        counter = {'invalid': 'invalid', 'archived': 'skipped'}.get(reason)
+        if counter:
+            with self._lock:
+                self._counts[counter] += 1
+        event = {'event': 'skipped', 'url': url, 'reason': reason}
+        if item_id:
+            event['id'] = item_id
+        self.emit(event)
+
+    def _is_archived(self, canonical):
+        return (self.download_archive is not None and canonical.video_id is not None
+                and self.download_archive.contains(archive_key(canonical.platform, canonical.video_id)))
+
+    @staticmethod
+    def _load_platform_download(platform):
+        entry = PLATFORM_LOGIC.get(platform)
+        if entry is None:
+            return None
+        module_path, func_name = entry
+        try:
+            return getattr(importlib.import_module(module_path), func_name)
+        except (ImportError, AttributeError) as e:
+            logger.warning("无法加载 %s 逻辑模块 (%s)，将直接按 URL 下载: %s", platform, module_path, e)
+            return None
+
+    def _create_download_service(self, processes):
+        components = dict(info_cache=self.info_cache, retry_policy=self.retry_policy,
+                          bandwidth_limiter=self.bandwidth_limiter, download_archive=self.download_archive,
+                          format_policy=self.format_policy, connection_pool=self.connection_pool,
+                          defer_postprocessing=self.postprocess_pool is not None)
+        get_config = self.config_manager.get_config
+        if processes is None and str(get_config('execution_mode', 'thread') or 'thread').lower() != 'process':
+            return DownloadService(**components)
+        if processes is None:
+            service = ProcessDownloadService.from_config(get_config, **components)
+        else:
+            service = ProcessDownloadService(processes or None, **components)
+        logger.info("下载在 %d 个工作进程中执行", service.processes)
+        return service
+
+    def _create_info_cache(self, project_root):
+        get_config = self.config_manager.get_config
+        if not get_config('info_cache_enabled', True):
+            return None
+        try:
+            max_mb = int(get_config('info_cache_max_mb', 256))
+        except (ValueError, TypeError):
+            max_mb = 256
+        try:
+            failure_ttl = int(get_config('failure_memory_ttl', 24 * 3600))
+        except (ValueError, TypeError):
+            failure_ttl = 24 * 3600
+        platform_ttls = get_config('info_cache_ttls', {}) or {}
+        cache_path = os.path.join(project_root, 'cache', 'info_cache.sqlite3')
+        try:
+            return InfoCache(cache_path, max_bytes=max_mb * 1024 * 1024,
+                             platform_ttls=platform_ttls if isinstance(platform_ttls, dict) else None,
+                             failure_ttl=failure_ttl)
+        except Exception as e:
+            logger.warning("无法创建信息字典缓存 (%s): %s", cache_path, e)
+            return None
+
+    def _create_download_archive(self, project_root):
+        if not self.config_manager.get_config('download_archive_enabled', True):
+            return None
+        archive_path = os.path.join(project_root, 'cache', 'download_archive.sqlite3')
+        try:
+            return DownloadArchive(archive_path)
+        except Exception as e:
+            logger.warning("无法创建下载存档 (%s): %s", archive_path, e)
+            return None
+
+    def _create_queue_journal(self, project_root):
+        try:
+            compact_events = int(self.config_manager.get_config('queue_journal_compact_events', 10000))
+        except (ValueError, TypeError):
+            compact_events = 10000
+        return QueueJournal(os.path.join(project_root, 'download_queue.journal'), compact_events=compact_events)
+
+
+def read_urls(paths):
+    """
+    从链接文件 (或 '-' 表示标准输入) 读取 URL，忽略空行和 '#' 注释行。
+
+    返回:
+        list[str]: 按出现顺序排列的 URL 字符串 (未去重，由调用方规范化)。
+    """
+    urls = []
+    for path in paths:
+        if path == '-':
+            lines = sys.stdin
+        else:
+            lines = open(path, 'r', encoding='utf-8', errors='replace')
+        with contextlib.ExitStack() as stack:
+            if lines is not sys.stdin:
+                stack.enter_context(lines)
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    urls.extend(line.split())
+    return urls
+
+
+def _resolve_output_path(config_manager, project_root, output):
+    """命令行参数优先，其次是配置中的 default_download_path，最后是项目根目录下的 download。"""
+    path = output or config_manager.get_config('default_download_path') or os.path.join(project_root, 'download')
+    if not os.path.isabs(path):
+        path = os.path.abspath(path if output else os.path.join(project_root, path))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m core.headless',
+        description='无界面批量下载: 从链接文件或标准输入读取 URL，标准输出每行一个 JSON 事件。',
+        epilog=f'退出码: {EXIT_OK} 全部成功, {EXIT_FAILED} 有任务失败, {EXIT_USAGE} 参数或输入错误, '
+               f'{EXIT_NO_TASKS} 没有可下载的 URL, {EXIT_INTERRUPTED} 被中断。')
+    parser.add_argument('files', nargs='*', metavar='FILE', help="链接文件，每行一个或多个 URL；'-' 或省略时读取标准输入")
+    parser.add_argument('-o', '--output', help='下载目录 (默认使用配置中的 default_download_path)')
+    parser.add_argument('-j', '--concurrency', type=int, help='并发下载数 (默认使用配置中的 max_concurrent_downloads)')
+    parser.add_argument('--queue', action='store_true',
+                        help='同时继续图形界面队列中未完成的任务，并把本次任务写入队列日志 (请勿与图形界面同时运行)')
+    parser.add_argument('--serve', action='store_true',
+                        help='启动 HTTP 任务接口 (地址和令牌见配置 http_api_*)，任务完成后继续运行，直到 Ctrl+C')
+    parser.add_argument('--port', type=int, help='HTTP 任务接口的端口 (默认使用配置中的 http_api_port)')
+    parser.add_argument('--processes', type=int, metavar='N',
+                        help='在 N 个工作进程中执行下载，0 表示与 CPU 核数相同 (默认按配置 execution_mode)')
+    parser.add_argument('--no-archive', action='store_true', help='不使用下载存档 (已下载过的视频也重新下载)')
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help=f'每个任务 progress 事件的最小间隔秒数 (默认 {DEFAULT_PROGRESS_INTERVAL})')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='在标准错误输出更多日志 (-vv 为调试日志)')
+    return parser
+
+
+def _start_api_server(runner, config_manager, port=None):
+    """启动 HTTP 任务接口 (aiohttp 只在此时导入)。"""
+    from core.http_api import JobApiServer, DEFAULT_HOST, DEFAULT_PORT
+    get_config = config_manager.get_config
+    server = JobApiServer(runner, host=get_config('http_api_host', DEFAULT_HOST) or DEFAULT_HOST,
+                          port=port if port is not None else int(get_config('http_api_port', DEFAULT_PORT)),
+                          token=get_config('http_api_token', '') or None)
+    server.start()
+    return server
+
+
+def _make_emitter(stream):
+    lock = threading.Lock() # HTTP 接口线程也会输出事件
+    def emit(event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with lock:
+            stream.write(line)
+            stream.flush()
+    return emit
+
+
+def _raise_interrupted(signum, frame):
+    raise _Interrupted()
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    logging.getLogger().setLevel((logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)])
+    stdout = sys.stdout
+    emit = _make_emitter(stdout)
+
+    if args.concurrency is not None and args.concurrency < 1:
+        print("错误: --concurrency 必须大于 0", file=sys.stderr)
+        return EXIT_USAGE
+    files = args.files or ['-']
+    if not args.files and sys.stdin.isatty():
+        if not (args.queue or args.serve):
+            print("错误: 没有提供链接文件，且标准输入不是管道。使用 -h 查看用法。", file=sys.stderr)
+            return EXIT_USAGE
+        files = [] # 只继续队列中的任务或等待 HTTP 接口提交
+
+    try:
+        urls = read_urls(files)
+    except OSError as e:
+        print(f"错误: 无法读取链接文件: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # 配置和各组件的提示信息用 print 输出，重定向到标准错误，标准输出只保留 JSON 事件
+    with contextlib.redirect_stdout(sys.stderr):
+        config_manager = ConfigManager(config_file=os.path.join(project_root, 'config', 'config.json'),
+                                       example_config_file=os.path.join(project_root, 'config', 'config.example.json'))
+        try:
+            output_path = _resolve_output_path(config_manager, project_root, args.output)
+        except OSError as e:
+            print(f"错误: 无法创建下载目录: {e}")
+            return EXIT_USAGE
+        runner = HeadlessRunner(config_manager, project_root, output_path, emit, concurrency=args.concurrency,
+                                use_queue=args.queue, use_archive=not args.no_archive,
+                                progress_interval=args.progress_interval, processes=args.processes)
+
+    api_server = None
+    if args.serve:
+        try:
+            api_server = _start_api_server(runner, config_manager, args.port)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"错误: 无法启动 HTTP 任务接口: {e}", file=sys.stderr)
+            runner.close()
+            return EXIT_USAGE
+        emit({'event': 'listening', 'url': api_server.url})
+
+    signal.signal(signal.SIGTERM, _raise_interrupted)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            runner.load_queue()
+            runner.add_urls(urls)
+        summary = runner.run(serve=args.serve)
+    except (KeyboardInterrupt, _Interrupted):
+        if api_server is not None:
+            api_server.stop()
+        runner.close(interrupted=True)
+        emit({'event': 'summary', 'interrupted': True})
+        # 正在进行的 yt-dlp 下载无法中途停止，不等待工作线程；.part 文件保留，下次续传
+        os._exit(EXIT_INTERRUPTED)
+    connections = runner.connection_pool.get_stats() # 连接复用和握手耗时
+    runner.close()
+    emit(dict(summary, event='summary', output_path=output_path, connections=connections))
+
+    if summary['failed']:
+        return EXIT_FAILED
+    if summary['total'] == 0 and not summary['skipped']:
+        return EXIT_NO_TASKS
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+# core/host_limiter.py - Per-host concurrency limits and circuit breakers
+import collections
+import threading
+import time
+import logging
+from urllib.parse import urlsplit
+
+from core.error_classifier import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# 域名后缀到平台名的映射，同一平台的多个域名共享并发限制和熔断状态
+_PLATFORM_DOMAINS = (
+    ('tiktok', ('tiktok.com', 'tiktokv.com', 'tiktokcdn.com', 'musical.ly')),
+    ('youtube', ('youtube.com', 'youtu.be', 'youtube-nocookie.com', 'googlevideo.com')),
+)
+
+
+def host_key_for_url(url):
+    """
+    返回 URL 所属的限流键：已知平台返回平台名 (例如 'tiktok')，其他站点返回主域名。
+    """
+    try:
+        hostname = (urlsplit(url).hostname or '').lower()
+    except (ValueError, AttributeError):
+        return 'unknown'
+    for platform, domains in _PLATFORM_DOMAINS:
+        if any(hostname == domain or hostname.endswith('.' + domain) for domain in domains):
+            return platform
+    labels = [label for label in hostname.split('.') if label]
+    if not labels:
+        return 'unknown'
+    return '.'.join(labels[-2:])
+
+
+class CircuitBreaker:
+    """
+    单个主机的熔断器 (非线程安全，由 HostLimiter 的锁保护)。
+
+    连续 failure_threshold 次被限流 (429、提取阶段的 403) 后进入 open 状态，冷却期内不再向该主机
+    发起请求；冷却结束后进入 half_open，只放行一个探测任务：探测成功则恢复 closed，
+    再次被限流则重新打开并将冷却时间加倍 (不超过 max_cooldown)。探测以其他错误结束或被取消时
+    不改变状态，放行下一个探测。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, cooldown=60.0, max_cooldown=600.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_cooldown = max(1.0, float(cooldown))
+        self.max_cooldown = max(self.base_cooldown, float(max_cooldown))
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.trips = 0
+
+    def allow(self, now):
+        """返回是否允许发起新请求；冷却结束时转为 half_open 并放行一个探测。"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def remaining(self, now):
+        """距离允许探测的秒数 (未打开时为 0)。"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_until - now)
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("熔断器恢复: 探测请求成功")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self.probe_in_flight = False
+
+    def record_neutral(self):
+        """记录一次既非成功也非限流的结果 (其他错误、取消): 不改变状态和计数，只结束探测。"""
+        self.probe_in_flight = False
+
+    def record_rate_limited(self, now):
+        """记录一次被限流，返回熔断器是否 (重新) 打开。"""
+        if self.state == self.HALF_OPEN:
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self._open(now)
+            return True
+        if self.state == self.OPEN:
+            return False # 打开前已在执行的任务返回的结果，不重复计数
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self._open(now)
+            return True
+        return False
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.open_until = now + self.cooldown
+        self.probe_in_flight = False
+        self.failures = 0
+        self.trips += 1
+
+
+class HostLimiter:
+    """
+    按主机/平台限制并发并进行熔断。
+
+    不可执行的任务 (并发已满或熔断器打开) 暂存在各主机的等待队列中，而不是占用线程池
+    工作线程，因此一个被限流的平台不会阻塞同一批次中其他平台的任务。
+    """
+
+    def __init__(self, limits=None, default_limit=None, failure_threshold=3, cooldown=60.0, max_cooldown=600.0):
+        """
+        参数:
+            limits (dict | None): 主机键 (平台名或主域名) 到最大并发数的映射，例如 {'tiktok': 2}。
+            default_limit (int | None): 未配置主机的最大并发数，None 表示只受线程池大小限制。
+            failure_threshold (int): 连续被限流多少次后打开熔断器。
+            cooldown (float): 熔断器首次打开的冷却秒数，之后每次探测失败加倍。
+            max_cooldown (float): 冷却时间上限 (秒)。
+        """
+        self.limits = {str(k).lower(): max(1, int(v)) for k, v in (limits or {}).items()}
+        self.default_limit = max(1, int(default_limit)) if default_limit else None
+        self._breaker_args = (failure_threshold, cooldown, max_cooldown)
+        self._lock = threading.Lock()
+        self._active = collections.Counter()
+        self._waiting = collections.defaultdict(collections.deque)
+        self._breakers = {}
+
+    @classmethod
+    def from_config(cls, get_config):
+        """
+        根据配置创建限制器，无效值回退到默认值。
+
+        参数:
+            get_config (callable): 形如 ConfigManager.get_config(key, default) 的函数。
+        """
+        limits = get_config('platform_concurrency', {}) or {}
+        if not isinstance(limits, dict):
+            print("警告: 配置中的 'platform_concurrency' 不是字典，将忽略。")
+            limits = {}
+        values = {}
+        for key, attr, default in (('circuit_failure_threshold', 'failure_threshold', 3),
+                                   ('circuit_cooldown', 'cooldown', 60.0),
+                                   ('circuit_max_cooldown', 'max_cooldown', 600.0)):
+            try:
+                values[attr] = float(get_config(key, default))
+            except (ValueError, TypeError):
+                print(f"警告: 配置中的 '{key}' 值无效，将使用默认值 {default}。")
+                values[attr] = default
+        try:
+            return cls(limits=limits, **values)
+        except (ValueError, TypeError) as e:
+            print(f"警告: 配置中的 'platform_concurrency' 值无效 ({e})，将不限制单平台并发。")
+            return cls(**values)
+
+    def limit_for(self, host):
+        return self.limits.get(host, self.default_limit)
+
+    def acquire_or_park(self, host, entry):
+        """
+        尝试为任务占用主机的一个并发名额。
+
+        返回:
+            tuple: (acquired, wake_delay)。acquired 为 False 时 entry 已放入等待队列；
+                   wake_delay 不为 None 表示熔断器打开，调用方应在该秒数后调用 pump()。
+        """
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breaker(host)
+            if not self._waiting[host] and self._has_slot(host) and breaker.allow(now):
+                self._active[host] += 1
+                return True, None
+            self._waiting[host].append(entry)
+            return False, self._wake_delay(breaker, now)
+
+    def release(self, host, status=None, category=None):
+        """
+        任务的一次尝试结束后释放名额并记录结果。
+
+        参数:
+            status (str | None): 尝试的结果状态。只有 'finished' 算作成功 (关闭熔断器、清零计数)。
+            category (str | None): 失败类别 (见 core.error_classifier)，RATE_LIMITED 计入熔断；
+                                   其他失败、取消和 status 为 None (未执行) 都不改变熔断器状态。
+        返回:
+            tuple: (runnable_entries, wake_delay)，runnable_entries 为现在可以执行的等待任务
+                   (名额已为它们占用)。
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._active[host] = max(0, self._active[host] - 1)
+            breaker = self._breaker(host)
+            if category == RATE_LIMITED:
+                if breaker.record_rate_limited(now):
+                    logger.warning("主机 %s 多次被限流，熔断 %.0f 秒 (第 %d 次)", host, breaker.cooldown, breaker.trips)
+            elif status == 'finished':
+                breaker.record_success()
+            else:
+                breaker.record_neutral()
+            return self._take_runnable(host, breaker, now)
+
+    def pump(self, host):
+        """熔断冷却结束时调用，取出可以执行的等待任务。返回值同 release()。"""
+        now = time.monotonic()
+        with self._lock:
+            return self._take_runnable(host, self._breaker(host), now)
+
+    def peek_waiting(self, limit):
+        """
+        按排队顺序查看各主机等待队列中的任务 (不取出)，熔断冷却中的主机除外。
+
+        返回:
+            list: 最多 limit 个 entry，各主机轮流取，每个主机按入队顺序。
+        """
+        now = time.monotonic()
+        entries = []
+        with self._lock:
+            queues = [queue for host, queue in self._waiting.items()
+                      if host not in self._breakers or self._breakers[host].remaining(now) <= 0]
+            position = 0
+            while len(entries) < limit and any(position < len(queue) for queue in queues):
+                for queue in queues:
+                    if position < len(queue) and len(entries) < limit:
+                        entries.append(queue[position])
+                position += 1
+        return entries
+
+    def remove_waiting(self, predicate):
+        """
+        从等待队列中移除第一个满足 predicate(entry) 的任务 (取消时使用)。
+
+        返回:
+            object | None: 被移除的 entry，没有找到时为 None。
+        """
+        with self._lock:
+            for host, queue in self._waiting.items():
+                for entry in queue:
+                    if predicate(entry):
+                        queue.remove(entry)
+                        if not queue:
+                            del self._waiting[host]
+                        return entry
+        return None
+
+    def drain_waiting(self):
+        """取出所有主机的全部等待任务 (关闭时使用)。"""
+        with self._lock:
+            entries = [entry for queue in self._waiting.values() for entry in queue]
+            self._waiting.clear()
+        return entries
+
+    def get_stats(self):
+        """返回各主机的并发、等待数量和熔断器状态。"""
+        now = time.monotonic()
+        with self._lock:
+            hosts = set(self._active) | set(self._waiting) | set(self._breakers)
+            return {host: {
+                'active': self._active.get(host, 0),
+                'waiting': len(self._waiting.get(host, ())),
+                'limit': self.limit_for(host),
+                'state': self._breakers[host].state if host in self._breakers else CircuitBreaker.CLOSED,
+                'trips': self._breakers[host].trips if host in self._breakers else 0,
+                'reopen_in': self._breakers[host].remaining(now) if host in self._breakers else 0.0,
+            } for host in sorted(hosts)}
+
+    # --- Internal Helpers (调用方需持有锁) ---
+
+    def _breaker(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(*self._breaker_args)
+        return breaker
+
+    def _has_slot(self, host):
+        limit = self.limit_for(host)
+        return limit is None or self._active[host] < limit
+
+    def _take_runnable(self, host, breaker, now):
+        runnable = []
+        queue = self._waiting.get(host)
+        while queue and self._has_slot(host) and breaker.allow(now):
+            runnable.append(queue.popleft())
+            self._active[host] += 1
+        if queue is not None and not queue:
+            del self._waiting[host]
+        wake_delay = self._wake_delay(breaker, now) if self._waiting.get(host) else None
+        return runnable, wake_delay
+
+    @staticmethod
+    def _wake_delay(breaker, now):
+        if breaker.state == CircuitBreaker.OPEN:
+            return breaker.remaining(now)
+        return None
@@ -0,0 +1,364 @@
+# core/http_api.py - Local HTTP job API (aiohttp) for submitting and monitoring downloads
+"""
+本地 HTTP 任务接口，供其他服务提交链接和查询下载状态。
+
+接口 (JSON):
+    POST   /api/jobs                {"url": ..., "platform": 可选}        提交一个链接 (202)
+    POST   /api/jobs/batch          {"urls": [...], "platform": 可选}     批量提交 (202)
+    GET    /api/jobs                ?status=&platform=&ids=a,b&offset=&limit=  任务列表
+    GET    /api/jobs/{id}           任务状态
+    POST   /api/jobs/{id}/cancel    取消任务 (DELETE /api/jobs/{id} 相同)
+    POST   /api/jobs/cancel         {"ids": [...]} 或 {"all": true}      批量取消 (all: 所有未完成的任务)
+    GET    /api/events              Server-Sent Events: 合并后的任务变化 (?ids=a,b 只订阅指定任务)
+    GET    /api/stats               队列计数和接口统计
+    GET    /api/health
+
+配置了 token 时，请求需带 "Authorization: Bearer <token>" 头或 ?token= 参数 (EventSource 无法设置请求头)。
+
+服务器在独立线程的事件循环中运行。查询接口只读取事件循环内的任务快照，快照每隔
+refresh_interval 秒从 TaskStore 的独立变化通道 (open_change_feed) 增量更新一次，
+同一批变化也推送给所有 SSE 订阅者；大量并发轮询不会访问任务存储的锁，也不占用下载线程。
+"""
+import hmac
+import json
+import time
+import asyncio
+import threading
+import logging
+
+from aiohttp import web
+
+from core.task_store import ACTIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_REFRESH_INTERVAL = 0.5 # 任务快照和 SSE 推送的刷新间隔 (秒)
+SSE_HEARTBEAT = 15.0           # 没有变化时 SSE 注释心跳的间隔 (秒)，防止代理断开空闲连接
+MAX_BATCH_URLS = 10000         # 一次批量提交的最大链接数
+DEFAULT_LIST_LIMIT = 100
+MAX_LIST_LIMIT = 1000
+_MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+class _Subscriber:
+    """一个 SSE 连接的待发送变化 (按任务 id 合并，客户端读得慢时只保留每个任务的最新状态)。"""
+
+    __slots__ = ('ids', 'changed', 'removed', 'event')
+
+    def __init__(self, ids=None):
+        self.ids = ids
+        self.changed = {}
+        self.removed = set()
+        self.event = asyncio.Event()
+
+    def push(self, tasks, removed_ids):
+        for task in tasks:
+            if self.ids is None or task['id'] in self.ids:
+                self.changed[task['id']] = task
+                self.removed.discard(task['id'])
+        for task_id in removed_ids:
+            if self.ids is None or task_id in self.ids:
+                self.changed.pop(task_id, None)
+                self.removed.add(task_id)
+        if self.changed or self.removed:
+            self.event.set()
+
+    def take(self):
+        changed, self.changed = list(self.changed.values()), {}
+        removed, self.removed = sorted(self.removed), set()
+        self.event.clear()
+        return changed, removed
+
+
+class JobApiServer:
+    """
+    嵌入式 HTTP 任务接口。
+
+    backend 为下载控制器 (图形界面的 SucoiAppController 或无界面的 HeadlessRunner)，需要提供:
+        task_store:                       TaskStore
+        api_submit(urls, platform=None):  提交链接 (接口线程调用)，返回每个链接的结果字典列表
+                                          {'url', 'id', 'platform', 'result': queued/duplicate/archived/invalid}
+        api_cancel(task_id):              取消任务，返回 {'id', 'cancelled', 'running'}，任务不存在时返回 None
+        api_stats():                      返回队列计数等统计字典
+    """
+
+    def __init__(self, backend, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """
+        参数:
+            backend: 下载控制器 (见类说明)。
+            host (str): 监听地址，默认只监听本机。
+            port (int): 监听端口，0 表示由系统分配 (启动后见 self.port)。
+            token (str | None): 访问令牌，为空时不校验。
+            refresh_interval (float): 任务快照和 SSE 推送的刷新间隔 (秒)。
+        """
+        self.backend = backend
+        self.host = host
+        self.port = int(port)
+        self.token = token or None
+        self.refresh_interval = max(0.05, float(refresh_interval))
+        self._tasks = {} # 任务快照: id -> 任务字典 (只在事件循环线程中访问)
+        self._subscribers = set()
+        self._feed_id = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+        self._start_error = None
+        self._stats = {'requests': 0, 'submitted': 0, 'sse_clients': 0, 'refreshes': 0, 'unauthorized': 0}
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout=10.0):
+        """在后台线程中启动服务器，监听成功后返回；端口被占用等错误时抛出 OSError。"""
+        self._thread = threading.Thread(target=self._run, name='JobApiServer', daemon=True)
+        self._thread.start()
+        if not self._started.wait(timeout):
+            raise OSError(f"HTTP 接口在 {timeout} 秒内未能启动")
+        if self._start_error is not None:
+            raise self._start_error
+        logger.info("HTTP 任务接口已启动: %s", self.url)
+
+    def stop(self, timeout=5.0):
+        """关闭服务器 (断开 SSE 连接) 并等待线程结束。"""
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+        self._thread.join(timeout)
+
+    def get_stats(self):
+        return dict(self._stats, tasks=len(self._tasks))
+
+    # --- 事件循环线程 ---
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._startup())
+        except Exception as e:
+            logger.error("HTTP 任务接口启动失败 (%s:%s): %s", self.host, self.port, e)
+            self._start_error = e if isinstance(e, OSError) else OSError(str(e))
+            self._started.set()
+            self._loop.close()
+            return
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _startup(self):
+        app = web.Application(middlewares=[self._auth_middleware], client_max_size=_MAX_REQUEST_BYTES)
+        app.router.add_post('/api/jobs', self._handle_submit)
+        app.router.add_post('/api/jobs/batch', self._handle_submit_batch)
+        app.router.add_post('/api/jobs/cancel', self._handle_cancel_batch)
+        app.router.add_get('/api/jobs', self._handle_list)
+        app.router.add_get('/api/jobs/{task_id}', self._handle_get)
+        app.router.add_post('/api/jobs/{task_id}/cancel', self._handle_cancel)
+        app.router.add_delete('/api/jobs/{task_id}', self._handle_cancel)
+        app.router.add_get('/api/events', self._handle_events)
+        app.router.add_get('/api/stats', self._handle_stats)
+        app.router.add_get('/api/health', self._handle_health)
+
+        self._feed_id, tasks = self.backend.task_store.open_change_feed()
+        self._tasks = {task['id']: task for task in tasks}
+        self._runner = web.AppRunner(app, handle_signals=False, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        try:
+            await site.start()
+        except Exception:
+            await self._runner.cleanup()
+            self.backend.task_store.close_change_feed(self._feed_id)
+            raise
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        self._refresh_task = asyncio.ensure_future(self._refresh_loop())
+
+    async def _shutdown(self):
+        self._refresh_task.cancel()
+        for subscriber in list(self._subscribers):
+            subscriber.event.set() # 让 SSE 处理函数退出
+        self._subscribers.clear()
+        await self._runner.cleanup()
+        self.backend.task_store.close_change_feed(self._feed_id)
+        self._loop.stop()
+
+    async def _refresh_loop(self):
+        """定时从任务存储的变化通道取出变化，更新快照并推送给 SSE 订阅者。"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                self._refresh()
+            except Exception as e:
+                logger.error("刷新 HTTP 接口的任务快照时出错: %s", e, exc_info=True)
+
+    def _refresh(self):
+        tasks, removed_ids = self.backend.task_store.take_feed_changes(self._feed_id)
+        if not tasks and not removed_ids:
+            return
+        self._stats['refreshes'] += 1
+        for task in tasks:
+            self._tasks[task['id']] = task
+        for task_id in removed_ids:
+            self._tasks.pop(task_id, None)
+        for subscriber in self._subscribers:
+            subscriber.push(tasks, removed_ids)
+
+    # --- Handlers ---
+
+    @web.middleware
+    async def _auth_middleware(self, request, handler):
+        self._stats['requests'] += 1
+        if self.token is not None and request.path != '/api/health':
+            header = request.headers.get('Authorization', '')
+            supplied = header[7:] if header.startswith('Bearer ') else request.query.get('token')
+            if not hmac.compare_digest(supplied or '', self.token):
+                self._stats['unauthorized'] += 1
+                return _error(401, '未授权')
+        return await handler(request)
+
+    async def _handle_submit(self, request):
+        body = await _read_json(request)
+        url = body.get('url')
+        if not isinstance(url, str) or not url.strip():
+            return _error(400, '缺少 url')
+        results = await self._submit([url], body.get('platform'))
+        return web.json_response(results[0], status=202)
+
+    async def _handle_submit_batch(self, request):
+        body = await _read_json(request)
+        urls = body.get('urls')
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            return _error(400, 'urls 必须是非空的字符串列表')
+        if len(urls) > MAX_BATCH_URLS:
+            return _error(400, f'一次最多提交 {MAX_BATCH_URLS} 个链接')
+        results = await self._submit(urls, body.get('platform'))
+        counts = {}
+        for result in results:
+            counts[result['result']] = counts.get(result['result'], 0) + 1
+        return web.json_response({'results': results, 'counts': counts}, status=202)
+
+    async def _submit(self, urls, platform):
+        if platform is not None and not isinstance(platform, str):
+            raise web.HTTPBadRequest(text=json.dumps({'error': 'platform 必须是字符串'}), content_type='application/json')
+        # 规范化和写入任务存储可能较慢 (大批量)，放到线程池中执行，不阻塞事件循环
+        results = await self._loop.run_in_executor(None, self.backend.api_submit, urls, platform)
+        self._stats['submitted'] += sum(1 for result in results if result['result'] == 'queued')
+        return results
+
+    async def _handle_list(self, request):
+        query = request.query
+        try:
+            offset = max(0, int(query.get('offset', 0)))
+            limit = max(1, min(MAX_LIST_LIMIT, int(query.get('limit', DEFAULT_LIST_LIMIT))))
+        except ValueError:
+            return _error(400, 'offset 和 limit 必须是整数')
+        if 'ids' in query:
+            tasks = (self._tasks.get(task_id) for task_id in query['ids'].split(','))
+            tasks = [task for task in tasks if task is not None]
+        else:
+            tasks = self._tasks.values()
+        statuses = set(query['status'].split(',')) if query.get('status') else None
+        platform = query.get('platform')
+        matched = [task for task in tasks
+                   if (statuses is None or task['status'] in statuses) and (platform is None or task['platform'] == platform)]
+        return web.json_response({'total': len(matched), 'offset': offset, 'limit': limit,
+                                  'jobs': matched[offset:offset + limit]})
+
+    async def _handle_get(self, request):
+        task = self._tasks.get(request.match_info['task_id'])
+        if task is None:
+            task_id = request.match_info['task_id']
+            record = self.backend.task_store.get(task_id) # 刚提交、快照尚未刷新
+            if record is None:
+                return _error(404, '任务不存在')
+            task = record.to_dict()
+        return web.json_response(task)
+
+    async def _handle_cancel(self, request):
+        result = await self._loop.run_in_executor(None, self.backend.api_cancel, request.match_info['task_id'])
+        if result is None:
+            return _error(404, '任务不存在')
+        return web.json_response(result)
+
+    async def _handle_cancel_batch(self, request):
+        body = await _read_json(request)
+        if body.get('all') is True:
+            ids = [task_id for task_id, task in self._tasks.items() if task['status'] in ACTIVE_STATUSES]
+        else:
+            ids = body.get('ids')
+            if not isinstance(ids, list) or not all(isinstance(task_id, str) for task_id in ids):
+                return _error(400, 'ids 必须是字符串列表 (或使用 {"all": true})')
+            if len(ids) > MAX_BATCH_URLS:
+                return _error(400, f'一次最多取消 {MAX_BATCH_URLS} 个任务')
+        results = await self._loop.run_in_executor(None, self._cancel_many, ids)
+        cancelled = sum(1 for result in results if result.get('cancelled'))
+        return web.json_response({'results': results, 'cancelled': cancelled})
+
+    def _cancel_many(self, ids):
+        results = []
+        for task_id in ids:
+            result = self.backend.api_cancel(task_id)
+            results.append(result if result is not None else {'id': task_id, 'cancelled': False, 'missing': True})
+        return results
+
+    async def _handle_events(self, request):
+        ids = set(request.query['ids'].split(',')) if request.query.get('ids') else None
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                               'X-Accel-Buffering': 'no'})
+        await response.prepare(request)
+        subscriber = _Subscriber(ids)
+        # 先发送订阅范围内的当前状态，之后只发送变化
+        snapshot = [task for task in self._tasks.values() if ids is None or task['id'] in ids]
+        await response.write(_sse('snapshot', {'jobs': snapshot}))
+        self._subscribers.add(subscriber)
+        self._stats['sse_clients'] += 1
+        try:
+            while subscriber in self._subscribers:
+                try:
+                    await asyncio.wait_for(subscriber.event.wait(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await response.write(b': keep-alive\n\n')
+                    continue
+                changed, removed = subscriber.take()
+                if changed or removed:
+                    await response.write(_sse('jobs', {'jobs': changed, 'removed': removed, 'time': time.time()}))
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass # 客户端断开
+        finally:
+            self._subscribers.discard(subscriber)
+            self._stats['sse_clients'] -= 1
+        return response
+
+    async def _handle_stats(self, request):
+        stats = self.backend.api_stats()
+        stats['api'] = self.get_stats()
+        return web.json_response(stats)
+
+    async def _handle_health(self, request):
+        return web.json_response({'ok': True})
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def _error(status, message):
+    return web.json_response({'error': message}, status=status)
+
+
+async def _read_json(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text=json.dumps({'error': '请求体不是有效的 JSON'}), content_type='application/json')
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text=json.dumps({'error': '请求体必须是 JSON 对象'}), content_type='application/json')
+    return body
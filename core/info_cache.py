@@ -0,0 +1,284 @@
+# core/info_cache.py - Persistent cache of yt-dlp extracted info dicts
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import threading
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# 各平台信息字典的默认有效期 (秒)。签名媒体链接过期后缓存必须失效，
+# YouTube 的 googlevideo 链接约 6 小时，TikTok CDN 链接通常更短。
+DEFAULT_PLATFORM_TTLS = {
+    'youtube': 5 * 3600,
+    'tiktok': 30 * 60,
+}
+DEFAULT_TTL = 30 * 60
+DEFAULT_FAILURE_TTL = 24 * 3600 # 永久性失败的记忆时长，过期后允许重新尝试 (例如私密视频被公开)
+EXPIRE_SAFETY_MARGIN = 5 * 60 # 在签名链接过期前提前这么多秒视为失效
+
+# 匹配签名链接中的过期时间戳，例如 YouTube 的 expire=1712345678 或 /expire/1712345678/，
+# TikTok 的 x-expires=1712345678
+_EXPIRE_PATTERN = re.compile(r'(?:[?&/])(?:x-)?expires?[=/](\d{9,11})')
+
+
+@lru_cache(maxsize=4096)
+def cache_key_for_url(url):
+    """
+    不经过网络，根据 yt-dlp 的提取器匹配规则为 URL 生成规范缓存键。
+
+    返回:
+        str | None: 形如 "youtube dQw4w9WgXcQ" 的键 (与 yt-dlp 下载存档格式一致)，
+                    无法确定视频 ID 时返回 None。
+    """
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+    except ImportError:
+        return None
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic' or not ie.suitable(url):
+            continue
+        try:
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            video_id = None
+        if video_id:
+            return f"{ie.ie_key().lower()} {video_id}"
+        return None
+    return None
+
+
+def _url_expiry(info):
+    """从信息字典中的媒体链接解析最早的签名过期时间，找不到时返回 None。"""
+    expiries = []
+    formats = info.get('requested_formats') or info.get('formats') or []
+    urls = [f.get('url') for f in formats if isinstance(f, dict)]
+    urls.append(info.get('url'))
+    for url in urls:
+        if not isinstance(url, str):
+            continue
+        match = _EXPIRE_PATTERN.search(url)
+        if match:
+            expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+class InfoCache:
+    """
+    基于 SQLite 的 yt-dlp 信息字典磁盘缓存。
+
+    以规范视频键 (见 cache_key_for_url) 存储经过清理的信息字典，支持按平台设置有效期、
+    按总大小淘汰最久未访问的条目，并统计命中/未命中次数。重试、重新下载和重新选择格式时
+    可直接复用缓存，跳过耗时的提取阶段。
+    """
+
+    def __init__(self, db_path, max_bytes=256 * 1024 * 1024, platform_ttls=None, default_ttl=DEFAULT_TTL,
+                 failure_ttl=DEFAULT_FAILURE_TTL):
+        """
+        参数:
+            db_path (str): SQLite 数据库文件路径。
+            max_bytes (int): 缓存数据 (压缩后) 的总大小上限，超过后淘汰最久未访问的条目。
+            platform_ttls (dict | None): 平台名 (小写提取器名) 到有效期秒数的映射，覆盖默认值。
+            default_ttl (int): 未配置平台的默认有效期。
+            failure_ttl (int): 永久性失败记录的有效期。
+        """
+        self.db_path = db_path
+        self.max_bytes = max(0, int(max_bytes))
+        self.platform_ttls = dict(DEFAULT_PLATFORM_TTLS)
+        if platform_ttls:
+            self.platform_ttls.update({str(k).lower(): int(v) for k, v in platform_ttls.items()})
+        self.default_ttl = int(default_ttl)
+        self.failure_ttl = int(failure_ttl)
+
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'puts': 0, 'evictions': 0, 'invalidations': 0,
+                       'failure_hits': 0}
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS info ('
+            ' key TEXT PRIMARY KEY,'
+            ' platform TEXT,'
+            ' data BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' expires REAL NOT NULL,'
+            ' last_access REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_info_last_access ON info(last_access)')
+        # 永久性失败的负缓存 (私密、已删除、地区限制等)，同一链接再次入队时可立即失败
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS failures ('
+            ' key TEXT PRIMARY KEY,'
+            ' reason TEXT,'
+            ' message TEXT,'
+            ' created REAL NOT NULL,'
+            ' expires REAL NOT NULL)')
+        self._purge_expired()
+
+    # --- Public API ---
+
+    def ttl_for(self, platform):
+        """返回指定平台的有效期 (秒)。"""
+        return self.platform_ttls.get((platform or '').lower(), self.default_ttl)
+
+    def get(self, key):
+        """
+        读取缓存的信息字典。
+
+        返回:
+            dict | None: 未过期的信息字典，未命中或已过期时返回 None。
+        """
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT data, expires FROM info WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            data, expires = row
+            if expires <= now:
+                self._conn.execute('DELETE FROM info WHERE key = ?', (key,))
+                self._stats['misses'] += 1
+                self._stats['expired'] += 1
+                return None
+            self._conn.execute('UPDATE info SET last_access = ? WHERE key = ?', (now, key))
+            self._stats['hits'] += 1
+        try:
+            return json.loads(zlib.decompress(data).decode('utf-8'))
+        except Exception as e:
+            logger.warning("缓存条目 %s 解码失败，已删除: %s", key, e)
+            self.invalidate(key)
+            return None
+
+    def contains(self, key):
+        """是否有未过期的缓存条目 (不解码、不计入命中统计，供预取阶段判断是否需要提取)。"""
+        if not key:
+            return False
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM info WHERE key = ? AND expires > ?', (key, time.time())).fetchone()
+        return row is not None
+
+    def put(self, key, info, platform=None):
+        """
+        写入信息字典 (应已通过 YoutubeDL.sanitize_info 清理为可序列化形式)。
+
+        有效期取平台有效期与媒体链接签名过期时间中较早者。
+        """
+        if not key or not info:
+            return
+        if platform is None:
+            platform = key.split(' ', 1)[0]
+        now = time.time()
+        expires = now + self.ttl_for(platform)
+        url_expiry = _url_expiry(info)
+        if url_expiry:
+            expires = min(expires, url_expiry - EXPIRE_SAFETY_MARGIN)
+        if expires <= now:
+            return # 链接即将过期，缓存没有意义
+        try:
+            data = zlib.compress(json.dumps(info, ensure_ascii=False).encode('utf-8'))
+        except (TypeError, ValueError) as e:
+            logger.warning("信息字典无法序列化，跳过缓存 %s: %s", key, e)
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO info (key, platform, data, size, created, expires, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, platform, data, len(data), now, expires, now))
+            self._stats['puts'] += 1
+            self._evict_if_needed()
+
+    def invalidate(self, key):
+        """删除一个缓存条目 (例如缓存的媒体链接已无法下载时)。"""
+        if not key:
+            return
+        with self._lock:
+            self._conn.execute('DELETE FROM info WHERE key = ?', (key,))
+            self._stats['invalidations'] += 1
+
+    def put_failure(self, key, reason, message):
+        """记录一个永久性失败。"""
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO failures (key, reason, message, created, expires) VALUES (?, ?, ?, ?, ?)',
+                (key, reason, message, now, now + self.failure_ttl))
+
+    def get_failure(self, key):
+        """
+        查询未过期的永久性失败记录。
+
+        返回:
+            dict | None: {'reason': ..., 'message': ...}，没有记录时返回 None。
+        """
+        if not key:
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT reason, message, expires FROM failures WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[2] <= time.time():
+                self._conn.execute('DELETE FROM failures WHERE key = ?', (key,))
+                return None
+            self._stats['failure_hits'] += 1
+        return {'reason': row[0], 'message': row[1]}
+
+    def clear_failure(self, key):
+        """删除永久性失败记录 (例如用户手动重试时)。"""
+        if not key:
+            return
+        with self._lock:
+            self._conn.execute('DELETE FROM failures WHERE key = ?', (key,))
+
+    def get_stats(self):
+        """返回命中/未命中等计数以及当前条目数和总大小。"""
+        with self._lock:
+            entries, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM info').fetchone()
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update(entries=entries, bytes=total,
+                     hit_ratio=(stats['hits'] / lookups) if lookups else 0.0)
+        return stats
+
+    def close(self):
+        with self._lock:
+            try: self._conn.close()
+            except sqlite3.Error: pass
+
+    # --- Internal Helpers ---
+
+    def _purge_expired(self):
+        with self._lock:
+            now = time.time()
+            self._conn.execute('DELETE FROM info WHERE expires <= ?', (now,))
+            self._conn.execute('DELETE FROM failures WHERE expires <= ?', (now,))
+
+    def _evict_if_needed(self):
+        """总大小超过上限时按最久未访问顺序淘汰，直到降到上限的 90%。调用方需持有锁。"""
+        if not self.max_bytes:
+            return
+        (total,) = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM info').fetchone()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for key, size in self._conn.execute('SELECT key, size FROM info ORDER BY last_access').fetchall():
+            if total <= target:
+                break
+            self._conn.execute('DELETE FROM info WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        self._stats['evictions'] += evicted
+        if evicted:
+            logger.info("信息缓存超过大小上限，已淘汰 %d 个条目", evicted)
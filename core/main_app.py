@@ -4,8 +4,7 @@ from tkinter import messagebox # Keep for internal logic potentially
 import os
 import importlib # For dynamic module loading
 from threading import Thread
-import time # For monitor thread sleep
-import concurrent.futures
+import itertools
 import re # 用于清除 ANSI 转义码
 import json # 用于队列持久化
 
@@ -16,6 +15,26 @@ try:
     from config.config_manager import ConfigManager
     from ui.main_window import MainWindow
     from core.download_service import DownloadService # <-- 已取消注释
+    from core.info_cache import InfoCache
+    from core.progress_bus import ProgressBus
+    from core.retry_scheduler import RetryPolicy
+    from core.download_scheduler import DownloadScheduler
+    from core.host_limiter import HostLimiter
+    from core.bandwidth_limiter import BandwidthLimiter
+    from core.batch_tracker import DownloadBatch
+    from core.autotuner import ConcurrencyAutotuner, ThroughputMeter
+    from core.prefetch import ExtractionPrefetcher
+    from core.postprocess_pool import PostProcessPool
+    from core.format_policy import FormatPolicy
+    from core.connection_pool import ConnectionPool
+    from core.cancel_token import REASON_SHUTDOWN
+    from core.queue_journal import QueueJournal
+    from core.bulk_import import BulkUrlImporter
+    from core.url_canonicalizer import canonicalize
+    from core.download_archive import DownloadArchive, archive_key
+    from core.task_store import (TaskStore, normalize_status, STATUS_LABELS, STARTABLE_STATUSES, ACTIVE_STATUSES,
+                                 PENDING, QUEUED, PREPARING, DOWNLOADING, POSTPROCESSING, RETRYING, WAITING, FINISHED,
+                                 ERROR, CANCELLED)
 except ImportError:
     # Fallback if running directly from core directory (adjust paths)
     import sys
@@ -26,6 +45,37 @@ except ImportError:
     from config.config_manager import ConfigManager
     from ui.main_window import MainWindow
     from core.download_service import DownloadService # <-- 已取消注释 (Fallback)
+    from core.info_cache import InfoCache
+    from core.progress_bus import ProgressBus
+    from core.retry_scheduler import RetryPolicy
+    from core.download_scheduler import DownloadScheduler
+    from core.host_limiter import HostLimiter
+    from core.bandwidth_limiter import BandwidthLimiter
+    from core.batch_tracker import DownloadBatch
+    from core.autotuner import ConcurrencyAutotuner, ThroughputMeter
+    from core.prefetch import ExtractionPrefetcher
+    from core.postprocess_pool import PostProcessPool
+    from core.format_policy import FormatPolicy
+    from core.connection_pool import ConnectionPool
+    from core.cancel_token import REASON_SHUTDOWN
+    from core.queue_journal import QueueJournal
+    from core.bulk_import import BulkUrlImporter
+    from core.url_canonicalizer import canonicalize
+    from core.download_archive import DownloadArchive, archive_key
+    from core.task_store import (TaskStore, normalize_status, STATUS_LABELS, STARTABLE_STATUSES, ACTIVE_STATUSES,
+                                 PENDING, QUEUED, PREPARING, DOWNLOADING, POSTPROCESSING, RETRYING, WAITING, FINISHED,
+                                 ERROR, CANCELLED)
+
+# 用于清除 yt-dlp 进度字符串中的 ANSI 转义码
+ANSI_ESCAPE_PATTERN = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+# 下载进度批量刷新到界面的默认间隔 (毫秒)
+DEFAULT_PROGRESS_INTERVAL_MS = 100
+# 设置窗口中可选的最大并发数 (同时也是线程池的默认大小)
+MAX_CONCURRENT_DOWNLOADS = 10
+# 旧版本按 md5(url) 前 8 位生成的任务 id 的后缀，加载时改为规范 id
+LEGACY_TASK_ID_PATTERN = re.compile(r'_[0-9a-f]{8}$')
+# 批量导入进度窗口的刷新间隔 (毫秒)
+BULK_IMPORT_POLL_MS = 200
 
 class SucoiAppController:
     """主应用程序逻辑控制器。"""
@@ -44,30 +94,91 @@ class SucoiAppController:
 
         self.config_manager = ConfigManager(config_file=config_path,
                                              example_config_file=example_config_path)
-        # Initialize DownloadService
-        self.download_service = DownloadService() # <-- 恢复原状
+        # Initialize DownloadService (带信息字典缓存)
+        self.info_cache = self._create_info_cache(project_root)
+        # 下载存档: 记录已下载的视频 (按规范视频 id)，再次入队时直接跳过
+        self.download_archive = self._create_download_archive(project_root)
+        # 队列日志: 任务的新增、状态变化和移除在发生时追加写入，崩溃后也能恢复
+        self.queue_journal = self._create_queue_journal(project_root)
+        # 重试策略: 指数退避 + 抖动，参数可在配置中调整
+        self.retry_policy = RetryPolicy.from_config(self.config_manager.get_config)
+        # 全局带宽限制: 所有下载线程共享一个令牌桶，可按平台和时间段设置限速
+        self.bandwidth_limiter = BandwidthLimiter.from_config(self.config_manager.get_config)
+        # 聚合吞吐量计数 (进度钩子写入)，供并发自动调节使用
+        self.throughput_meter = ThroughputMeter()
+        # 格式策略: 优先选择编码与目标容器兼容的流，能转封装就不转码
+        self.format_policy = FormatPolicy.from_config(self.config_manager.get_config)
+        # 连接池: 各任务的 yt-dlp 实例共享 HTTP 会话 (keep-alive) 和进程内 DNS 缓存
+        self.connection_pool = ConnectionPool.from_config(self.config_manager.get_config)
+        # 后处理队列: FFmpeg 转码在下载完成后排队执行，不占用下载名额，并按 CPU 预算限制并发
+        self.postprocess_pool = PostProcessPool.from_config(self.config_manager.get_config,
+                                                            progress_callback=self.update_download_progress,
+                                                            format_policy=self.format_policy)
+        # 执行模式: thread (默认，下载在线程池中执行) 或 process (每次尝试在工作进程中执行，提取不受 GIL 限制)
+        self.download_service = self._create_download_service()
+        # 并发上限: 进程模式下允许与工作进程数相同的并发
+        self.concurrency_limit = max(MAX_CONCURRENT_DOWNLOADS, getattr(self.download_service, 'processes', 0))
 
         # --- Initialize ThreadPoolExecutor ---
         try:
             max_workers_config = self.config_manager.get_config('max_concurrent_downloads', 3)
             # Ensure it's a valid integer between 1 and, say, 10 (or a reasonable upper limit)
-            self.max_workers = max(1, min(10, int(max_workers_config)))
+            self.max_workers = max(1, min(self.concurrency_limit, int(max_workers_config)))
         except (ValueError, TypeError):
             print(f"警告: 配置中的 'max_concurrent_downloads' 值无效，将使用默认值 3。")
             self.max_workers = 3
         print(f"信息: 初始化下载线程池，最大并发数: {self.max_workers}")
-        self.download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
-        self.active_futures = {} # 用于存储 Future 对象，键为 item_id
+        # 调度器: 线程池执行单次尝试，重试通过延迟队列重新入队，不占用工作线程；
+        # 每个平台单独限制并发，连续被限流时熔断该平台，不影响其他平台的任务
+        self.host_limiter = HostLimiter.from_config(self.config_manager.get_config)
+        # 并发自动调节 (AIMD): 根据吞吐量和错误率在 [min, max] 范围内调整并发许可数，
+        # 线程池按上限创建一次，调整时不重建线程池
+        self.autotuner = ConcurrencyAutotuner.from_config(
+            self.config_manager.get_config,
+            set_concurrency=lambda n: self.download_scheduler.set_concurrency(n),
+            get_counts=lambda: self.download_scheduler.get_counts(),
+            meter=self.throughput_meter,
+            default_max=self.concurrency_limit)
+        # 流水线的提取阶段: 单独的线程池为即将开始的排队任务预取信息字典，与其他任务的传输重叠进行
+        self.prefetcher = ExtractionPrefetcher.from_config(
+            self.config_manager.get_config,
+            extract=self.download_service.prefetch_info,
+            upcoming=lambda limit: self.download_scheduler.upcoming(limit))
+        self.download_scheduler = DownloadScheduler(self._run_single_download_task, self.max_workers,
+                                                    host_limiter=self.host_limiter,
+                                                    on_waiting=self._on_task_waiting,
+                                                    on_attempt_done=self.autotuner.record_attempt,
+                                                    max_pool_size=max(self.concurrency_limit, self.autotuner.max_workers),
+                                                    on_attempt_start=self.prefetcher.claim,
+                                                    postprocessor=self.postprocess_pool)
+        if self.info_cache is not None: # 预取结果通过信息字典缓存交给下载阶段
+            self.prefetcher.start()
+        if self.config_manager.get_config('autotune_enabled', False):
+            print(f"信息: 已启用并发自动调节，范围 {self.autotuner.min_workers}-{self.autotuner.max_workers}。")
+            self.autotuner.start(self.download_scheduler.retry_queue)
+        self.active_futures = {} # 未完成的任务 Future，键为 item_id (完成时由回调移除)
         # self.active_task_progress = {} # 不再需要，已移除
-        self.removed_item_ids = set() # 存储用户已移除的任务ID
-        # --- 新增：用于基于计数的批次进度条 ---
-        self.total_batch_tasks = 0      # 当前批次的总任务数
-        self.completed_batch_tasks = 0  # 当前批次已完成的任务数
-
+        # --- 任务存储: 下载任务的唯一数据源，下载列表 (Treeview) 只是它的投影 ---
+        self.task_store = TaskStore()
+        self.bulk_importer = None # 正在进行的批量 URL 导入 (BulkUrlImporter)
+        # --- 批次完成计数: 由 Future 的 done-callback 驱动，多个批次可以重叠 ---
+        self.active_batches = {} # batch_id -> DownloadBatch
+        self._batch_ids = itertools.count(1)
+        self._pending_summary = {'total': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0, 'batches': 0} # 等待队列空闲时显示
+        self._last_queue_counts = None
+
+
+        # --- 进度总线: 工作线程只写入最新状态，UI 定时批量刷新 ---
+        self.progress_bus = ProgressBus()
+        try:
+            self.progress_interval_ms = max(20, int(self.config_manager.get_config('progress_ui_interval_ms', DEFAULT_PROGRESS_INTERVAL_MS)))
+        except (ValueError, TypeError):
+            self.progress_interval_ms = DEFAULT_PROGRESS_INTERVAL_MS
 
         # --- Initialize UI ---
         # Pass self (the controller) to the MainWindow
         self.view = MainWindow(self.root, self)
+        self.view.get_download_list().attach(self.task_store, self._row_values)
 
         # --- Load Platform Modules and Tabs ---
         self.platform_modules = {} # Store loaded platform logic modules
@@ -80,8 +191,206 @@ class SucoiAppController:
         # --- Load Persistent Queue ---
         # --- Start the Application ---
         self._load_persistent_queue() # 加载上次未完成的任务
+        # 本地 HTTP 任务接口 (可选): 其他服务通过它提交链接、查询状态
+        self.api_server = self._start_api_server()
+        self.root.after(self.progress_interval_ms, self._progress_tick)
         self.root.mainloop()
 
+    def _create_download_service(self):
+        """根据配置的执行模式创建下载服务，进程池创建失败时回退到线程模式。"""
+        components = dict(info_cache=self.info_cache, retry_policy=self.retry_policy,
+                          bandwidth_limiter=self.bandwidth_limiter, throughput_meter=self.throughput_meter,
+                          download_archive=self.download_archive, format_policy=self.format_policy,
+                          connection_pool=self.connection_pool, defer_postprocessing=self.postprocess_pool is not None)
+        mode = str(self.config_manager.get_config('execution_mode', 'thread') or 'thread').lower()
+        if mode == 'process':
+            try:
+                from core.process_pool import ProcessDownloadService
+                service = ProcessDownloadService.from_config(self.config_manager.get_config, **components)
+                print(f"信息: 下载在 {service.processes} 个工作进程中执行 (进程模式)。")
+                return service
+            except Exception as e:
+                print(f"警告: 无法创建下载进程池，将使用线程模式: {e}")
+        elif mode != 'thread':
+            print(f"警告: 配置中的 'execution_mode' 值 '{mode}' 无效，将使用线程模式。")
+        return DownloadService(**components)
+
+    def _create_info_cache(self, project_root):
+        """根据配置创建 yt-dlp 信息字典缓存，禁用或创建失败时返回 None。"""
+        if not self.config_manager.get_config('info_cache_enabled', True):
+            print("信息: 信息字典缓存已在配置中禁用。")
+            return None
+        try:
+            max_mb = int(self.config_manager.get_config('info_cache_max_mb', 256))
+        except (ValueError, TypeError):
+            print("警告: 配置中的 'info_cache_max_mb' 值无效，将使用默认值 256。")
+            max_mb = 256
+        platform_ttls = self.config_manager.get_config('info_cache_ttls', {}) or {}
+        try:
+            failure_ttl = int(self.config_manager.get_config('failure_memory_ttl', 24 * 3600))
+        except (ValueError, TypeError):
+            print("警告: 配置中的 'failure_memory_ttl' 值无效，将使用默认值 86400。")
+            failure_ttl = 24 * 3600
+        cache_path = os.path.join(project_root, 'cache', 'info_cache.sqlite3')
+        try:
+            return InfoCache(cache_path, max_bytes=max_mb * 1024 * 1024,
+                             platform_ttls=platform_ttls if isinstance(platform_ttls, dict) else None,
+                             failure_ttl=failure_ttl)
+        except Exception as e:
+            print(f"警告: 无法创建信息字典缓存 ({cache_path}): {e}")
+            return None
+
+    def _create_download_archive(self, project_root):
+        """根据配置创建下载存档，禁用或创建失败时返回 None。"""
+        if not self.config_manager.get_config('download_archive_enabled', True):
+            print("信息: 下载存档已在配置中禁用。")
+            return None
+        archive_path = os.path.join(project_root, 'cache', 'download_archive.sqlite3')
+        try:
+            archive = DownloadArchive(archive_path)
+            print(f"信息: 下载存档已加载，共 {len(archive)} 条记录。")
+            return archive
+        except Exception as e:
+            print(f"警告: 无法创建下载存档 ({archive_path}): {e}")
+            return None
+
+    def import_download_archive(self, path, parent=None):
+        """从 yt-dlp 的 download_archive 文件导入下载存档 (在后台线程中进行)。"""
+        self._run_archive_transfer('import', path, parent)
+
+    def export_download_archive(self, path, parent=None):
+        """把下载存档导出为 yt-dlp 的 download_archive 文件 (在后台线程中进行)。"""
+        self._run_archive_transfer('export', path, parent)
+
+    def _run_archive_transfer(self, direction, path, parent):
+        if self.download_archive is None:
+            self.view.show_message("提示", "下载存档未启用。", msg_type='warning', parent=parent)
+            return
+        self.update_status("正在导入下载存档..." if direction == 'import' else "正在导出下载存档...")
+        Thread(target=self._archive_transfer_task, args=(direction, path), daemon=True).start()
+
+    def _archive_transfer_task(self, direction, path):
+        try:
+            if direction == 'import':
+                added = self.download_archive.import_ytdlp_archive(path)
+                message = f"已导入 {added} 条新记录，共 {len(self.download_archive)} 条。"
+            else:
+                exported = self.download_archive.export_ytdlp_archive(path)
+                message = f"已导出 {exported} 条记录到:\n{path}"
+        except Exception as e:
+            print(f"错误: 下载存档{'导入' if direction == 'import' else '导出'}失败: {e}")
+            self.update_status("状态: 下载存档操作失败")
+            self.show_message("错误", f"下载存档操作失败:\n{e}", msg_type='error')
+            return
+        self.update_status(f"下载存档: {message.splitlines()[0]}")
+        self.show_message("下载存档", message)
+
+    def is_archived(self, canonical):
+        """规范化后的视频是否已在下载存档中 (已下载过)。"""
+        return (self.download_archive is not None and canonical.video_id is not None
+                and self.download_archive.contains(archive_key(canonical.platform, canonical.video_id)))
+
+    def _create_queue_journal(self, project_root):
+        """创建下载队列的追加写入日志，创建失败时返回 None (退出时回退到保存 download_queue.json)。"""
+        try:
+            compact_events = int(self.config_manager.get_config('queue_journal_compact_events', 10000))
+        except (ValueError, TypeError):
+            print("警告: 配置中的 'queue_journal_compact_events' 值无效，将使用默认值 10000。")
+            compact_events = 10000
+        journal_path = os.path.join(project_root, 'download_queue.journal')
+        try:
+            return QueueJournal(journal_path, compact_events=compact_events)
+        except Exception as e:
+            print(f"警告: 无法创建下载队列日志 ({journal_path}): {e}")
+            return None
+
+    def _start_api_server(self):
+        """根据配置启动本地 HTTP 任务接口 (aiohttp 只在启用时导入)，未启用或启动失败时返回 None。"""
+        if not self.config_manager.get_config('http_api_enabled', False):
+            return None
+        try:
+            from core.http_api import JobApiServer, DEFAULT_HOST, DEFAULT_PORT
+            server = JobApiServer(self,
+                                  host=self.config_manager.get_config('http_api_host', DEFAULT_HOST) or DEFAULT_HOST,
+                                  port=int(self.config_manager.get_config('http_api_port', DEFAULT_PORT)),
+                                  token=self.config_manager.get_config('http_api_token', '') or None)
+            server.start()
+        except ImportError as e:
+            print(f"警告: 无法启动 HTTP 任务接口，缺少依赖 (pip install aiohttp): {e}")
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            print(f"警告: 无法启动 HTTP 任务接口: {e}")
+            return None
+        print(f"信息: HTTP 任务接口已启动: {server.url}")
+        return server
+
+    # --- HTTP 任务接口 (core.http_api) 使用的接口，在接口线程中调用 ---
+
+    def api_submit(self, urls, platform=None):
+        """
+        把链接加入任务存储并提交下载 (不弹出任何对话框)。
+
+        返回:
+            list: 每个链接的结果字典 {'url', 'id', 'platform', 'result'}，result 为
+                  queued / duplicate / archived / invalid。
+        """
+        results = []
+        to_submit = []
+        submitted_ids = set() # 与 to_submit 同步，批量中的重复判断为 O(1)
+        for url in urls:
+            canonical = canonicalize(url, platform)
+            if canonical is None:
+                results.append({'url': url, 'result': 'invalid'})
+                continue
+            item_id = canonical.task_id
+            entry = {'url': canonical.url, 'id': item_id, 'platform': canonical.platform}
+            if self.is_archived(canonical):
+                entry['result'] = 'archived'
+            elif item_id in submitted_ids or self.download_scheduler.is_inflight(item_id):
+                entry['result'] = 'duplicate'
+            elif (self.task_store.add(item_id, canonical.url, canonical.platform,
+                                      filename=self._title_from_url(canonical.url))
+                  or self.task_store.get(item_id).status in STARTABLE_STATUSES):
+                entry['result'] = 'queued'
+                to_submit.append(item_id)
+                submitted_ids.add(item_id)
+            else:
+                entry['result'] = 'duplicate' # 已完成或正在进行
+            results.append(entry)
+        if to_submit:
+            self._run_on_ui_thread(self._submit_api_tasks, to_submit)
+        return results
+
+    def _submit_api_tasks(self, item_ids):
+        """在主线程中提交 HTTP 接口登记的任务 (下载路径取自界面)。"""
+        output_path = self.get_download_path()
+        if not output_path:
+            print("警告: 无法确定有效的下载路径，HTTP 接口提交的任务未开始。")
+            return
+        submitted_count = self._submit_task_ids(item_ids, output_path)
+        if submitted_count:
+            self.update_status(f"HTTP 接口提交了 {submitted_count} 个下载任务。")
+
+    def api_cancel(self, task_id):
+        """
+        取消任务: 未开始的任务不再执行，正在进行的下载在下一次进度回调时中止 (删除 .part 文件)。
+
+        返回:
+            dict | None: {'id', 'cancelled', 'running'}，任务不存在时返回 None。
+        """
+        if task_id not in self.task_store:
+            return None
+        running = self.download_scheduler.is_running(task_id)
+        cancelled = self.download_scheduler.cancel(task_id)
+        if cancelled and not running:
+            self.update_download_progress({'id': task_id, 'status': 'cancelled', 'description': '已取消'})
+        return {'id': task_id, 'cancelled': cancelled, 'running': running}
+
+    def api_stats(self):
+        return {'queue': self.download_scheduler.get_counts(), 'tasks': self.task_store.count_by_status(), 'prefetch': self.prefetcher.get_stats(),
+                'postprocess': self.postprocess_pool.get_stats() if self.postprocess_pool else None,
+                'format_policy': self.format_policy.get_stats(), 'connections': self.connection_pool.get_stats()}
+
     def _load_platforms(self):
         """Dynamically load platform modules and add their UI tabs."""
         # Define platforms to load { 'PlatformName': ('logic_module_path', 'ui_module_path') }
@@ -131,18 +440,21 @@ class SucoiAppController:
 
     # 取消功能相关代码已移除
     # 修改：接收 limit_kb_str，参数名使用 kwargs 风格以提高可读性
-    def save_settings(self, *, api_key, concurrency_str, window, placeholder_api): # 移除 download_path, placeholder_pth
+    def save_settings(self, *, api_key, concurrency_str, window, placeholder_api, bandwidth_limit_str=None): # 移除 download_path, placeholder_pth
         """Saves settings from the settings dialog. Called by Save button in settings."""
         updates = {}
         final_api_key = api_key if api_key != placeholder_api else ''
         # 下载路径相关逻辑已移除 (现在通过主窗口路径变量自动保存)
         # --- 处理并发数 (添加空字符串检查) ---
         final_concurrency = self.config_manager.get_config('max_concurrent_downloads', 3) # 默认值
-        if concurrency_str: # 仅在非空时尝试转换
+        autotune_enabled = concurrency_str == 'auto' # 设置窗口选择"自动"时启用并发自动调节
+        if autotune_enabled:
+            pass # 保留 max_concurrent_downloads 作为关闭自动调节后的固定并发数
+        elif concurrency_str: # 仅在非空时尝试转换
             try:
                 concurrency_int = int(concurrency_str)
                 # 限制范围
-                final_concurrency = max(1, min(10, concurrency_int))
+                final_concurrency = max(1, min(self.concurrency_limit, concurrency_int))
             except (ValueError, TypeError):
                 print(f"警告: 无效的并发数值 '{concurrency_str}'，将使用旧值或默认值 {final_concurrency}。")
                 self.view.show_message("警告", f"并发数值 '{concurrency_str}' 无效，未更新此项。", msg_type='warning', parent=window)
@@ -151,34 +463,42 @@ class SucoiAppController:
             print(f"警告: 并发数值为空，将使用旧值或默认值 {final_concurrency}。")
             self.view.show_message("警告", "并发数值未设置，将使用默认值。", msg_type='warning', parent=window)
 
-        # --- 下载限速逻辑已移除 ---
+        # --- 全局下载限速 (KB/s，0 或空表示不限速) ---
+        final_limit_kbps = self.bandwidth_limiter.limit_kbps
+        if bandwidth_limit_str is not None:
+            try:
+                final_limit_kbps = max(0, int(bandwidth_limit_str.strip() or 0))
+            except (ValueError, TypeError):
+                print(f"警告: 无效的限速值 '{bandwidth_limit_str}'，将保留当前值 {final_limit_kbps}。")
+                self.view.show_message("警告", f"限速值 '{bandwidth_limit_str}' 无效，未更新此项。", msg_type='warning', parent=window)
 
         updates['api_key'] = final_api_key
         # 下载路径不再从此方法更新
         updates['max_concurrent_downloads'] = final_concurrency
-        # updates['download_limit_kb'] = final_limit_kb # 限速值更新已移除
+        updates['autotune_enabled'] = autotune_enabled
+        updates['bandwidth_limit_kbps'] = final_limit_kbps
 
         # Perform the save
         save_successful, error_msg = self.config_manager.update_multiple_configs(updates) # 修改：接收返回元组
 
         if save_successful:
-            # 添加：更新当前的 ThreadPoolExecutor (如果并发数改变)
-            if self.max_workers != final_concurrency:
-                 print(f"信息: 并发数已从 {self.max_workers} 更改为 {final_concurrency}。重新创建线程池...")
-                 # 关闭旧的 executor - 非阻塞，允许现有任务完成
-                 # 注意：这可能导致短时间内超过新的 max_workers 限制
-                 self.download_executor.shutdown(wait=False)
-                 # 创建新的 executor
-                 self.max_workers = final_concurrency
-                 try:
-                     self.download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
-                     print("信息: 新的下载线程池已创建。")
-                 except Exception as e:
-                     # 如果创建失败，记录错误并通知用户，可能需要重启应用
-                     print(f"错误：创建新的 ThreadPoolExecutor 失败: {e}")
-                     self.view.show_message("错误", f"无法应用新的并发设置 ({final_concurrency}): {e}\n请重启应用。", msg_type='error', parent=window)
-                     # Revert max_workers or keep? Let's keep the config value but warn.
-                     # Executor might be unusable now.
+            # 调整并发许可数，线程池不重建，正在进行的任务不受影响
+            self.max_workers = final_concurrency
+            if autotune_enabled and not self.autotuner.enabled:
+                print("信息: 已启用并发自动调节。")
+                self.autotuner.start(self.download_scheduler.retry_queue)
+            elif not autotune_enabled:
+                if self.autotuner.enabled:
+                    print("信息: 已关闭并发自动调节。")
+                    self.autotuner.stop()
+                if self.download_scheduler.max_workers != final_concurrency:
+                    applied = self.download_scheduler.set_concurrency(final_concurrency)
+                    print(f"信息: 并发数已更改为 {applied}。")
+
+            # 限速立即对正在进行的下载生效，无需重启任务
+            if self.bandwidth_limiter.limit_kbps != final_limit_kbps:
+                self.bandwidth_limiter.set_limit(final_limit_kbps)
+                print(f"信息: 全局下载限速已更改为 {final_limit_kbps or '不限速'} KB/s。")
 
             self.view.show_message("设置", "设置已保存。", parent=window)
 
@@ -222,184 +542,261 @@ class SucoiAppController:
     # 取消功能相关代码已移除
 
     def add_urls_to_download_queue(self, urls, platform):
-        """Adds URLs to the main download queue (Treeview)."""
-        if not self.root.winfo_exists(): return # Don't update if window closed
+        """
+        将 URL 添加到任务存储，下载列表在下一次同步时显示新任务。
 
-        # 修改：记录总尝试次数
+        返回:
+            list: 新增任务的 id 列表。
+        """
         total_attempted = len(urls)
+        added_ids = []
+        skipped_count = 0
+        archived_count = 0
+        error_count = 0
 
-        def do_add():
-            download_tree = self.view.get_download_treeview()
-            if not download_tree: return
+        for url in urls:
+            try:
+                # 同一视频的不同写法 (短链、移动版、带时间戳等) 得到相同的任务 id，在下载前就合并
+                canonical = canonicalize(url, platform)
+            except Exception as canon_e:
+                print(f"规范化 URL '{url}' 时出错: {canon_e}")
+                error_count += 1
+                continue
+            if canonical is None:
+                print(f"警告: 跳过格式无效的 URL: {url}")
+                skipped_count += 1 # 无效格式也算跳过
+                continue
+            if self.is_archived(canonical):
+                archived_count += 1
+                continue
 
-            added_count = 0
-            skipped_count = 0
-            error_count = 0 # 新增错误计数
-            existing_download_iids = set(download_tree.get_children())
+            item_id = canonical.task_id
+            if self.task_store.add(item_id, canonical.url, canonical.platform, filename=self._title_from_url(canonical.url)):
+                added_ids.append(item_id)
+            else:
+                skipped_count += 1
 
-            for url in urls:
-                if not url or not isinstance(url, str) or not (url.startswith("http://") or url.startswith("https://")):
-                    print(f"警告: 跳过格式无效的 URL: {url}")
-                    skipped_count += 1 # 无效格式也算跳过
-                    continue
+        # 更新状态提示，包含总数、成功数、跳过数和错误数
+        status_parts = []
+        if added_ids: status_parts.append(f"成功添加 {len(added_ids)}")
+        if skipped_count > 0: status_parts.append(f"跳过 {skipped_count} (无效/重复)")
+        if archived_count > 0: status_parts.append(f"已下载过 {archived_count}")
+        if error_count > 0: status_parts.append(f"失败 {error_count}")
 
-                # Generate unique ID
-                import hashlib
-                try:
-                    url_hash = hashlib.md5(url.encode()).hexdigest()[:8] # Short hash
-                    download_iid = f"{platform}_{url_hash}"
-                except Exception as hash_e:
-                    print(f"为 URL '{url}' 生成哈希时出错: {hash_e}")
-                    error_count += 1
-                    continue
+        if not status_parts:
+             status_message = f"尝试添加 {total_attempted} 个任务，无有效操作。"
+        else:
+             status_message = f"添加任务 (尝试 {total_attempted} 个): {', '.join(status_parts)}。"
 
-                if download_iid in existing_download_iids:
-                    skipped_count += 1
-                    continue
+        self.update_status(status_message)
+        if added_ids:
+            self._run_on_ui_thread(self._sync_download_tree)
+        return added_ids
 
-                try:
-                    # Use URL part as title fallback
-                    video_title = url.split('/')[-1].split('?')[0] if '/' in url else url
-                    if not video_title: video_title = url # Final fallback
-                    # Store full URL in description column
-                    download_values = ('☑', video_title[:50], '未知', '待下载', '', '', platform, url)
-                    download_tree.insert('', tk.END, iid=download_iid, values=download_values)
-                    added_count += 1
-                except Exception as e:
-                    print(f"添加 URL '{url}' 到下载列表时出错: {e}")
-                    error_count += 1 # 插入失败算作错误
+    @staticmethod
+    def _title_from_url(url):
+        """在获取到真实文件名之前，用 URL 的最后一段作为显示名称。"""
+        video_title = url.split('/')[-1].split('?')[0] if '/' in url else url
+        return (video_title or url)[:50]
 
-            # 修改：更新状态提示，包含总数、成功数、跳过数和错误数
-            status_parts = []
-            if added_count > 0: status_parts.append(f"成功添加 {added_count}")
-            if skipped_count > 0: status_parts.append(f"跳过 {skipped_count} (无效/重复)")
-            if error_count > 0: status_parts.append(f"失败 {error_count}")
+    def import_urls(self, platform, path=None, text=None):
+        """
+        在后台线程中批量导入 URL (来自文件或一段文本)，分批写入任务存储。
 
-            if not status_parts:
-                 status_message = f"尝试添加 {total_attempted} 个任务，无有效操作。"
-            else:
-                 status_message = f"添加任务 (尝试 {total_attempted} 个): {', '.join(status_parts)}。"
+        读取、规范化、去重和生成 id 都不在 UI 线程中进行，下载列表由进度定时器增量刷新，
+        数万行的链接列表也不会卡住界面。同一时间只允许一个导入。
 
-            self.update_status(status_message)
+        参数:
+            platform (str): 任务所属的平台名。
+            path (str | None): 链接文件路径 (每行一个或多个 URL)。
+            text (str | None): 没有提供 path 时导入的文本。
 
-        self.root.after(0, do_add)
+        返回:
+            bool: 是否开始了导入。
+        """
+        if self.bulk_importer is not None and self.bulk_importer.is_running():
+            self.show_message("提示", "已有批量导入正在进行，请等待完成或先取消。")
+            return False
+        try:
+            chunk_size = int(self.config_manager.get_config('bulk_import_chunk_size', 2000))
+        except (ValueError, TypeError):
+            print("警告: 配置中的 'bulk_import_chunk_size' 值无效，将使用默认值 2000。")
+            chunk_size = 2000
+        importer = BulkUrlImporter(self.task_store, platform, self._title_from_url, chunk_size=chunk_size,
+                                   is_archived=self.is_archived if self.download_archive is not None else None)
+        if path:
+            importer.start_file(path)
+            source = os.path.basename(path)
+        else:
+            importer.start_text(text or '')
+            source = "文本"
+        self.bulk_importer = importer
+        print(f"信息: 开始从{source}批量导入 {platform} 链接。")
+        self.view.open_import_progress(f"导入 {platform} 链接 - {source}", self.cancel_bulk_import)
+        self.root.after(BULK_IMPORT_POLL_MS, self._poll_bulk_import, importer)
+        return True
+
+    def import_urls_from_clipboard(self, platform):
+        """从剪贴板批量导入 URL (剪贴板只能在 UI 线程读取，其余处理在后台线程)。"""
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            text = ''
+        if not text.strip():
+            self.show_message("提示", "剪贴板中没有文本。")
+            return False
+        return self.import_urls(platform, text=text)
+
+    def cancel_bulk_import(self):
+        """取消正在进行的批量导入，已导入的任务保留在列表中。"""
+        if self.bulk_importer is not None and self.bulk_importer.is_running():
+            self.bulk_importer.cancel()
+            self.view.update_import_progress(self.bulk_importer.progress()['fraction'], "正在取消...")
+
+    def _poll_bulk_import(self, importer):
+        """定时刷新批量导入进度 (UI 线程)，导入结束后关闭进度窗口并显示结果。"""
+        if importer is not self.bulk_importer:
+            return
+        progress = importer.progress()
+        counts_text = (f"已读取 {progress['lines']} 行 | 新增 {progress['added']} | "
+                       f"重复 {progress['duplicates']} | 已下载过 {progress['archived']} | 无效 {progress['invalid']}")
+        if not progress['done']:
+            self.view.update_import_progress(progress['fraction'], counts_text)
+            self.root.after(BULK_IMPORT_POLL_MS, self._poll_bulk_import, importer)
+            return
 
+        self.bulk_importer = None
+        self.view.close_import_progress()
+        self._sync_download_tree()
+        if progress['error']:
+            self.update_status(f"批量导入失败: {progress['error']} ({counts_text})")
+            self.show_message("导入错误", f"批量导入时出错:\n{progress['error']}", msg_type='error')
+        elif progress['cancelled']:
+            self.update_status(f"批量导入已取消: {counts_text}")
+        else:
+            self.update_status(f"批量导入完成: {counts_text}")
+        print(f"信息: 批量导入结束: {progress}")
 
     def update_download_progress(self, progress_data):
         """
-        Safely updates the download list and progress bar.
-        Called by download threads (via self.root.after).
-        """
-        if not self.root.winfo_exists(): return # Don't update if window closed
+        接收下载线程的进度数据 (可在任意线程调用)。
 
+        数据只写入进度总线，每个任务保留最新状态；由 _progress_tick 定时批量应用到下载列表。
+        """
         item_id = progress_data.get('id') # Expected format: platform_hash
         if not item_id:
             print("警告: 收到缺少 id 的进度回调数据:", progress_data)
             return
+        self.progress_bus.publish(progress_data)
 
-        # 编译一次正则表达式以提高效率
-        ansi_escape_pattern = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-
-        def do_update():
-            if not self.root.winfo_exists(): return
-            download_tree = self.view.get_download_treeview()
-            # progress_bar = self.view.get_progress_bar() # 移除进度条引用
-            if not download_tree: return # 仅检查 download_tree
-
+    def _progress_tick(self):
+        """UI 定时器：取出合并后的进度写入任务存储，把变化投影到下载列表，然后安排下一次刷新。"""
+        if not self.root.winfo_exists(): return
+        try:
+            batch = self.progress_bus.drain()
+            if batch:
+                self._apply_progress_batch(batch)
+            self._sync_download_tree()
+            self._journal_store_changes()
+            self._refresh_queue_status()
+        except Exception as e:
+            print(f"批量更新下载进度时出错: {e}")
+        self.root.after(self.progress_interval_ms, self._progress_tick)
+
+    def _apply_progress_batch(self, batch):
+        """在主线程中将一批进度数据写入任务存储 (不访问 Treeview)。"""
+        dropped = 0
+        for progress_data in batch:
+            item_id = progress_data['id']
+            record = self.task_store.get(item_id)
+            if record is None: # Item might have been removed
+                dropped += 1
+                continue
             try:
-                if not download_tree.exists(item_id): return # Item might have been removed
-
-                status = progress_data.get('status')
-                values_to_set = {}
-                # percent_value = None # 不再需要
-                status_text = "" # 用于组合符号和文本
-
-                if status == 'preparing':
-                    status_text = "[...]" # 使用 ASCII 符号
-                    values_to_set = {'status': status_text, 'description': ''} # 清空旧描述
-                    # percent_value = 0.0 # 不再需要
-                elif status == 'downloading':
-                    p_str = progress_data.get('percent', '0%')
-                    try:
-                        # 清除 ANSI 转义码
-                        cleaned_p_str = ansi_escape_pattern.sub('', p_str)
-                        # percent_value = float(cleaned_p_str.strip('%')) # 不再需要
-                        status_text = f"{cleaned_p_str}" # 只显示清理后的百分比
-                    except ValueError:
-                         # percent_value = 0.0 # 不再需要
-                         status_text = "0%" # 如果转换失败，显示0%
-                    # 清理 ETA 和 Speed 字符串中的 ANSI 码
-                    eta_str = progress_data.get('eta', 'N/A')
-                    speed_str = progress_data.get('speed', 'N/A')
-                    cleaned_eta_str = ansi_escape_pattern.sub('', eta_str)
-                    cleaned_speed_str = ansi_escape_pattern.sub('', speed_str)
-                    values_to_set = {
-                        'filename': progress_data.get('filename', download_tree.set(item_id, 'filename'))[:50], # Limit length
-                        'size': progress_data.get('size', '未知'),
-                        'status': status_text,
-                        'eta': cleaned_eta_str, # 使用清理后的 ETA
-                        'speed': cleaned_speed_str, # 使用清理后的 Speed
-                        'description': '' # 清空描述，避免干扰
-                    }
-                elif status == 'finished':
-                    status_text = "[OK]" # 使用 ASCII 符号
-                    values_to_set = {
-                        'filename': progress_data.get('filename', download_tree.set(item_id, 'filename'))[:50],
-                        'size': progress_data.get('size', '未知'),
-                        'status': status_text, 'eta': '0s', 'speed': '',
-                        'description': progress_data.get('description', '') # 保留可能的文件路径等
-                    }
-                    # percent_value = 100.0 # 不再需要
-                elif status == 'error':
-                    status_text = "[ERR]" # 使用 ASCII 符号
-                    # 获取原始错误描述
-                    error_desc_raw = str(progress_data.get('description', '未知错误'))
-                    # 清理 ANSI 码
-                    cleaned_error_desc = ansi_escape_pattern.sub('', error_desc_raw)
-                    # 设置清理后的描述，并限制长度
-                    values_to_set = {'status': status_text, 'description': cleaned_error_desc[:100]} # Limit desc length
-                    # percent_value = 0.0 # Reset progress on error # 不再需要
-                # 取消功能相关代码已移除
-                elif status == 'retrying': # 新增处理重试状态，并显示次数
-                    retry_count = progress_data.get('retry_count', '?') # 从回调数据获取当前重试次数
-                    max_retries = progress_data.get('max_retries', '?') # 从回调数据获取最大重试次数
-                    status_text = "[重试中...]" # 简化状态文本
-                    # description 可能包含重试的具体原因，保留它
-                    values_to_set = {'status': status_text, 'description': progress_data.get('description', '')}
-                    # 重试时不改变进度百分比，percent_value 设为 None
-                    # percent_value = None # 不再需要
-
-                # Update Treeview
-                for col, value in values_to_set.items():
-                     if download_tree.exists(item_id):
-                          download_tree.set(item_id, column=col, value=value)
-
-                # --- 更新状态栏计数器 ---
-                if status == 'finished':
-                    # 检查是否已对此任务计数，防止重复增加
-                    # 使用一个临时属性来跟踪已完成的任务ID，避免在 `_final_ui_update` 前重置计数器导致问题
-                    if not hasattr(self, '_finished_ids_for_status_update'):
-                         self._finished_ids_for_status_update = set()
-
-                    if item_id not in self._finished_ids_for_status_update:
-                         self._finished_ids_for_status_update.add(item_id)
-                         # 仅在首次标记任务为完成时增加计数器
-                         if self.completed_batch_tasks < self.total_batch_tasks: # 避免超过总数
-                            self.completed_batch_tasks += 1
-
-                         # 更新状态栏
-                         if self.total_batch_tasks > 0:
-                             current_status_text = f"正在下载: {self.completed_batch_tasks}/{self.total_batch_tasks}"
-                             self.update_status(current_status_text)
-                             # print(f"Debug: 任务完成 {item_id}, 更新状态: {current_status_text}") # 调试日志
-                # --- 进度条更新逻辑已移除 ---
-
+                self.task_store.update(item_id, **self._progress_fields(progress_data, record))
             except Exception as e:
-                # Avoid crashing the app due to UI update errors
-                print(f"更新 Treeview 或进度时出错 (iid={item_id}, data={progress_data}): {e}")
-
-        self.root.after(0, do_update)
+                print(f"更新任务进度时出错 (iid={item_id}, data={progress_data}): {e}")
+        if dropped:
+            self.progress_bus.record_dropped(dropped)
+
+    def _progress_fields(self, progress_data, record):
+        """将一条进度数据转换为需要更新的任务字段字典。"""
+        status = progress_data.get('status')
+        fields = {}
+
+        if status == 'preparing':
+            fields = {'status': PREPARING, 'description': ''} # 清空旧描述
+        elif status == 'downloading':
+            # 清除百分比、ETA 和 Speed 字符串中的 ANSI 码
+            fields = {
+                'filename': progress_data.get('filename', record.filename)[:50], # Limit length
+                'size': progress_data.get('size', '未知'),
+                'status': DOWNLOADING,
+                'progress': ANSI_ESCAPE_PATTERN.sub('', progress_data.get('percent', '0%')) or "0%",
+                'eta': ANSI_ESCAPE_PATTERN.sub('', progress_data.get('eta', 'N/A')),
+                'speed': ANSI_ESCAPE_PATTERN.sub('', progress_data.get('speed', 'N/A')),
+                'description': '' # 清空描述，避免干扰
+            }
+            if 'partial' in progress_data:
+                fields['partial'] = progress_data['partial'] # .part 文件检查点，重启后续传
+        elif status == 'finished':
+            fields = {
+                'filename': progress_data.get('filename', record.filename)[:50],
+                'size': progress_data.get('size', record.size), # 后处理完成的事件不带大小，保留下载时的值
+                'status': FINISHED, 'progress': '', 'eta': '0s', 'speed': '',
+                'description': progress_data.get('description', ''), # 保留可能的文件路径等
+                'partial': None # 下载已完成，不再需要 .part 检查点
+            }
+        elif status == 'error':
+            # 获取原始错误描述并清理 ANSI 码，限制长度
+            error_desc_raw = str(progress_data.get('description', '未知错误'))
+            fields = {'status': ERROR, 'description': ANSI_ESCAPE_PATTERN.sub('', error_desc_raw)[:100]}
+        elif status == 'retrying':
+            # description 可能包含重试的具体原因，保留它
+            fields = {'status': RETRYING, 'description': progress_data.get('description', '')}
+        elif status == 'waiting':
+            fields = {'status': WAITING, 'description': progress_data.get('description', '')}
+        elif status == 'postprocessing':
+            fields = {'status': POSTPROCESSING, 'progress': '', 'eta': '', 'speed': '',
+                      'description': progress_data.get('description', '')}
+        elif status == 'cancelled':
+            fields = {'status': CANCELLED, 'progress': '', 'eta': '', 'speed': '',
+                      'description': progress_data.get('description', '')}
+            if 'partial' in progress_data:
+                fields['partial'] = progress_data['partial'] # .part 文件已删除时清除检查点
+        return fields
+
+    def _sync_download_tree(self):
+        """
+        将任务存储的变化投影到下载列表 (主线程调用)。
 
+        下载列表是虚拟化的，只刷新可见窗口内的行，任务总数不影响刷新开销。
+        """
+        changed_ids, removed_ids = self.task_store.take_changes()
+        self.view.get_download_list().refresh(changed_ids, removed_ids)
+
+    def _journal_store_changes(self):
+        """把任务存储中需要持久化的变化追加到队列日志，事件过多时压缩 (主线程调用)。"""
+        if self.queue_journal is None: return
+        tasks, removed_ids = self.task_store.take_persist_changes()
+        if tasks or removed_ids:
+            self.queue_journal.record(tasks, removed_ids)
+        if self.queue_journal.needs_compaction(len(self.task_store)):
+            self.queue_journal.compact(self.task_store.export(exclude_statuses=(FINISHED,), persist_only=True))
+
+    @staticmethod
+    def _row_values(record):
+        """任务记录在下载列表中的显示值，列顺序与 MainWindow 的下载列表一致。"""
+        return ('☑' if record.selected else '☐', record.filename, record.size, record.status_label,
+                record.eta, record.speed, record.platform, record.description or record.url)
+
+    def _on_task_waiting(self, item_info, host, wake_delay):
+        """任务因平台并发已满或熔断而进入等待队列时更新界面 (调度器线程调用)。"""
+        if wake_delay is None:
+            description = f"等待 {host} 并发名额"
+        else:
+            description = f"{host} 被限流，约 {wake_delay:.0f}s 后恢复"
+        self.update_download_progress({'id': item_info.get('id'), 'status': 'waiting', 'description': description})
 
     # --- Core Application Logic ---
 
@@ -478,23 +875,26 @@ class SucoiAppController:
             self.show_message("提示", "没有提供有效的下载任务信息。")
             return
 
-        download_tree = self.view.get_download_treeview()
-        if not download_tree:
-             self.show_message("错误", "无法访问下载列表界面。")
-             return
-
-        # --- 1. 准备阶段: 筛选有效任务信息 & 识别新URL ---
+        # --- 1. 准备阶段: 筛选有效任务信息，新任务直接加入任务存储 ---
         valid_items_to_submit = []
-        new_urls_to_add_to_ui = []
-        initial_existing_iids = set(download_tree.get_children()) if download_tree else set()
+        new_items_count = 0
+        archived_count = 0 # 下载存档中已有的视频
         processed_ids_in_batch = set() # 防止同一批次重复处理相同ID
 
         for item_info in items_info_list:
+            # 任务 id 统一由规范化的 URL 生成，已在列表中的同一视频不会重复下载
+            canonical = canonicalize(item_info.get('url'), platform)
+            if canonical is not None:
+                item_info['id'], item_info['url'] = canonical.task_id, canonical.url
             item_id = item_info.get('id')
             url = item_info.get('url')
 
+            if canonical is not None and self.is_archived(canonical):
+                archived_count += 1
+                continue
+
             # 基本验证 + 批次内去重
-            if not item_id or not url or not isinstance(url, str) or not (url.startswith("http://") or url.startswith("https://")) or item_id in processed_ids_in_batch:
+            if canonical is None or not item_id or item_id in processed_ids_in_batch:
                 if item_id in processed_ids_in_batch:
                      print(f"信息: 批次内已包含任务 {item_id}，跳过重复项。")
                 else:
@@ -505,226 +905,123 @@ class SucoiAppController:
             valid_items_to_submit.append(item_info) # 加入待提交列表
             processed_ids_in_batch.add(item_id)
 
-            if item_id not in initial_existing_iids:
-                new_urls_to_add_to_ui.append(url)
+            if self.task_store.add(item_id, url, canonical.platform, filename=self._title_from_url(url)):
+                new_items_count += 1
+            else:
+                item_info.setdefault('partial', self.task_store.get(item_id).partial)
         # ------------------------------------
 
-        # --- 2. UI 添加阶段 (异步) ---
-        if new_urls_to_add_to_ui:
-            print(f"信息: 尝试添加 {len(new_urls_to_add_to_ui)} 个新 URL 到 UI...")
-            self.add_urls_to_download_queue(new_urls_to_add_to_ui, platform)
-        # --------------------------
+        if new_items_count:
+            print(f"信息: 添加了 {new_items_count} 个新任务到下载列表。")
+        if archived_count:
+            print(f"信息: 跳过 {archived_count} 个已下载过的视频 (下载存档中有记录)。")
 
-        # --- 3. 提交阶段 ---
+        # --- 2. 提交阶段 ---
         if not valid_items_to_submit:
-            self.show_message("提示", "没有有效的任务可供下载。")
+            if archived_count:
+                self.show_message("提示", f"{archived_count} 个视频都已下载过 (下载存档中有记录)。")
+            else:
+                self.show_message("提示", "没有有效的任务可供下载。")
             return
 
-        # self.reset_cancel_request() # 取消功能已移除
-        # self.reset_cancel_request() # 取消功能已移除
-        self.view.disable_controls(True)
-        try:
-            # 移除停止按钮相关的显式控制
-            if hasattr(self.view, 'remove_button'): self.view.remove_button.config(state=tk.DISABLED)
-        except Exception as e: print(f"禁用移除按钮时出错: {e}")
-        # 停止按钮已移除，无需显式控制
-
-        # --- 初始化批次计数器和状态栏 ---
-        self.total_batch_tasks = len(valid_items_to_submit) # 实际提交的任务总数
-        self.completed_batch_tasks = 0
-        initial_status = f"正在下载: 0/{self.total_batch_tasks}"
-        self.update_status(initial_status)
-        # --- 移除进度条初始化代码 ---
-        # self.active_task_progress = {} # 已移除
-        # try:
-        #     progress_bar = self.view.get_progress_bar() # 已移除
-        #     if progress_bar: progress_bar['value'] = 0 # 已移除
-        # except Exception as e: print(f"设置初始进度条时出错: {e}") # 已移除
-
-        self.active_futures = {}
+        # 下载队列持续运行，提交期间不禁用控件，可随时继续添加链接
+        # --- 新建批次，完成计数由 Future 回调驱动 ---
+        batch = self._create_batch()
         submitted_count = 0
         # 直接提交所有有效任务 (valid_items_to_submit)
         for item_info in valid_items_to_submit:
             item_id = item_info['id']
 
-            # 检查是否已在运行 (防止外部快速连续点击导致重复提交)
-            if item_id in self.active_futures and not self.active_futures[item_id].done():
+            # 检查是否已在队列中 (防止外部快速连续点击导致重复提交)
+            if self.download_scheduler.is_inflight(item_id):
                  print(f"信息: 任务 {item_id} 已在运行或等待中，跳过本次提交。")
                  continue
 
             try:
-                future = self.download_executor.submit(self._run_single_download_task, item_info)
-                self.active_futures[item_id] = future
-                future.add_done_callback(
-                    lambda f, captured_id=item_id: print(f"信息: Future 完成回调 (立即下载) for {captured_id}. 结果: {f.result() if not f.exception() else f.exception()}")
-                )
+                self.task_store.update(item_id, status=QUEUED, description='')
+                future = self.download_scheduler.submit(item_info)
+                self._track_future(batch, item_id, future)
                 submitted_count += 1
-                # 不再在此处更新UI状态为 '[...]', 交给 _run_single_download_task 处理
             except Exception as submit_e:
                 print(f"提交下载任务 {item_id} 到线程池时出错: {submit_e}")
-                # 提交失败，尝试更新 UI（如果任务存在）
-                try:
-                    # 检查是否存在再更新
-                    if download_tree.exists(item_id):
-                         self.update_download_progress({'id': item_id, 'status': 'error', 'description': f'提交错误: {submit_e}'})
-                    # else: # 如果任务还不在UI上，也无法更新，忽略即可，后续 _run_single_download_task 也无法执行
-                except Exception as update_e:
-                     print(f"在报告提交错误时更新 UI 失败 ({item_id}): {update_e}")
+                self.task_store.update(item_id, status=ERROR, description=f'提交错误: {submit_e}'[:100])
 
+        self._sync_download_tree()
         if submitted_count == 0:
-            self.view.disable_controls(False)
-            try:
-                if hasattr(self.view, 'remove_button'): self.view.remove_button.config(state=tk.NORMAL)
-            except Exception as e: print(f"恢复移除按钮时出错: {e}")
+            self._discard_batch(batch)
             self.update_status("没有任务成功提交。") # 更新状态
             return
 
-        # 只有在成功提交了任务后才启动监控
-        self.update_status(f"已提交 {submitted_count} 个任务，开始下载...") # 更新最终提交状态
-        monitor_thread = Thread(target=self._monitor_download_futures)
-        monitor_thread.daemon = True
-        monitor_thread.start()
+        self._refresh_queue_status()
+        batch.seal() # 全部完成时由回调触发 _final_ui_update
 
 
     def start_selected_downloads(self):
-        """Starts downloading selected ('☑') items from the list."""
+        """开始下载所有已勾选 ('☑') 的待下载、出错或已取消的任务 (通过任务存储的索引查找)。"""
         if not self.root.winfo_exists(): return
-        download_tree = self.view.get_download_treeview()
         output_path = self.get_download_path() # Ensures path is valid or fallback
         if not output_path:
             self.show_message("警告", "无法确定有效的下载路径！")
-            return # Correctly indented return
+            return
 
-        selected_iids = []
-        items_to_reset = []
+        selected_ids = self.task_store.selected_ids(statuses=STARTABLE_STATUSES)
+        if not selected_ids:
+            self.show_message("提示", "没有选中待下载或可重试的任务。")
+            return
 
-        for item_iid in download_tree.get_children(''):
-            try:
-                 values = download_tree.item(item_iid, 'values')
-                 # Checkbox (col 0), Status (col 3)
-                 # 允许重试 '[ERR]' 和 '[CAN]' 状态的任务
-                 if values and len(values) > 3 and values[0] == '☑' and values[3] in ('待下载', '下载出错', '准备下载', '[ERR]', '[CAN]'):
-                      selected_iids.append(item_iid)
-                      items_to_reset.append(item_iid)
-            except Exception as e:
-                 print(f"检查下载项 {item_iid} 时出错: {e}")
+        if self._submit_task_ids(selected_ids, output_path) == 0:
+            self.update_status("没有有效的任务启动。")
 
-        if not selected_iids:
-            self.show_message("提示", "没有选中待下载或可重试的任务。")
-            return # Correctly indented return
+    def _submit_task_ids(self, item_ids, output_path):
+        """
+        将任务存储中的任务作为一个批次提交到调度器 (主线程调用)。
 
-        # --- Reset status in UI immediately ---
-        for iid in items_to_reset:
-            try:
-                 if download_tree.exists(iid):
-                      download_tree.set(iid, column='status', value="[...] ") # 使用准备中符号
-                      # Clear description only if it's not the URL
-                      # Assuming URL is now in col 7
-                      current_desc = "" # Default to empty
-                      try: # Getting value might fail if col doesn't exist yet
-                          current_desc = download_tree.set(iid, column=7)
-                      except Exception: pass
-                      # Check type before calling startswith
-                      if not (isinstance(current_desc, str) and (current_desc.startswith("http://") or current_desc.startswith("https://"))):
-                           download_tree.set(iid, column='description', value="") # Clear non-URL description
-            except Exception as e: print(f"重置下载状态时出错 (iid={iid}): {e}")
-        # ------------------------------------
+        返回:
+            int: 成功提交的任务数。
+        """
+        # 下载队列持续运行，提交期间不禁用控件，可随时继续添加链接
+        # --- 新建批次，完成计数由 Future 回调驱动 ---
+        batch = self._create_batch()
 
-        # self.reset_cancel_request() # 取消功能已移除
-        self.view.disable_controls(True) # Disable general controls
-        # Explicitly disable remove button during download start (Part 1 of Fix #2)
-        try:
-            if hasattr(self.view, 'remove_button'): self.view.remove_button.config(state=tk.DISABLED)
-        except Exception as e: print(f"禁用移除按钮时出错: {e}")
-        # 停止按钮已移除，无需显式控制
-        # 修改：改进状态提示，并设置进度条初始值
-        # --- 初始化批次计数器和状态栏 ---
-        self.total_batch_tasks = len(selected_iids) # 实际将要启动的任务数
-        self.completed_batch_tasks = 0
-        initial_status = f"正在下载: 0/{self.total_batch_tasks}"
-        self.update_status(initial_status)
-
-        # --- 移除进度条初始化代码 ---
-        # if hasattr(self, '_finished_in_current_batch'): # 清除上一批次的完成记录 # 已移除
-        #     del self._finished_in_current_batch # 已移除
-        # try:
-        #     progress_bar = self.view.get_progress_bar() # 已移除
-        #     if progress_bar:
-        #         progress_bar['value'] = 5 if actual_task_count > 0 else 0 # 设置初始进度为 5% (如果任务数>0) # 已移除
-        #     else:
-        #         print("警告: 无法获取进度条控件。") # 已移除
-        # except Exception as e:
-        #     print(f"设置初始进度条时出错: {e}") # 已移除
-        # -----------------------------
-
-        # 修改：使用 ThreadPoolExecutor 提交任务
-        self.active_futures = {} # 清空之前的 Future 记录
-
-        # --- Submit tasks to the executor for each selected item ---
         submitted_count = 0
-        for item_iid in selected_iids:
+        for item_id in item_ids:
+            record = self.task_store.get(item_id)
+            if record is None:
+                print(f"警告: 任务 {item_id} 在提交前已从列表移除，跳过。")
+                continue
+            if self.download_scheduler.is_inflight(item_id):
+                print(f"信息: 任务 {item_id} 已在运行或等待中，跳过本次提交。")
+                continue
             try:
-                 # === 新增检查: 确认任务存在且状态仍可下载 ===
-                 if not download_tree.exists(item_iid):
-                     print(f"警告: 任务 {item_iid} 在提交前已从列表移除，跳过。")
-                     continue
-
-                 current_status = download_tree.set(item_iid, 'status')
-                 # 允许 '待下载', '[...]', '下载出错', '[ERR]', '[CAN]' 状态的任务提交
-                 # '[...]' 是我们刚刚在 UI 上设置的准备状态
-                 allowed_statuses_for_submit = ['待下载', '[...]', '下载出错', '[ERR]', '[CAN]', '[...] '] # 添加 '[...] ' 状态
-                 if current_status not in allowed_statuses_for_submit:
-                     print(f"警告: 任务 {item_iid} 状态为 '{current_status}'，不适合提交下载，跳过。")
-                     continue
-                 # ========================================
-
-                 # Get URL from the 8th column ('description', index 7)
-                 values = download_tree.item(item_iid, 'values')
-                 if len(values) > 7:
-                      url = values[7]
-                      if url and isinstance(url, str) and (url.startswith("http://") or url.startswith("https://")):
-                           item_info = {
-                               'id': item_iid,
-                               'url': url,
-                               'output_path': output_path,
-                               # TODO: Add platform-specific ydl_opts if needed here based on iid prefix?
-                           }
-                           future = self.download_executor.submit(self._run_single_download_task, item_info)
-                           self.active_futures[item_iid] = future # 使用 item_id 作为键存储 Future
-                           # 添加回调以立即检查 Future 结果
-                           item_id_for_callback = item_iid # 捕获当前 item_id
-                           future.add_done_callback(
-                               lambda f, captured_id=item_id_for_callback: print(f"信息: Future 完成回调 (选中下载) for {captured_id}. 结果: {f.result() if not f.exception() else f.exception()}")
-                           )
-                           submitted_count += 1
-                      else:
-                           print(f"警告: 无法从列表获取有效的URL for iid {item_iid} (value: {url})")
-                           self.update_download_progress({'id': item_iid, 'status': 'error', 'description': '列表中的URL无效'})
-                 else:
-                      print(f"警告: 无法获取 {item_iid} 的完整值 (列数不足)")
-                      self.update_download_progress({'id': item_iid, 'status': 'error', 'description': '内部列表数据错误'})
+                self.task_store.update(item_id, status=QUEUED, description='')
+                item_info = {
+                    'id': item_id,
+                    'url': record.url,
+                    'output_path': output_path,
+                    'partial': record.partial, # 上次未完成的 .part 文件检查点
+                }
+                future = self.download_scheduler.submit(item_info)
+                self._track_future(batch, item_id, future)
+                submitted_count += 1
             except Exception as e:
-                 print(f"提交下载任务 {item_iid} 到线程池时出错: {e}")
-                 self.update_download_progress({'id': item_iid, 'status': 'error', 'description': f'提交错误: {e}'})
-        # -------------------------------------------
+                print(f"提交下载任务 {item_id} 到线程池时出错: {e}")
+                self.task_store.update(item_id, status=ERROR, description=f'提交错误: {e}'[:100])
 
+        self._sync_download_tree()
         if submitted_count == 0:
-            self.view.disable_controls(False) # Re-enable controls if nothing started
-            # 恢复移除按钮状态
-            try:
-                if hasattr(self.view, 'remove_button'): self.view.remove_button.config(state=tk.NORMAL)
-            except Exception as e: print(f"恢复移除按钮时出错: {e}")
-            self.update_status("没有有效的任务启动。")
-            return # Correctly indented return
+            self._discard_batch(batch)
+            return 0
 
-        # Start monitoring thread (now monitors futures) ONLY if tasks were submitted
-        monitor_thread = Thread(target=self._monitor_download_futures) # 修改：调用新的监控方法
-        monitor_thread.daemon = True # Ensure monitor thread doesn't block exit
-        monitor_thread.start()
+        self._refresh_queue_status()
+        batch.seal() # 全部完成时由回调触发 _final_ui_update
+        return submitted_count
 
 
-    def _run_single_download_task(self, item_info):
-        """在后台线程中调用 DownloadService 下载单个项目，并确保返回字典。"""
+    def _run_single_download_task(self, item_info, cancel_token=None):
+        """
+        在后台线程中调用 DownloadService 执行单次下载尝试，并确保返回字典。
+        返回 status='retry' 时由 DownloadScheduler 延迟后重新提交；cancel_token 被取消时尝试中止。
+        """
         item_id = item_info.get('id')
         # 默认错误结果，防止意外情况导致返回 None
         result = {'id': item_id, 'status': 'error', 'error_message': '未知任务执行错误'}
@@ -739,8 +1036,8 @@ class SucoiAppController:
         print(f"信息: 下载线程启动 for: {item_id}")
         try:
             # 调用 DownloadService 进行下载
-            # 移除 is_cancel_requested 回调
-            download_result = self.download_service.download_item(item_info, self.update_download_progress)
+            download_result = self.download_service.download_item(item_info, self.update_download_progress,
+                                                                  cancel_token)
             # 关键日志：记录 download_item 的实际返回值
             print(f"信息: download_item 直接返回结果 for {item_id}: {download_result} (类型: {type(download_result)})")
 
@@ -771,183 +1068,176 @@ class SucoiAppController:
         print(f"信息: _run_single_download_task 即将返回最终结果 for {item_id}: {result}")
         return result
 
-    def _monitor_download_futures(self):
-        """Waits for active download futures to complete and updates UI."""
-        if not self.active_futures:
-            print("监控：没有活动的 Future 对象需要监控。") # 添加调试信息
-            return
-
-        print(f"监控：开始监控 {len(self.active_futures)} 个 Future 对象...") # 添加调试信息
-        processed_ids = set(self.active_futures.keys()) # 修正：在循环开始前获取 ID 集合
-        all_futures = list(self.active_futures.values()) # 获取 Future 列表
-
-        # 使用 concurrent.futures.wait 等待所有 Future 完成
-        # done, not_done = concurrent.futures.wait(all_futures, return_when=concurrent.futures.ALL_COMPLETED)
-        # 或者，更简单地循环检查直到所有 future 都 done (处理取消时可能更好)
-        # 改进：使用 wait 结合超时和取消检测
-        active_futures_set = set(all_futures)
-        while active_futures_set:
-            # 等待任何一个任务完成，或超时 0.5 秒
-            done_futures, _ = concurrent.futures.wait(
-                active_futures_set,
-                timeout=0.5,
-                return_when=concurrent.futures.FIRST_COMPLETED
-            )
-
-            # 处理已完成的任务
-            active_futures_set.difference_update(done_futures)
-
-            # 取消检测逻辑已移除
-
-        print("监控：所有 Future 对象已完成。") # 添加调试信息
-        # was_cancelled = False # 取消功能已移除
-
-        # --- 准备最终 UI 更新的回调参数 ---
-        # 修正：将统计逻辑移到 final_ui_update
-        # final_update_args = { ... }
-
-        # --- 在主线程中执行收尾 UI 更新 ---
-        if self.root.winfo_exists():
-            print("监控：调度 final_ui_update 到主线程。") # 添加调试信息
-            # 修正：传递 processed_ids 给 final_ui_update
-            self.root.after(0, lambda p_ids=processed_ids: self._final_ui_update(p_ids)) # 移除 cancelled 参数
-        else:
-            print("监控：窗口已关闭，无法调度 final_ui_update。") # 添加调试信息
-
-        # 修正：清空操作移到 _final_ui_update 的末尾
-        # print("监控：清空 active_futures。")
-        # self.active_futures = {}
+    # --- Batch Tracking (Future done-callbacks, no polling thread) ---
+
+    def _create_batch(self):
+        """新建一个下载批次。批次的完成回调在工作线程中触发，通过 root.after 转交主线程。"""
+        batch_id = next(self._batch_ids)
+        batch = DownloadBatch(
+            batch_id,
+            on_complete=lambda summary: self._run_on_ui_thread(self._final_ui_update, summary),
+        )
+        self.active_batches[batch_id] = batch
+        return batch
+
+    def _track_future(self, batch, item_id, future):
+        """登记任务 Future: 计入批次，并在完成时从 active_futures 中移除。"""
+        self.active_futures[item_id] = future
+        future.add_done_callback(lambda f, captured_id=item_id: self._forget_future(captured_id, f))
+        batch.add(item_id, future)
+
+    def _forget_future(self, item_id, future):
+        if self.active_futures.get(item_id) is future:
+            self.active_futures.pop(item_id, None)
+
+    def _discard_batch(self, batch):
+        """丢弃一个没有提交任何任务的批次。"""
+        self.active_batches.pop(batch.batch_id, None)
+
+    def _run_on_ui_thread(self, func, *args):
+        try:
+            self.root.after(0, func, *args)
+        except (tk.TclError, RuntimeError) as e: # 窗口已关闭
+            print(f"信息: 无法调度界面更新 ({getattr(func, '__name__', func)}): {e}")
+
+    def _refresh_queue_status(self):
+        """根据调度器的实时计数更新状态栏 (主线程调用，由 _progress_tick 定时触发)。"""
+        counts = self.download_scheduler.get_counts()
+        if counts == self._last_queue_counts: return
+        self._last_queue_counts = counts
+        if counts['queued'] or counts['running']:
+            auto_note = "自动" if self.autotuner.enabled else ""
+            self.update_status(f"队列: 等待 {counts['queued']} | 下载中 {counts['running']} | "
+                               f"已完成 {counts['succeeded']} | 失败 {counts['failed']} | 并发{auto_note} {counts['limit']}")
+        elif counts['succeeded'] or counts['failed']:
+            failed_note = " (部分任务失败，请查看列表或日志)" if counts['failed'] else ""
+            self.update_status(f"队列空闲 | 已完成 {counts['succeeded']} | 失败 {counts['failed']}{failed_note}")
+
+    def _final_ui_update(self, summary):
+        """
+        在主线程中处理一个批次的结束，计数来自批次计数器。
 
-    # 修正：修改 final_ui_update 签名并调整逻辑
-    def _final_ui_update(self, processed_ids):
-        """在主线程中执行下载结束后的 UI 更新和总结。"""
+        队列持续运行时，先结束的批次只累计到待显示的总结中；所有批次都结束后
+        才弹出一次合并的总结，避免连续添加链接时频繁弹窗。
+        """
         if not self.root.winfo_exists():
              print("监控：UI 更新时窗口已不存在。") # 添加调试信息
              return
-        print("监控：开始执行最终 UI 更新。") # 添加调试信息
-
-        # --- Calculate Summary ---
-        success_count = 0
-        error_count = 0
-        # cancelled_count = 0 # 取消功能已移除
-        download_tree = self.view.get_download_treeview()
-        total_tasks_in_batch = len(processed_ids) # 使用传递过来的 ID 数量
-        print(f"监控：统计 {total_tasks_in_batch} 个任务的结果...") # 添加调试信息
-
-        if download_tree:
-            for item_iid in processed_ids:
-                try:
-                    if download_tree.exists(item_iid):
-                         status = download_tree.set(item_iid, 'status')
-                         if status == "[OK]": # 使用新的状态文本
-                             success_count += 1
-                         elif status == "[ERR]": # 使用新的状态文本
-                             error_count += 1
-                         # 取消状态处理已移除
-                         # 其他状态（如准备中[...]或百分比%）视为未完成
-                    else:
-                         # 如果任务从列表移除了，也算一种结果（或计入失败？）
-                         print(f"监控：任务 {item_iid} 在列表中不存在，计为错误。")
-                         error_count += 1
-                except Exception as read_status_e:
-                     print(f"监控：读取任务 {item_iid} 状态时出错: {read_status_e}")
-                     error_count += 1 # 读取状态失败也算错误
-        else:
-            print("监控：无法访问下载列表 Treeview，所有任务计为错误。")
-            error_count = total_tasks_in_batch # 无法读取列表，全算失败
-
-        # --- Re-enable Controls ---
-        print("监控：恢复 UI 控件状态。")
-        # 取消功能相关代码已移除
-        self.view.disable_controls(False)
-        try:
-            if hasattr(self.view, 'remove_button'): self.view.remove_button.config(state=tk.NORMAL)
-        except Exception as e: print(f"恢复移除按钮时出错: {e}")
-        # 取消功能相关代码已移除
-        # 停止按钮已移除，无需显式控制
-        # 停止按钮已移除，无需显式控制
-
-        # --- 更新最终状态栏文本 ---
-        final_status_msg = ""
-        if error_count > 0: # 仅检查是否有失败的任务 (取消状态已移除)
-            final_status_msg = f"已完成: {success_count}/{total_tasks_in_batch} (部分任务失败，请查看列表或日志)"
-        else: # 全部成功
-            final_status_msg = f"已完成: {success_count}/{total_tasks_in_batch}"
-        self.update_status(final_status_msg) # <--- 修复缩进，移回方法内部
-        # --- 进度条更新逻辑已移除 ---
-
-        summary_title = "下载完成" # 取消逻辑移除
-        summary_message = f"下载批次处理完毕。\n\n" \
-                          f"总计任务: {total_tasks_in_batch} 个\n" \
-                          f"成功: {success_count} 个\n" \
-                          f"失败: {error_count} 个\n"
-        # 取消状态计数已移除
-        # if was_cancelled and (success_count + error_count + cancelled_count < total_tasks_in_batch):
-        #      summary_message += f"\n注意：部分任务可能因取消而未完成或状态未知。"
-        # --- 计数器重置移到方法末尾 ---
-
-        print(f"监控：显示总结弹窗: Title='{summary_title}', Message='{summary_message.replace('\\n', ' ')}'") # 添加调试信息
+        self.active_batches.pop(summary.batch_id, None)
+        print(f"监控：批次 {summary.batch_id} 完成: {summary}")
+        pending = self._pending_summary
+        pending['total'] += summary.total
+        pending['succeeded'] += summary.succeeded
+        pending['failed'] += summary.failed
+        pending['cancelled'] += summary.cancelled
+        pending['batches'] += 1
+        if self.active_batches:
+            return # 其他批次仍在进行，稍后一起总结
+
+        self._pending_summary = {'total': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0, 'batches': 0}
+        self._refresh_queue_status()
+        summary_title = "下载完成"
+        batch_note = f"(共 {pending['batches']} 批)" if pending['batches'] > 1 else ""
+        summary_message = f"下载队列处理完毕{batch_note}。\n\n" \
+                          f"总计任务: {pending['total']} 个\n" \
+                          f"成功: {pending['succeeded']} 个\n" \
+                          f"失败: {pending['failed']} 个\n" \
+                          f"已取消: {pending['cancelled']} 个\n"
         self.show_message(summary_title, summary_message)
 
-        # 修正：在 final_ui_update 的最后清空 futures 和 progress
-        print("监控：清空 active_futures 和 active_task_progress。") # 添加调试信息
-        self.active_futures = {} # 清空 Future 记录
-        self.active_task_progress = {} # 清空进度记录
-
-        # --- 重置批次计数器和临时状态 ---
-        print(f"Debug: 重置批次计数器，之前状态: {self.completed_batch_tasks}/{self.total_batch_tasks}")
-        self.total_batch_tasks = 0
-        self.completed_batch_tasks = 0
-        if hasattr(self, '_finished_in_current_batch'):
-            del self._finished_in_current_batch
-        # ------------------------------------
-
 
     def _on_closing(self):
         """Handles the window closing event, saving the queue."""
         print("检测到窗口关闭事件...")
 
+        if self.bulk_importer is not None:
+            # 停止批量导入，等待正在写入的一批完成，使其随后进入队列日志
+            self.bulk_importer.cancel()
+            self.bulk_importer.wait(timeout=2.0)
+
         # --- 保存队列逻辑 ---
+        if self.queue_journal is not None:
+            # 队列日志在运行期间已持续写入，这里只需写入最后的变化并压缩 (包括仍在下载中的任务，
+            # 下次启动时自动继续)
+            self._journal_store_changes()
+            self.queue_journal.compact(self.task_store.export(exclude_statuses=(FINISHED,), persist_only=True))
+            self.queue_journal.flush()
+            print(f"信息: 下载队列日志已保存: {self.queue_journal.get_stats()}")
+        else:
+            self._save_legacy_queue_file()
+
+        # --- 检查是否有活动任务，并提示用户 ---
+        if self.active_futures:
+             # 弹出确认对话框
+             if messagebox.askyesno("退出确认", "下载仍在进行中，确定要退出吗？\n未完成的任务状态将保存。", parent=self.root):
+                  print("用户确认退出，正在请求取消下载...")
+                  if self.api_server: self.api_server.stop()
+                  self.request_cancel() # Signal cancellation to running tasks
+                  # 关闭 Executor，非阻塞
+                  self.prefetcher.stop()
+                  self.download_scheduler.shutdown(wait=False)
+                  if self.postprocess_pool: self.postprocess_pool.shutdown(wait=False)
+                  if hasattr(self.download_service, 'close'): self.download_service.close(wait=False)
+                  print("下载线程池关闭指令已发送。")
+                  if self.queue_journal: self.queue_journal.close()
+                  if self.download_archive: self.download_archive.save() # 下载线程可能仍在写入，不关闭
+                  if self.root.winfo_exists(): self.root.destroy()
+                  print("应用程序退出。")
+             else:
+                  print("用户取消退出。")
+                  return # 用户取消，不关闭窗口
+        else:
+             # 没有活动任务，正常关闭
+             if self.api_server:
+                 print(f"信息: HTTP 任务接口统计: {self.api_server.get_stats()}")
+                 self.api_server.stop()
+             self.prefetcher.stop()
+             print("关闭下载线程池...")
+             self.download_scheduler.shutdown(wait=True) # 等待线程池完全关闭
+             print("下载线程池已关闭。")
+             if self.postprocess_pool:
+                 self.postprocess_pool.shutdown(wait=True)
+                 print(f"信息: 后处理队列统计: {self.postprocess_pool.get_stats()}")
+             if hasattr(self.download_service, 'close'):
+                 print(f"信息: 下载进程池统计: {self.download_service.get_stats()}")
+                 self.download_service.close()
+             print(f"信息: 进度总线统计: {self.progress_bus.get_stats()}")
+             print(f"信息: 平台限流统计: {self.host_limiter.get_stats()}")
+             print(f"信息: 带宽限制统计: {self.bandwidth_limiter.get_stats()}")
+             print(f"信息: 并发自动调节统计: {self.autotuner.get_stats()}")
+             print(f"信息: 信息字典预取统计: {self.prefetcher.get_stats()}")
+             print(f"信息: 连接复用统计: {self.connection_pool.get_stats()}")
+             self.connection_pool.close()
+             if self.info_cache:
+                 print(f"信息: 信息字典缓存统计: {self.info_cache.get_stats()}")
+                 self.info_cache.close()
+             if self.download_archive:
+                 print(f"信息: 下载存档统计: {self.download_archive.get_stats()}")
+                 self.download_archive.close()
+             if self.queue_journal: self.queue_journal.close()
+             if self.root.winfo_exists(): self.root.destroy()
+             print("应用程序退出。")
+
+    def _save_legacy_queue_file(self):
+        """队列日志不可用时，退出前把未完成的任务保存到 download_queue.json (旧格式)。"""
         print("信息: 开始处理队列保存逻辑...") # 添加日志
         queue_to_save = []
-        download_tree = self.view.get_download_treeview()
-        if download_tree:
-            all_item_ids = download_tree.get_children()
-            for item_id in all_item_ids:
-                try:
-                    values = download_tree.item(item_id, 'values')
-                    # ('☑', filename, size, status, eta, speed, platform, description/url)
-                    status = values[3]
-                    # 只有未完成、出错、取消的状态需要保存
-                    savable_statuses = ['待下载', '下载出错', '已取消', '[...]','[重试中...]', '[ERR]', '[CAN]', '0%', '10%', '...'] # 包含可能的中间状态和旧格式
-                    # 更准确的判断：只要不是 '[OK]' 都应该尝试保存其原始信息
-                    # 增加检查：跳过用户已移除的任务
-                    if status != '[OK]' and item_id not in self.removed_item_ids:
-                        # 从 description 或 item_id 恢复 URL
-                        url = values[7] # 假设第8列是 Description/URL
-                        if not (url.startswith('http://') or url.startswith('https://')):
-                           # 如果 Description 不是 URL，尝试从 item_id 解析 (需要约定格式)
-                           # 或者需要额外存储 URL 信息，目前先假设 description 是 URL
-                           print(f"警告: 无法从任务 {item_id} 的描述 '{url}' 中明确恢复 URL，跳过保存。")
-                           continue
-
-                        task_data = {
-                            "item_id": item_id,
-                            "url": url,
-                            "platform": values[6],
-                            "filename": values[1], # 保存文件名
-                            "size": values[2],     # 保存大小
-                            "status": status,      # 保存当前状态
-                            "description": values[7] # 保存描述（可能是错误信息或原始 URL）
-                        }
-                        # 对于正在下载的状态，统一保存为“待下载”，以便下次启动时重新开始
-                        if '%' in status or status == '[...] ' or status == '[重试中...]': # 修正：匹配带空格的状态
-                            task_data['status'] = '待下载'
-                            task_data['description'] = url # 重新下载时清空旧描述
-
-                        queue_to_save.append(task_data)
-                except Exception as e:
-                    print(f"处理任务 {item_id} 以进行保存时出错: {e}")
+        # 直接从任务存储导出未完成的任务 (已移除的任务不在存储中)，格式与旧版本兼容
+        for task in self.task_store.export(exclude_statuses=(FINISHED,)):
+            status = task['status']
+            description = task['description']
+            # 对于正在下载或等待中的任务，统一保存为"待下载"，以便下次启动时重新开始
+            if status not in (ERROR, CANCELLED):
+                status, description = PENDING, ''
+            queue_to_save.append({
+                "item_id": task['id'],
+                "url": task['url'],
+                "platform": task['platform'],
+                "filename": task['filename'],
+                "size": task['size'],
+                "status": STATUS_LABELS[status],
+                "description": description or task['url'],
+            })
 
         print(f"信息: 准备保存的任务数量: {len(queue_to_save)}") # 添加日志
         if queue_to_save:
@@ -986,30 +1276,88 @@ class SucoiAppController:
                 except Exception as mb_e:
                      print(f"显示清空错误弹窗时也发生错误: {mb_e}")
 
-        # --- 检查是否有活动任务，并提示用户 ---
-        if self.active_futures:
-             # 弹出确认对话框
-             if messagebox.askyesno("退出确认", "下载仍在进行中，确定要退出吗？\n未完成的任务状态将保存。", parent=self.root):
-                  print("用户确认退出，正在请求取消下载...")
-                  self.request_cancel() # Signal cancellation to running tasks
-                  # 关闭 Executor，非阻塞
-                  self.download_executor.shutdown(wait=False, cancel_futures=False)
-                  print("下载线程池关闭指令已发送。")
-                  if self.root.winfo_exists(): self.root.destroy()
-                  print("应用程序退出。")
-             else:
-                  print("用户取消退出。")
-                  return # 用户取消，不关闭窗口
+    def _load_persistent_queue(self):
+        """
+        加载上次的下载队列：优先重放队列日志 (包括上次运行时正在下载的任务)，
+        日志为空时从旧版本的 download_queue.json 迁移。
+        """
+        if self.queue_journal is not None and self.queue_journal.exists():
+            self._load_queue_journal()
         else:
-             # 没有活动任务，正常关闭
-             print("关闭下载线程池...")
-             self.download_executor.shutdown(wait=True) # 等待线程池完全关闭
-             print("下载线程池已关闭。")
-             if self.root.winfo_exists(): self.root.destroy()
-             print("应用程序退出。")
+            self._load_legacy_queue_file()
+            if self.queue_journal is not None and len(self.task_store):
+                self._migrate_legacy_queue_file()
+        self.task_store.take_persist_changes() # 刚加载的任务已在日志中，不重复记录
 
-    def _load_persistent_queue(self):
-        """加载持久化的下载队列，增强错误处理。"""
+    def _load_queue_journal(self):
+        """重放队列日志恢复任务和状态；上次运行时未结束的任务在启动后自动继续下载。"""
+        try:
+            tasks = self.queue_journal.replay()
+        except (OSError, UnicodeDecodeError) as e:
+            error_msg = f"读取下载队列日志时发生错误。\n错误: {e}\n文件路径: {self.queue_journal.path}"
+            print(f"错误: {error_msg}")
+            self.show_message("加载错误", error_msg, msg_type='error')
+            return
+        tasks = [task for task in tasks if normalize_status(task.get('status')) != FINISHED]
+        rekeyed_count = self._canonicalize_loaded_tasks(tasks)
+        added_count = len(self.task_store.add_many(tasks))
+        interrupted_ids = self.task_store.ids_with_status(*ACTIVE_STATUSES)
+        print(f"信息: 从队列日志恢复了 {added_count} 个任务，其中 {len(interrupted_ids)} 个在上次运行时未完成。")
+        if rekeyed_count:
+            # 日志中仍是旧 id，用当前任务重写一次
+            print(f"信息: {rekeyed_count} 个任务改用规范 id，合并了 {len(tasks) - added_count} 个重复任务。")
+            self.queue_journal.compact(self.task_store.export(exclude_statuses=(FINISHED,), persist_only=True))
+        if not interrupted_ids:
+            return
+        if self.config_manager.get_config('resume_interrupted_downloads', True):
+            self.root.after(0, self._resume_interrupted_tasks, interrupted_ids)
+        else:
+            for item_id in interrupted_ids:
+                self.task_store.update(item_id, status=PENDING, description='上次运行时中断')
+
+    @staticmethod
+    def _canonicalize_loaded_tasks(tasks):
+        """
+        把旧版本按 md5(url) 生成 id 的任务改为规范 id (就地修改)，指向同一视频的任务随后在
+        add_many() 中合并为一个。
+
+        返回:
+            int: 改变了 id 的任务数量。
+        """
+        rekeyed = 0
+        for task in tasks:
+            if not LEGACY_TASK_ID_PATTERN.search(task.get('id') or ''):
+                continue
+            canonical = canonicalize(task.get('url'), task.get('platform'))
+            if canonical is not None and canonical.task_id != task['id']:
+                task.update(id=canonical.task_id, url=canonical.url, platform=canonical.platform)
+                rekeyed += 1
+        return rekeyed
+
+    def _resume_interrupted_tasks(self, item_ids):
+        """重新提交上次运行时未完成的任务 (主线程调用)。"""
+        output_path = self.get_download_path()
+        if not output_path:
+            print("警告: 无法确定有效的下载路径，未恢复中断的下载。")
+            return
+        submitted_count = self._submit_task_ids(item_ids, output_path)
+        if submitted_count:
+            self.update_status(f"已恢复 {submitted_count} 个上次未完成的下载。")
+
+    def _migrate_legacy_queue_file(self):
+        """把从 download_queue.json 加载的任务写入队列日志，并将旧文件重命名，避免下次重复加载。"""
+        self.queue_journal.compact(self.task_store.export(exclude_statuses=(FINISHED,), persist_only=True))
+        self.queue_journal.flush()
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        queue_file_path = os.path.join(os.path.dirname(script_dir), 'download_queue.json')
+        try:
+            os.replace(queue_file_path, queue_file_path + '.migrated')
+            print(f"信息: 已将 {queue_file_path} 迁移到队列日志。")
+        except OSError as e:
+            print(f"警告: 重命名旧队列文件 {queue_file_path} 失败: {e}")
+
+    def _load_legacy_queue_file(self):
+        """从旧版本的 download_queue.json 加载队列，增强错误处理。"""
         script_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(script_dir)
         queue_file_path = os.path.join(project_root, 'download_queue.json')
@@ -1057,18 +1405,9 @@ class SucoiAppController:
             print("信息: 持久化队列为空或加载失败后为空。")
             return
 
-        # --- 接下来的加载逻辑与之前相同 ---
-        download_tree = self.view.get_download_treeview()
-        if not download_tree:
-            print("错误: 无法获取下载列表 Treeview 组件，无法加载队列。")
-            # 也许也应该给用户一个提示？
-            self.show_message("内部错误", "无法访问下载列表界面组件，队列加载失败。", msg_type='error')
-            return
-
-        added_count = 0
+        tasks_to_add = []
         skipped_count = 0
         error_count = 0
-        existing_iids = set(download_tree.get_children())
 
         for task_data in loaded_tasks:
             try:
@@ -1082,34 +1421,29 @@ class SucoiAppController:
                     skipped_count += 1
                     continue
 
-                if item_id in existing_iids:
-                    skipped_count += 1
-                    continue
-
                 filename = task_data.get('filename', url.split('/')[-1].split('?')[0] or url)[:50]
                 size = task_data.get('size', '未知')
-                description = task_data.get('description', url)
+                description = task_data.get('description', '')
+                if description == url: description = '' # 旧版本在描述列中保存 URL
 
-                normalized_status = status
-                if status == '[ERR]': normalized_status = '下载出错'
-                if status == '[CAN]': normalized_status = '已取消'
-
-                # 对于加载时状态不是 '待下载'/'下载出错'/'已取消' 的任务，也将其状态重置为 '待下载'
-                # 这样即使用户手动改了json，启动后也能尝试重新下载
-                if normalized_status not in ['待下载', '下载出错', '已取消']:
+                # 兼容旧版本保存的显示文本；不可恢复的状态重置为待下载，以便启动后重新下载
+                normalized_status = normalize_status(status)
+                if normalized_status not in STARTABLE_STATUSES:
                     print(f"警告: 持久化任务状态 '{status}' 无效或不可恢复，重置为 '待下载' 以尝试重新下载任务 {item_id}")
-                    normalized_status = '待下载'
-                    description = url # 重置描述为URL
+                    normalized_status = PENDING
+                    description = ''
 
-                values = ('☑', filename, size, normalized_status, '', '', platform, description)
-                download_tree.insert('', tk.END, iid=item_id, values=values)
-                existing_iids.add(item_id)
-                added_count += 1
+                tasks_to_add.append({'id': item_id, 'url': url, 'platform': platform, 'status': normalized_status,
+                                     'filename': filename, 'size': size, 'description': description})
 
             except Exception as load_item_e:
                 print(f"从持久化数据加载任务 {task_data.get('item_id', '未知ID')} 时出错: {load_item_e}")
                 error_count += 1
-                # 这里可以考虑是否给用户一个总的加载失败条目提示
+
+        # 一次性批量加入任务存储 (重复的 id 被跳过)；下载列表是虚拟化的，只显示可见的行
+        self._canonicalize_loaded_tasks(tasks_to_add)
+        added_count = len(self.task_store.add_many(tasks_to_add))
+        skipped_count += len(tasks_to_add) - added_count
 
         status_parts = []
         if added_count > 0: status_parts.append(f"成功加载 {added_count}")
@@ -1232,20 +1566,66 @@ class SucoiAppController:
                 except Exception as e:
                     print(f"插入 YouTube 搜索结果时出错 (vid={video.get('id')}): {e}")
             self.update_status(f"状态: 找到 {len(videos_info)} 个视频")
-
-    def mark_items_as_removed(self, item_ids):
-        """记录用户已从UI移除的任务ID，以便在保存时忽略它们。"""
-        if isinstance(item_ids, list):
-            self.removed_item_ids.update(item_ids)
-            print(f"信息: 标记了 {len(item_ids)} 个任务为已移除: {item_ids}")
-        elif isinstance(item_ids, str):
-            self.removed_item_ids.add(item_ids)
-            print(f"信息: 标记了任务 {item_ids} 为已移除")
-
         else:
             self.update_status("状态: 未找到相关视频")
             self.show_message("搜索结果", "未找到与关键词匹配的视频。") # parent=self.view.root?
 
+    def toggle_task_selection(self, item_id):
+        """切换任务的勾选状态 (☑/☐)，并立即刷新下载列表。"""
+        if self.task_store.toggle_selected(item_id) is not None:
+            self._sync_download_tree()
+
+    def get_selected_task_ids(self):
+        """返回所有已勾选任务的 id (按添加顺序)。"""
+        return self.task_store.selected_ids()
+
+    def cancel_tasks(self, item_ids):
+        """
+        取消一组任务: 排队中的不再执行，正在下载的立即中止。返回实际取消的数量。
+        """
+        cancelled_count = 0
+        for item_id in item_ids:
+            outcome = self.api_cancel(item_id)
+            if outcome and outcome['cancelled']:
+                cancelled_count += 1
+        if cancelled_count:
+            print(f"信息: 取消了 {cancelled_count} 个任务")
+            self.update_status(f"已取消 {cancelled_count} 个下载任务。")
+        return cancelled_count
+
+    def cancel_selected_downloads(self):
+        """取消所有已勾选的任务。"""
+        item_ids = self.get_selected_task_ids()
+        if not item_ids:
+            self.show_message("提示", "请先在下载列表中勾选要取消的任务。")
+            return 0
+        return self.cancel_tasks(item_ids)
+
+    def cancel_all_downloads(self):
+        """取消整个下载队列 (所有未完成的任务)。"""
+        return self.cancel_tasks(self.task_store.ids_with_status(*ACTIVE_STATUSES))
+
+    def request_cancel(self):
+        """
+        退出时取消所有已提交的任务，正在下载的尝试中止并释放工作线程。.part 文件和队列日志中的
+        检查点保留，下次启动续传。
+        """
+        for item_id in list(self.active_futures):
+            self.download_scheduler.cancel(item_id, reason=REASON_SHUTDOWN)
+
+    def remove_tasks(self, item_ids):
+        """从任务存储中移除任务 (下次启动不会加载)，下载列表随之删除对应行。返回移除的数量。
+
+        仍在下载或排队的任务先取消，不会在移除后继续占用下载名额。
+        """
+        for item_id in item_ids:
+            self.download_scheduler.cancel(item_id)
+        removed = self.task_store.remove(item_ids)
+        if removed:
+            print(f"信息: 移除了 {removed} 个任务")
+            self._sync_download_tree()
+        return removed
+
     def add_selected_to_download(self):
         """将活动标签页搜索结果中选中的项添加到全局下载列表。"""
         try:
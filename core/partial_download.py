@@ -0,0 +1,124 @@
+# core/partial_download.py - Checkpoints for resuming .part files across restarts
+import os
+import glob
+import time
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+TAIL_CHECK_BYTES = 64 * 1024 # 校验 .part 文件末尾的字节数
+CHECKPOINT_INTERVAL_BYTES = 8 * 1024 * 1024 # 每下载这么多字节记录一次检查点
+CHECKPOINT_INTERVAL_SECONDS = 15.0 # 或距离上次检查点超过这么多秒
+
+
+def _tail_sha256(f, offset):
+    start = max(0, offset - TAIL_CHECK_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def make_checkpoint(part_path):
+    """
+    为正在下载的 .part 文件生成检查点。
+
+    使用文件在磁盘上的实际大小 (而不是 yt-dlp 报告的已下载字节数，其中可能包含尚未写入的缓冲)，
+    并记录该位置之前 TAIL_CHECK_BYTES 字节的 SHA-256。
+
+    返回:
+        dict | None: {'path', 'offset', 'tail_sha256'}，文件不存在或为空时返回 None。
+    """
+    try:
+        with open(part_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            if offset == 0:
+                return None
+            return {'path': part_path, 'offset': offset, 'tail_sha256': _tail_sha256(f, offset)}
+    except OSError as e:
+        logger.debug("无法为 %s 生成检查点: %s", part_path, e)
+        return None
+
+
+def verify_checkpoint(checkpoint):
+    """
+    启动后校验检查点: 文件存在、大小不小于记录的偏移量且末尾校验和一致。
+
+    校验通过时把文件截断到检查点位置 (丢弃检查点之后未经校验的字节)，yt-dlp 随后从该位置
+    用 HTTP Range 请求继续下载。
+
+    返回:
+        tuple: (status, detail)。status 为 'resume' (可以续传)、'missing' (文件已不存在，
+               通常已下载完成并重命名) 或 'mismatch' (文件被截断或内容不一致，应重新下载)。
+    """
+    path, offset = checkpoint.get('path'), int(checkpoint.get('offset') or 0)
+    if not path or not os.path.exists(path):
+        return 'missing', None
+    try:
+        size = os.path.getsize(path)
+        if size < offset:
+            return 'mismatch', f"文件大小 {size} 小于检查点 {offset}"
+        with open(path, 'r+b') as f:
+            if _tail_sha256(f, offset) != checkpoint.get('tail_sha256'):
+                return 'mismatch', "末尾校验和不一致"
+            if size > offset:
+                f.truncate(offset)
+        return 'resume', offset
+    except OSError as e:
+        return 'mismatch', str(e)
+
+
+def discard_partial(part_path):
+    """删除 .part 文件及 yt-dlp 的分片续传状态文件 (.ytdl) 和已下载的分片 (.part-FragN)。"""
+    base_path = part_path[:-len('.part')] if part_path.endswith('.part') else part_path
+    fragments = glob.glob(glob.escape(part_path) + '-Frag*')
+    for path in (part_path, base_path + '.ytdl', *fragments):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("删除未完成的下载文件 %s 失败: %s", path, e)
+
+
+class CheckpointTracker:
+    """
+    记录一个下载任务各个 .part 文件 (例如分开下载的视频流和音频流) 的最新检查点。
+
+    非线程安全，只在执行该任务的下载线程中使用。
+    """
+
+    def __init__(self, checkpoints=None):
+        self._checkpoints = {cp['path']: cp for cp in checkpoints or () if cp.get('path')}
+        self._last = {} # path -> (offset, monotonic time)
+
+    def update(self, part_path, downloaded_bytes):
+        """
+        下载进度回调中调用，达到间隔时生成新的检查点。
+
+        返回:
+            bool: 是否生成了新的检查点。
+        """
+        if not part_path or not part_path.endswith('.part'):
+            return False
+        now = time.monotonic()
+        last_offset, last_time = self._last.get(part_path, (None, None))
+        if last_offset is None:
+            self._last[part_path] = (downloaded_bytes, now) # 第一次回调只记录位置
+            return False
+        if (downloaded_bytes - last_offset < CHECKPOINT_INTERVAL_BYTES
+                and now - last_time < CHECKPOINT_INTERVAL_SECONDS):
+            return False
+        checkpoint = make_checkpoint(part_path)
+        self._last[part_path] = (downloaded_bytes, now)
+        if checkpoint is None:
+            return False
+        self._checkpoints[part_path] = checkpoint
+        return True
+
+    def checkpoints(self):
+        return list(self._checkpoints.values())
+
+    def part_paths(self):
+        """本任务出现过的所有 .part 文件 (包括尚未生成检查点的)。"""
+        return list(dict.fromkeys([*self._checkpoints, *self._last]))
@@ -0,0 +1,199 @@
+# core/postprocess_pool.py - CPU-budgeted job queue for FFmpeg post-processing
+import os
+import time
+import threading
+import concurrent.futures
+import logging
+
+import yt_dlp
+
+from core.format_policy import FormatPolicy, describe_conversion
+
+logger = logging.getLogger(__name__)
+
+
+class PostProcessPool:
+    """
+    后处理 (FFmpeg 转码/转封装) 作业队列。
+
+    下载尝试在传输完成后返回后处理作业 (见 DownloadService 的 defer_postprocessing)，调度器把作业
+    放入本队列并立即释放下载名额，传输不再等待转码。作业按 CPU 预算执行:
+    同时运行的作业数 × 每个作业的 FFmpeg 线程数 不超过 CPU 预算 (默认等于 CPU 核数)，
+    多个转码同时进行时不会超额占用 CPU。作业按提交顺序执行。
+    """
+
+    def __init__(self, progress_callback=None, cpu_budget=None, max_jobs=None, threads_per_job=None,
+                 format_policy=None):
+        """
+        参数:
+            progress_callback (callable | None): 进度回调，接收与 DownloadService 相同格式的进度字典
+                                                 (status 为 'postprocessing' / 'finished' / 'error')。
+            cpu_budget (int | None): 后处理可以使用的 CPU 核数，默认等于 CPU 核数。
+            max_jobs (int | None): 同时运行的作业数上限，默认为预算的一半。
+            threads_per_job (int | None): 每个作业的 FFmpeg 线程数 (-threads)，默认为 预算 / 作业数。
+            format_policy (FormatPolicy | None): 执行作业中的容器转换 (转封装/转码) 并记录统计。
+        """
+        self.progress_callback = progress_callback
+        self.format_policy = format_policy or FormatPolicy()
+        self.cpu_budget = max(1, int(cpu_budget or os.cpu_count() or 1))
+        max_jobs = max(1, int(max_jobs)) if max_jobs else None
+        threads = max(1, int(threads_per_job)) if threads_per_job else None
+        if max_jobs is None and threads is None:
+            max_jobs = max(1, self.cpu_budget // 2)
+        if threads is None:
+            threads = max(1, self.cpu_budget // max_jobs)
+        self.threads_per_job = min(threads, self.cpu_budget)
+        # 作业数由预算和每个作业的线程数共同决定，取较小者
+        self.max_jobs = max(1, min(max_jobs or self.cpu_budget, self.cpu_budget // self.threads_per_job))
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_jobs,
+                                                               thread_name_prefix='PostProcess')
+        self._lock = threading.Lock()
+        self._jobs = {} # item_id -> {'future', 'started', 'cancelled'}
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'busy_seconds': 0.0}
+        logger.info("后处理队列: 最多 %d 个作业同时运行，每个作业 %d 个线程 (CPU 预算 %d)",
+                    self.max_jobs, self.threads_per_job, self.cpu_budget)
+
+    @classmethod
+    def from_config(cls, get_config, progress_callback=None, format_policy=None):
+        """
+        根据配置创建后处理队列，配置中关闭后处理分离 (postprocess_offload) 时返回 None。
+
+        参数:
+            get_config (callable): 形如 ConfigManager.get_config(key, default) 的函数。
+            progress_callback (callable | None): 进度回调。
+            format_policy (FormatPolicy | None): 容器转换策略。
+        """
+        if not get_config('postprocess_offload', True):
+            return None
+        values = {}
+        for key, attr in (('postprocess_cpu_budget', 'cpu_budget'), ('postprocess_max_jobs', 'max_jobs'),
+                          ('postprocess_threads', 'threads_per_job')):
+            try:
+                values[attr] = max(0, int(get_config(key, 0) or 0)) or None
+            except (ValueError, TypeError):
+                print(f"警告: 配置中的 '{key}' 值无效，将自动确定。")
+                values[attr] = None
+        return cls(progress_callback, format_policy=format_policy, **values)
+
+    def submit(self, item_info, result):
+        """
+        提交下载尝试返回的后处理作业 (result['postprocess'])。
+
+        返回:
+            concurrent.futures.Future: 结果为任务的最终结果字典 (finished / error / cancelled)。
+        """
+        item_id = item_info.get('id')
+        job = result.get('postprocess') or {}
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._jobs[item_id] = {'future': future, 'started': False, 'cancelled': False}
+            self._stats['submitted'] += 1
+            queued = sum(1 for entry in self._jobs.values() if not entry['started'])
+        self._report({'id': item_id, 'status': 'postprocessing',
+                      'description': f'等待后处理 (队列中 {queued} 个)' if queued > self.max_jobs else '等待后处理...'})
+        try:
+            self._executor.submit(self._run_job, item_id, job, result)
+        except RuntimeError as e: # 已关闭
+            with self._lock:
+                self._jobs.pop(item_id, None)
+            future.set_result({'id': item_id, 'status': 'error', 'error_message': f'后处理队列已关闭: {e}'})
+        return future
+
+    def cancel(self, item_id):
+        """
+        取消尚未开始的后处理作业 (已下载的原始文件保留)。
+
+        返回:
+            bool: 是否取消成功 (正在运行的作业不会被中断)。
+        """
+        with self._lock:
+            entry = self._jobs.get(item_id)
+            if entry is None or entry['started'] or entry['cancelled']:
+                return False
+            entry['cancelled'] = True
+            self._stats['cancelled'] += 1
+        entry['future'].set_result({'id': item_id, 'status': 'cancelled', 'error_message': '已取消 (未后处理)'})
+        self._report({'id': item_id, 'status': 'cancelled', 'description': '已取消 (未后处理)'})
+        return True
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['running'] = sum(1 for entry in self._jobs.values() if entry['started'])
+            stats['queued'] = len(self._jobs) - stats['running']
+        stats.update(max_jobs=self.max_jobs, threads_per_job=self.threads_per_job, cpu_budget=self.cpu_budget)
+        return stats
+
+    def shutdown(self, wait=True):
+        """关闭队列。wait=False 时丢弃尚未开始的作业 (其任务以错误结束，原始文件保留)。"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        if wait:
+            return
+        with self._lock:
+            dropped = [(item_id, entry) for item_id, entry in self._jobs.items()
+                       if not entry['started'] and not entry['cancelled']]
+            for item_id, _ in dropped:
+                del self._jobs[item_id]
+        for item_id, entry in dropped:
+            entry['future'].set_result({'id': item_id, 'status': 'error', 'error_message': '程序退出，后处理未执行'})
+
+    # --- Internal Helpers (作业线程) ---
+
+    def _run_job(self, item_id, job, download_result):
+        with self._lock:
+            entry = self._jobs.get(item_id)
+            if entry is None or entry['cancelled']:
+                self._jobs.pop(item_id, None)
+                return
+            entry['started'] = True
+        self._report({'id': item_id, 'status': 'postprocessing', 'description': '后处理中...'})
+        started = time.monotonic()
+        try:
+            filepath, conversion = self._postprocess(job)
+        except Exception as e:
+            error_message = f"后处理失败: {e}"
+            logger.error("任务 [%s] %s", item_id, error_message)
+            result = {'id': item_id, 'status': 'error', 'error_message': error_message}
+            self._report({'id': item_id, 'status': 'error', 'description': error_message[:100]})
+        else:
+            result = {key: value for key, value in download_result.items() if key != 'postprocess'}
+            result.update(status='finished', filepath=filepath)
+            if conversion:
+                result['conversion'] = conversion
+            self._report({'id': item_id, 'status': 'finished', 'filename': os.path.basename(filepath),
+                          'description': describe_conversion(conversion)})
+        elapsed = time.monotonic() - started
+        result['postprocess_seconds'] = round(elapsed, 3)
+        with self._lock:
+            self._jobs.pop(item_id, None)
+            self._stats['failed' if result['status'] == 'error' else 'completed'] += 1
+            self._stats['busy_seconds'] += elapsed
+        entry['future'].set_result(result)
+
+    def _postprocess(self, job):
+        """用 yt-dlp 的后处理器处理已下载的文件，返回 (处理后的文件路径, 容器转换记录或 None)。"""
+        filepath = job.get('filepath')
+        if not filepath or not os.path.exists(filepath):
+            raise FileNotFoundError(f"文件不存在: {filepath}")
+        ydl_opts = {
+            'quiet': True,
+            'noprogress': True,
+            'postprocessors': job.get('postprocessors') or [],
+            # 每个 FFmpeg 进程的线程数受 CPU 预算限制 ('default' 作用于各后处理器的第一个输出)
+            'postprocessor_args': {'default': ['-threads', str(self.threads_per_job)]},
+        }
+        conversions = []
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if job.get('container'):
+                self.format_policy.install(ydl, job['container'], on_result=conversions.append)
+            info = ydl.post_process(filepath, dict(job.get('info') or {}))
+        return info.get('filepath') or filepath, (conversions[-1] if conversions else None)
+
+    def _report(self, progress_data):
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(progress_data)
+        except Exception as e:
+            logger.error("调用后处理进度回调时出错 (item_id: %s): %s", progress_data.get('id'), e)
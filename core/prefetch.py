@@ -0,0 +1,167 @@
+# core/prefetch.py - Extraction stage of the download pipeline (info-dict prefetch for queued tasks)
+import threading
+import concurrent.futures
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2 # 提取阶段的线程数
+DEFAULT_DEPTH = 4 # 向前预取的排队任务数 (提取阶段与传输阶段之间的缓冲区大小)
+DEFAULT_CLAIM_TIMEOUT = 30.0 # 下载尝试开始时等待该任务正在进行的预取的最长秒数
+POLL_INTERVAL = 0.5 # 没有新事件时重新查看排队任务的间隔 (秒)
+
+
+class ExtractionPrefetcher:
+    """
+    下载流水线的提取阶段。
+
+    用单独的小线程池，为排在最前面的 depth 个等待中的任务提前提取信息字典 (写入 InfoCache)。
+    这些任务开始下载时 DownloadService 直接使用缓存，跳过提取，因此一个任务的提取与其他任务的
+    网络传输重叠进行，传输名额不再因提取而空闲。预取只针对即将开始的任务，缓冲区大小为 depth，
+    不会为整个队列提前请求网站。
+
+    任务开始下载时调用 claim()：预取仍在进行则等待其完成 (不重复提取)，然后从缓冲区移除。
+    """
+
+    def __init__(self, extract, upcoming, workers=DEFAULT_WORKERS, depth=DEFAULT_DEPTH,
+                 claim_timeout=DEFAULT_CLAIM_TIMEOUT):
+        """
+        参数:
+            extract (callable): extract(item_info) 提取并缓存信息字典，返回 'extracted' / 'cached' /
+                                'skipped' / 'failed' (例如 DownloadService.prefetch_info)。
+            upcoming (callable): upcoming(limit) 按开始顺序返回即将执行的 item_info (例如 DownloadScheduler.upcoming)。
+            workers (int): 提取线程数，0 表示禁用预取。
+            depth (int): 向前预取的任务数。
+            claim_timeout (float): claim() 等待进行中预取的最长秒数。
+        """
+        self._extract = extract
+        self._upcoming = upcoming
+        self.workers = max(0, int(workers))
+        self.depth = max(1, int(depth))
+        self.claim_timeout = max(0.0, float(claim_timeout))
+        self._condition = threading.Condition()
+        self._running = {} # item_id -> threading.Event (预取进行中)
+        self._done = set() # 已预取、尚未开始下载的任务 id
+        self._executor = None
+        self._thread = None
+        self._stopped = False
+        self._stats = {'extracted': 0, 'cached': 0, 'skipped': 0, 'failed': 0,
+                       'claimed_ready': 0, 'claimed_waited': 0, 'claimed_missed': 0}
+
+    @classmethod
+    def from_config(cls, get_config, extract, upcoming):
+        """根据配置创建预取器，无效值回退到默认值。"""
+        values = {}
+        for key, attr, cast, default in (('prefetch_workers', 'workers', int, DEFAULT_WORKERS),
+                                         ('prefetch_depth', 'depth', int, DEFAULT_DEPTH),
+                                         ('prefetch_claim_timeout', 'claim_timeout', float, DEFAULT_CLAIM_TIMEOUT)):
+            try:
+                values[attr] = cast(get_config(key, default))
+            except (ValueError, TypeError):
+                print(f"警告: 配置中的 '{key}' 值无效，将使用默认值 {default}。")
+                values[attr] = default
+        return cls(extract, upcoming, **values)
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def start(self):
+        """启动提取阶段 (workers 为 0 时不启动)。"""
+        if self.workers <= 0 or self._thread is not None:
+            return
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                               thread_name_prefix='Prefetch')
+        self._thread = threading.Thread(target=self._loop, name='ExtractionPrefetcher', daemon=True)
+        self._thread.start()
+
+    def poke(self):
+        """排队任务发生变化 (例如有任务开始或新提交)，立即重新查看。"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def claim(self, item_info):
+        """
+        任务即将开始下载 (DownloadScheduler 的 on_attempt_start 回调，工作线程调用)。
+        该任务的预取正在进行时等待其完成，避免传输阶段重复提取。
+        """
+        if not self.enabled:
+            return
+        item_id = item_info.get('id')
+        with self._condition:
+            event = self._running.get(item_id)
+            if event is None:
+                self._stats['claimed_ready' if item_id in self._done else 'claimed_missed'] += 1
+            self._done.discard(item_id)
+            self._condition.notify_all() # 缓冲区空出一个位置
+        if event is not None:
+            event.wait(self.claim_timeout)
+            with self._condition:
+                self._stats['claimed_waited'] += 1
+                self._done.discard(item_id)
+
+    def get_stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['running'] = len(self._running)
+            stats['buffered'] = len(self._done)
+        stats.update(enabled=self.enabled, workers=self.workers, depth=self.depth)
+        return stats
+
+    def stop(self):
+        """停止提取阶段，不等待进行中的提取。"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- Internal Helpers ---
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+            try:
+                self._fill()
+            except Exception as e:
+                logger.error("预取调度出错: %s", e, exc_info=True)
+            with self._condition:
+                if self._stopped:
+                    return
+                self._condition.wait(POLL_INTERVAL)
+
+    def _fill(self):
+        """为排在最前面的 depth 个任务中尚未预取的任务提交提取，同时最多 workers 个。"""
+        window = self._upcoming(self.depth)
+        window_ids = {item_info.get('id') for item_info in window}
+        with self._condition:
+            # 离开预取窗口的任务 (已开始、已取消或被移除) 不再占用缓冲区
+            self._done &= window_ids
+            for item_info in window:
+                if len(self._running) >= self.workers:
+                    break
+                item_id = item_info.get('id')
+                if item_id is None or item_id in self._running or item_id in self._done:
+                    continue
+                self._running[item_id] = threading.Event()
+                try:
+                    self._executor.submit(self._prefetch, dict(item_info))
+                except RuntimeError: # 已停止
+                    self._running.pop(item_id).set()
+                    return
+
+    def _prefetch(self, item_info):
+        item_id = item_info.get('id')
+        outcome = 'failed'
+        try:
+            outcome = self._extract(item_info)
+        except Exception as e:
+            logger.error("预取信息字典时出错 [%s]: %s", item_id, e, exc_info=True)
+        finally:
+            with self._condition:
+                self._stats[outcome if outcome in self._stats else 'failed'] += 1
+                self._done.add(item_id)
+                self._running.pop(item_id).set()
+                self._condition.notify_all()
@@ -0,0 +1,612 @@
+# core/process_pool.py - Run DownloadService attempts in worker processes
+import os
+import queue
+import hashlib
+import signal
+import threading
+import time
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+from core.download_service import DownloadService, archive_key_for_url, cancelled_result
+from core.error_classifier import TRANSIENT
+from core.info_cache import InfoCache
+from core.format_policy import FormatPolicy
+from core.connection_pool import ConnectionPool
+from core.cancel_token import REASON_USER, REASON_SHUTDOWN, keeps_partials
+from core.retry_scheduler import RetryPolicy
+from core.prefetch import DEFAULT_WORKERS as DEFAULT_PREFETCH_PROCESSES
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FORWARD_INTERVAL = 0.1 # 子进程转发 downloading 进度的最小间隔 (秒)，状态变化总是立即转发
+BYTES_FORWARD_INTERVAL = 0.25 # 子进程汇报下载字节数 (吞吐量统计) 的间隔 (秒)
+BANDWIDTH_SYNC_INTERVAL = 1.0 # 主进程把限速 (含时间段限速和运行时修改) 同步到共享令牌桶的间隔 (秒)
+DONE_MARKER_TIMEOUT = 2.0 # 任务结果返回后等待其剩余进度消息转发完毕的最长秒数
+MAX_WAIT_SLICE = 0.5 # 共享令牌桶单次等待的最长秒数
+CANCEL_FLAG_SLOTS = 256 # 同时可以处于取消状态的尝试数 (共享内存中的槽位)
+
+
+class SharedTokenBuckets:
+    """
+    跨进程共享的一组令牌桶 (共享内存 + 进程锁)，槽位 0 为全局限速，其余槽位依次为各平台子限速。
+
+    每个槽位保存 [rate, tokens, last] 三个浮点数，语义与 bandwidth_limiter.TokenBucket 相同:
+    先扣除令牌 (允许透支)，再等待到透支被补足，所有进程的总速率不超过 rate。rate 为 0 表示不限速。
+    """
+
+    def __init__(self, context, platforms=()):
+        """
+        参数:
+            context: multiprocessing 上下文 (决定共享内存和锁的创建方式)。
+            platforms (iterable): 需要子限速的平台名 (小写，与 BandwidthLimiter 的键一致)。
+        """
+        self.platforms = [str(p).lower() for p in platforms]
+        self._slots = {platform: i for i, platform in enumerate(self.platforms, 1)}
+        self._values = context.RawArray('d', 3 * (1 + len(self.platforms)))
+        self._lock = context.Lock()
+        now = time.monotonic()
+        for slot in range(1 + len(self.platforms)):
+            self._values[3 * slot + 2] = now
+
+    def slot_for(self, platform):
+        """平台对应的槽位，没有子限速的平台返回 None。"""
+        return self._slots.get(platform)
+
+    def set_rate(self, slot, rate):
+        """修改槽位的速率 (字节/秒)，正在等待的进程在下一个等待片段按新速率重新计算。"""
+        with self._lock:
+            self._refill_locked(slot)
+            base = 3 * slot
+            rate = max(0.0, float(rate or 0))
+            self._values[base] = rate
+            self._values[base + 1] = min(self._values[base + 1], rate) if rate else 0.0
+
+    def consume(self, slot, amount, should_stop=None):
+        """扣除 amount 字节的令牌，必要时阻塞当前线程 (should_stop 返回 True 时提前结束)。返回实际等待的秒数。"""
+        if amount <= 0:
+            return 0.0
+        base = 3 * slot
+        with self._lock:
+            if not self._values[base]:
+                return 0.0
+            self._refill_locked(slot)
+            self._values[base + 1] -= amount
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill_locked(slot)
+                rate, tokens = self._values[base], self._values[base + 1]
+            if not rate or tokens >= 0 or (should_stop is not None and should_stop()):
+                return waited
+            delay = min(MAX_WAIT_SLICE, -tokens / rate)
+            time.sleep(delay)
+            waited += delay
+
+    def sync_from(self, limiter):
+        """按主进程的 BandwidthLimiter (全局限速已按时间段计算) 更新各槽位的速率。"""
+        rates = [limiter.effective_limit_kbps() * 1024]
+        platform_limits = limiter.get_stats()['platform_limits_kbps']
+        rates.extend(platform_limits.get(platform, 0) * 1024 for platform in self.platforms)
+        for slot, rate in enumerate(rates):
+            if self._values[3 * slot] != rate:
+                self.set_rate(slot, rate)
+
+    def _refill_locked(self, slot):
+        base = 3 * slot
+        now = time.monotonic()
+        rate = self._values[base]
+        if rate:
+            self._values[base + 1] = min(rate, self._values[base + 1] + (now - self._values[base + 2]) * rate)
+        self._values[base + 2] = now
+
+
+class SharedCancelFlags:
+    """
+    跨进程共享的取消标志: 共享内存中保存已取消任务 id 的 64 位摘要 (0 表示空槽位)。
+
+    主进程在任务的 CancelToken 被取消时 set()，尝试结束后 clear()；子进程的进度钩子通过
+    reason() 检查，与线程模式一样在下一次进度回调时中止传输。每个槽位另记是否保留 .part 文件
+    (程序退出时的取消)。
+    """
+
+    def __init__(self, context, size=CANCEL_FLAG_SLOTS):
+        self._values = context.RawArray('Q', max(1, int(size)))
+        self._keep = context.RawArray('b', max(1, int(size)))
+        self._lock = context.Lock()
+
+    @staticmethod
+    def _digest(item_id):
+        digest = hashlib.blake2b(str(item_id).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') or 1
+
+    def set(self, item_id, keep_partials=False):
+        """标记任务已取消。返回是否成功 (槽位已满时返回 False，该尝试只能等待自然结束)。"""
+        digest = self._digest(item_id)
+        with self._lock:
+            free = None
+            for index, value in enumerate(self._values):
+                if value == digest:
+                    return True
+                if not value and free is None:
+                    free = index
+            if free is None:
+                return False
+            self._keep[free] = 1 if keep_partials else 0
+            self._values[free] = digest
+            return True
+
+    def clear(self, item_id):
+        digest = self._digest(item_id)
+        with self._lock:
+            for index, value in enumerate(self._values):
+                if value == digest:
+                    self._values[index] = 0
+
+    def is_set(self, item_id):
+        return self.reason(item_id) is not None
+
+    def reason(self, item_id):
+        """返回取消原因 (REASON_USER / REASON_SHUTDOWN)，未取消时返回 None。"""
+        digest = self._digest(item_id)
+        with self._lock:
+            for index, value in enumerate(self._values):
+                if value == digest:
+                    return REASON_SHUTDOWN if self._keep[index] else REASON_USER
+        return None
+
+
+# --- 子进程一侧 ---
+
+class _SharedBandwidthLimiter:
+    """子进程中代替 BandwidthLimiter 的对象 (DownloadService 只调用 consume)。"""
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+
+    def consume(self, platform, nbytes, should_stop=None):
+        if nbytes <= 0:
+            return
+        slot = self._buckets.slot_for(platform)
+        if slot is not None:
+            self._buckets.consume(slot, nbytes, should_stop)
+        self._buckets.consume(0, nbytes, should_stop)
+
+
+class _ForwardingMeter:
+    """子进程中代替 ThroughputMeter 的对象: 累计字节数，定期发送给主进程。"""
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._bytes = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, nbytes):
+        if nbytes <= 0:
+            return
+        self._bytes += nbytes
+        if time.monotonic() - self._last_flush >= BYTES_FORWARD_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if self._bytes:
+            nbytes, self._bytes = self._bytes, 0
+            self._channel.put(('bytes', nbytes))
+
+
+class _ForwardingArchive:
+    """
+    子进程中代替 DownloadArchive 的对象: 新记录交给主进程写入，使主进程的布隆过滤器保持最新。
+    是否已下载由主进程在提交前检查，这里总是返回 False。
+    """
+
+    def __init__(self, channel):
+        self._channel = channel
+
+    def contains(self, key):
+        return False
+
+    def add(self, key, title=None, filepath=None):
+        if key:
+            self._channel.put(('archive', key, title, filepath))
+        return True
+
+
+class _SharedCancelToken:
+    """子进程中代替 CancelToken 的对象 (DownloadService 只读取 cancelled 和 reason)。"""
+
+    def __init__(self, flags, item_id):
+        self._flags = flags
+        self._item_id = item_id
+
+    @property
+    def cancelled(self):
+        return self._flags.is_set(self._item_id)
+
+    @property
+    def reason(self):
+        return self._flags.reason(self._item_id)
+
+
+class _WorkerState:
+    """一个子进程内的下载服务和转发通道 (每个子进程同一时间只执行一个任务)。"""
+
+    def __init__(self, channel, buckets, cancel_flags, service_config):
+        self.channel = channel
+        self.cancel_flags = cancel_flags
+        info_cache = None
+        if service_config.get('info_cache'):
+            try:
+                info_cache = InfoCache(**service_config['info_cache'])
+            except Exception as e:
+                logger.warning("子进程无法打开信息字典缓存，将不使用缓存: %s", e)
+        self.meter = _ForwardingMeter(channel)
+        self.connection_pool = None
+        if service_config.get('connection_pool'):
+            self.connection_pool = ConnectionPool(**service_config['connection_pool'])
+        self.service = DownloadService(
+            default_options=service_config.get('default_options'),
+            info_cache=info_cache,
+            retry_policy=service_config.get('retry_policy'),
+            bandwidth_limiter=_SharedBandwidthLimiter(buckets) if buckets is not None else None,
+            throughput_meter=self.meter if service_config.get('throughput') else None,
+            download_archive=_ForwardingArchive(channel) if service_config.get('archive') else None,
+            defer_postprocessing=service_config.get('defer_postprocessing', False),
+            format_policy=FormatPolicy(service_config.get('remux_first', True)),
+            connection_pool=self.connection_pool)
+        self._last_progress = 0.0
+
+    def forward_progress(self, data):
+        if data.get('status') == 'downloading':
+            now = time.monotonic()
+            if now - self._last_progress < PROGRESS_FORWARD_INTERVAL:
+                return # 主进程的进度总线本来也只保留最新状态，中间的进度可以丢弃
+            self._last_progress = now
+        else:
+            self._last_progress = 0.0
+        self.channel.put(('progress', data))
+
+    def forward_connection_stats(self):
+        delta = self.connection_pool.take_delta() if self.connection_pool is not None else None
+        if delta:
+            self.channel.put(('connections', delta))
+
+
+_worker_state = None
+
+
+def _init_worker(channel, buckets, cancel_flags, service_config):
+    """子进程初始化: 创建本进程的 DownloadService。中断信号由主进程处理。"""
+    global _worker_state
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_state = _WorkerState(channel, buckets, cancel_flags, service_config)
+
+
+def _run_in_worker(item_info):
+    """在子进程中执行一次下载尝试，结束后发送 done 标记 (排在该任务所有进度消息之后)。"""
+    state = _worker_state
+    cancel_token = _SharedCancelToken(state.cancel_flags, item_info.get('id'))
+    try:
+        return state.service.download_item(item_info, state.forward_progress, cancel_token)
+    finally:
+        state.meter.flush()
+        state.forward_connection_stats()
+        state.channel.put(('done', item_info.get('id')))
+
+
+def _prefetch_in_worker(item_info):
+    """在子进程中只提取信息字典并写入缓存 (见 DownloadService.prefetch_info)。"""
+    try:
+        return _worker_state.service.prefetch_info(item_info)
+    finally:
+        _worker_state.forward_connection_stats()
+
+
+# --- 主进程一侧 ---
+
+class ProcessDownloadService:
+    """
+    与 DownloadService 接口相同的下载服务，但每次下载尝试在独立的工作进程中执行。
+
+    yt-dlp 的提取 (正则、JSON 解析、签名解密等) 是纯 Python 的 CPU 密集计算，线程模式下
+    所有下载线程共享一个 GIL；进程模式下提取吞吐量随 CPU 核数增长。调度器线程只负责提交并
+    等待结果，进度事件经 multiprocessing 队列 (管道) 转发回同一个 progress_callback。
+
+    共享组件在进程模式下的处理:
+      - 带宽限制: 全局和各平台的令牌桶放在共享内存中，所有进程共同扣减，限速仍对总速率生效；
+      - 吞吐量统计和下载存档: 子进程汇报给主进程，由主进程写入 (存档的布隆过滤器只在主进程中)；
+      - 信息字典缓存: 每个进程打开同一个 SQLite 文件 (WAL 模式，支持多进程并发访问)；
+      - 取消: 任务的 CancelToken 被取消时写入共享的取消标志，子进程的进度钩子据此中止传输；
+      - 连接复用: 每个子进程有自己的共享网络会话和 DNS 缓存，连接统计汇报给主进程的连接池合并。
+
+    预取 (prefetch_info) 使用单独的小进程池 (首次预取时创建)，不与下载尝试排同一个队列，
+    因此等待预取的下载尝试 (ExtractionPrefetcher.claim) 不会被排在前面的传输阻塞。
+    """
+
+    def __init__(self, processes=None, info_cache=None, retry_policy=None, bandwidth_limiter=None,
+                 throughput_meter=None, download_archive=None, default_options=None, defer_postprocessing=False,
+                 format_policy=None, connection_pool=None, prefetch_processes=DEFAULT_PREFETCH_PROCESSES):
+        """
+        参数:
+            processes (int | None): 工作进程数，默认等于 CPU 核数。
+            info_cache (InfoCache | None): 主进程的信息字典缓存，子进程按相同参数打开同一个文件。
+            retry_policy (RetryPolicy | None): 重试策略 (复制到子进程)。
+            bandwidth_limiter (BandwidthLimiter | None): 主进程的带宽限制器，限速定期同步到共享令牌桶。
+            throughput_meter (ThroughputMeter | None): 聚合吞吐量计数器，由子进程汇报的字节数驱动。
+            download_archive (DownloadArchive | None): 下载存档，在主进程中检查和写入。
+            default_options (dict | None): 覆盖默认 yt-dlp 选项。
+            defer_postprocessing (bool): 见 DownloadService；后处理作业随结果传回主进程的后处理队列。
+            format_policy (FormatPolicy | None): 格式策略，子进程按相同设置创建 (不延迟后处理时，
+                                                 子进程中的容器转换不计入主进程的统计)。
+            connection_pool (ConnectionPool | None): 主进程的连接池；子进程按相同设置创建自己的连接池，
+                                                     连接统计合并到这里。
+            prefetch_processes (int): 预取进程池的进程数，0 表示不预取 (prefetch_info 直接返回 'skipped')。
+        """
+        self.processes = max(1, int(processes or os.cpu_count() or 1))
+        self.prefetch_processes = max(0, int(prefetch_processes))
+        self.info_cache = info_cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.bandwidth_limiter = bandwidth_limiter
+        self.throughput_meter = throughput_meter
+        self.download_archive = download_archive
+        self.connection_pool = connection_pool
+
+        # 使用 spawn 启动子进程: 在已有 Tk 和多个线程的进程中 fork 并不安全，且与 Windows 行为一致
+        self._context = multiprocessing.get_context('spawn')
+        self._channel = self._context.Queue()
+        self._buckets = None
+        if bandwidth_limiter is not None:
+            platforms = bandwidth_limiter.get_stats()['platform_limits_kbps']
+            self._buckets = SharedTokenBuckets(self._context, platforms)
+            self._buckets.sync_from(bandwidth_limiter)
+        self._cancel_flags = SharedCancelFlags(self._context)
+        self._service_config = {
+            'default_options': default_options,
+            'info_cache': self._info_cache_options(info_cache),
+            'retry_policy': self.retry_policy,
+            'throughput': throughput_meter is not None,
+            'archive': download_archive is not None,
+            'defer_postprocessing': defer_postprocessing,
+            'remux_first': format_policy.remux_first if format_policy is not None else True,
+            'connection_pool': connection_pool.worker_config() if connection_pool is not None else None,
+        }
+
+        self._lock = threading.Lock()
+        self._callbacks = {} # item_id -> (progress_callback, done_event)
+        self._stats = {'attempts': 0, 'progress_messages': 0, 'bytes_messages': 0, 'archived': 0,
+                       'dropped_messages': 0, 'pool_restarts': 0, 'cancelled': 0}
+        self._closed = False
+        self._executor = self._create_executor()
+        self._prefetch_executor = None # 首次预取时创建
+        self._forwarder = threading.Thread(target=self._forward_loop, name='ProcessProgressForwarder', daemon=True)
+        self._forwarder.start()
+        logger.info("下载进程池已创建: %d 个工作进程", self.processes)
+
+    @classmethod
+    def from_config(cls, get_config, **components):
+        """
+        根据配置创建进程模式下载服务。
+
+        参数:
+            get_config (callable): 形如 ConfigManager.get_config(key, default) 的函数。
+            **components: 传给构造函数的共享组件 (info_cache、retry_policy 等)。
+        """
+        try:
+            processes = max(0, int(get_config('process_workers', 0) or 0))
+        except (ValueError, TypeError):
+            print("警告: 配置中的 'process_workers' 值无效，将使用 CPU 核数。")
+            processes = 0
+        try: # 预取进程数与预取线程数一致 (无效值由 ExtractionPrefetcher.from_config 提示)
+            components.setdefault('prefetch_processes',
+                                  max(0, int(get_config('prefetch_workers', DEFAULT_PREFETCH_PROCESSES))))
+        except (ValueError, TypeError):
+            pass
+        return cls(processes or None, **components)
+
+    def download_item(self, item_info, progress_callback, cancel_token=None):
+        """
+        在工作进程中执行一次下载尝试 (阻塞调用线程直到结果返回)，返回值与 DownloadService.download_item 相同。
+        cancel_token 被取消时，尚未开始的尝试不再执行，正在执行的尝试在子进程的下一次进度回调时中止。
+        """
+        item_id = item_info.get('id')
+        url = item_info.get('url')
+        if self.download_archive and url and not item_info.get('ignore_archive'):
+            if self.download_archive.contains(archive_key_for_url(url)):
+                logger.info("任务 [%s] 已在下载存档中，跳过下载: %s", item_id, url)
+                progress_callback({'id': item_id, 'status': 'finished', 'description': '已下载 (下载存档中有记录)'})
+                return {'id': item_id, 'status': 'finished', 'skipped': 'archived'}
+
+        if cancel_token is not None and cancel_token.cancelled:
+            return cancelled_result(item_id, progress_callback, keeps_partials(cancel_token))
+
+        done = threading.Event()
+        with self._lock:
+            self._callbacks[item_id] = (progress_callback, done)
+            executor = self._executor
+            self._stats['attempts'] += 1
+        future = None
+        on_cancel = lambda token: self._cancel_attempt(item_id, future, keeps_partials(token))
+        try:
+            try:
+                future = executor.submit(_run_in_worker, dict(item_info))
+                if cancel_token is not None:
+                    cancel_token.add_callback(on_cancel)
+                result = future.result()
+            except CancelledError: # 取消时尚未开始执行
+                return cancelled_result(item_id, progress_callback, keeps_partials(cancel_token))
+            except BrokenProcessPool as e:
+                self._replace_broken_executor(executor)
+                return self._worker_lost_result(item_info, progress_callback, e)
+            except RuntimeError as e: # 进程池已关闭
+                return {'id': item_id, 'status': 'error', 'error_message': f"下载进程池不可用: {e}"}
+            # 等待该任务剩余的进度消息 (包括最终状态) 转发完毕，之后的消息不再属于这次尝试
+            done.wait(DONE_MARKER_TIMEOUT)
+            return result
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(on_cancel)
+                self._cancel_flags.clear(item_id)
+            with self._lock:
+                self._callbacks.pop(item_id, None)
+
+    def prefetch_info(self, item_info):
+        """在预取进程池中提取信息字典 (流水线的提取阶段)，返回值与 DownloadService.prefetch_info 相同。"""
+        url = item_info.get('url')
+        if self.download_archive and url and self.download_archive.contains(archive_key_for_url(url)):
+            return 'skipped'
+        with self._lock:
+            if self._closed or self.prefetch_processes <= 0:
+                return 'skipped'
+            if self._prefetch_executor is None:
+                self._prefetch_executor = self._create_executor(self.prefetch_processes)
+            executor = self._prefetch_executor
+        try:
+            return executor.submit(_prefetch_in_worker, dict(item_info)).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._prefetch_executor is executor:
+                    self._prefetch_executor = None # 下次预取时重新创建
+            executor.shutdown(wait=False, cancel_futures=True)
+            return 'failed'
+        except RuntimeError: # 进程池已关闭
+            return 'skipped'
+
+    def download_item_with_retries(self, item_info, progress_callback, cancel_token=None):
+        """同步执行下载并在当前线程内完成全部重试 (见 DownloadService.download_item_with_retries)。"""
+        item_info = dict(item_info)
+        while True:
+            result = self.download_item(item_info, progress_callback, cancel_token)
+            if result.get('status') != 'retry':
+                return result
+            if cancel_token is not None:
+                if cancel_token.wait(result.get('retry_delay', 0)):
+                    return cancelled_result(item_info.get('id'), progress_callback, keeps_partials(cancel_token))
+            else:
+                time.sleep(result.get('retry_delay', 0))
+            item_info['attempt'] = result.get('attempt', 0) + 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._callbacks)
+        stats['processes'] = self.processes
+        stats['prefetch_processes'] = self.prefetch_processes
+        return stats
+
+    def close(self, wait=True):
+        """关闭进程池和转发线程。wait=False 时不等待正在执行的尝试结束。"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            executors = [executor for executor in (self._executor, self._prefetch_executor) if executor is not None]
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            if not wait:
+                # 与线程模式下退出进程即终止下载一致: 不等待正在执行的尝试，直接结束工作进程
+                # (ProcessPoolExecutor 在 3.14 之前没有公开的终止接口)
+                for process in list((getattr(executor, '_processes', None) or {}).values()):
+                    process.terminate()
+        self._channel.put(None)
+        self._forwarder.join(timeout=DONE_MARKER_TIMEOUT)
+        logger.info("下载进程池已关闭: %s", self.get_stats())
+
+    # --- Internal Helpers ---
+
+    @staticmethod
+    def _info_cache_options(info_cache):
+        if info_cache is None:
+            return None
+        return {'db_path': info_cache.db_path, 'max_bytes': info_cache.max_bytes,
+                'platform_ttls': info_cache.platform_ttls, 'default_ttl': info_cache.default_ttl,
+                'failure_ttl': info_cache.failure_ttl}
+
+    def _create_executor(self, processes=None):
+        return ProcessPoolExecutor(max_workers=processes or self.processes, mp_context=self._context,
+                                   initializer=_init_worker,
+                                   initargs=(self._channel, self._buckets, self._cancel_flags, self._service_config))
+
+    def _replace_broken_executor(self, broken):
+        """工作进程意外退出 (崩溃、被系统杀死) 后整个进程池不可用，重建一个新的 (只重建一次)。"""
+        with self._lock:
+            if self._closed or self._executor is not broken:
+                return
+            logger.error("下载工作进程意外退出，重建进程池")
+            self._executor = self._create_executor()
+            self._stats['pool_restarts'] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel_attempt(self, item_id, future, keep_partials=False):
+        """CancelToken 的回调 (在请求取消的线程中调用): 撤回尚未开始的尝试，或通知子进程中止。"""
+        with self._lock:
+            self._stats['cancelled'] += 1
+        if future is not None and future.cancel():
+            return
+        if not self._cancel_flags.set(item_id, keep_partials):
+            logger.warning("取消标志槽位已满，任务 [%s] 的下载将继续到结束", item_id)
+
+    def _worker_lost_result(self, item_info, progress_callback, error):
+        """工作进程意外退出时按临时错误处理，由重试策略决定是否重试。"""
+        item_id = item_info.get('id')
+        attempt = int(item_info.get('attempt', 0) or 0)
+        error_message = f"下载进程意外退出: {error}"
+        if self.retry_policy.should_retry(attempt, TRANSIENT):
+            delay = self.retry_policy.delay_for(attempt, TRANSIENT)
+            progress_callback({'id': item_id, 'status': 'retrying',
+                               'description': f'等待 {delay:.0f}s 后重试 ({attempt + 2}/{self.retry_policy.max_retries + 1})'})
+            return {'id': item_id, 'status': 'retry', 'attempt': attempt, 'retry_delay': delay,
+                    'error_message': error_message, 'error_category': TRANSIENT}
+        progress_callback({'id': item_id, 'status': 'error', 'description': error_message[:100]})
+        return {'id': item_id, 'status': 'error', 'error_message': error_message, 'error_category': TRANSIENT}
+
+    def _forward_loop(self):
+        """转发线程: 把子进程发来的消息分发到进度回调、吞吐量计数器和下载存档，并定期同步限速。"""
+        next_sync = time.monotonic() + BANDWIDTH_SYNC_INTERVAL
+        while True:
+            try:
+                message = self._channel.get(timeout=BANDWIDTH_SYNC_INTERVAL)
+            except queue.Empty:
+                message = ()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            if message:
+                try:
+                    self._dispatch(message)
+                except Exception as e:
+                    logger.error("转发子进程消息时出错 (%s): %s", message[0], e, exc_info=True)
+            if self._buckets is not None and time.monotonic() >= next_sync:
+                next_sync = time.monotonic() + BANDWIDTH_SYNC_INTERVAL
+                self._buckets.sync_from(self.bandwidth_limiter)
+
+    def _dispatch(self, message):
+        kind = message[0]
+        if kind == 'progress':
+            data = message[1]
+            with self._lock:
+                entry = self._callbacks.get(data.get('id'))
+                self._stats['progress_messages' if entry else 'dropped_messages'] += 1
+            if entry:
+                entry[0](data)
+        elif kind == 'done':
+            with self._lock:
+                entry = self._callbacks.get(message[1])
+            if entry:
+                entry[1].set()
+        elif kind == 'bytes':
+            with self._lock:
+                self._stats['bytes_messages'] += 1
+            if self.throughput_meter is not None:
+                self.throughput_meter.add(message[1])
+        elif kind == 'connections':
+            if self.connection_pool is not None:
+                self.connection_pool.merge(message[1])
+        elif kind == 'archive':
+            _, key, title, filepath = message
+            if self.download_archive is not None and self.download_archive.add(key, title=title, filepath=filepath):
+                with self._lock:
+                    self._stats['archived'] += 1
@@ -0,0 +1,88 @@
+# core/progress_bus.py - Coalescing progress channel from worker threads to the UI
+import threading
+import time
+
+
+class ProgressBus:
+    """
+    下载线程到 UI 线程的合并式进度通道。
+
+    工作线程调用 publish() 写入进度，每个任务只保留最新状态 (分片字典 + 分片锁，
+    降低多线程竞争)；UI 线程定时调用 drain() 一次性取走所有待应用的状态。
+    在两次 drain 之间被覆盖的事件计为"合并"，UI 丢弃的事件 (例如任务已移除) 通过
+    record_dropped() 计入，以便调整刷新间隔。
+    """
+
+    def __init__(self, shard_count=16):
+        """
+        参数:
+            shard_count (int): 分片数量，越大竞争越少。
+        """
+        self._shard_count = max(1, int(shard_count))
+        self._shards = [{} for _ in range(self._shard_count)]
+        self._locks = [threading.Lock() for _ in range(self._shard_count)]
+        # 计数器按分片保存，在各自的锁内递增，读取时汇总
+        self._published = [0] * self._shard_count
+        self._coalesced = [0] * self._shard_count
+        self._stats_lock = threading.Lock()
+        self._drains = 0
+        self._drained_items = 0
+        self._dropped = 0
+        self._max_batch = 0
+        self._last_drain_duration = 0.0
+
+    def publish(self, progress_data):
+        """写入一个任务的最新进度 (可在任意线程调用)。缺少 id 的数据返回 False。"""
+        item_id = progress_data.get('id')
+        if not item_id:
+            return False
+        index = hash(item_id) % self._shard_count
+        with self._locks[index]:
+            shard = self._shards[index]
+            if item_id in shard:
+                self._coalesced[index] += 1
+            shard[item_id] = progress_data
+            self._published[index] += 1
+        return True
+
+    def drain(self):
+        """取走所有待应用的进度 (UI 线程调用)，返回进度字典列表。"""
+        started = time.perf_counter()
+        batch = []
+        for index in range(self._shard_count):
+            with self._locks[index]:
+                if not self._shards[index]:
+                    continue
+                shard = self._shards[index]
+                self._shards[index] = {}
+            batch.extend(shard.values())
+        with self._stats_lock:
+            self._drains += 1
+            self._drained_items += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._last_drain_duration = time.perf_counter() - started
+        return batch
+
+    def record_dropped(self, count=1):
+        """记录被 UI 丢弃的事件数量。"""
+        with self._stats_lock:
+            self._dropped += count
+
+    def get_stats(self):
+        """返回发布、合并、丢弃等计数，用于调整刷新间隔。"""
+        published = coalesced = 0
+        for index in range(self._shard_count):
+            with self._locks[index]:
+                published += self._published[index]
+                coalesced += self._coalesced[index]
+        with self._stats_lock:
+            return {
+                'published': published,
+                'coalesced': coalesced,
+                'dropped': self._dropped,
+                'drains': self._drains,
+                'drained_items': self._drained_items,
+                'max_batch': self._max_batch,
+                'last_drain_ms': self._last_drain_duration * 1000,
+                'coalesce_ratio': (coalesced / published) if published else 0.0,
+            }
@@ -0,0 +1,203 @@
+# core/queue_journal.py - Crash-safe append-only journal of the download queue
+import os
+import json
+import time
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FORMAT_VERSION = 1
+DEFAULT_COMPACT_EVENTS = 10000 # 自上次压缩以来的事件数超过该值 (且超过任务数的 2 倍) 时压缩
+_STOP = object()
+
+
+class QueueJournal:
+    """
+    下载队列的追加写入日志 (JSON Lines)。
+
+    每行一个事件:
+      {"op": "put", "task": {...}}      新增任务或任务的持久化字段发生变化 (整条记录)
+      {"op": "remove", "ids": [...]}    移除任务
+      {"op": "snapshot", ...}           压缩后文件的第一行
+    事件由调用方放入队列，后台线程顺序写入并在队列清空时 flush，进程崩溃或被强制结束时
+    最多丢失尚未写入的最后几条事件；最后一行写到一半时重放会忽略它。
+    压缩时把当前所有任务写入临时文件，fsync 后原子替换日志文件。
+    """
+
+    def __init__(self, path, compact_events=DEFAULT_COMPACT_EVENTS):
+        """
+        参数:
+            path (str): 日志文件路径。
+            compact_events (int): 触发压缩的最少事件数。
+        """
+        self.path = path
+        self.compact_events = max(100, int(compact_events))
+        self._events_since_compact = 0
+        self._stats = {'events': 0, 'compactions': 0, 'replayed': 0, 'corrupt_lines': 0}
+        self._stats_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        torn_tail = self._ends_with_partial_line(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn_tail:
+            self._file.write('\n') # 上次崩溃时写到一半的行单独成行，避免与新事件粘连
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='QueueJournalWriter', daemon=True)
+        self._writer.start()
+
+    def exists(self):
+        """日志文件是否已有内容 (为空时调用方可以从旧的队列文件迁移)。"""
+        try:
+            return os.path.getsize(self.path) > 0
+        except OSError:
+            return False
+
+    def replay(self):
+        """
+        读取日志并重放事件，返回任务字典列表 (按首次加入的顺序)。
+        """
+        tasks = {}
+        corrupt = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                        op = event.get('op')
+                        if op == 'put':
+                            task = event['task']
+                            existing = tasks.get(task['id'])
+                            if existing is None:
+                                tasks[task['id']] = task
+                            else:
+                                existing.update(task)
+                        elif op == 'remove':
+                            for task_id in event.get('ids', ()):
+                                tasks.pop(task_id, None)
+                        elif op == 'snapshot':
+                            tasks.clear()
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        corrupt += 1 # 通常是崩溃时写到一半的最后一行
+        except FileNotFoundError:
+            return []
+        if corrupt:
+            logger.warning("队列日志 %s 中有 %d 行无法解析，已忽略", self.path, corrupt)
+        with self._stats_lock:
+            self._stats['replayed'] += len(tasks)
+            self._stats['corrupt_lines'] += corrupt
+        self._events_since_compact = len(tasks)
+        return list(tasks.values())
+
+    def record(self, tasks=(), removed_ids=()):
+        """
+        记录事件 (任意线程调用，不阻塞)。
+
+        参数:
+            tasks (iterable): 新增或变化的任务字典 (必须包含 id)。
+            removed_ids (iterable): 被移除的任务 id。
+        """
+        if self._closed:
+            return
+        lines = [json.dumps({'op': 'put', 'task': task}, ensure_ascii=False) for task in tasks]
+        removed_ids = list(removed_ids)
+        if removed_ids:
+            lines.append(json.dumps({'op': 'remove', 'ids': removed_ids}, ensure_ascii=False))
+        if lines:
+            self._events_since_compact += len(lines)
+            self._queue.put(lines)
+
+    def needs_compaction(self, live_tasks):
+        """事件数超过阈值且明显多于当前任务数时返回 True。"""
+        return self._events_since_compact > max(self.compact_events, 2 * live_tasks)
+
+    def compact(self, tasks):
+        """
+        用当前任务快照替换日志 (在写入线程中执行，之前排队的事件先写入旧文件)。
+
+        参数:
+            tasks (list): 当前所有需要保留的任务字典。
+        """
+        if self._closed:
+            return
+        self._events_since_compact = len(tasks)
+        self._queue.put(('compact', list(tasks)))
+
+    def flush(self):
+        """等待已排队的事件 (和压缩) 全部写入磁盘。"""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """写入剩余事件并关闭日志。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['events_since_compact'] = self._events_since_compact
+        return stats
+
+    # --- Internal Helpers ---
+
+    @staticmethod
+    def _ends_with_partial_line(path):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b'\n'
+        except OSError:
+            return False
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._file.close()
+                    return
+                if isinstance(item, tuple):
+                    self._write_snapshot(item[1])
+                else:
+                    self._file.write('\n'.join(item) + '\n')
+                    with self._stats_lock:
+                        self._stats['events'] += len(item)
+                if self._queue.empty():
+                    self._file.flush()
+            except (OSError, ValueError) as e:
+                logger.error("写入队列日志 %s 失败: %s", self.path, e)
+            finally:
+                self._queue.task_done()
+
+    def _write_snapshot(self, tasks):
+        started = time.monotonic()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'snapshot', 'version': JOURNAL_FORMAT_VERSION, 'time': time.time(),
+                                'count': len(tasks)}) + '\n')
+            for task in tasks:
+                f.write(json.dumps({'op': 'put', 'task': task}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close() # Windows 上不能替换仍处于打开状态的文件
+        try:
+            os.replace(tmp_path, self.path)
+        finally:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        with self._stats_lock:
+            self._stats['compactions'] += 1
+        logger.info("队列日志已压缩: %d 个任务 (%.2f 秒)", len(tasks), time.monotonic() - started)
@@ -0,0 +1,167 @@
+# core/retry_scheduler.py - Retry backoff policy and delayed (timer heap) task queue
+import heapq
+import itertools
+import random
+import threading
+import time
+import logging
+
+from core.error_classifier import PERMANENT, RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """指数退避 + 随机抖动的重试策略。"""
+
+    def __init__(self, max_retries=2, base_delay=3.0, multiplier=2.0, max_delay=60.0, jitter=0.2,
+                 rate_limit_scale=4.0):
+        """
+        参数:
+            max_retries (int): 首次尝试之外的最大重试次数。
+            base_delay (float): 第一次重试前的基础等待秒数。
+            multiplier (float): 每次重试等待时间的增长倍数。
+            max_delay (float): 单次等待的上限秒数。
+            jitter (float): 抖动比例 (0~1)，实际等待在 delay*(1±jitter) 之间随机取值，
+                            避免大量任务在同一时刻集中重试。
+            rate_limit_scale (float): 被限流 (RATE_LIMITED) 时等待时间的放大倍数。
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = max(0.0, float(base_delay))
+        self.multiplier = max(1.0, float(multiplier))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.jitter = min(1.0, max(0.0, float(jitter)))
+        self.rate_limit_scale = max(1.0, float(rate_limit_scale))
+
+    @classmethod
+    def from_config(cls, get_config):
+        """
+        根据配置创建策略，无效值回退到默认值。
+
+        参数:
+            get_config (callable): 形如 ConfigManager.get_config(key, default) 的函数。
+        """
+        defaults = cls()
+        values = {}
+        for key, attr, cast in (('retry_max_retries', 'max_retries', int),
+                                ('retry_base_delay', 'base_delay', float),
+                                ('retry_multiplier', 'multiplier', float),
+                                ('retry_max_delay', 'max_delay', float),
+                                ('retry_jitter', 'jitter', float),
+                                ('retry_rate_limit_scale', 'rate_limit_scale', float)):
+            try:
+                values[attr] = cast(get_config(key, getattr(defaults, attr)))
+            except (ValueError, TypeError):
+                print(f"警告: 配置中的 '{key}' 值无效，将使用默认值 {getattr(defaults, attr)}。")
+                values[attr] = getattr(defaults, attr)
+        return cls(**values)
+
+    def should_retry(self, attempt, category=None):
+        """
+        attempt 为刚失败的尝试序号 (从 0 开始)，返回是否还允许重试。
+        永久性错误 (category == 'permanent') 不重试。
+        """
+        if category == PERMANENT:
+            return False
+        return attempt < self.max_retries
+
+    def delay_for(self, attempt, category=None):
+        """根据错误类别返回等待秒数，被限流时使用更长的退避。"""
+        return self.next_delay(attempt, self.rate_limit_scale if category == RATE_LIMITED else 1.0)
+
+    def next_delay(self, attempt, scale=1.0):
+        """
+        返回第 attempt 次尝试 (从 0 开始) 失败后的等待秒数。
+
+        参数:
+            scale (float): 额外的放大系数 (例如被限流时使用更长的等待)。
+        """
+        delay = min(self.max_delay, self.base_delay * (self.multiplier ** attempt)) * scale
+        if self.jitter:
+            delay *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        return max(0.0, delay)
+
+
+class DelayedTaskQueue:
+    """
+    按到期时间排序的延迟任务队列 (最小堆 + 单个定时线程)。
+
+    到期的任务在定时线程中调用，调用方应只做轻量操作 (例如重新提交到线程池)，
+    从而让等待中的重试不占用下载线程池的工作线程。
+    """
+
+    def __init__(self, name='DelayedTaskQueue'):
+        self._heap = []
+        self._keys = {} # key -> 堆条目，用于按键取消
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def schedule(self, delay, func, *args, key=None):
+        """
+        在 delay 秒后调用 func(*args)。
+
+        参数:
+            key: 可选的任务键；同一键再次调度会替换之前未到期的任务，也可用于 cancel()。
+        返回:
+            bool: 队列已关闭时返回 False。
+        """
+        entry = [time.monotonic() + max(0.0, delay), next(self._counter), key, func, args, True]
+        with self._condition:
+            if self._stopped:
+                return False
+            if key is not None:
+                old_entry = self._keys.pop(key, None)
+                if old_entry: old_entry[5] = False # 标记失效，出堆时跳过
+                self._keys[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._condition.notify()
+        return True
+
+    def cancel(self, key):
+        """取消指定键的未到期任务，返回是否找到。"""
+        with self._condition:
+            entry = self._keys.pop(key, None)
+            if entry:
+                entry[5] = False
+                self._condition.notify()
+                return True
+        return False
+
+    def pending_count(self):
+        with self._condition:
+            return sum(1 for entry in self._heap if entry[5])
+
+    def shutdown(self):
+        """停止定时线程并丢弃所有未到期任务。"""
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._keys.clear()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    while self._heap and not self._heap[0][5]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                entry = heapq.heappop(self._heap)
+                key = entry[2]
+                if key is not None and self._keys.get(key) is entry:
+                    del self._keys[key]
+            try:
+                entry[3](*entry[4])
+            except Exception as e:
+                logger.error("延迟任务执行出错 (key=%s): %s", key, e, exc_info=True)
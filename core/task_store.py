@@ -0,0 +1,472 @@
+# core/task_store.py - Authoritative in-memory store of download tasks
+import collections
+import itertools
+import re
+import threading
+
+# --- 任务状态 (规范值) ---
+PENDING = 'pending'         # 待下载
+QUEUED = 'queued'           # 已提交，等待调度
+PREPARING = 'preparing'     # 正在提取信息
+DOWNLOADING = 'downloading' # 正在下载
+POSTPROCESSING = 'postprocessing' # 下载完成，等待或正在后处理 (转码/转封装)
+RETRYING = 'retrying'       # 等待重试
+WAITING = 'waiting'         # 等待平台并发名额或限流恢复
+FINISHED = 'finished'       # 已完成
+ERROR = 'error'             # 出错
+CANCELLED = 'cancelled'     # 已取消
+
+ALL_STATUSES = (PENDING, QUEUED, PREPARING, DOWNLOADING, POSTPROCESSING, RETRYING, WAITING, FINISHED, ERROR,
+                CANCELLED)
+# 可以 (重新) 开始下载的状态
+STARTABLE_STATUSES = (PENDING, ERROR, CANCELLED)
+# 已提交、尚未结束的状态
+ACTIVE_STATUSES = (QUEUED, PREPARING, DOWNLOADING, POSTPROCESSING, RETRYING, WAITING)
+
+# 状态在下载列表中的显示文本 (DOWNLOADING 显示百分比)
+STATUS_LABELS = {
+    PENDING: '待下载',
+    QUEUED: '[...]',
+    PREPARING: '[...]',
+    DOWNLOADING: '0%',
+    POSTPROCESSING: '[后处理]',
+    RETRYING: '[重试中...]',
+    WAITING: '[等待]',
+    FINISHED: '[OK]',
+    ERROR: '[ERR]',
+    CANCELLED: '[CAN]',
+}
+
+# 旧版本保存的显示文本到规范状态的映射 (加载 download_queue.json 时使用)
+_LEGACY_LABELS = {
+    '待下载': PENDING, '准备下载': PENDING, '[...]': PENDING, '[...] ': PENDING,
+    '[重试中...]': PENDING, '[等待]': PENDING,
+    '[OK]': FINISHED,
+    '[ERR]': ERROR, '下载出错': ERROR,
+    '[CAN]': CANCELLED, '已取消': CANCELLED,
+}
+
+
+# 排序时的状态顺序: 进行中的任务在前，已完成的在后
+_STATUS_SORT_ORDER = {status: index for index, status in enumerate(
+    (DOWNLOADING, POSTPROCESSING, PREPARING, QUEUED, RETRYING, WAITING, PENDING, ERROR, CANCELLED, FINISHED))}
+
+_SIZE_PATTERN = re.compile(r'^\s*([\d.]+)\s*([KMGT]?i?B)?', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4,
+               'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4}
+
+
+def parse_size(text):
+    """将 yt-dlp 的大小字符串 (例如 '10.5MiB') 转换为字节数，无法解析时返回 -1。"""
+    match = _SIZE_PATTERN.match(str(text or ''))
+    if not match:
+        return -1
+    try:
+        return float(match.group(1)) * _SIZE_UNITS.get((match.group(2) or '').lower(), 1)
+    except ValueError:
+        return -1
+
+
+def normalize_status(value):
+    """将规范状态或旧版本的显示文本转换为规范状态，无法识别时返回 PENDING。"""
+    if value in ALL_STATUSES:
+        return value
+    return _LEGACY_LABELS.get(value, PENDING)
+
+
+class TaskRecord:
+    """一个下载任务的记录 (槽位存储，字段固定)。"""
+
+    __slots__ = ('slot', 'seq', 'id', 'url', 'platform', 'status', 'selected', 'filename', 'size',
+                 'progress', 'eta', 'speed', 'description', 'filepath', 'error_category', 'partial')
+
+    # 可通过 TaskStore.update() 修改的字段
+    MUTABLE_FIELDS = frozenset(('status', 'selected', 'filename', 'size', 'progress', 'eta', 'speed',
+                                'description', 'filepath', 'error_category', 'partial'))
+    # 需要持久化的字段 (进度、剩余时间和速度变化频繁，不持久化)
+    PERSISTED_FIELDS = frozenset(('status', 'selected', 'filename', 'size', 'description', 'filepath',
+                                  'error_category', 'partial'))
+
+    def __init__(self, slot, seq, task_id, url, platform, status=PENDING, selected=True, filename='',
+                 size='未知', description=''):
+        self.slot = slot
+        self.seq = seq
+        self.id = task_id
+        self.url = url
+        self.platform = platform
+        self.status = status
+        self.selected = selected
+        self.filename = filename
+        self.size = size
+        self.progress = ''
+        self.eta = ''
+        self.speed = ''
+        self.description = description
+        self.filepath = None
+        self.error_category = None
+        self.partial = None # 未完成的 .part 文件检查点列表 (见 core.partial_download)，用于重启后续传
+
+    @property
+    def status_label(self):
+        if self.status == DOWNLOADING and self.progress:
+            return self.progress
+        return STATUS_LABELS.get(self.status, self.status)
+
+    def to_persist_dict(self):
+        """需要持久化的字段 (用于队列日志)。"""
+        return {'id': self.id, 'url': self.url, 'platform': self.platform, 'status': self.status,
+                'selected': self.selected, 'filename': self.filename, 'size': self.size,
+                'description': self.description, 'filepath': self.filepath,
+                'error_category': self.error_category, 'partial': self.partial}
+
+    def to_dict(self):
+        return {'id': self.id, 'url': self.url, 'platform': self.platform, 'status': self.status,
+                'selected': self.selected, 'filename': self.filename, 'size': self.size,
+                'progress': self.progress, 'eta': self.eta, 'speed': self.speed,
+                'description': self.description, 'filepath': self.filepath,
+                'error_category': self.error_category, 'partial': self.partial}
+
+
+class TaskStore:
+    """
+    下载任务的唯一数据源。
+
+    记录保存在槽位列表中 (删除后的槽位会被复用)，并按 id、状态、平台和勾选状态建立索引，
+    选择、统计和持久化都通过索引完成，不需要遍历界面控件。所有方法都是线程安全的。
+
+    界面是存储的投影：take_changes() 返回自上次调用以来新增/修改和删除的任务 id，
+    由界面按需刷新对应的行。其他读取方 (例如 HTTP 接口) 可以用 open_change_feed() 打开
+    独立的变化通道，互不影响。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._slots = []  # slot -> TaskRecord | None
+        self._free_slots = []
+        self._seq = itertools.count()
+        self._by_id = {}  # id -> slot
+        self._by_status = collections.defaultdict(set)  # status -> {id}
+        self._by_platform = collections.defaultdict(set)  # platform -> {id}
+        self._selected = set()
+        self._changed = {}  # 有序集合: 自上次 take_changes() 以来新增或修改的 id
+        self._removed = {}  # 有序集合: 自上次 take_changes() 以来删除的 id
+        self._persist_changed = {}  # 有序集合: 持久化字段发生变化、尚未写入队列日志的 id
+        self._persist_removed = {}  # 有序集合: 已删除、尚未写入队列日志的 id
+        self._feeds = {}  # 变化通道: feed_id -> [changed 有序集合, removed 有序集合]
+        self._feed_ids = itertools.count(1)
+        self.version = 0  # 每次新增或删除任务时递增，视图据此判断是否需要重新查询
+
+    # --- 增删改 ---
+
+    def add(self, task_id, url, platform, status=PENDING, selected=True, **fields):
+        """
+        新增任务。id 已存在时不做修改。
+
+        返回:
+            bool: 是否新增。
+        """
+        with self._lock:
+            if task_id in self._by_id:
+                return False
+            slot = self._free_slots.pop() if self._free_slots else len(self._slots)
+            record = TaskRecord(slot, next(self._seq), task_id, url, platform, normalize_status(status), bool(selected))
+            for name, value in fields.items():
+                if name in TaskRecord.MUTABLE_FIELDS:
+                    setattr(record, name, value)
+            if slot == len(self._slots):
+                self._slots.append(record)
+            else:
+                self._slots[slot] = record
+            self._by_id[task_id] = slot
+            self._by_status[record.status].add(task_id)
+            self._by_platform[platform].add(task_id)
+            if record.selected:
+                self._selected.add(task_id)
+            self._removed.pop(task_id, None)
+            self._changed[task_id] = None
+            self._persist_changed[task_id] = None
+            self._mark_feeds(task_id)
+            self.version += 1
+            return True
+
+    def add_many(self, tasks):
+        """
+        批量新增任务 (只获取一次锁)，用于加载持久化队列等大批量场景。
+
+        参数:
+            tasks (iterable): 字典序列，必须包含 id、url、platform，
+                              可选 status、selected、filename、size、description。
+        返回:
+            list: 新增任务的 id 列表 (已存在的 id 被跳过)。
+        """
+        added = []
+        with self._lock:
+            by_id, slots, free_slots = self._by_id, self._slots, self._free_slots
+            for task in tasks:
+                task_id = task['id']
+                if task_id in by_id:
+                    continue
+                slot = free_slots.pop() if free_slots else len(slots)
+                record = TaskRecord(slot, next(self._seq), task_id, task['url'], task['platform'],
+                                    normalize_status(task.get('status', PENDING)), bool(task.get('selected', True)),
+                                    task.get('filename', ''), task.get('size', '未知'), task.get('description', ''))
+                record.filepath = task.get('filepath')
+                record.error_category = task.get('error_category')
+                record.partial = task.get('partial')
+                if slot == len(slots):
+                    slots.append(record)
+                else:
+                    slots[slot] = record
+                by_id[task_id] = slot
+                self._by_status[record.status].add(task_id)
+                self._by_platform[record.platform].add(task_id)
+                if record.selected:
+                    self._selected.add(task_id)
+                self._removed.pop(task_id, None)
+                self._changed[task_id] = None
+                self._persist_changed[task_id] = None
+                self._mark_feeds(task_id)
+                added.append(task_id)
+            if added:
+                self.version += 1
+        return added
+
+    def update(self, task_id, **fields):
+        """
+        修改任务字段并维护索引。
+
+        返回:
+            bool: 任务存在且有字段发生变化时返回 True。
+        """
+        with self._lock:
+            record = self._record(task_id)
+            if record is None:
+                return False
+            changed = False
+            for name, value in fields.items():
+                if name not in TaskRecord.MUTABLE_FIELDS:
+                    raise AttributeError(f"TaskRecord 字段 '{name}' 不可修改")
+                if getattr(record, name) == value:
+                    continue
+                if name in TaskRecord.PERSISTED_FIELDS:
+                    self._persist_changed[task_id] = None
+                if name == 'status':
+                    self._by_status[record.status].discard(task_id)
+                    self._by_status[value].add(task_id)
+                elif name == 'selected':
+                    (self._selected.add if value else self._selected.discard)(task_id)
+                setattr(record, name, value)
+                changed = True
+            if changed:
+                self._changed[task_id] = None
+                self._mark_feeds(task_id)
+            return changed
+
+    def toggle_selected(self, task_id):
+        """切换任务的勾选状态，返回新的状态 (任务不存在时返回 None)。"""
+        with self._lock:
+            record = self._record(task_id)
+            if record is None:
+                return None
+            self.update(task_id, selected=not record.selected)
+            return record.selected
+
+    def remove(self, task_ids):
+        """删除任务，返回实际删除的数量。"""
+        removed = 0
+        with self._lock:
+            for task_id in task_ids:
+                slot = self._by_id.pop(task_id, None)
+                if slot is None:
+                    continue
+                record = self._slots[slot]
+                self._slots[slot] = None
+                self._free_slots.append(slot)
+                self._by_status[record.status].discard(task_id)
+                self._by_platform[record.platform].discard(task_id)
+                self._selected.discard(task_id)
+                self._changed.pop(task_id, None)
+                self._removed[task_id] = None
+                self._persist_changed.pop(task_id, None)
+                self._persist_removed[task_id] = None
+                self._mark_feeds(task_id, removed=True)
+                removed += 1
+            if removed:
+                self.version += 1
+        return removed
+
+    # --- 查询 ---
+
+    def get(self, task_id):
+        """返回任务记录 (调用方不应直接修改)，不存在时返回 None。"""
+        with self._lock:
+            return self._record(task_id)
+
+    def __contains__(self, task_id):
+        with self._lock:
+            return task_id in self._by_id
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    def ids_with_status(self, *statuses):
+        """返回处于指定状态之一的任务 id (按添加顺序)。"""
+        with self._lock:
+            ids = set().union(*(self._by_status.get(status, ()) for status in statuses))
+            return self._in_order(ids)
+
+    def ids_for_platform(self, platform):
+        with self._lock:
+            return self._in_order(self._by_platform.get(platform, ()))
+
+    def selected_ids(self, statuses=None):
+        """返回已勾选的任务 id，可按状态过滤 (按添加顺序)。"""
+        with self._lock:
+            ids = self._selected
+            if statuses is not None:
+                ids = ids & set().union(*(self._by_status.get(status, ()) for status in statuses))
+            return self._in_order(ids)
+
+    def platforms(self):
+        """返回当前有任务的平台名 (排序后)。"""
+        with self._lock:
+            return sorted(platform for platform, ids in self._by_platform.items() if ids)
+
+    def query(self, statuses=None, platform=None, sort_by=None, reverse=False):
+        """
+        按状态和平台过滤并排序，返回任务 id 列表。
+
+        参数:
+            statuses (iterable | None): 只返回这些状态的任务，None 表示不过滤。
+            platform (str | None): 只返回该平台的任务，None 表示不过滤。
+            sort_by (str | None): 'status'、'platform'、'size' 或 'filename'，None 表示按添加顺序。
+            reverse (bool): 是否倒序。
+        """
+        with self._lock:
+            if statuses is None and platform is None:
+                ids = list(self._by_id)  # 字典保持插入顺序，即添加顺序
+            else:
+                candidates = None
+                if statuses is not None:
+                    candidates = set().union(*(self._by_status.get(status, ()) for status in statuses))
+                if platform is not None:
+                    platform_ids = self._by_platform.get(platform, set())
+                    candidates = platform_ids if candidates is None else candidates & platform_ids
+                ids = self._in_order(candidates)
+            if sort_by is not None:
+                key = self._sort_key(sort_by)
+                ids.sort(key=lambda task_id: key(self._slots[self._by_id[task_id]]), reverse=reverse)
+            elif reverse:
+                ids.reverse()
+            return ids
+
+    def count_by_status(self):
+        """返回 {状态: 任务数}，只包含数量大于 0 的状态。"""
+        with self._lock:
+            return {status: len(ids) for status, ids in self._by_status.items() if ids}
+
+    def all_ids(self):
+        with self._lock:
+            return list(self._by_id)
+
+    def export(self, exclude_statuses=(), persist_only=False):
+        """返回任务字典列表 (按添加顺序)，用于持久化；persist_only 为 True 时只包含持久化字段。"""
+        with self._lock:
+            excluded = set(exclude_statuses)
+            records = (self._slots[slot] for slot in self._by_id.values())
+            to_dict = TaskRecord.to_persist_dict if persist_only else TaskRecord.to_dict
+            return [to_dict(record) for record in records if record.status not in excluded]
+
+    def take_changes(self):
+        """
+        取出自上次调用以来的变化。
+
+        返回:
+            tuple: (changed_ids, removed_ids)，changed_ids 包含新增和修改的任务。
+        """
+        with self._lock:
+            changed, self._changed = list(self._changed), {}
+            removed, self._removed = list(self._removed), {}
+        return changed, removed
+
+    def take_persist_changes(self):
+        """
+        取出自上次调用以来需要持久化的变化 (进度等频繁变化的字段不计入)。
+
+        返回:
+            tuple: (tasks, removed_ids)，tasks 为变化任务的持久化字典 (见 TaskRecord.to_persist_dict)。
+        """
+        with self._lock:
+            changed, self._persist_changed = self._persist_changed, {}
+            removed, self._persist_removed = list(self._persist_removed), {}
+            tasks = [self._slots[self._by_id[task_id]].to_persist_dict() for task_id in changed
+                     if task_id in self._by_id]
+        return tasks, removed
+
+    # --- 独立的变化通道 ---
+
+    def open_change_feed(self):
+        """
+        打开一个独立的变化通道 (不影响 take_changes() 和队列日志)。
+
+        返回:
+            tuple: (feed_id, tasks)，tasks 为打开时所有任务的字典 (见 TaskRecord.to_dict)，
+                   之后的变化通过 take_feed_changes(feed_id) 获取。
+        """
+        with self._lock:
+            feed_id = next(self._feed_ids)
+            self._feeds[feed_id] = [{}, {}]
+            return feed_id, [self._slots[slot].to_dict() for slot in self._by_id.values()]
+
+    def take_feed_changes(self, feed_id):
+        """
+        取出变化通道自上次调用以来的变化。
+
+        返回:
+            tuple: (tasks, removed_ids)，tasks 为新增或修改任务的字典。
+        """
+        with self._lock:
+            feed = self._feeds.get(feed_id)
+            if feed is None:
+                return [], []
+            changed, removed = feed
+            self._feeds[feed_id] = [{}, {}]
+            tasks = [self._slots[self._by_id[task_id]].to_dict() for task_id in changed if task_id in self._by_id]
+        return tasks, list(removed)
+
+    def close_change_feed(self, feed_id):
+        with self._lock:
+            self._feeds.pop(feed_id, None)
+
+    # --- Internal Helpers (调用方需持有锁) ---
+
+    def _mark_feeds(self, task_id, removed=False):
+        for changed_ids, removed_ids in self._feeds.values():
+            if removed:
+                changed_ids.pop(task_id, None)
+                removed_ids[task_id] = None
+            else:
+                removed_ids.pop(task_id, None)
+                changed_ids[task_id] = None
+
+    def _record(self, task_id):
+        slot = self._by_id.get(task_id)
+        return self._slots[slot] if slot is not None else None
+
+    def _in_order(self, ids):
+        if len(ids) * 8 >= len(self._by_id):
+            # 子集较大时按字典的插入顺序过滤 (O(n))，比排序更快
+            ids = ids if isinstance(ids, (set, frozenset)) else set(ids)
+            return [task_id for task_id in self._by_id if task_id in ids]
+        return sorted(ids, key=lambda task_id: self._slots[self._by_id[task_id]].seq)
+
+    @staticmethod
+    def _sort_key(sort_by):
+        if sort_by == 'status':
+            return lambda record: _STATUS_SORT_ORDER.get(record.status, len(_STATUS_SORT_ORDER))
+        if sort_by == 'size':
+            return lambda record: parse_size(record.size)
+        if sort_by in ('platform', 'filename'):
+            return lambda record: (getattr(record, sort_by) or '').lower()
+        raise ValueError(f"不支持的排序字段: {sort_by}")
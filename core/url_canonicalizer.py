@@ -0,0 +1,134 @@
+# core/url_canonicalizer.py - Map video URLs to (platform, video_id) without network I/O
+import re
+import hashlib
+from collections import namedtuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+_TRAILING_PUNCTUATION = ',;\'"<>)]}。，；'
+# 不影响内容的跟踪/分享参数，生成规范键时去掉
+_TRACKING_PARAMS = frozenset((
+    'si', 'feature', 'pp', 'fbclid', 'gclid', 'igshid', 'ref', 'ref_src',
+    'is_from_webapp', 'is_copy_url', 'sender_device', 'sender_web_id', 'share_app_id',
+    'share_item_id', 'share_link_id', 'social_sharing', 'source', '_r', '_t', 'lang',
+))
+
+_YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_PATH_RE = re.compile(r'^/(?:shorts|embed|live|v|e)/([^/?#]+)')
+_TIKTOK_VIDEO_RE = re.compile(r'^/(?:@([^/]*)/video|share/video|embed(?:/v2)?|v|video)/(\d{6,})(?:\.html)?/?$')
+
+
+class CanonicalUrl(namedtuple('CanonicalUrl', 'platform video_id url key')):
+    """
+    规范化的视频地址。
+
+    platform: 平台名 ("YouTube"、"TikTok"，或调用方传入的平台)
+    video_id: 平台上的视频 id，无法离线识别时为 None
+    url:      用于下载的规范 URL
+    key:      去重键，同一视频的不同写法 (短链、移动版、带时间戳或分享参数) 得到相同的键
+    """
+    __slots__ = ()
+
+    @property
+    def task_id(self):
+        """任务 id: 识别出视频 id 时为 "平台_视频id"，否则为 "平台_url_" 加去重键 SHA-1 的前 16 位。"""
+        if self.video_id:
+            return f"{self.platform}_{self.video_id}"
+        return f"{self.platform}_url_{hashlib.sha1(self.key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def normalize_url(token):
+    """
+    规范化从文本中提取的 URL: 去掉两端的标点和片段 (#...)，协议和域名转为小写。
+
+    返回:
+        str | None: 规范化后的 URL，不是有效的 http(s) 链接时返回 None。
+    """
+    token = token.strip().rstrip(_TRAILING_PUNCTUATION).lstrip('(<["\'')
+    if not token.lower().startswith(('http://', 'https://')):
+        return None
+    try:
+        parts = urlsplit(token)
+        parts.port # 端口无效时抛出 ValueError
+    except ValueError:
+        return None
+    if not parts.hostname:
+        return None
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+
+def canonicalize(url, platform=None):
+    """
+    把 URL 映射为规范形式 (纯字符串处理，不访问网络)。
+
+    YouTube 的 watch、youtu.be、shorts、embed、live 以及移动版/音乐版链接都映射为
+    https://www.youtube.com/watch?v=ID；TikTok 的 /@user/video/ID、/v/ID.html 和 embed 链接
+    按视频 id 去重。无法离线识别的链接 (例如 TikTok 短链 vm.tiktok.com/...) 去掉跟踪参数后
+    按 URL 去重。
+
+    参数:
+        url (str): 原始 URL。
+        platform (str | None): 调用方认为的平台名，域名无法识别时使用。
+
+    返回:
+        CanonicalUrl | None: URL 无效时返回 None。
+    """
+    url = normalize_url(url) if isinstance(url, str) else None
+    if url is None:
+        return None
+    parts = urlsplit(url)
+    host = parts.hostname
+    bare_host = host[4:] if host.startswith('www.') else host
+
+    for name, domains, extractor in _EXTRACTORS:
+        if any(bare_host == domain or bare_host.endswith('.' + domain) for domain in domains):
+            video_id, canonical_url = extractor(parts, bare_host)
+            if video_id:
+                return CanonicalUrl(name, video_id, canonical_url, f"{name}:{video_id}")
+            platform = name
+            break
+
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith('utm_')])
+    path = parts.path.rstrip('/') or '/'
+    clean_url = urlunsplit((parts.scheme, parts.netloc, path, query, ''))
+    key_host = bare_host[2:] if bare_host.startswith('m.') else bare_host
+    port = f":{parts.port}" if parts.port else ''
+    return CanonicalUrl(platform or bare_host, None, clean_url, f"{key_host}{port}{path}?{query}")
+
+
+def canonical_task_id(url, platform=None):
+    """返回 URL 对应的任务 id，URL 无效时返回 None。"""
+    canonical = canonicalize(url, platform)
+    return canonical.task_id if canonical is not None else None
+
+
+# --- 平台规则 ---
+
+def _youtube(parts, host):
+    video_id = None
+    if host == 'youtu.be':
+        video_id = parts.path.lstrip('/').split('/', 1)[0]
+    elif parts.path in ('/watch', '/watch/'):
+        video_id = dict(parse_qsl(parts.query)).get('v')
+    else:
+        match = _YOUTUBE_PATH_RE.match(parts.path)
+        if match:
+            video_id = match.group(1)
+    if not video_id or not _YOUTUBE_ID_RE.match(video_id):
+        return None, None
+    return video_id, f"https://www.youtube.com/watch?v={video_id}"
+
+
+def _tiktok(parts, host):
+    match = _TIKTOK_VIDEO_RE.match(parts.path)
+    if not match:
+        return None, None
+    user, video_id = match.groups()
+    return video_id, f"https://www.tiktok.com/@{user or ''}/video/{video_id}" # yt-dlp 接受省略用户名的形式
+
+
+# (平台名, 域名, 规则)，平台名与 modules/*/logic.py 中的 PLATFORM_NAME 一致
+_EXTRACTORS = (
+    ('YouTube', ('youtube.com', 'youtu.be', 'youtube-nocookie.com'), _youtube),
+    ('TikTok', ('tiktok.com', 'tiktokv.com'), _tiktok),
+)
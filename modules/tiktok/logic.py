@@ -1,5 +1,5 @@
 # modules/tiktok/logic.py - TikTok Platform Specific Business Logic
-import hashlib # 用于生成 ID
+from core.url_canonicalizer import canonicalize # 用于生成 ID
 
 # 注意：这个文件不应直接依赖 Tkinter 控件。
 # 它通过 app 实例 (主程序控制器) 与 UI 和核心功能交互。
@@ -80,17 +80,16 @@ def download_tiktok_urls(urls, app):
     skipped_count = 0
     for url in urls:
         # 在这里也做一次基本的 URL 格式检查
-        if not url or not isinstance(url, str) or not (url.startswith("http://") or url.startswith("https://")):
+        canonical = canonicalize(url, PLATFORM_NAME)
+        if canonical is None:
              print(f"逻辑层: 跳过无效格式的 URL: {url}")
              skipped_count += 1
              continue
         try:
-            # 生成唯一 ID
-            url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-            item_id = f"{PLATFORM_NAME}_{url_hash}"
+            # 由规范化的 URL 生成唯一 ID (同一视频的不同链接得到相同 ID)
             item_info = {
-                'id': item_id,
-                'url': url,
+                'id': canonical.task_id,
+                'url': canonical.url,
                 # output_path 由主程序的 start_immediate_downloads 统一处理/覆盖
                 # 'output_path': output_path, # 不在此处设置，由调用者决定最终路径
                 # 可以添加特定于 TikTok 的 ydl_opts (如果需要)
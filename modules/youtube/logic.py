@@ -6,6 +6,7 @@ import os
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import logging # Use logging
+from core.format_policy import LEGACY_FORMAT
 
 logger = logging.getLogger(__name__)
 PLATFORM_NAME = "YouTube" # Define platform name
@@ -131,7 +132,8 @@ def download_item(app, item_iid, output_path):
         'output_path': output_path,
         'ydl_opts': {
             # 特定于 YouTube 的选项可以放在这里
-             'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+             # DownloadService 的格式策略会把它换成转封装优先的选择，并按编码决定转封装还是转码
+             'format': LEGACY_FORMAT,
              'postprocessors': [
                   {'key': 'FFmpegVideoConvertor', 'preferedformat': 'mp4'},
              ],
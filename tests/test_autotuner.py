@@ -0,0 +1,96 @@
+# tests/test_autotuner.py - AIMD concurrency autotuner ticks with injected counts
+import pytest
+
+from core.autotuner import ConcurrencyAutotuner, ThroughputMeter
+from core.error_classifier import PERMANENT, RATE_LIMITED, TRANSIENT
+
+
+class _FakePool:
+    """代替 DownloadScheduler 的 get_counts / set_concurrency。"""
+
+    def __init__(self, limit, queued=0, running=1):
+        self.counts = {'limit': limit, 'queued': queued, 'running': running}
+        self.calls = []
+
+    def get_counts(self):
+        return dict(self.counts)
+
+    def set_concurrency(self, value):
+        self.calls.append(value)
+        self.counts['limit'] = value
+        return value
+
+
+def _tuner(pool, **kwargs):
+    kwargs.setdefault('min_workers', 1)
+    kwargs.setdefault('max_workers', 8)
+    return ConcurrencyAutotuner(pool.set_concurrency, pool.get_counts, ThroughputMeter(), **kwargs)
+
+
+def test_rate_limited_attempt_halves_concurrency():
+    pool = _FakePool(limit=6, queued=10)
+    tuner = _tuner(pool)
+    tuner.record_attempt({'status': 'finished'})
+    tuner.record_attempt({'status': 'retry', 'error_category': RATE_LIMITED})
+    assert tuner.tick() == 3
+    assert tuner.history[-1][-1] == 'decrease'
+
+
+def test_error_rate_above_threshold_decreases_but_permanent_errors_do_not():
+    pool = _FakePool(limit=4)
+    tuner = _tuner(pool, error_threshold=0.2)
+    for _ in range(5):
+        tuner.record_attempt({'status': 'error', 'error_category': PERMANENT})
+    assert tuner.tick() == 4 # 永久性错误与负载无关
+    tuner.record_attempt({'status': 'retry', 'error_category': TRANSIENT})
+    tuner.record_attempt({'status': 'retry', 'error_category': TRANSIENT})
+    tuner.record_attempt({'status': 'finished'})
+    assert tuner.tick() == 2
+
+
+def test_queued_tasks_increase_then_revert_when_throughput_drops():
+    pool = _FakePool(limit=2, queued=5)
+    tuner = _tuner(pool)
+    tuner.meter.add(10_000_000)
+    assert tuner.tick() == 3
+    tuner.meter.add(10) # 增加并发后吞吐量明显下降
+    assert tuner.tick() == 2
+    assert [entry[-1] for entry in tuner.history] == ['increase', 'revert']
+    assert pool.calls == [3, 2]
+
+
+def test_idle_pool_holds():
+    pool = _FakePool(limit=2, queued=5, running=0)
+    tuner = _tuner(pool)
+    assert tuner.tick() == 2
+    assert tuner.history[-1][-1] == 'idle' and pool.calls == []
+
+
+@pytest.mark.parametrize('limit, queued, category, expected', [
+    (8, 5, None, 8),          # 已达上限，不再增加
+    (1, 0, RATE_LIMITED, 1),  # 已达下限，不再减少
+])
+def test_target_is_clamped_to_range(limit, queued, category, expected):
+    pool = _FakePool(limit=limit, queued=queued)
+    tuner = _tuner(pool)
+    if category:
+        tuner.record_attempt({'status': 'retry', 'error_category': category})
+    assert tuner.tick() == expected
+    assert pool.calls == []
+    assert tuner.history[-1][-1] == 'hold'
+
+
+def test_decrease_from_above_max_is_clamped():
+    pool = _FakePool(limit=20, queued=5)
+    tuner = _tuner(pool, max_workers=8)
+    tuner.record_attempt({'status': 'retry', 'error_category': RATE_LIMITED})
+    assert tuner.tick() == 8
+
+
+def test_from_config_falls_back_on_invalid_values(capsys):
+    config = {'autotune_min_workers': 'two', 'autotune_max_workers': 6}
+    pool = _FakePool(limit=2)
+    tuner = ConcurrencyAutotuner.from_config(lambda key, default=None: config.get(key, default),
+                                             pool.set_concurrency, pool.get_counts, ThroughputMeter())
+    assert (tuner.min_workers, tuner.max_workers) == (1, 6)
+    assert 'autotune_min_workers' in capsys.readouterr().out
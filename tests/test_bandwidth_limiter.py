@@ -0,0 +1,82 @@
+# tests/test_bandwidth_limiter.py - Token bucket, time-of-day schedule and shared limiter
+import datetime
+import threading
+import time
+
+from core.bandwidth_limiter import TokenBucket, BandwidthSchedule, BandwidthLimiter
+
+
+def _at(hour, minute=0):
+    return datetime.datetime(2026, 1, 1, hour, minute)
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket()
+    assert bucket.consume(10 ** 9) == 0.0
+    bucket.set_rate(0)
+    assert bucket.rate is None
+
+
+def test_bucket_waits_for_overdraft_to_refill():
+    bucket = TokenBucket(rate=100_000)
+    started = time.monotonic()
+    waited = bucket.consume(20_000) # 桶初始为空，需要约 0.2 秒补足
+    elapsed = time.monotonic() - started
+    assert 0.15 <= waited <= 0.5
+    assert 0.15 <= elapsed <= 0.5
+
+
+def test_bucket_burst_absorbs_small_reads():
+    bucket = TokenBucket(rate=1_000_000, burst=50_000)
+    time.sleep(0.06) # 补满桶
+    assert bucket.consume(40_000) == 0.0
+
+
+def test_bucket_should_stop_ends_wait_early():
+    bucket = TokenBucket(rate=1_000)
+    started = time.monotonic()
+    bucket.consume(100_000, should_stop=lambda: True) # 不限时等待需要 100 秒
+    assert time.monotonic() - started < 0.1
+
+
+def test_set_rate_wakes_waiting_consumer():
+    bucket = TokenBucket(rate=1_000)
+    started = time.monotonic()
+    threading.Timer(0.1, bucket.set_rate, args=(None,)).start()
+    bucket.consume(100_000)
+    assert time.monotonic() - started < 0.7
+
+
+def test_schedule_picks_matching_window():
+    schedule = BandwidthSchedule([{'start': '09:00', 'end': '18:00', 'limit_kbps': 512}])
+    assert schedule.limit_for(_at(9), 0) == 512
+    assert schedule.limit_for(_at(17, 59), 0) == 512
+    assert schedule.limit_for(_at(18), 100) == 100
+    assert schedule.limit_for(_at(8, 59), 100) == 100
+
+
+def test_schedule_window_across_midnight():
+    schedule = BandwidthSchedule([{'start': '22:00', 'end': '06:00', 'limit_kbps': 0},
+                                  {'start': '00:00', 'end': '23:59', 'limit_kbps': 256}])
+    assert schedule.limit_for(_at(23), 64) == 0 # 先匹配者优先
+    assert schedule.limit_for(_at(3), 64) == 0
+    assert schedule.limit_for(_at(12), 64) == 256
+
+
+def test_schedule_ignores_invalid_rules(capsys):
+    schedule = BandwidthSchedule([{'start': '9am', 'end': '10:00'}, {'end': '10:00'},
+                                  {'start': '01:00', 'end': '02:00', 'limit_kbps': 10}])
+    assert len(schedule.rules) == 1
+    assert '忽略无效的限速时间段' in capsys.readouterr().out
+
+
+def test_limiter_tracks_platform_limits_and_bytes():
+    limiter = BandwidthLimiter(limit_kbps=0, platform_limits_kbps={'TikTok': 100, 'youtube': 'fast'})
+    stats = limiter.get_stats()
+    assert stats['platform_limits_kbps'] == {'tiktok': 100}
+    limiter.consume('youtube', 1_000_000) # 没有平台限速，也没有全局限速
+    limiter.set_limit(2048)
+    assert limiter.effective_limit_kbps() == 2048
+    stats = limiter.get_stats()
+    assert stats['bytes'] == 1_000_000
+    assert stats['effective_kbps'] == 2048
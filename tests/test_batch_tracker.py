@@ -0,0 +1,93 @@
+# tests/test_batch_tracker.py - Batch completion counts with overlapping batches and sealing
+import concurrent.futures
+
+import pytest
+
+from core.batch_tracker import DownloadBatch
+
+
+def _future():
+    future = concurrent.futures.Future()
+    future.set_running_or_notify_cancel()
+    return future
+
+
+def _finish(future, status):
+    future.set_result({'id': 'x', 'status': status})
+
+
+def _batch(batch_id, completions, item_updates=None):
+    return DownloadBatch(batch_id, on_complete=completions.append,
+                         on_item_done=item_updates.append if item_updates is not None else None)
+
+
+def test_overlapping_batches_count_independently():
+    completions = []
+    first, second = _batch(1, completions), _batch(2, completions)
+    a, b, c = _future(), _future(), _future()
+    first.add('a', a)
+    first.add('b', b)
+    first.seal()
+    _finish(a, 'finished')
+    second.add('b', b) # 第二批提交时第一批仍在进行，重复的任务共享同一个 Future
+    second.add('c', c)
+    second.seal()
+    _finish(c, 'error')
+    assert completions == []
+    _finish(b, 'cancelled')
+
+    assert [summary.batch_id for summary in completions] == [1, 2]
+    summaries = {summary.batch_id: summary for summary in completions}
+    assert (summaries[1].total, summaries[1].succeeded, summaries[1].failed, summaries[1].cancelled) == (2, 1, 0, 1)
+    assert (summaries[2].total, summaries[2].succeeded, summaries[2].failed, summaries[2].cancelled) == (2, 0, 1, 1)
+
+
+def test_item_updates_and_failed_futures():
+    completions, updates = [], []
+    batch = _batch('b', completions, updates)
+    raised, cancelled = _future(), concurrent.futures.Future()
+    batch.add('raised', raised)
+    batch.add('cancelled', cancelled)
+    batch.seal()
+    raised.set_exception(RuntimeError('boom'))
+    cancelled.cancel() # Future 本身被取消 (未得到结果字典) 计为失败
+    assert [summary.done for summary in updates] == [1, 2]
+    assert completions[0].failed == 2 and completions[0].is_complete
+
+
+def test_completion_waits_for_seal():
+    completions = []
+    batch = _batch('b', completions)
+    future = _future()
+    batch.add('a', future)
+    _finish(future, 'finished')
+    assert completions == [] # 还可能继续添加任务
+    batch.seal()
+    assert len(completions) == 1 and completions[0].succeeded == 1
+
+
+@pytest.mark.parametrize('finished_before_seal', [0, 2])
+def test_seal_on_empty_or_finished_batch_completes_once(finished_before_seal):
+    completions = []
+    batch = _batch('b', completions)
+    for _ in range(finished_before_seal):
+        future = _future()
+        batch.add('a', future)
+        _finish(future, 'finished')
+    batch.seal()
+    batch.seal()
+    assert len(completions) == 1
+    assert completions[0].total == completions[0].succeeded == finished_before_seal
+    with pytest.raises(RuntimeError):
+        batch.add('late', _future())
+
+
+def test_callback_errors_do_not_break_counting():
+    def failing(summary):
+        raise ValueError('callback failed')
+    batch = DownloadBatch('b', on_item_done=failing, on_complete=failing)
+    future = _future()
+    batch.add('a', future)
+    batch.seal()
+    _finish(future, 'finished')
+    assert batch.summary().succeeded == 1
@@ -0,0 +1,96 @@
+# tests/test_bulk_import.py - Streaming bulk URL import: chunked dedup, progress and cancellation
+import pytest
+
+from core.bulk_import import BulkUrlImporter
+from core.task_store import TaskStore
+
+TIMEOUT = 5
+
+
+def _urls(*numbers):
+    return [f'https://www.tiktok.com/@u/video/{number}' for number in numbers]
+
+
+class _RecordingStore(TaskStore):
+    """记录每次 add_many 写入的批量大小。"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def add_many(self, tasks):
+        tasks = list(tasks)
+        self.chunks.append(len(tasks))
+        return super().add_many(tasks)
+
+
+@pytest.fixture
+def store():
+    return _RecordingStore()
+
+
+def _import_text(importer, text):
+    importer.start_text(text)
+    importer.wait(TIMEOUT)
+    assert not importer.is_running()
+    return importer.progress()
+
+
+def test_text_import_dedups_across_chunks_and_existing_tasks(store):
+    existing, first, second, third = _urls(1000001, 1000002, 1000003, 1000004)
+    store.add('TikTok_1000001', existing, 'TikTok')
+    text = '\n'.join([
+        '# 注释行',
+        f'{first} {second}',
+        f'https://m.tiktok.com/v/1000002.html', # 同一视频的另一种写法
+        'not a url',
+        '',
+        f'{third} {existing}',
+    ]) + '\n'
+    progress = _import_text(BulkUrlImporter(store, 'TikTok', chunk_size=2), text)
+    assert store.chunks == [2, 2] # 每 chunk_size 个链接写入一次
+    assert store.query() == ['TikTok_1000001', 'TikTok_1000002', 'TikTok_1000003', 'TikTok_1000004']
+    assert (progress['lines'], progress['added'], progress['duplicates'], progress['invalid']) == (6, 3, 2, 1)
+    assert progress['done'] and not progress['cancelled'] and progress['error'] is None
+    assert progress['fraction'] == 1.0
+    assert store.get('TikTok_1000003').filename == second # 默认显示名称为规范 URL
+
+
+def test_archived_videos_are_skipped(store):
+    importer = BulkUrlImporter(store, 'TikTok', is_archived=lambda canonical: canonical.video_id == '1000002')
+    progress = _import_text(importer, '\n'.join(_urls(1000001, 1000002)))
+    assert store.query() == ['TikTok_1000001']
+    assert progress['archived'] == 1
+
+
+def test_file_import_reports_byte_position(store, tmp_path):
+    path = tmp_path / 'urls.txt'
+    path.write_text('\n'.join(_urls(*range(1000000, 1000050))) + '\n', encoding='utf-8')
+    importer = BulkUrlImporter(store, 'TikTok', chunk_size=20)
+    importer.start_file(str(path))
+    importer.wait(TIMEOUT)
+    progress = importer.progress()
+    assert progress['total'] == progress['position'] == path.stat().st_size
+    assert progress['added'] == 50 and store.chunks == [20, 20, 10]
+
+
+def test_missing_file_reports_error(store, tmp_path):
+    importer = BulkUrlImporter(store, 'TikTok')
+    importer.start_file(str(tmp_path / 'missing.txt'))
+    importer.wait(TIMEOUT)
+    progress = importer.progress()
+    assert progress['done'] and progress['error']
+
+
+def test_cancel_keeps_lines_already_read(store):
+    importer = None
+
+    def cancel_at_third(canonical):
+        if canonical.video_id == '1000003':
+            importer.cancel() # 在导入线程中取消: 当前行处理完后停止
+        return False
+    importer = BulkUrlImporter(store, 'TikTok', chunk_size=2, is_archived=cancel_at_third)
+    progress = _import_text(importer, '\n'.join(_urls(*range(1000001, 1000010))))
+    assert store.query() == ['TikTok_1000001', 'TikTok_1000002', 'TikTok_1000003'] # 未满一批的第三个链接也保留
+    assert progress['cancelled'] and progress['lines'] == 3 and progress['added'] == 3
+
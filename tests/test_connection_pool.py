@@ -0,0 +1,161 @@
+# tests/test_connection_pool.py - DNS cache, shared transport connection reuse and handshake stats
+import http.server
+import socket
+import threading
+
+import pytest
+
+import core.connection_pool as connection_pool_module
+from core.connection_pool import ConnectionPool, DnsCache
+
+
+class _Resolver:
+    """代替 socket.getaddrinfo，记录实际解析的主机。"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        self.calls.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    resolver = _Resolver()
+    monkeypatch.setattr(connection_pool_module.socket, 'getaddrinfo', resolver)
+    return resolver
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(connection_pool_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_dns_cache_reuses_results_until_ttl(resolver, clock):
+    lookups = []
+    cache = DnsCache(ttl=60, on_lookup=lambda hit, seconds: lookups.append(hit))
+    first = cache.getaddrinfo('CDN.example.com', 443)
+    assert cache.getaddrinfo('cdn.example.com', 443) == first # 主机名不区分大小写
+    cache.getaddrinfo('cdn.example.com', 80) # 端口不同，单独缓存
+    clock.now += 61
+    cache.getaddrinfo('cdn.example.com', 443)
+    assert resolver.calls == ['CDN.example.com', 'cdn.example.com', 'cdn.example.com']
+    assert lookups == [False, True, False, False]
+
+
+def test_dns_cache_evicts_least_recently_used(resolver, clock):
+    cache = DnsCache(ttl=60, max_entries=2)
+    cache.getaddrinfo('a.com', 443)
+    cache.getaddrinfo('b.com', 443)
+    cache.getaddrinfo('a.com', 443) # a 变为最近使用
+    cache.getaddrinfo('c.com', 443)
+    assert len(cache) == 2
+    cache.getaddrinfo('a.com', 443)
+    cache.getaddrinfo('b.com', 443) # b 已被淘汰，重新解析
+    assert resolver.calls == ['a.com', 'b.com', 'c.com', 'b.com']
+
+
+def test_dns_cache_bypasses_ip_literals(resolver):
+    cache = DnsCache()
+    for host in ('127.0.0.1', '::1', 'fe80::1%eth0'):
+        cache.getaddrinfo(host, 443)
+    assert resolver.calls == ['127.0.0.1', '::1', 'fe80::1%eth0']
+    assert len(cache) == 0
+
+
+def test_failed_lookups_are_not_cached(monkeypatch):
+    def fail(*args):
+        raise socket.gaierror('no such host')
+    monkeypatch.setattr(connection_pool_module.socket, 'getaddrinfo', fail)
+    cache = DnsCache()
+    with pytest.raises(socket.gaierror):
+        cache.getaddrinfo('missing.example', 443)
+    assert len(cache) == 0
+
+
+def test_reuse_ratio_handshake_and_dns_stats():
+    pool = ConnectionPool(dns_ttl=0)
+    assert pool.get_stats()['reuse_ratio'] is None
+    for _ in range(4):
+        pool._record_request()
+    pool._record_connection(0.2, tls=True)
+    pool._record_dns(False, 0.05)
+    pool._record_dns(True, 0.0)
+    stats = pool.get_stats()
+    assert stats['reuse_ratio'] == 0.75
+    assert stats['handshake_ms_avg'] == 200.0
+    assert stats['tls_connections'] == 1 and stats['dns_hit_ratio'] == 0.5
+    assert stats['dns_entries'] == 0 and pool.dns_cache is None
+
+
+def test_worker_deltas_merge_into_parent_stats():
+    worker, parent = ConnectionPool(), ConnectionPool()
+    assert worker.take_delta() is None
+    worker._record_request()
+    worker._record_request()
+    worker._record_connection(0.1, tls=False)
+    delta = worker.take_delta()
+    assert delta['requests'] == 2 and delta['connections'] == 1
+    assert worker.take_delta() is None # 已取走
+    parent.merge(delta)
+    assert parent.get_stats()['reuse_ratio'] == 0.5
+    assert parent.take_delta() is None # 合并的计数不会再次发回
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://localhost:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused_across_ydl_instances(http_server):
+    pytest.importorskip('requests') # 没有 requests 时 yt-dlp 使用 urllib 处理器，不共享传输层
+    pool = ConnectionPool()
+    real_getaddrinfo = socket.getaddrinfo
+    try:
+        for _ in range(3): # 每个任务一个新的 YoutubeDL 实例
+            with pool.new_ydl({'quiet': True}) as ydl:
+                assert ydl.urlopen(http_server).read() == b'ok'
+        stats = pool.get_stats()
+        assert (stats['requests'], stats['connections'], stats['sessions']) == (3, 1, 1)
+        assert stats['reuse_ratio'] == 0.667
+        assert stats['dns_misses'] == 1
+        assert socket.getaddrinfo is real_getaddrinfo # 没有替换全局解析函数
+    finally:
+        pool.close()
+
+
+def test_reuse_disabled_returns_plain_youtubedl():
+    import yt_dlp
+    pool = ConnectionPool(reuse=False)
+    with pool.new_ydl({'quiet': True}) as ydl:
+        assert type(ydl) is yt_dlp.YoutubeDL
@@ -0,0 +1,89 @@
+# tests/test_download_archive.py - Bloom-filtered download archive and yt-dlp archive files
+import sqlite3
+
+import pytest
+
+from core.download_archive import DownloadArchive, BloomFilter, archive_key
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'archive.sqlite3')
+
+
+def test_archive_key_matches_ytdlp_format():
+    assert archive_key('YouTube', 'abc') == 'youtube abc'
+    assert archive_key('Tik Tok', '1') == 'tiktok 1'
+    assert archive_key('YouTube', None) is None
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = [f'youtube {i}' for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'tiktok {i}' in bloom for i in range(10000))
+    assert false_positives < 100 # 目标误判率 0.1%，留足余量
+    with pytest.raises(ValueError):
+        BloomFilter(1000, bits=b'\0')
+
+
+def test_add_and_contains(db_path):
+    archive = DownloadArchive(db_path, capacity=100)
+    assert archive.add('youtube a', title='A')
+    assert not archive.add('youtube a')
+    assert archive.contains('youtube a') and 'youtube a' in archive
+    assert not archive.contains('youtube b')
+    assert not archive.contains(None)
+    stats = archive.get_stats()
+    assert stats['entries'] == 1 and stats['hits'] == 2 and stats['lookups'] == 3
+    archive.close()
+
+
+def test_bloom_grows_and_rebuilds_past_capacity(db_path):
+    archive = DownloadArchive(db_path, capacity=10)
+    for i in range(25):
+        archive.add(f'youtube {i}')
+    stats = archive.get_stats()
+    assert stats['bloom_capacity'] >= 25
+    assert stats['rebuilds'] >= 2 # 首次打开一次，超出容量后至少再一次
+    assert all(archive.contains(f'youtube {i}') for i in range(25))
+    archive.close()
+
+
+def test_saved_bloom_is_loaded_and_stale_bloom_is_rebuilt(db_path):
+    archive = DownloadArchive(db_path, capacity=100)
+    archive.add('youtube a')
+    archive.close()
+
+    archive = DownloadArchive(db_path, capacity=100)
+    assert archive.get_stats()['rebuilds'] == 0 # 条目数一致，直接加载
+    assert archive.contains('youtube a')
+    archive.close()
+
+    with sqlite3.connect(db_path) as conn: # 模拟上次没有正常关闭: 新记录不在已保存的过滤器中
+        conn.execute("INSERT INTO archive (key, added) VALUES ('youtube b', 0)")
+    archive = DownloadArchive(db_path, capacity=100)
+    assert archive.get_stats()['rebuilds'] == 1
+    assert archive.contains('youtube b')
+    archive.close()
+
+
+def test_import_export_round_trip(db_path, tmp_path):
+    source = tmp_path / 'archive.txt'
+    source.write_text('youtube a\n\ntiktok 123\nyoutube a\nbroken\n', encoding='utf-8')
+    archive = DownloadArchive(db_path, capacity=100)
+    assert archive.import_ytdlp_archive(str(source)) == 2
+    assert archive.import_ytdlp_archive(str(source)) == 0
+    assert archive.contains('tiktok 123')
+
+    exported = tmp_path / 'exported.txt'
+    assert archive.export_ytdlp_archive(str(exported)) == 2
+    archive.close()
+    assert exported.read_text(encoding='utf-8') == 'tiktok 123\nyoutube a\n'
+
+    other = DownloadArchive(str(tmp_path / 'other.sqlite3'), capacity=100)
+    assert other.import_ytdlp_archive(str(exported)) == 2
+    assert other.contains('youtube a') and other.contains('tiktok 123')
+    other.close()
@@ -0,0 +1,135 @@
+# tests/test_download_scheduler.py - Retry resolution and cancellation in every scheduler state
+import threading
+import time
+
+import pytest
+
+from core.download_scheduler import DownloadScheduler
+from core.host_limiter import HostLimiter
+
+TIMEOUT = 5
+
+
+class _Attempts:
+    """按任务 id 记录尝试次数；id 以 block 开头的尝试一直阻塞到 release 或被取消。"""
+
+    def __init__(self, retries=0, retry_delay=0.01):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, item_info, token):
+        self.calls.append((item_info['id'], item_info.get('attempt', 0)))
+        if item_info['id'].startswith('block'):
+            self.started.set()
+            while not self.release.is_set():
+                if token.wait(0.01):
+                    return {'id': item_info['id'], 'status': 'cancelled'}
+        if item_info.get('attempt', 0) < self.retries:
+            return {'id': item_info['id'], 'status': 'retry', 'retry_delay': self.retry_delay,
+                    'attempt': item_info.get('attempt', 0)}
+        return {'id': item_info['id'], 'status': 'finished'}
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(attempts, max_workers=2, host_limiter=None):
+        scheduler = DownloadScheduler(attempts, max_workers, host_limiter=host_limiter)
+        schedulers.append((scheduler, attempts))
+        return scheduler
+    yield make
+    for scheduler, attempts in schedulers:
+        attempts.release.set()
+        scheduler.shutdown()
+
+
+def _item(item_id, host='a.com'):
+    return {'id': item_id, 'url': f'https://{host}/{item_id}'}
+
+
+def test_retry_is_rescheduled_until_finished(make_scheduler):
+    attempts = _Attempts(retries=2)
+    scheduler = make_scheduler(attempts)
+    result = scheduler.submit(_item('x')).result(TIMEOUT)
+    assert result['status'] == 'finished'
+    assert attempts.calls == [('x', 0), ('x', 1), ('x', 2)]
+    counts = scheduler.get_counts()
+    assert (counts['queued'], counts['running'], counts['succeeded']) == (0, 0, 1)
+    assert not scheduler.is_inflight('x')
+
+
+def test_duplicate_submit_returns_existing_future(make_scheduler):
+    attempts = _Attempts()
+    scheduler = make_scheduler(attempts)
+    first = scheduler.submit(_item('block'))
+    assert attempts.started.wait(TIMEOUT)
+    assert scheduler.submit(_item('block')) is first
+    attempts.release.set()
+    assert first.result(TIMEOUT)['status'] == 'finished'
+    assert attempts.calls == [('block', 0)]
+
+
+def test_cancel_running_attempt_uses_token(make_scheduler):
+    attempts = _Attempts()
+    scheduler = make_scheduler(attempts)
+    future = scheduler.submit(_item('block'))
+    assert attempts.started.wait(TIMEOUT)
+    assert scheduler.is_running('block')
+    assert scheduler.cancel('block')
+    assert future.result(TIMEOUT)['status'] == 'cancelled'
+    assert scheduler.get_counts()['cancelled'] == 1
+    assert not scheduler.cancel('block') # 已完成
+
+
+def test_cancel_waiting_for_permit_resolves_and_frees_host_slot(make_scheduler):
+    attempts = _Attempts()
+    scheduler = make_scheduler(attempts, max_workers=1, host_limiter=HostLimiter(limits={'b.com': 1}))
+    blocker = scheduler.submit(_item('block'))
+    assert attempts.started.wait(TIMEOUT)
+    parked = scheduler.submit(_item('b1', 'b.com')) # 取得主机名额，等待并发许可
+    waiting = scheduler.submit(_item('b2', 'b.com')) # 等待主机名额
+    assert [item['id'] for item in scheduler.upcoming(10)] == ['b1', 'b2']
+
+    assert scheduler.cancel('b1')
+    assert parked.result(TIMEOUT)['status'] == 'cancelled' # 不必等正在执行的任务结束
+    assert [item['id'] for item in scheduler.upcoming(10)] == ['b2'] # 主机名额交给了 b2
+    attempts.release.set()
+    assert blocker.result(TIMEOUT)['status'] == 'finished'
+    assert waiting.result(TIMEOUT)['status'] == 'finished'
+    assert [item_id for item_id, _ in attempts.calls] == ['block', 'b2']
+
+
+def test_cancel_waiting_for_host_slot_resolves_immediately(make_scheduler):
+    attempts = _Attempts()
+    scheduler = make_scheduler(attempts, max_workers=2, host_limiter=HostLimiter(limits={'a.com': 1}))
+    blocker = scheduler.submit(_item('block'))
+    assert attempts.started.wait(TIMEOUT)
+    waiting = scheduler.submit(_item('w'))
+    assert scheduler.cancel('w')
+    assert waiting.result(TIMEOUT)['status'] == 'cancelled'
+    assert scheduler.upcoming(10) == []
+    attempts.release.set()
+    assert blocker.result(TIMEOUT)['status'] == 'finished'
+    counts = scheduler.get_counts()
+    assert (counts['queued'], counts['cancelled'], counts['succeeded']) == (0, 1, 1)
+
+
+def test_cancel_during_retry_delay_resolves_immediately(make_scheduler):
+    attempts = _Attempts(retries=1, retry_delay=30)
+    scheduler = make_scheduler(attempts)
+    future = scheduler.submit(_item('x'))
+    while scheduler.retry_queue.pending_count() == 0 and not future.done():
+        time.sleep(0.01)
+    assert scheduler.cancel('x')
+    assert future.result(TIMEOUT)['status'] == 'cancelled'
+    assert attempts.calls == [('x', 0)]
+    assert scheduler.get_counts()['queued'] == 0
+
+
+def test_cancel_unknown_task_returns_false(make_scheduler):
+    scheduler = make_scheduler(_Attempts())
+    assert not scheduler.cancel('missing')
@@ -0,0 +1,109 @@
+# tests/test_download_service.py - Final file path comes from download hooks, not a second extraction
+import os
+
+import pytest
+
+import core.download_service as download_service_module
+from core.download_service import DownloadService
+
+URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+class _StubYoutubeDL:
+    """
+    代替 yt_dlp.YoutubeDL: 不访问网络，按真实下载的顺序触发进度钩子、后处理钩子和最终钩子，
+    并记录 extract_info 的调用次数。
+    """
+
+    instances = []
+    fire_post_hook = True
+
+    def __init__(self, params):
+        self.params = params
+        self.extract_calls = 0
+        self._download_retcode = 0
+        _StubYoutubeDL.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_post_processor(self, pp, when='post_process'):
+        pass
+
+    def extract_info(self, url, download=True, process=True, **kwargs):
+        self.extract_calls += 1
+        return {'id': 'dQw4w9WgXcQ', 'title': 'Video', 'ext': 'webm', 'webpage_url': url,
+                'extractor_key': 'Youtube', 'extractor': 'youtube'}
+
+    def sanitize_info(self, info, remove_private_keys=False):
+        return dict(info)
+
+    def prepare_filename(self, info):
+        return os.path.join(self.params['output_dir'], f"{info['title']} [{info['id']}].{info['ext']}")
+
+    def process_ie_result(self, ie_result, download=True, extra_info=None):
+        self._fire_hooks(ie_result)
+        return ie_result
+
+    def download(self, urls):
+        self._fire_hooks({'id': 'dQw4w9WgXcQ', 'title': 'Video', 'ext': 'webm'})
+        return 0
+
+    def _fire_hooks(self, info):
+        output_dir = os.path.dirname(self.params['outtmpl'] if isinstance(self.params['outtmpl'], str)
+                                     else self.params['outtmpl']['default'])
+        self.params['output_dir'] = output_dir
+        downloaded = self.prepare_filename(info)
+        converted = downloaded[:-len('webm')] + 'mp4'
+        with open(converted, 'wb') as f:
+            f.write(b'video')
+        for hook in self.params.get('progress_hooks', []):
+            hook({'status': 'finished', 'filename': downloaded, 'info_dict': dict(info), '_total_bytes_str': '5B'})
+        for hook in self.params.get('postprocessor_hooks', []):
+            hook({'status': 'finished', 'postprocessor': 'VideoConvertor', 'info_dict': dict(info, filepath=converted)})
+        if self.fire_post_hook:
+            for hook in self.params.get('post_hooks', []):
+                hook(converted)
+
+
+@pytest.fixture
+def stub_ydl(monkeypatch):
+    _StubYoutubeDL.instances = []
+    _StubYoutubeDL.fire_post_hook = True
+    monkeypatch.setattr(download_service_module.yt_dlp, 'YoutubeDL', _StubYoutubeDL)
+    return _StubYoutubeDL
+
+
+def _download(service, tmp_path, events):
+    item = {'id': 'YouTube_dQw4w9WgXcQ', 'url': URL, 'output_path': str(tmp_path)}
+    return service.download_item(item, events.append)
+
+
+def test_filepath_comes_from_post_hook_without_extraction(stub_ydl, tmp_path):
+    events = []
+    result = _download(DownloadService(), tmp_path, events)
+    assert result['status'] == 'finished'
+    assert result['filepath'] == str(tmp_path / 'Video [dQw4w9WgXcQ].mp4')
+    assert [ydl.extract_calls for ydl in stub_ydl.instances] == [0] # 不再为取文件名重新提取
+    assert events[0] == {'id': 'YouTube_dQw4w9WgXcQ', 'status': 'preparing'}
+    assert any(event['status'] == 'finished' for event in events)
+
+
+def test_postprocessor_hook_path_is_used_without_post_hook(stub_ydl, tmp_path):
+    stub_ydl.fire_post_hook = False
+    result = _download(DownloadService(), tmp_path, [])
+    assert result['filepath'] == str(tmp_path / 'Video [dQw4w9WgXcQ].mp4') # 转换后的路径，而不是 .webm
+
+
+def test_info_cache_extracts_at_most_once(stub_ydl, tmp_path):
+    from core.info_cache import InfoCache
+    cache = InfoCache(str(tmp_path / 'cache' / 'info.sqlite3'))
+    service = DownloadService(info_cache=cache)
+    first = _download(service, tmp_path, [])
+    second = _download(service, tmp_path, []) # 缓存命中，跳过提取
+    cache.close()
+    assert first['filepath'] == second['filepath'] == str(tmp_path / 'Video [dQw4w9WgXcQ].mp4')
+    assert [ydl.extract_calls for ydl in stub_ydl.instances] == [1, 0]
@@ -0,0 +1,83 @@
+# tests/test_error_classifier.py - Error classification and category-aware retry delays
+import pytest
+from yt_dlp.utils import DownloadError, ExtractorError, GeoRestrictedError
+
+from core.error_classifier import classify_error, PERMANENT, TRANSIENT, RATE_LIMITED
+from core.retry_scheduler import RetryPolicy
+
+
+class _HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f'HTTP Error {status}')
+        self.status = status
+
+
+@pytest.mark.parametrize('message, category, reason', [
+    ('ERROR: [youtube] abc: Private video. Sign in if you have access', PERMANENT, 'private'),
+    ('ERROR: Video unavailable. This video has been removed by the uploader', PERMANENT, 'removed'),
+    ('ERROR: Unsupported URL: https://example.com/', PERMANENT, 'unsupported'),
+    ('ERROR: Requested format is not available', PERMANENT, 'format_unavailable'),
+    ('ERROR: unable to download video data: HTTP Error 429: Too Many Requests', RATE_LIMITED, 'rate_limited'),
+    ('ERROR: [youtube] abc: Unable to download webpage: HTTP Error 403: Forbidden', RATE_LIMITED, 'forbidden'),
+    ('ERROR: [generic] Unable to download JSON metadata: HTTP Error 404: Not Found', PERMANENT, 'removed'),
+    ('ERROR: unable to download video data: HTTP Error 403: Forbidden', TRANSIENT, 'media_forbidden'),
+    ('ERROR: unable to download video data: HTTP Error 404: Not Found', TRANSIENT, 'media_not_found'),
+    ('ERROR: unable to download video data: HTTP Error 410: Gone', TRANSIENT, 'media_not_found'),
+    ('ERROR: Access forbidden for this region, see the FAQ', TRANSIENT, 'unknown'),
+    ('ERROR: Read timed out.', TRANSIENT, 'network'),
+    ('ERROR: HTTP Error 503: Service Unavailable', TRANSIENT, 'server_error'),
+    ('ERROR: something odd happened', TRANSIENT, 'unknown'),
+])
+def test_classify_error_messages(message, category, reason):
+    classification = classify_error(message)
+    assert (classification.category, classification.reason) == (category, reason)
+
+
+def test_http_status_in_cause_chain_wins_over_text():
+    cause = ExtractorError('unable to download', cause=_HTTPError(404))
+    error = DownloadError('ERROR: unable to download', exc_info=(None, cause, None))
+    classification = classify_error(error)
+    assert classification.category == PERMANENT
+    assert classification.reason == 'removed'
+    assert classification.http_status == 404
+
+
+def test_media_download_not_found_is_not_permanent():
+    # 下载媒体时的 404 (签名 URL 过期等) 应当重试，而不是记为永久失败
+    message = 'ERROR: unable to download video data: HTTP Error 404: Not Found'
+    assert not classify_error(message).is_permanent
+    error = DownloadError(message, exc_info=(None, _HTTPError(404), None))
+    classification = classify_error(error)
+    assert classification.category == TRANSIENT and classification.http_status == 404
+
+
+def test_wrapped_cause_is_classified():
+    cause = _HTTPError(429)
+    try:
+        try:
+            raise cause
+        except _HTTPError as e:
+            raise ExtractorError('unable to download webpage') from e
+    except ExtractorError as error:
+        classification = classify_error(error)
+    assert classification.category == RATE_LIMITED
+    assert classification.http_status == 429
+
+
+def test_geo_restricted_exception_type_is_permanent():
+    classification = classify_error(GeoRestrictedError('The uploader has not made this video available'))
+    assert classification.is_permanent
+    assert classification.reason == 'geo_blocked'
+
+
+def test_unclassified_server_status_is_transient():
+    classification = classify_error(_HTTPError(502))
+    assert (classification.category, classification.reason) == (TRANSIENT, 'server_error')
+
+
+def test_retry_policy_uses_category():
+    policy = RetryPolicy(max_retries=3, base_delay=2.0, multiplier=2.0, jitter=0, rate_limit_scale=4.0)
+    assert not policy.should_retry(0, PERMANENT)
+    assert policy.should_retry(0, RATE_LIMITED)
+    assert policy.delay_for(1, TRANSIENT) == 4.0
+    assert policy.delay_for(1, RATE_LIMITED) == 16.0
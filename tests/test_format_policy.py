@@ -0,0 +1,79 @@
+# tests/test_format_policy.py - Remux-first format selection and codec compatibility
+import pytest
+from yt_dlp import YoutubeDL
+
+from core.format_policy import FormatPolicy, LEGACY_FORMAT, codecs_fit, remux_first_format
+
+
+def _video(format_id, ext, vcodec, height):
+    return {'format_id': format_id, 'url': f'https://cdn.example.com/{format_id}', 'ext': ext,
+            'vcodec': vcodec, 'acodec': 'none', 'height': height, 'protocol': 'https'}
+
+
+def _audio(format_id, ext, acodec, abr):
+    return {'format_id': format_id, 'url': f'https://cdn.example.com/{format_id}', 'ext': ext,
+            'vcodec': 'none', 'acodec': acodec, 'abr': abr, 'protocol': 'https'}
+
+
+def _muxed(format_id, ext, vcodec, acodec, height):
+    return {'format_id': format_id, 'url': f'https://cdn.example.com/{format_id}', 'ext': ext,
+            'vcodec': vcodec, 'acodec': acodec, 'height': height, 'protocol': 'https'}
+
+
+def _select(spec, formats):
+    with YoutubeDL({'quiet': True}) as ydl:
+        return [f['format_id'] for f in ydl._select_formats(formats, ydl.build_format_selector(spec))]
+
+
+def test_prefers_native_mp4_and_m4a_pair():
+    formats = [_video('av1', 'mp4', 'av01.0.08M.08', 1080), _video('vp9', 'webm', 'vp9', 2160),
+               _audio('m4a', 'm4a', 'mp4a.40.2', 128), _audio('opus', 'webm', 'opus', 160)]
+    assert _select(remux_first_format('mp4'), formats) == ['av1+m4a']
+
+
+def test_falls_back_to_streams_that_only_need_remuxing():
+    # 没有 mp4 视频流时，选 VP9 + Opus (可以直接放入 mp4)，而不是回退到需要转码的 best
+    formats = [_video('vp9', 'webm', 'vp9', 1080), _video('theora', 'ogv', 'theora', 2160),
+               _audio('opus', 'webm', 'opus', 160), _muxed('flv', 'flv', 'h263', 'nellymoser', 240)]
+    assert _select(remux_first_format('mp4'), formats) == ['vp9+opus']
+    assert _select(LEGACY_FORMAT, formats) == ['flv'] # 原有选择会选中需要转码的格式
+
+
+def test_falls_back_to_compatible_single_file_then_anything():
+    formats = [_muxed('webm', 'webm', 'vp8', 'vorbis', 360), _muxed('flv', 'flv', 'h263', 'nellymoser', 720)]
+    assert _select(remux_first_format('mp4'), formats) == ['flv']
+    assert _select(remux_first_format('webm'), formats) == ['webm']
+    formats = [_muxed('ts', 'ts', 'avc1.64001f', 'mp4a.40.2', 720), _muxed('flv', 'flv', 'h263', 'nellymoser', 1080)]
+    assert _select(remux_first_format('mp4'), formats) == ['ts']
+
+
+def test_unknown_container_keeps_legacy_format():
+    assert remux_first_format('avi') == LEGACY_FORMAT
+
+
+@pytest.mark.parametrize('container, vcodec, acodec, expected', [
+    ('mp4', 'avc1.64001f', 'mp4a.40.2', True),
+    ('mp4', 'vp9', 'opus', True),
+    ('mp4', 'vp8', 'vorbis', False),
+    ('webm', 'avc1.64001f', 'opus', False),
+    ('webm', 'none', 'opus', True),
+    ('mp4', None, 'mp4a.40.2', None),
+    ('mkv', 'anything', 'anything', True),
+    ('avi', 'avc1', 'mp3', None),
+])
+def test_codecs_fit(container, vcodec, acodec, expected):
+    assert codecs_fit(container, vcodec, acodec) is expected
+
+
+def test_prepare_replaces_convertor_and_legacy_format():
+    opts = {'format': LEGACY_FORMAT, 'postprocessors': [
+        {'key': 'FFmpegMetadata'}, {'key': 'FFmpegVideoConvertor', 'preferedformat': 'MP4'}]}
+    prepared, target = FormatPolicy().prepare(opts)
+    assert target == 'mp4'
+    assert prepared['format'] == remux_first_format('mp4') != LEGACY_FORMAT
+    assert prepared['postprocessors'] == [{'key': 'FFmpegMetadata'}]
+    assert opts['postprocessors'][1]['key'] == 'FFmpegVideoConvertor' # 不修改传入的选项
+
+    assert FormatPolicy(remux_first=False).prepare(opts) == (opts, None)
+    mapped = {'postprocessors': [{'key': 'FFmpegVideoConvertor', 'preferedformat': 'webm>mp4/mkv'}]}
+    assert FormatPolicy().prepare(mapped) == (mapped, None)
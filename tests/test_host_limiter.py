@@ -0,0 +1,114 @@
+# tests/test_host_limiter.py - Per-host concurrency limits and circuit breaker state transitions
+from core.error_classifier import RATE_LIMITED, TRANSIENT
+from core.host_limiter import CircuitBreaker, HostLimiter, host_key_for_url
+
+
+def test_host_key_groups_platform_domains():
+    assert host_key_for_url('https://www.youtube.com/watch?v=abc') == 'youtube'
+    assert host_key_for_url('https://rr3---sn-abc.googlevideo.com/videoplayback') == 'youtube'
+    assert host_key_for_url('https://vm.tiktok.com/xyz') == 'tiktok'
+    assert host_key_for_url('https://cdn.media.example.co/a.mp4') == 'example.co'
+    assert host_key_for_url('not a url') == 'unknown'
+
+
+def test_breaker_opens_after_threshold_and_blocks_until_cooldown():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, max_cooldown=40)
+    assert not breaker.record_rate_limited(0)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.record_rate_limited(1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow(5)
+    assert breaker.remaining(5) == 6
+
+
+def test_breaker_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_rate_limited(0)
+    assert breaker.allow(10)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow(10)
+
+
+def test_breaker_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_rate_limited(0)
+    breaker.allow(10)
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow(10) and breaker.allow(10)
+
+
+def test_breaker_probe_rate_limited_reopens_with_doubled_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, max_cooldown=15)
+    breaker.record_rate_limited(0)
+    breaker.allow(10)
+    assert breaker.record_rate_limited(10)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.cooldown == 15 # 加倍后不超过 max_cooldown
+    assert breaker.trips == 2
+    assert not breaker.allow(20)
+
+
+def test_breaker_neutral_probe_keeps_half_open_and_frees_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10)
+    breaker.record_rate_limited(0)
+    breaker.allow(10)
+    breaker.record_neutral()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow(10) # 可以再放行一个探测
+
+
+def test_limiter_parks_over_limit_and_hands_slot_to_next():
+    limiter = HostLimiter(limits={'tiktok': 1})
+    assert limiter.acquire_or_park('tiktok', 'first') == (True, None)
+    assert limiter.acquire_or_park('tiktok', 'second') == (False, None)
+    assert limiter.acquire_or_park('youtube', 'other') == (True, None) # 其他平台不受影响
+    runnable, wake_delay = limiter.release('tiktok', 'finished')
+    assert runnable == ['second'] and wake_delay is None
+    assert limiter.get_stats()['tiktok']['active'] == 1
+
+
+def test_limiter_only_finished_resets_failure_count():
+    limiter = HostLimiter(failure_threshold=2, cooldown=30)
+    for status, category in (('retry', RATE_LIMITED), ('error', TRANSIENT), ('cancelled', None)):
+        limiter.acquire_or_park('site.com', status)
+        limiter.release('site.com', status, category)
+    assert limiter.get_stats()['site.com']['state'] == CircuitBreaker.CLOSED
+    limiter.acquire_or_park('site.com', 'again')
+    limiter.release('site.com', 'retry', RATE_LIMITED) # 失败和取消没有清零计数
+    assert limiter.get_stats()['site.com']['state'] == CircuitBreaker.OPEN
+
+    limiter = HostLimiter(failure_threshold=2, cooldown=30)
+    limiter.acquire_or_park('site.com', 'a')
+    limiter.release('site.com', 'retry', RATE_LIMITED)
+    limiter.acquire_or_park('site.com', 'b')
+    limiter.release('site.com', 'finished')
+    limiter.acquire_or_park('site.com', 'c')
+    limiter.release('site.com', 'retry', RATE_LIMITED)
+    assert limiter.get_stats()['site.com']['state'] == CircuitBreaker.CLOSED
+
+
+def test_limiter_open_breaker_parks_with_wake_delay():
+    limiter = HostLimiter(failure_threshold=1, cooldown=30)
+    limiter.acquire_or_park('site.com', 'a')
+    runnable, wake_delay = limiter.release('site.com', 'retry', RATE_LIMITED)
+    assert runnable == [] and wake_delay is None # 没有等待任务
+    acquired, wake_delay = limiter.acquire_or_park('site.com', 'b')
+    assert not acquired
+    assert 0 < wake_delay <= 30
+    runnable, wake_delay = limiter.pump('site.com') # 冷却未结束
+    assert runnable == [] and 0 < wake_delay <= 30
+
+
+def test_limiter_peek_remove_and_drain_waiting():
+    limiter = HostLimiter(default_limit=1)
+    limiter.acquire_or_park('a.com', ('a0',))
+    limiter.acquire_or_park('b.com', ('b0',))
+    for entry in (('a1',), ('a2',), ('b1',)):
+        limiter.acquire_or_park(entry[0][0] + '.com', entry)
+    assert limiter.peek_waiting(10) == [('a1',), ('b1',), ('a2',)]
+    assert limiter.remove_waiting(lambda entry: entry[0] == 'b1') == ('b1',)
+    assert limiter.remove_waiting(lambda entry: entry[0] == 'missing') is None
+    assert 'b.com' not in [host for host, stats in limiter.get_stats().items() if stats['waiting']]
+    assert limiter.drain_waiting() == [('a1',), ('a2',)]
+    assert limiter.peek_waiting(10) == []
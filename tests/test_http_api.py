@@ -0,0 +1,108 @@
+# tests/test_http_api.py - HTTP job API: submit, list, cancel and token auth against a fake backend
+import asyncio
+
+import aiohttp
+import pytest
+
+from core.http_api import JobApiServer
+from core.task_store import TaskStore, QUEUED, CANCELLED
+from core.url_canonicalizer import canonicalize
+
+TOKEN = 'secret-token'
+
+
+class _FakeBackend:
+    """最小的下载控制器: 只登记任务，不下载。"""
+
+    def __init__(self):
+        self.task_store = TaskStore()
+        self.cancelled = []
+
+    def api_submit(self, urls, platform=None):
+        results = []
+        for url in urls:
+            canonical = canonicalize(url, platform)
+            if canonical is None:
+                results.append({'url': url, 'result': 'invalid'})
+                continue
+            added = self.task_store.add(canonical.task_id, canonical.url, canonical.platform, status=QUEUED)
+            results.append({'url': canonical.url, 'id': canonical.task_id, 'platform': canonical.platform,
+                            'result': 'queued' if added else 'duplicate'})
+        return results
+
+    def api_cancel(self, task_id):
+        if task_id not in self.task_store:
+            return None
+        self.cancelled.append(task_id)
+        self.task_store.update(task_id, status=CANCELLED)
+        return {'id': task_id, 'cancelled': True, 'running': False}
+
+    def api_stats(self):
+        return {'tasks': self.task_store.count_by_status()}
+
+
+@pytest.fixture
+def server():
+    api = JobApiServer(_FakeBackend(), port=0, token=TOKEN, refresh_interval=0.05)
+    api.start()
+    yield api
+    api.stop()
+
+
+def _run(server, requests):
+    """依次发送请求 [(method, path, json, headers)]，返回 [(status, body)]。"""
+    async def send_all():
+        responses = []
+        async with aiohttp.ClientSession(server.url) as session:
+            for method, path, body, headers in requests:
+                if headers is None:
+                    headers = {'Authorization': f'Bearer {TOKEN}'}
+                async with session.request(method, path, json=body, headers=headers) as response:
+                    responses.append((response.status, await response.json()))
+                await asyncio.sleep(0.15) # 等待任务快照刷新
+        return responses
+    return asyncio.run(send_all())
+
+
+def test_submit_list_and_cancel(server):
+    video = 'https://youtu.be/dQw4w9WgXcQ'
+    (submit, batch, listed, filtered, cancel, missing, got) = _run(server, [
+        ('POST', '/api/jobs', {'url': video}, None),
+        ('POST', '/api/jobs/batch', {'urls': [video, 'not a url', 'https://www.tiktok.com/@u/video/1234567']}, None),
+        ('GET', '/api/jobs', None, None),
+        ('GET', '/api/jobs?platform=TikTok', None, None),
+        ('POST', '/api/jobs/YouTube_dQw4w9WgXcQ/cancel', None, None),
+        ('DELETE', '/api/jobs/missing', None, None),
+        ('GET', '/api/jobs/YouTube_dQw4w9WgXcQ', None, None),
+    ])
+    assert submit == (202, {'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'id': 'YouTube_dQw4w9WgXcQ',
+                            'platform': 'YouTube', 'result': 'queued'})
+    assert batch[0] == 202
+    assert batch[1]['counts'] == {'duplicate': 1, 'invalid': 1, 'queued': 1}
+    assert listed[1]['total'] == 2
+    assert [job['id'] for job in filtered[1]['jobs']] == ['TikTok_1234567']
+    assert cancel == (200, {'id': 'YouTube_dQw4w9WgXcQ', 'cancelled': True, 'running': False})
+    assert missing[0] == 404
+    assert got[1]['status'] == CANCELLED
+    assert server.backend.cancelled == ['YouTube_dQw4w9WgXcQ']
+
+
+def test_rejects_bad_requests(server):
+    (no_url, empty_batch, bad_limit) = _run(server, [
+        ('POST', '/api/jobs', {'link': 'x'}, None),
+        ('POST', '/api/jobs/batch', {'urls': []}, None),
+        ('GET', '/api/jobs?limit=many', None, None),
+    ])
+    assert no_url[0] == 400 and empty_batch[0] == 400 and bad_limit[0] == 400
+
+
+def test_token_is_required_except_for_health(server):
+    (no_token, wrong_token, query_token, health) = _run(server, [
+        ('GET', '/api/jobs', None, {}),
+        ('GET', '/api/jobs', None, {'Authorization': 'Bearer wrong'}),
+        ('GET', f'/api/stats?token={TOKEN}', None, {}),
+        ('GET', '/api/health', None, {}),
+    ])
+    assert no_token[0] == 401 and wrong_token[0] == 401
+    assert query_token[0] == 200 and query_token[1]['api']['unauthorized'] == 2
+    assert health == (200, {'ok': True})
@@ -0,0 +1,137 @@
+# tests/test_info_cache.py - SQLite info-dict cache: TTLs, signed-URL expiry, LRU eviction and failures
+import os
+
+import pytest
+
+import core.info_cache as info_cache_module
+from core.info_cache import InfoCache, EXPIRE_SAFETY_MARGIN, _url_expiry, cache_key_for_url
+
+NOW = 1_700_000_000.0
+
+
+class _Clock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(info_cache_module.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = InfoCache(str(tmp_path / 'info.sqlite3'), platform_ttls={'YouTube': 3600}, default_ttl=60)
+    yield cache
+    cache.close()
+
+
+def _info(video_id, url='https://cdn.example.com/v.mp4', padding=0):
+    return {'id': video_id, 'title': video_id, 'formats': [{'url': url}], 'padding': os.urandom(padding).hex()}
+
+
+def test_cache_key_for_url_uses_extractor_id():
+    assert cache_key_for_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ') == 'youtube dQw4w9WgXcQ'
+    assert cache_key_for_url('https://example.com/not-a-video') is None
+
+
+def test_round_trip_and_hit_miss_stats(cache):
+    cache.put('youtube a', _info('a'))
+    assert cache.get('youtube a')['title'] == 'a'
+    assert cache.get('youtube missing') is None
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['puts'], stats['entries']) == (1, 1, 1, 1)
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_platform_ttl_expiry(cache, clock):
+    assert cache.ttl_for('youtube') == 3600 and cache.ttl_for('other') == 60
+    cache.put('youtube a', _info('a'))
+    cache.put('other b', _info('b'))
+    clock.now += 120
+    assert cache.get('youtube a') is not None
+    assert cache.get('other b') is None # 默认有效期 60 秒已过
+    clock.now += 3600
+    assert cache.get('youtube a') is None
+    assert cache.get_stats()['expired'] == 2
+
+
+def test_signed_url_expiry_shortens_ttl(cache, clock):
+    expire = int(NOW) + EXPIRE_SAFETY_MARGIN + 600
+    cache.put('youtube a', _info('a', url=f'https://r1.googlevideo.com/videoplayback?expire={expire}&id=1'))
+    clock.now += 599
+    assert cache.get('youtube a') is not None
+    clock.now += 2
+    assert cache.get('youtube a') is None # 签名链接过期前 EXPIRE_SAFETY_MARGIN 秒失效
+
+    soon = int(NOW) + 60 # 链接即将过期，不写入缓存
+    cache.put('tiktok b', _info('b', url=f'https://v16.tiktokcdn.com/x/?x-expires={soon}'))
+    assert cache.get_stats()['puts'] == 1
+
+
+def test_contains_checks_expiry_without_counting_hits(cache, clock):
+    cache.put('other a', _info('a'))
+    assert cache.contains('other a')
+    assert not cache.contains('other missing') and not cache.contains(None)
+    clock.now += 61
+    assert not cache.contains('other a') # 已过期的条目不再视为存在
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses']) == (0, 0)
+
+
+def test_url_expiry_parsing():
+    info = {'formats': [{'url': 'https://a/videoplayback/expire/1712345678/id/1'},
+                        {'url': 'https://b/?x-expires=1712340000&sig=1'}, {'url': None}],
+            'url': 'https://c/no-expiry'}
+    assert _url_expiry(info) == 1712340000
+    assert _url_expiry({'url': 'https://c/?expires=12'}) is None # 不是时间戳
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path, clock):
+    cache = InfoCache(str(tmp_path / 'info.sqlite3'))
+    for index, key in enumerate(('youtube a', 'youtube b')):
+        clock.now = NOW + index
+        cache.put(key, _info(key, padding=1000))
+    cache.max_bytes = int(cache.get_stats()['bytes'] * 1.25) # 只能容纳两个条目
+    clock.now = NOW + 10
+    assert cache.get('youtube a') is not None # a 变为最近访问
+    clock.now = NOW + 11
+    cache.put('youtube c', _info('c', padding=1000))
+    assert cache.get('youtube b') is None
+    assert cache.get('youtube a') is not None and cache.get('youtube c') is not None
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['bytes'] <= cache.max_bytes
+    cache.close()
+
+
+def test_failures_table_expires(tmp_path, clock):
+    cache = InfoCache(str(tmp_path / 'info.sqlite3'), failure_ttl=100)
+    cache.put_failure('youtube a', 'private', '视频为私密视频')
+    assert cache.get_failure('youtube a') == {'reason': 'private', 'message': '视频为私密视频'}
+    assert cache.get_stats()['failure_hits'] == 1
+    clock.now += 101
+    assert cache.get_failure('youtube a') is None
+    cache.put_failure('youtube b', 'removed', '已删除')
+    cache.clear_failure('youtube b')
+    assert cache.get_failure('youtube b') is None
+    cache.close()
+
+
+def test_entries_survive_reopen_and_expired_rows_are_purged(tmp_path, clock):
+    path = str(tmp_path / 'info.sqlite3')
+    cache = InfoCache(path, default_ttl=60)
+    cache.put('youtube a', _info('a'))
+    cache.put('other b', _info('b'))
+    cache.close()
+    clock.now += 120
+    cache = InfoCache(path, default_ttl=60)
+    assert cache.get_stats()['entries'] == 1 # 过期条目在打开时清除
+    assert cache.get('youtube a')['id'] == 'a'
+    cache.invalidate('youtube a')
+    assert cache.get('youtube a') is None
+    cache.close()
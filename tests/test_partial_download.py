@@ -0,0 +1,66 @@
+# tests/test_partial_download.py - .part checkpoints, verification and truncation
+import os
+
+from core.partial_download import make_checkpoint, verify_checkpoint, discard_partial, TAIL_CHECK_BYTES
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_verify_truncates_unverified_bytes_after_checkpoint(tmp_path):
+    part = str(tmp_path / 'video.mp4.part')
+    data = os.urandom(TAIL_CHECK_BYTES + 1000)
+    _write(part, data)
+    checkpoint = make_checkpoint(part)
+    assert checkpoint['offset'] == len(data)
+    with open(part, 'ab') as f:
+        f.write(b'\0' * 5000) # 检查点之后写入的字节可能只是缓冲未落盘的垃圾
+
+    assert verify_checkpoint(checkpoint) == ('resume', len(data))
+    with open(part, 'rb') as f:
+        assert f.read() == data
+
+
+def test_verify_exact_size_is_left_untouched(tmp_path):
+    part = str(tmp_path / 'a.part')
+    _write(part, b'abc')
+    assert verify_checkpoint(make_checkpoint(part)) == ('resume', 3)
+    assert os.path.getsize(part) == 3
+
+
+def test_verify_reports_shorter_file_as_mismatch(tmp_path):
+    part = str(tmp_path / 'a.part')
+    _write(part, b'x' * 100)
+    checkpoint = make_checkpoint(part)
+    _write(part, b'x' * 50)
+    status, detail = verify_checkpoint(checkpoint)
+    assert status == 'mismatch' and '50' in detail
+    assert os.path.getsize(part) == 50 # 不匹配时不修改文件
+
+
+def test_verify_reports_changed_tail_as_mismatch(tmp_path):
+    part = str(tmp_path / 'a.part')
+    _write(part, b'x' * 100)
+    checkpoint = make_checkpoint(part)
+    _write(part, b'x' * 99 + b'y' + b'z' * 10)
+    assert verify_checkpoint(checkpoint)[0] == 'mismatch'
+    assert os.path.getsize(part) == 110
+
+
+def test_missing_and_empty_parts(tmp_path):
+    part = str(tmp_path / 'a.part')
+    assert make_checkpoint(part) is None
+    assert verify_checkpoint({'path': part, 'offset': 10, 'tail_sha256': ''}) == ('missing', None)
+    _write(part, b'')
+    assert make_checkpoint(part) is None
+
+
+def test_discard_partial_removes_fragments_and_state(tmp_path):
+    part = str(tmp_path / 'v[1].mp4.part')
+    for path in (part, part + '-Frag1', part + '-Frag2', str(tmp_path / 'v[1].mp4.ytdl')):
+        _write(path, b'1')
+    _write(str(tmp_path / 'other.part'), b'1')
+    discard_partial(part)
+    assert sorted(os.listdir(tmp_path)) == ['other.part']
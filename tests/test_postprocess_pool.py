@@ -0,0 +1,84 @@
+# tests/test_postprocess_pool.py - CPU budget of the post-processing queue and cancelling queued jobs
+import itertools
+import threading
+
+import pytest
+
+from core.postprocess_pool import PostProcessPool
+
+TIMEOUT = 5
+
+
+@pytest.mark.parametrize('cpu_budget', range(1, 13))
+def test_jobs_times_threads_never_exceed_budget(cpu_budget):
+    for max_jobs, threads in itertools.product([None, *range(1, 15)], repeat=2):
+        pool = PostProcessPool(cpu_budget=cpu_budget, max_jobs=max_jobs, threads_per_job=threads)
+        try:
+            assert pool.max_jobs >= 1 and pool.threads_per_job >= 1
+            assert pool.max_jobs * pool.threads_per_job <= cpu_budget, (max_jobs, threads)
+            if max_jobs and max_jobs * (threads or 1) <= cpu_budget:
+                assert pool.max_jobs == max_jobs # 预算足够时按配置的作业数运行
+        finally:
+            pool.shutdown()
+
+
+def test_defaults_split_budget_between_jobs():
+    pool = PostProcessPool(cpu_budget=8)
+    assert (pool.max_jobs, pool.threads_per_job) == (4, 2)
+    pool.shutdown()
+
+
+def test_from_config_can_disable_offload(capsys):
+    config = {'postprocess_offload': False}
+    assert PostProcessPool.from_config(lambda key, default=None: config.get(key, default)) is None
+    config = {'postprocess_cpu_budget': 'all', 'postprocess_max_jobs': 2}
+    pool = PostProcessPool.from_config(lambda key, default=None: config.get(key, default))
+    assert pool.max_jobs <= 2
+    assert 'postprocess_cpu_budget' in capsys.readouterr().out
+    pool.shutdown()
+
+
+class _BlockingPool(PostProcessPool):
+    """不调用 FFmpeg 的后处理队列: 作业阻塞到 release 被设置。"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.processed = []
+
+    def _postprocess(self, job):
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        self.processed.append(job['filepath'])
+        return job['filepath'], None
+
+
+def test_cancel_queued_job_before_it_starts():
+    events = []
+    pool = _BlockingPool(progress_callback=events.append, cpu_budget=1)
+    first = pool.submit({'id': 'a'}, {'id': 'a', 'status': 'postprocessing', 'postprocess': {'filepath': 'a.mp4'}})
+    assert pool.started.wait(TIMEOUT)
+    second = pool.submit({'id': 'b'}, {'id': 'b', 'status': 'postprocessing', 'postprocess': {'filepath': 'b.mp4'}})
+    assert pool.get_stats()['queued'] == 1
+
+    assert not pool.cancel('a') # 正在运行的作业不会被中断
+    assert pool.cancel('b')
+    assert not pool.cancel('b')
+    assert second.result(TIMEOUT)['status'] == 'cancelled'
+    pool.release.set()
+    result = first.result(TIMEOUT)
+    assert result['status'] == 'finished' and result['filepath'] == 'a.mp4' and 'postprocess' not in result
+    pool.shutdown()
+    assert pool.processed == ['a.mp4']
+    stats = pool.get_stats()
+    assert (stats['completed'], stats['cancelled'], stats['queued'], stats['running']) == (1, 1, 0, 0)
+    assert {'id': 'b', 'status': 'cancelled', 'description': '已取消 (未后处理)'} in events
+
+
+def test_missing_file_fails_the_job():
+    pool = PostProcessPool(cpu_budget=1)
+    future = pool.submit({'id': 'a'}, {'id': 'a', 'postprocess': {'filepath': '/nonexistent/a.mp4'}})
+    result = future.result(TIMEOUT)
+    assert result['status'] == 'error' and '文件不存在' in result['error_message']
+    pool.shutdown()
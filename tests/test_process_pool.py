@@ -0,0 +1,77 @@
+# tests/test_process_pool.py - Shared-memory token buckets and cancel flags used by the process mode
+import multiprocessing
+import time
+
+import pytest
+
+from core.bandwidth_limiter import BandwidthLimiter
+from core.cancel_token import REASON_USER, REASON_SHUTDOWN
+from core.process_pool import SharedTokenBuckets, SharedCancelFlags, _SharedBandwidthLimiter, _SharedCancelToken
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context('spawn')
+
+
+def test_unlimited_slots_never_wait(context):
+    buckets = SharedTokenBuckets(context, platforms=['TikTok'])
+    assert buckets.slot_for('tiktok') == 1 and buckets.slot_for('youtube') is None
+    assert buckets.consume(0, 10 ** 9) == 0.0
+    assert buckets.consume(1, 0) == 0.0
+
+
+def test_overdraft_waits_for_refill(context):
+    buckets = SharedTokenBuckets(context)
+    buckets.set_rate(0, 100_000)
+    started = time.monotonic()
+    waited = buckets.consume(0, 20_000) # 桶初始为空，约 0.2 秒补足
+    assert 0.15 <= waited <= 0.5
+    assert 0.15 <= time.monotonic() - started <= 0.5
+
+
+def test_should_stop_and_rate_change_end_wait(context):
+    buckets = SharedTokenBuckets(context)
+    buckets.set_rate(0, 1_000)
+    started = time.monotonic()
+    buckets.consume(0, 100_000, should_stop=lambda: True)
+    assert time.monotonic() - started < 0.1
+    buckets.set_rate(0, 0) # 取消限速后等待立即结束，透支也被清零
+    assert buckets.consume(0, 100_000) == 0.0
+
+
+def test_sync_from_limiter_sets_global_and_platform_rates(context):
+    limiter = BandwidthLimiter(limit_kbps=0, platform_limits_kbps={'tiktok': 100})
+    buckets = SharedTokenBuckets(context, platforms=limiter.get_stats()['platform_limits_kbps'])
+    buckets.sync_from(limiter)
+    started = time.monotonic()
+    _SharedBandwidthLimiter(buckets).consume('youtube', 10 ** 9) # 只有平台子限速，youtube 不受限
+    assert time.monotonic() - started < 0.1
+    limiter.set_limit(2048)
+    buckets.sync_from(limiter)
+    assert buckets._values[0] == 2048 * 1024
+    assert buckets._values[3] == 100 * 1024
+
+
+def test_cancel_flags_record_reason_and_clear(context):
+    flags = SharedCancelFlags(context, size=4)
+    assert flags.reason('a') is None
+    assert flags.set('a')
+    assert flags.set('b', keep_partials=True)
+    assert flags.reason('a') == REASON_USER
+    assert flags.reason('b') == REASON_SHUTDOWN
+    token = _SharedCancelToken(flags, 'b')
+    assert token.cancelled and token.reason == REASON_SHUTDOWN
+    flags.clear('b')
+    assert not token.cancelled and token.reason is None
+    assert flags.is_set('a') and not flags.is_set('c')
+
+
+def test_cancel_flags_full_and_slot_reuse(context):
+    flags = SharedCancelFlags(context, size=2)
+    assert flags.set('a') and flags.set('b')
+    assert flags.set('a') # 已标记的任务不占用新槽位
+    assert not flags.set('c') # 槽位已满
+    flags.clear('a')
+    assert flags.set('c', keep_partials=True)
+    assert flags.reason('c') == REASON_SHUTDOWN and flags.reason('b') == REASON_USER
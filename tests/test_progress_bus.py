@@ -0,0 +1,62 @@
+# tests/test_progress_bus.py - Coalescing progress channel: latest state per item and counters
+import threading
+
+from core.progress_bus import ProgressBus
+
+
+def test_keeps_only_latest_state_per_item():
+    bus = ProgressBus(shard_count=4)
+    for percent in ('10%', '50%', '90%'):
+        bus.publish({'id': 'a', 'status': 'downloading', 'percent': percent})
+    bus.publish({'id': 'b', 'status': 'finished'})
+    batch = {data['id']: data for data in bus.drain()}
+    assert batch == {'a': {'id': 'a', 'status': 'downloading', 'percent': '90%'},
+                     'b': {'id': 'b', 'status': 'finished'}}
+    stats = bus.get_stats()
+    assert (stats['published'], stats['coalesced'], stats['drained_items']) == (4, 2, 2)
+    assert stats['coalesce_ratio'] == 0.5
+
+
+def test_drain_empties_every_shard():
+    bus = ProgressBus(shard_count=8)
+    ids = [f'task-{i}' for i in range(100)]
+    for item_id in ids:
+        bus.publish({'id': item_id})
+    assert sorted(data['id'] for data in bus.drain()) == sorted(ids)
+    assert bus.drain() == []
+    bus.publish({'id': 'task-1', 'percent': '1%'}) # 取走后再次发布不计为合并
+    assert bus.drain() == [{'id': 'task-1', 'percent': '1%'}]
+    stats = bus.get_stats()
+    assert stats['coalesced'] == 0 and stats['drains'] == 3 and stats['max_batch'] == 100
+
+
+def test_rejects_data_without_id_and_counts_dropped():
+    bus = ProgressBus()
+    assert not bus.publish({'status': 'downloading'})
+    bus.record_dropped()
+    bus.record_dropped(3)
+    stats = bus.get_stats()
+    assert stats['published'] == 0 and stats['dropped'] == 4
+    assert stats['coalesce_ratio'] == 0.0
+
+
+def test_concurrent_publishers_lose_nothing():
+    bus = ProgressBus(shard_count=4)
+    drained = {}
+
+    def publish(worker):
+        for step in range(500):
+            bus.publish({'id': f'w{worker}', 'step': step})
+
+    threads = [threading.Thread(target=publish, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        drained.update((data['id'], data['step']) for data in bus.drain())
+    for thread in threads:
+        thread.join()
+    drained.update((data['id'], data['step']) for data in bus.drain())
+    assert drained == {f'w{worker}': 499 for worker in range(8)} # 每个任务的最后状态都送达
+    stats = bus.get_stats()
+    assert stats['published'] == 4000
+    assert stats['coalesced'] + stats['drained_items'] == 4000
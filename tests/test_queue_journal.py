@@ -0,0 +1,71 @@
+# tests/test_queue_journal.py - Journal replay after a crash and snapshot compaction
+import json
+
+import pytest
+
+from core.queue_journal import QueueJournal
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'queue.jsonl')
+
+
+def _open(path):
+    return QueueJournal(path, compact_events=100)
+
+
+def test_replay_applies_puts_updates_and_removes(journal_path):
+    journal = _open(journal_path)
+    journal.record(tasks=[{'id': 'a', 'status': '等待中'}, {'id': 'b', 'status': '等待中'}])
+    journal.record(tasks=[{'id': 'a', 'status': '已完成'}], removed_ids=['b'])
+    journal.record(tasks=[{'id': 'c', 'status': '等待中'}])
+    journal.close()
+
+    tasks = _open(journal_path).replay()
+    assert tasks == [{'id': 'a', 'status': '已完成'}, {'id': 'c', 'status': '等待中'}]
+
+
+def test_replay_ignores_torn_tail_and_keeps_appending(journal_path):
+    journal = _open(journal_path)
+    journal.record(tasks=[{'id': 'a', 'status': '等待中'}])
+    journal.close()
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "put", "task": {"id": "b", "sta') # 崩溃时写到一半的最后一行
+
+    journal = _open(journal_path)
+    assert [task['id'] for task in journal.replay()] == ['a']
+    assert journal.get_stats()['corrupt_lines'] == 1
+    journal.record(tasks=[{'id': 'c'}]) # 新事件不能与残缺的行粘连
+    journal.close()
+
+    journal = _open(journal_path)
+    assert [task['id'] for task in journal.replay()] == ['a', 'c']
+    journal.close()
+
+
+def test_missing_journal_replays_empty(journal_path):
+    journal = _open(journal_path)
+    assert not journal.exists()
+    assert journal.replay() == []
+    journal.close()
+
+
+def test_compact_rewrites_journal_as_snapshot(journal_path):
+    journal = _open(journal_path)
+    for i in range(150):
+        journal.record(tasks=[{'id': 'a', 'progress': i}])
+    journal.record(tasks=[{'id': 'b'}], removed_ids=['gone'])
+    assert journal.needs_compaction(live_tasks=2)
+    journal.compact([{'id': 'a', 'progress': 149}, {'id': 'b'}])
+    assert not journal.needs_compaction(live_tasks=2)
+    journal.record(tasks=[{'id': 'c'}]) # 压缩后的事件追加到新文件
+    journal.flush()
+    assert journal.get_stats()['compactions'] == 1
+    journal.close()
+
+    with open(journal_path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]['op'] == 'snapshot' and lines[0]['count'] == 2
+    assert len(lines) == 4
+    assert [task['id'] for task in _open(journal_path).replay()] == ['a', 'b', 'c']
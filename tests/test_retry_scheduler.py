@@ -0,0 +1,74 @@
+# tests/test_retry_scheduler.py - RetryPolicy backoff and DelayedTaskQueue ordering
+import threading
+
+import pytest
+
+from core.retry_scheduler import RetryPolicy, DelayedTaskQueue
+
+
+def test_next_delay_grows_exponentially_without_jitter():
+    policy = RetryPolicy(base_delay=2.0, multiplier=3.0, max_delay=100.0, jitter=0)
+    assert [policy.next_delay(attempt) for attempt in range(4)] == [2.0, 6.0, 18.0, 54.0]
+
+
+def test_next_delay_is_capped_before_scaling():
+    policy = RetryPolicy(base_delay=10.0, multiplier=2.0, max_delay=30.0, jitter=0)
+    assert policy.next_delay(5) == 30.0
+    assert policy.next_delay(5, scale=2.0) == 60.0
+
+
+def test_next_delay_jitter_stays_within_bounds():
+    policy = RetryPolicy(base_delay=10.0, multiplier=1.0, jitter=0.2)
+    delays = [policy.next_delay(0) for _ in range(200)]
+    assert all(8.0 <= delay <= 12.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_should_retry_respects_max_retries():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry(0)
+    assert policy.should_retry(1)
+    assert not policy.should_retry(2)
+
+
+def test_from_config_falls_back_on_invalid_values():
+    config = {'retry_max_retries': 'many', 'retry_base_delay': '1.5'}
+    policy = RetryPolicy.from_config(lambda key, default=None: config.get(key, default))
+    assert policy.max_retries == RetryPolicy().max_retries
+    assert policy.base_delay == 1.5
+
+
+@pytest.fixture
+def queue():
+    delayed = DelayedTaskQueue(name='TestDelayedTaskQueue')
+    yield delayed
+    delayed.shutdown()
+
+
+def test_delayed_queue_runs_tasks_in_due_order(queue):
+    calls = []
+    done = threading.Event()
+    queue.schedule(0.10, calls.append, 'late')
+    queue.schedule(0.02, calls.append, 'early')
+    queue.schedule(0.15, done.set)
+    assert done.wait(2)
+    assert calls == ['early', 'late']
+
+
+def test_delayed_queue_cancel_and_replace_by_key(queue):
+    calls = []
+    done = threading.Event()
+    queue.schedule(0.02, calls.append, 'cancelled', key='a')
+    assert queue.cancel('a')
+    assert not queue.cancel('a')
+    queue.schedule(0.02, calls.append, 'first', key='b')
+    queue.schedule(0.05, calls.append, 'replacement', key='b')
+    queue.schedule(0.10, done.set)
+    assert done.wait(2)
+    assert calls == ['replacement']
+
+
+def test_delayed_queue_rejects_tasks_after_shutdown(queue):
+    queue.shutdown()
+    assert not queue.schedule(0, lambda: None)
+    assert queue.pending_count() == 0
@@ -0,0 +1,96 @@
+# tests/test_task_store.py - TaskStore indexes, filtered queries and change tracking
+import pytest
+
+from core.task_store import TaskStore, PENDING, QUEUED, DOWNLOADING, FINISHED, ERROR, parse_size
+
+
+@pytest.fixture
+def store():
+    store = TaskStore()
+    store.add('a', 'https://www.tiktok.com/@u/video/1', 'tiktok', filename='zeta', size='1.5 MB')
+    store.add('b', 'https://www.youtube.com/watch?v=b', 'youtube', status=FINISHED, filename='alpha', size='700 KB')
+    store.add('c', 'https://www.tiktok.com/@u/video/3', 'tiktok', status=ERROR, filename='mid', size='未知')
+    store.add('d', 'https://www.youtube.com/watch?v=d', 'youtube', status=QUEUED, filename='beta', size='2 GB',
+              selected=False)
+    store.take_changes()
+    return store
+
+
+def test_parse_size_units():
+    assert parse_size('1.5 MB') == 1_500_000
+    assert parse_size('2KiB') == 2048
+    assert parse_size('未知') == -1
+
+
+def test_query_filters_by_status_and_platform(store):
+    assert store.query() == ['a', 'b', 'c', 'd']
+    assert store.query(statuses=[PENDING, ERROR]) == ['a', 'c']
+    assert store.query(platform='youtube') == ['b', 'd']
+    assert store.query(statuses=[FINISHED, QUEUED], platform='youtube') == ['b', 'd']
+    assert store.query(statuses=[ERROR], platform='youtube') == []
+    assert store.query(platform='missing') == []
+
+
+def test_query_sorts_and_reverses(store):
+    assert store.query(sort_by='filename') == ['b', 'd', 'c', 'a']
+    assert store.query(sort_by='size', reverse=True) == ['d', 'a', 'b', 'c']
+    assert store.query(reverse=True) == ['d', 'c', 'b', 'a']
+
+
+def test_status_index_follows_updates(store):
+    assert store.update('a', status=DOWNLOADING)
+    assert not store.update('a', status=DOWNLOADING) # 没有变化
+    assert store.ids_with_status(DOWNLOADING) == ['a']
+    assert store.ids_with_status(PENDING) == []
+    assert store.count_by_status() == {DOWNLOADING: 1, FINISHED: 1, ERROR: 1, QUEUED: 1}
+    assert store.selected_ids(statuses=[QUEUED, DOWNLOADING]) == ['a']
+
+
+def test_removed_slot_is_reused_without_breaking_order(store):
+    assert store.remove(['b', 'missing']) == 1
+    store.add('e', 'https://example.com/e', 'other')
+    assert store.query() == ['a', 'c', 'd', 'e']
+    assert store.get('e').slot == 1
+    assert store.platforms() == ['other', 'tiktok', 'youtube']
+
+
+def test_take_changes_reports_each_change_once(store):
+    store.update('a', description='下载中')
+    store.add('e', 'https://example.com/e', 'other')
+    store.remove(['c'])
+    changed, removed = store.take_changes()
+    assert changed == ['a', 'e'] and removed == ['c']
+    assert store.take_changes() == ([], [])
+
+
+def test_persist_changes_skip_progress_only_fields(store):
+    store.take_persist_changes()
+    store.update('a', progress='42%', speed='1 MiB/s')
+    assert store.take_persist_changes() == ([], [])
+    store.update('a', status=ERROR)
+    tasks, removed = store.take_persist_changes()
+    assert [task['id'] for task in tasks] == ['a'] and removed == []
+
+
+def test_change_feeds_are_independent(store):
+    feed_id, snapshot = store.open_change_feed()
+    assert [task['id'] for task in snapshot] == ['a', 'b', 'c', 'd']
+    other_id, _ = store.open_change_feed()
+    store.update('a', status=QUEUED)
+    store.remove(['b'])
+    tasks, removed = store.take_feed_changes(feed_id)
+    assert [task['id'] for task in tasks] == ['a'] and tasks[0]['status'] == QUEUED
+    assert removed == ['b']
+    assert store.take_feed_changes(feed_id) == ([], [])
+    assert store.take_feed_changes(other_id)[1] == ['b'] # 另一个通道不受影响
+    assert store.take_changes() == (['a'], ['b'])
+
+
+def test_change_feed_remove_then_add_reports_latest_state(store):
+    feed_id, _ = store.open_change_feed()
+    store.remove(['a'])
+    store.add('a', 'https://www.tiktok.com/@u/video/1', 'tiktok', status=FINISHED)
+    tasks, removed = store.take_feed_changes(feed_id)
+    assert [task['id'] for task in tasks] == ['a'] and removed == []
+    store.close_change_feed(feed_id)
+    assert store.take_feed_changes(feed_id) == ([], [])
@@ -0,0 +1,63 @@
+# tests/test_url_canonicalizer.py - Offline URL canonicalization and duplicate keys
+import pytest
+
+from core.url_canonicalizer import canonicalize, canonical_task_id, normalize_url
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+@pytest.mark.parametrize('url', [
+    f'https://www.youtube.com/watch?v={VIDEO_ID}',
+    f'https://youtu.be/{VIDEO_ID}',
+    f'https://youtu.be/{VIDEO_ID}?si=abcdef&t=42',
+    f'https://www.youtube.com/watch?v={VIDEO_ID}&t=42s',
+    f'https://www.youtube.com/watch?feature=share&v={VIDEO_ID}&list=PL1',
+    f'https://m.youtube.com/watch?v={VIDEO_ID}',
+    f'https://music.youtube.com/watch?v={VIDEO_ID}',
+    f'https://www.youtube.com/shorts/{VIDEO_ID}',
+    f'https://www.youtube-nocookie.com/embed/{VIDEO_ID}',
+    f'HTTPS://WWW.YOUTUBE.COM/watch?v={VIDEO_ID}#comments',
+    f'(https://youtu.be/{VIDEO_ID}),',
+])
+def test_youtube_variants_share_one_key(url):
+    canonical = canonicalize(url)
+    assert canonical.platform == 'YouTube'
+    assert canonical.video_id == VIDEO_ID
+    assert canonical.url == f'https://www.youtube.com/watch?v={VIDEO_ID}'
+    assert canonical.key == f'YouTube:{VIDEO_ID}'
+    assert canonical.task_id == f'YouTube_{VIDEO_ID}'
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.tiktok.com/@someone/video/7234567890123456789',
+    'https://m.tiktok.com/v/7234567890123456789.html',
+    'https://www.tiktok.com/@someone/video/7234567890123456789/?is_from_webapp=1&sender_device=pc',
+    'https://www.tiktok.com/embed/v2/7234567890123456789',
+])
+def test_tiktok_variants_share_one_key(url):
+    canonical = canonicalize(url)
+    assert (canonical.platform, canonical.video_id) == ('TikTok', '7234567890123456789')
+
+
+def test_unrecognized_urls_dedupe_without_tracking_params_and_mobile_host():
+    plain = canonicalize('https://example.com/video/1/?id=5&utm_source=x&fbclid=y')
+    mobile = canonicalize('https://m.example.com/video/1?id=5')
+    assert plain.video_id is None
+    assert plain.url == 'https://example.com/video/1?id=5'
+    assert plain.key == mobile.key
+    assert plain.task_id == canonical_task_id('https://example.com/video/1?id=5')
+    assert canonicalize('https://example.com/video/1?id=6').key != plain.key
+
+
+def test_tiktok_short_link_keeps_platform_without_video_id():
+    canonical = canonicalize('https://vm.tiktok.com/ZMabc123/?_r=1')
+    assert canonical.platform == 'TikTok' and canonical.video_id is None
+    assert canonical.url == 'https://vm.tiktok.com/ZMabc123'
+    assert canonical.task_id.startswith('TikTok_url_')
+
+
+@pytest.mark.parametrize('token', ['ftp://example.com/a', 'not a url', 'https://', 'https://host:99999/a'])
+def test_invalid_urls_are_rejected(token):
+    assert normalize_url(token) is None
+    assert canonicalize(token) is None
+    assert canonical_task_id(token) is None
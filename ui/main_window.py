@@ -4,10 +4,28 @@ from tkinter import ttk
 from tkinter import filedialog, messagebox
 import os
 
+from ui.virtual_task_list import VirtualTaskList
+from core.task_store import PENDING, FINISHED, ERROR, CANCELLED, ACTIVE_STATUSES
+
 # 导入平台 UI 模块 (稍后用于动态加载)
 # import ui.tiktok_tab as tiktok_ui
 # import ui.youtube_tab as youtube_ui # (如果存在)
 
+# 设置窗口中"最大并发下载数"的自动调节选项
+AUTO_CONCURRENCY_LABEL = "自动"
+# 下载列表的状态过滤选项: 显示文本 -> 状态元组 (None 表示全部)
+STATUS_FILTERS = {
+    "全部": None,
+    "待下载": (PENDING,),
+    "进行中": ACTIVE_STATUSES,
+    "已完成": (FINISHED,),
+    "出错": (ERROR,),
+    "已取消": (CANCELLED,),
+}
+ALL_PLATFORMS_LABEL = "全部"
+# 可点击表头排序的列
+SORTABLE_DOWNLOAD_COLUMNS = ('filename', 'size', 'status', 'platform')
+
 class MainWindow:
     """负责主应用程序窗口的创建、布局和基本 UI 事件处理。"""
 
@@ -47,6 +65,7 @@ class MainWindow:
 
         # --- 绑定事件 ---
         self.download_tree.bind('<Button-1>', self._toggle_download_selection)
+        self.download_tree.bind('<Button-3>', self._show_download_menu)
 
     def _create_widgets(self):
         """创建窗口中的所有主要控件。"""
@@ -65,18 +84,39 @@ class MainWindow:
 
         # --- 全局下载列表框架和 Treeview ---
         self.download_frame = ttk.LabelFrame(self.root, text="下载列表")
+        # 过滤栏: 按状态和平台过滤，右侧显示数量
+        self.download_filter_frame = ttk.Frame(self.download_frame)
+        self.status_filter_var = tk.StringVar(value="全部")
+        self.platform_filter_var = tk.StringVar(value=ALL_PLATFORMS_LABEL)
+        self.download_summary_var = tk.StringVar(value="")
+        self.status_filter_combo = ttk.Combobox(self.download_filter_frame, textvariable=self.status_filter_var,
+                                                values=list(STATUS_FILTERS), state='readonly', width=8)
+        self.platform_filter_combo = ttk.Combobox(self.download_filter_frame, textvariable=self.platform_filter_var,
+                                                  values=[ALL_PLATFORMS_LABEL], state='readonly', width=10,
+                                                  postcommand=self._refresh_platform_filter_values)
+        self.status_filter_combo.bind('<<ComboboxSelected>>', self._apply_download_filter)
+        self.platform_filter_combo.bind('<<ComboboxSelected>>', self._apply_download_filter)
+        self.download_summary_label = ttk.Label(self.download_filter_frame, textvariable=self.download_summary_var)
+
         download_cols = ('select', 'filename', 'size', 'status', 'eta', 'speed', 'platform', 'description')
         self.download_tree = ttk.Treeview(self.download_frame, columns=download_cols, show='headings', height=10)
         self._setup_download_tree_columns(download_cols) # 配置列
-        self.download_scrollbar = ttk.Scrollbar(self.download_frame, orient=tk.VERTICAL, command=self.download_tree.yview)
-        self.download_tree.configure(yscrollcommand=self.download_scrollbar.set)
+        self.download_scrollbar = ttk.Scrollbar(self.download_frame, orient=tk.VERTICAL)
+        # 虚拟化列表: Treeview 只保留可见的行，数据来自控制器的任务存储 (由控制器调用 attach)
+        self.download_list = VirtualTaskList(self.download_tree, self.download_scrollbar,
+                                             summary_var=self.download_summary_var)
 
         # --- 下载列表下方的控件 (移除进度条, 父容器改为 self.root) ---
         self.controls_frame = ttk.Frame(self.root) # tk -> ttk
         self.remove_button = ttk.Button(self.controls_frame, text="移除选中项", command=self.remove_selected_downloads) # tk -> ttk
         self.download_selected_button = ttk.Button(self.controls_frame, text="下载选中项", command=self.app.start_selected_downloads) # tk -> ttk
-        # 修改：使用 ttk.Style 代替 background
-        # self.stop_button = ttk.Button(...) # 停止按钮已移除
+        self.cancel_selected_button = ttk.Button(self.controls_frame, text="取消选中项", command=self.app.cancel_selected_downloads)
+        self.cancel_all_button = ttk.Button(self.controls_frame, text="全部取消", style='Danger.TButton', command=self.cancel_all_downloads)
+        # 下载列表的右键菜单 (作用于点击的那一行)
+        self.download_menu = tk.Menu(self.root, tearoff=0)
+        self.download_menu.add_command(label="取消此任务", command=lambda: self._on_download_menu(self.app.cancel_tasks))
+        self.download_menu.add_command(label="移除此任务", command=lambda: self._on_download_menu(self.app.remove_tasks))
+        self._menu_item_id = None
 
         # --- 主进度条已移除 ---
 
@@ -109,10 +149,16 @@ class MainWindow:
 
         # --- 下载列表布局 ---
         self.download_frame.grid(row=3, column=0, sticky='nsew', padx=10, pady=5)
-        self.download_frame.grid_rowconfigure(0, weight=1) # Treeview row stretches
+        self.download_frame.grid_rowconfigure(1, weight=1) # Treeview row stretches
         self.download_frame.grid_columnconfigure(0, weight=1) # Treeview column stretches
-        self.download_tree.grid(row=0, column=0, sticky='nsew')
-        self.download_scrollbar.grid(row=0, column=1, sticky='ns')
+        self.download_filter_frame.grid(row=0, column=0, columnspan=2, sticky='ew', pady=(0, 5))
+        ttk.Label(self.download_filter_frame, text="状态:").pack(side=tk.LEFT)
+        self.status_filter_combo.pack(side=tk.LEFT, padx=(2, 10))
+        ttk.Label(self.download_filter_frame, text="平台:").pack(side=tk.LEFT)
+        self.platform_filter_combo.pack(side=tk.LEFT, padx=(2, 10))
+        self.download_summary_label.pack(side=tk.RIGHT)
+        self.download_tree.grid(row=1, column=0, sticky='nsew')
+        self.download_scrollbar.grid(row=1, column=1, sticky='ns')
 
         # --- 主进度条布局已移除 ---
 
@@ -124,6 +170,8 @@ class MainWindow:
         # self.stop_button.pack(...) # 停止按钮已移除
         self.download_selected_button.pack(in_=self.controls_frame, side=tk.RIGHT, padx=(5, 0))
         self.remove_button.pack(in_=self.controls_frame, side=tk.RIGHT, padx=(0, 0)) # 最右边的按钮（逻辑上是 remove）
+        self.cancel_selected_button.pack(in_=self.controls_frame, side=tk.RIGHT, padx=(0, 5))
+        self.cancel_all_button.pack(in_=self.controls_frame, side=tk.RIGHT, padx=(0, 5))
 
     # --- Public Methods for Controller to Use ---
 
@@ -165,9 +213,13 @@ class MainWindow:
             messagebox.showinfo(title, message, parent=parent_window)
 
     def get_download_treeview(self):
-        """返回下载列表 Treeview 控件的引用。"""
+        """返回下载列表 Treeview 控件的引用 (只包含可见的行)。"""
         return self.download_tree
 
+    def get_download_list(self):
+        """返回虚拟化下载列表 (VirtualTaskList) 的引用。"""
+        return self.download_list
+
     # get_progress_bar 方法已移除
 
     def get_path_variable(self):
@@ -207,11 +259,37 @@ class MainWindow:
         stretches = {'select': False, 'filename': True, 'size': False, 'status': False, 'eta': False,
                      'speed': False, 'platform': False, 'description': True} # 让描述列也拉伸
         anchors = {'select': tk.CENTER, 'size': tk.E, 'eta': tk.E, 'speed': tk.E}
+        self._download_headings = headings
         for col in cols:
-            self.download_tree.heading(col, text=headings.get(col, col))
+            if col in SORTABLE_DOWNLOAD_COLUMNS:
+                self.download_tree.heading(col, text=headings.get(col, col),
+                                           command=lambda c=col: self._sort_download_list(c))
+            else:
+                self.download_tree.heading(col, text=headings.get(col, col))
             self.download_tree.column(col, width=widths.get(col, 100), minwidth=minwidths.get(col, 40),
                                       stretch=stretches.get(col, False), anchor=anchors.get(col, tk.W))
 
+    def _sort_download_list(self, column):
+        """点击表头排序 (升序 -> 降序 -> 添加顺序)，并在表头显示排序方向。"""
+        sort_by, reverse = self.download_list.toggle_sort(column)
+        for col in SORTABLE_DOWNLOAD_COLUMNS:
+            text = self._download_headings.get(col, col)
+            if col == sort_by:
+                text += " ▼" if reverse else " ▲"
+            self.download_tree.heading(col, text=text)
+
+    def _apply_download_filter(self, event=None):
+        """状态或平台过滤条件变化时刷新下载列表。"""
+        platform = self.platform_filter_var.get()
+        self.download_list.set_filter(statuses=STATUS_FILTERS.get(self.status_filter_var.get()),
+                                      platform=None if platform == ALL_PLATFORMS_LABEL else platform)
+
+    def _refresh_platform_filter_values(self):
+        """展开平台下拉框时，列出任务存储中现有的平台。"""
+        store = getattr(self.app, 'task_store', None)
+        platforms = store.platforms() if store is not None else []
+        self.platform_filter_combo.configure(values=[ALL_PLATFORMS_LABEL] + platforms)
+
     def _add_error_tab(self, name, error_message):
         """在 Notebook 中添加一个显示错误的标签页"""
         error_tab = ttk.Frame(self.notebook, padding="10")
@@ -225,7 +303,7 @@ class MainWindow:
             self.path_var.set(os.path.abspath(folder)) # 更新变量，会自动触发 trace 回调
 
     def _toggle_download_selection(self, event):
-        """处理下载列表 Treeview 的点击事件，切换第一列的选择状态。"""
+        """处理下载列表 Treeview 的点击事件，切换第一列的选择状态 (写入任务存储，列表随之刷新)。"""
         region = self.download_tree.identify_region(event.x, event.y)
         if region != "cell": return
         column = self.download_tree.identify_column(event.x)
@@ -233,35 +311,39 @@ class MainWindow:
         item_iid = self.download_tree.identify_row(event.y)
         if not item_iid: return
 
-        current_value = self.download_tree.set(item_iid, column='select')
-        new_value = '☑' if current_value == '☐' else '☐'
-        self.download_tree.set(item_iid, column='select', value=new_value)
+        self.app.toggle_task_selection(item_iid)
 
-    def remove_selected_downloads(self):
-        """从下载列表中移除所有选中的项，并标记它们以便不再持久化。"""
-        items_to_remove = []
-        for item_iid in self.download_tree.get_children(''):
-            try:
-                if self.download_tree.set(item_iid, column='select') == '☑':
-                    items_to_remove.append(item_iid)
-            except tk.TclError: print(f"检查行 {item_iid} 的选择状态时出错。"); continue
+    def _show_download_menu(self, event):
+        """在下载列表中右键点击某一行时弹出任务菜单。"""
+        item_iid = self.download_tree.identify_row(event.y)
+        if not item_iid: return
+        self._menu_item_id = item_iid
+        try:
+            self.download_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.download_menu.grab_release()
+
+    def _on_download_menu(self, action):
+        """对右键菜单所属的任务执行 action([item_id])。"""
+        item_id, self._menu_item_id = self._menu_item_id, None
+        if item_id:
+            action([item_id])
 
+    def cancel_all_downloads(self):
+        """确认后取消整个下载队列 (正在下载的任务立即中止，已下载的部分删除)。"""
+        if messagebox.askyesno("确认", "确定要取消所有未完成的下载任务吗？\n（正在下载的部分文件将被删除）", parent=self.root):
+            self.app.cancel_all_downloads()
+
+    def remove_selected_downloads(self):
+        """从下载列表中移除所有选中的项 (从任务存储中删除，不再持久化)。"""
+        items_to_remove = self.app.get_selected_task_ids()
         if not items_to_remove:
             self.show_message("提示", "没有选中的下载项可移除。")
             return
 
-            # --- 新增：通知 Controller 标记这些项为已移除 ---
-            if hasattr(self.app, 'mark_items_as_removed'):
-                self.app.mark_items_as_removed(items_to_remove)
-            else:
-                print("警告: App Controller 没有 mark_items_as_removed 方法，无法标记移除项。")
-            # -----------------------------------------
         if messagebox.askyesno("确认", f"确定要移除选中的 {len(items_to_remove)} 个下载项吗？\n（移除后下次启动不会加载）", parent=self.root):
-            for item_iid in items_to_remove:
-                try:
-                    if self.download_tree.exists(item_iid): self.download_tree.delete(item_iid)
-                except tk.TclError: print(f"移除行 {item_iid} 时出错。")
-            self.update_status_bar(f"移除了 {len(items_to_remove)} 个下载项。")
+            removed = self.app.remove_tasks(items_to_remove)
+            self.update_status_bar(f"移除了 {removed} 个下载项。")
 
     def open_settings_window(self):
         """打开设置窗口。"""
@@ -280,6 +362,7 @@ class MainWindow:
         # --- 定义 Tkinter 变量 ---
         api_key_var = tk.StringVar()
         concurrency_var = tk.StringVar()
+        bandwidth_var = tk.StringVar()
 
         # --- API Key ---
         ttk.Label(settings_frame, text="YouTube API Key:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
@@ -293,18 +376,41 @@ class MainWindow:
         concurrency_combobox = ttk.Combobox(
             settings_frame,
             textvariable=concurrency_var,
-            values=[str(i) for i in range(1, 11)], # 1 到 10
+            # 自动 或 1 到并发上限 (线程模式为 10，进程模式为工作进程数)
+            values=[AUTO_CONCURRENCY_LABEL] + [str(i) for i in range(1, getattr(self.app, 'concurrency_limit', 10) + 1)],
             state='readonly',
             width=5
         )
         concurrency_combobox.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
 
-        # --- 下载限速行已移除 ---
+        # --- 全局下载限速 (KB/s，运行中修改立即生效) ---
+        ttk.Label(settings_frame, text="下载限速 (KB/s):").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        bandwidth_entry = ttk.Entry(settings_frame, textvariable=bandwidth_var, width=8)
+        bandwidth_entry.grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(settings_frame, text="0 表示不限速", foreground='grey').grid(row=2, column=2, padx=5, pady=5, sticky=tk.W)
 
+        # --- 下载存档 (与 yt-dlp 的 download_archive 文件互相导入导出) ---
+        ttk.Label(settings_frame, text="下载存档:").grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
+        archive_frame = ttk.Frame(settings_frame)
+        archive_frame.grid(row=3, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
 
-        # --- 底部按钮 (行号调整为 2) ---
+        def _import_archive_action():
+            path = filedialog.askopenfilename(parent=settings_window, title="选择 yt-dlp 下载存档文件",
+                                              filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")])
+            if path: self.app.import_download_archive(path, parent=settings_window)
+
+        def _export_archive_action():
+            path = filedialog.asksaveasfilename(parent=settings_window, title="导出为 yt-dlp 下载存档文件",
+                                                defaultextension=".txt", initialfile="archive.txt",
+                                                filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")])
+            if path: self.app.export_download_archive(path, parent=settings_window)
+
+        ttk.Button(archive_frame, text="导入 yt-dlp 存档...", command=_import_archive_action).pack(side=tk.LEFT)
+        ttk.Button(archive_frame, text="导出...", command=_export_archive_action).pack(side=tk.LEFT, padx=(5, 0))
+
+        # --- 底部按钮 (行号调整为 4) ---
         button_frame_settings = ttk.Frame(settings_frame)
-        button_frame_settings.grid(row=2, column=0, columnspan=3, pady=15, sticky=tk.EW) # 行号改为 2
+        button_frame_settings.grid(row=4, column=0, columnspan=3, pady=15, sticky=tk.EW) # 行号改为 4
 
         # 配置 button_frame_settings 的列权重，让中间列扩展
         # button_frame_settings.columnconfigure(0, weight=0) # 选择路径按钮列 (移除)
@@ -319,13 +425,15 @@ class MainWindow:
             api_key = api_key_var.get()
             # download_path 已移除
             concurrency = concurrency_var.get()
-            print(f"Debug: Saving settings - api_key='{api_key}', concurrency='{concurrency}'")
+            if concurrency == AUTO_CONCURRENCY_LABEL: concurrency = 'auto'
+            bandwidth_limit = bandwidth_var.get()
             # 移除调用 save_settings 的 download_path 和 placeholder_pth 参数
             self.app.save_settings(
                 api_key=api_key,
                 concurrency_str=concurrency,
                 window=settings_window,
-                placeholder_api=placeholder_api_key
+                placeholder_api=placeholder_api_key,
+                bandwidth_limit_str=bandwidth_limit
             )
 
         # 将保存按钮放在第 1 列 (改为1)
@@ -390,12 +498,16 @@ class MainWindow:
 
         # 设置下载路径初始值 (移除)
 
-        # 恢复并发数加载
-        concurrency_var.set(str(current_concurrency))
+        # 恢复并发数加载 (启用自动调节时显示"自动")
+        if self.app.get_config('autotune_enabled', False):
+            concurrency_var.set(AUTO_CONCURRENCY_LABEL)
+        else:
+            concurrency_var.set(str(current_concurrency))
 
         # 定义输入校验函数 (移除)
 
-        # 设置限速初始值 (移除)
+        # 设置限速初始值
+        bandwidth_var.set(str(self.app.get_config('bandwidth_limit_kbps', 0)))
 
 
         # 应用 Placeholder 逻辑
@@ -415,6 +527,50 @@ class MainWindow:
     # select_default_download_path 方法已不再需要，可以移除
     # def select_default_download_path(self, path_var, parent_window): ...
 
+    def open_import_progress(self, title, on_cancel):
+        """
+        打开批量导入的进度窗口 (非模态，导入期间可以继续操作主窗口)。
+
+        参数:
+            title (str): 窗口标题。
+            on_cancel (callable): 点击 "取消" 或关闭窗口时调用。
+        """
+        self.close_import_progress()
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.transient(self.root)
+        window.resizable(False, False)
+        window.protocol("WM_DELETE_WINDOW", on_cancel)
+
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(expand=True, fill="both")
+        self.import_progress_var = tk.DoubleVar(value=0.0)
+        self.import_message_var = tk.StringVar(value="正在读取链接...")
+        ttk.Progressbar(frame, variable=self.import_progress_var, maximum=100.0, length=320,
+                        mode='determinate').grid(row=0, column=0, sticky=tk.EW, pady=(0, 5))
+        ttk.Label(frame, textvariable=self.import_message_var).grid(row=1, column=0, sticky=tk.W)
+        self.import_cancel_button = ttk.Button(frame, text="取消", command=on_cancel)
+        self.import_cancel_button.grid(row=2, column=0, sticky=tk.E, pady=(10, 0))
+        self.import_window = window
+        self.center_window(window)
+
+    def update_import_progress(self, fraction, message):
+        """更新批量导入进度窗口 (fraction 为 0~1)。"""
+        if getattr(self, 'import_window', None) is None:
+            return
+        self.import_progress_var.set(round(fraction * 100.0, 1))
+        self.import_message_var.set(message)
+
+    def close_import_progress(self):
+        """关闭批量导入进度窗口 (如果存在)。"""
+        window = getattr(self, 'import_window', None)
+        self.import_window = None
+        if window is not None:
+            try:
+                window.destroy()
+            except tk.TclError:
+                pass
+
     def center_window(self, window):
         """将给定窗口在其父窗口或屏幕上居中。"""
         window.update_idletasks()
@@ -460,7 +616,7 @@ if __name__ == '__main__':
             self.root.children['!mainwindow'].update_status_bar("停止请求已发送...")
 
         # 修改 save_settings 签名，移除 download_path, placeholder_pth
-        def save_settings(self, *, api_key, concurrency_str, window, placeholder_api):
+        def save_settings(self, *, api_key, concurrency_str, window, placeholder_api, bandwidth_limit_str=None):
              try:
                 concurrency = int(concurrency_str)
                 if not 1 <= concurrency <= 10: raise ValueError("并发数必须在 1 到 10 之间")
@@ -479,8 +635,21 @@ if __name__ == '__main__':
         def start_selected_downloads(self):
             print("模拟开始下载选中项")
 
-        def mark_items_as_removed(self, item_iids):
-            print(f"模拟标记移除项: {item_iids}")
+        def toggle_task_selection(self, item_iid):
+            print(f"模拟切换选择: {item_iid}")
+
+        def get_selected_task_ids(self):
+            return []
+
+        def remove_tasks(self, item_iids):
+            print(f"模拟移除项: {item_iids}")
+            return len(item_iids)
+
+        def import_download_archive(self, path, parent=None):
+            print(f"模拟导入下载存档: {path}")
+
+        def export_download_archive(self, path, parent=None):
+            print(f"模拟导出下载存档: {path}")
 
         def load_tabs(self):
             try:
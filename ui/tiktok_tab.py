@@ -1,9 +1,13 @@
 # ui/tiktok_tab.py - TikTok Tab UI Definition
 import tkinter as tk
 from tkinter import ttk
+from tkinter import filedialog
 # 注意：这里的 command 需要调用 logic.py 中的函数，稍后处理 import 和连接
 # from ..modules.tiktok import logic # 示例：可能的相对导入
 
+# 文本框超过这么多行时，"添加到下载队列" 改为在后台线程中分批导入，避免界面卡顿
+BULK_IMPORT_LINE_THRESHOLD = 1000
+
 def create_tab(notebook, main_app_instance):
     """创建并返回 TikTok 标签页的 Frame。"""
     # 使用 ttk.Frame 并增加内边距
@@ -23,6 +27,8 @@ def create_tab(notebook, main_app_instance):
     # 使用 ttk.Button
     add_button = ttk.Button(button_frame, text="添加到下载队列", command=lambda: print("Add to queue placeholder")) # 临时占位
     download_now_button = ttk.Button(button_frame, text="立即下载", command=lambda: print("Download now placeholder")) # 临时占位
+    import_file_button = ttk.Button(button_frame, text="从文件导入...", state=tk.DISABLED)
+    import_clipboard_button = ttk.Button(button_frame, text="从剪贴板导入", state=tk.DISABLED)
 
     # --- TikTok 布局 ---
     # 标签布局
@@ -44,6 +50,8 @@ def create_tab(notebook, main_app_instance):
     button_frame.columnconfigure(3, weight=1) # 右侧空白
     add_button.grid(row=0, column=1, padx=(0, 5), pady=5, sticky="ew") # 按钮间加点间距
     download_now_button.grid(row=0, column=2, padx=(5, 0), pady=5, sticky="ew")
+    import_file_button.grid(row=1, column=1, padx=(0, 5), pady=5, sticky="ew")
+    import_clipboard_button.grid(row=1, column=2, padx=(5, 0), pady=5, sticky="ew")
 
     # 配置 TikTok Frame 的网格权重
     tiktok_frame.rowconfigure(1, weight=1) # 让 Text frame 可垂直扩展
@@ -67,20 +75,38 @@ def create_tab(notebook, main_app_instance):
         urls = urls_text.splitlines()
         return [url.strip() for url in urls if url.strip()]
 
+    def _add_urls(logic):
+        """添加文本框中的 URL；行数很多时交给后台批量导入。"""
+        line_count = int(url_text.index('end-1c').split('.')[0])
+        if line_count > BULK_IMPORT_LINE_THRESHOLD and hasattr(main_app_instance, 'import_urls'):
+            main_app_instance.import_urls(logic.PLATFORM_NAME, text=url_text.get("1.0", tk.END))
+        else:
+            logic.add_tiktok_urls(_extract_urls_from_text(url_text), main_app_instance)
+
+    def _import_from_file(logic):
+        path = filedialog.askopenfilename(parent=tiktok_frame, title="选择包含 TikTok 链接的文件",
+                                          filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")])
+        if path:
+            main_app_instance.import_urls(logic.PLATFORM_NAME, path=path)
+
+    def _configure_commands(logic):
+        add_button.config(command=lambda: _add_urls(logic))
+        download_now_button.config(command=lambda: logic.download_tiktok_urls(_extract_urls_from_text(url_text), main_app_instance))
+        if hasattr(main_app_instance, 'import_urls'):
+            import_file_button.config(state=tk.NORMAL, command=lambda: _import_from_file(logic))
+            import_clipboard_button.config(state=tk.NORMAL,
+                                           command=lambda: main_app_instance.import_urls_from_clipboard(logic.PLATFORM_NAME))
+
     def setup_commands():
         try:
             from ..modules.tiktok import logic # 尝试相对导入
-            # 修改：先提取 URL 列表再传递给 logic 函数
-            add_button.config(command=lambda: logic.add_tiktok_urls(_extract_urls_from_text(url_text), main_app_instance))
-            download_now_button.config(command=lambda: logic.download_tiktok_urls(_extract_urls_from_text(url_text), main_app_instance))
+            _configure_commands(logic)
             print("TikTok tab commands configured using relative import.")
         except ImportError:
              try:
                  # 如果在顶层运行 ui 文件测试，可能需要不同的导入方式
                  import modules.tiktok.logic as logic
-                 # 修改：先提取 URL 列表再传递给 logic 函数
-                 add_button.config(command=lambda: logic.add_tiktok_urls(_extract_urls_from_text(url_text), main_app_instance))
-                 download_now_button.config(command=lambda: logic.download_tiktok_urls(_extract_urls_from_text(url_text), main_app_instance))
+                 _configure_commands(logic)
                  print("TikTok tab commands configured using direct import (fallback).")
              except ImportError as e:
                  print(f"Error configuring TikTok commands: Could not import TikTok logic. {e}")
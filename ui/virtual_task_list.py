@@ -0,0 +1,208 @@
+# ui/virtual_task_list.py - Virtualized download list backed by the task store
+import time
+import tkinter as tk
+
+# 过滤或排序生效时，进度变化触发重新查询的最短间隔 (秒)
+REQUERY_INTERVAL = 1.0
+# 无法从 Treeview 测量时使用的默认行高和表头高度 (像素)
+DEFAULT_ROW_HEIGHT = 20
+DEFAULT_HEADER_HEIGHT = 24
+
+
+class VirtualTaskList:
+    """
+    虚拟化的下载列表：Treeview 中只存在当前可见窗口内的行。
+
+    行数据来自 TaskStore。滚动、过滤和排序只修改可见窗口的几十行，
+    列表规模 (例如 10 万个任务) 不影响界面响应速度。滚动条由本类自行维护。
+    """
+
+    def __init__(self, tree, scrollbar, summary_var=None):
+        """
+        参数:
+            tree (ttk.Treeview): 用于显示可见行的 Treeview (不要再直接插入行)。
+            scrollbar (ttk.Scrollbar): 纵向滚动条。
+            summary_var (tk.StringVar | None): 显示 "显示 X / 共 Y" 的变量。
+        """
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.summary_var = summary_var
+        self._store = None
+        self._row_values = None
+
+        self._ids = [] # 过滤和排序后的全部任务 id
+        self._top = 0 # 可见窗口第一行在 _ids 中的位置
+        self._visible_rows = tree.cget('height') or 10
+        self._rendered_ids = []
+        self._rendered_values = {} # item_id -> values (当前 Treeview 中的行)
+
+        self._statuses = None
+        self._platform = None
+        self._sort_by = None
+        self._reverse = False
+        self._store_version = None
+        self._needs_query = True
+        self._stale_since = None # 过滤/排序结果可能过期的时刻
+        self._last_summary = None
+
+        self.scrollbar.configure(command=self.yview)
+        self.tree.configure(yscrollcommand='')
+        self.tree.bind('<Configure>', self._on_configure, add='+')
+        self.tree.bind('<MouseWheel>', self._on_mousewheel, add='+')
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3), add='+')
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3), add='+')
+
+    def attach(self, store, row_values):
+        """
+        绑定数据源。
+
+        参数:
+            store (TaskStore): 任务存储。
+            row_values (callable): row_values(record) 返回一行的显示值。
+        """
+        self._store = store
+        self._row_values = row_values
+        self._needs_query = True
+        self.refresh()
+
+    # --- 过滤和排序 ---
+
+    def set_filter(self, statuses=None, platform=None):
+        """只显示指定状态 (可迭代对象) 和平台的任务，None 表示不过滤。"""
+        self._statuses = tuple(statuses) if statuses is not None else None
+        self._platform = platform
+        self._top = 0
+        self._needs_query = True
+        self.refresh()
+
+    def toggle_sort(self, column):
+        """
+        按列排序：第一次点击升序，再次点击降序，第三次恢复添加顺序。
+
+        返回:
+            tuple: (sort_by, reverse)，sort_by 为 None 表示按添加顺序。
+        """
+        if self._sort_by != column:
+            self._sort_by, self._reverse = column, False
+        elif not self._reverse:
+            self._reverse = True
+        else:
+            self._sort_by, self._reverse = None, False
+        self._needs_query = True
+        self.refresh()
+        return self._sort_by, self._reverse
+
+    # --- 刷新 ---
+
+    def refresh(self, changed_ids=(), removed_ids=()):
+        """
+        根据任务存储的变化刷新可见行 (主线程调用)。
+
+        任务增删时重新查询；过滤或排序依赖的字段变化时最多每 REQUERY_INTERVAL 秒重新查询一次；
+        其他情况只更新可见窗口中内容发生变化的行。
+        """
+        if self._store is None:
+            return
+        if self._store.version != self._store_version or removed_ids:
+            self._needs_query = True
+        elif changed_ids and self._depends_on_progress():
+            self._stale_since = self._stale_since or time.monotonic()
+        if self._stale_since and time.monotonic() - self._stale_since >= REQUERY_INTERVAL:
+            self._needs_query = True
+
+        if self._needs_query:
+            self._store_version = self._store.version
+            self._ids = self._store.query(self._statuses, self._platform, self._sort_by, self._reverse)
+            self._needs_query = False
+            self._stale_since = None
+        elif not changed_ids:
+            return
+        self._render()
+
+    def scroll(self, rows):
+        """向下 (正数) 或向上 (负数) 滚动若干行。"""
+        self._scroll_to(self._top + rows)
+        return 'break'
+
+    def yview(self, *args):
+        """滚动条回调，参数与 Treeview.yview 相同 ('moveto' 或 'scroll')。"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * len(self._ids)))
+        elif args[0] == 'scroll':
+            step = self._visible_rows if args[2] == 'pages' else 1
+            self._scroll_to(self._top + int(args[1]) * step)
+
+    # --- Internal Helpers ---
+
+    def _depends_on_progress(self):
+        """过滤或排序结果是否会随任务状态/大小/文件名变化。"""
+        return self._statuses is not None or self._sort_by in ('status', 'size', 'filename')
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, len(self._ids) - self._visible_rows))
+        if top != self._top:
+            self._top = top
+            self._render()
+
+    def _render(self):
+        total = len(self._ids)
+        self._top = max(0, min(self._top, total - self._visible_rows))
+        window = self._ids[self._top:self._top + self._visible_rows]
+        rows = []
+        for item_id in window:
+            record = self._store.get(item_id)
+            if record is not None:
+                rows.append((item_id, self._row_values(record)))
+
+        try:
+            if [item_id for item_id, _ in rows] != self._rendered_ids:
+                # 可见窗口变化: 重建这几十行
+                children = self.tree.get_children('')
+                if children:
+                    self.tree.delete(*children)
+                for item_id, values in rows:
+                    self.tree.insert('', tk.END, iid=item_id, values=values)
+                self._rendered_ids = [item_id for item_id, _ in rows]
+                self._rendered_values = dict(rows)
+            else:
+                for item_id, values in rows:
+                    if self._rendered_values.get(item_id) != values:
+                        self.tree.item(item_id, values=values)
+                        self._rendered_values[item_id] = values
+        except tk.TclError as e:
+            print(f"刷新下载列表时出错: {e}")
+
+        if total:
+            self.scrollbar.set(self._top / total, min(1.0, (self._top + self._visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._update_summary(len(self._ids), len(self._store))
+
+    def _update_summary(self, shown, total):
+        if self.summary_var is None or (shown, total) == self._last_summary:
+            return
+        self._last_summary = (shown, total)
+        if shown == total:
+            self.summary_var.set(f"共 {total} 项")
+        else:
+            self.summary_var.set(f"显示 {shown} / 共 {total} 项")
+
+    def _on_configure(self, event):
+        row_height, header_height = DEFAULT_ROW_HEIGHT, DEFAULT_HEADER_HEIGHT
+        if self._rendered_ids:
+            bbox = self.tree.bbox(self._rendered_ids[0])
+            if bbox:
+                header_height, row_height = bbox[1], max(1, bbox[3])
+        visible_rows = max(1, (event.height - header_height) // row_height)
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            if self._store is not None:
+                self._render()
+
+    def _on_mousewheel(self, event):
+        if event.delta:
+            units = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+            return self.scroll(units * 3)
+        return None